@@ -15,7 +15,9 @@ celery_app = Celery(
     include=[
         "app.tasks.exam_generation",
         "app.tasks.pdf_generation",
-        "app.tasks.analytics"
+        "app.tasks.analytics",
+        "app.tasks.gdpr_export",
+        "app.tasks.file_cleanup"
     ]
 )
 
@@ -31,4 +33,15 @@ celery_app.conf.update(
     task_soft_time_limit=240,  # 4 minutes soft limit
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=50,
+    # Tâches périodiques (worker lancé avec Celery beat)
+    beat_schedule={
+        "sweep-orphan-resource-files": {
+            "task": "sweep_orphan_resource_files",
+            "schedule": 3600.0,
+        },
+        "purge-expired-exports": {
+            "task": "purge_expired_exports",
+            "schedule": 3600.0,
+        },
+    },
 )
@@ -43,6 +43,8 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY", None)
     # Optional HTTP proxy for OpenAI requests, e.g. "http://proxy:3128"
     openai_proxy: Optional[str] = None
+    # API compatible OpenAI alternative (ex. benchmarks/fake_openai.py : "http://127.0.0.1:8100/v1")
+    openai_base_url: Optional[str] = os.getenv("OPENAI_BASE_URL", None)
     openai_model: str = "gpt-5-mini"  # Modèle par défaut (GPT-5-mini)
     gpt_5_2_model: str = "gpt-5.2"  # Expert - Raisonnement complexe (Examens, TD avancés, TP ML)
     gpt_5_mini_model: str = "gpt-5-mini"  # Principal - Pédagogique (TD standards, quiz, explications)
@@ -95,6 +97,27 @@ class Settings(BaseSettings):
     ai_monthly_token_limit: int = int(os.getenv("AI_MONTHLY_TOKEN_LIMIT", "10000000"))  # 10M tokens/mois
     ai_monthly_cost_limit_eur: float = float(os.getenv("AI_MONTHLY_COST_LIMIT_EUR", "50.0"))  # 50€/mois max
     
+    # Passerelle IA (pool de connexions OpenAI et concurrence par modèle)
+    ai_max_connections: int = int(os.getenv("AI_MAX_CONNECTIONS", "100"))
+    ai_max_keepalive_connections: int = int(os.getenv("AI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    ai_max_concurrency_per_model: int = int(os.getenv("AI_MAX_CONCURRENCY_PER_MODEL", "32"))
+    # Deadline globale d'une requête IA, retries compris (secondes)
+    ai_request_deadline_seconds: float = float(os.getenv("AI_REQUEST_DEADLINE_SECONDS", "90"))
+    ai_research_deadline_seconds: float = float(os.getenv("AI_RESEARCH_DEADLINE_SECONDS", "180"))
+    # Budget maximal (tokens) de l'historique de conversation envoyé au modèle
+    ai_history_token_budget: int = int(os.getenv("AI_HISTORY_TOKEN_BUDGET", "6000"))
+
+    # Classifieur local du Prompt Router (voir app/services/request_classifier.py)
+    # "local" : GPT seulement si la confiance est insuffisante, "shadow" : GPT décide et
+    # le classifieur local est évalué en parallèle, "gpt" : classification par GPT uniquement
+    request_classifier_mode: str = os.getenv("REQUEST_CLASSIFIER_MODE", "local")
+    request_classifier_path: str = os.getenv("REQUEST_CLASSIFIER_PATH", "")
+    request_classifier_min_confidence: float = float(os.getenv("REQUEST_CLASSIFIER_MIN_CONFIDENCE", "0.7"))
+
+    # Groupes de fonctionnalités chargés au démarrage (voir app/routers/registry.py)
+    # ex: "all", "core,tutor" ou "all,-payments"
+    enabled_features: str = os.getenv("ENABLED_FEATURES", "all")
+    
     @property
     def is_production(self) -> bool:
         """Vérifie si on est en production"""
@@ -0,0 +1,340 @@
+"""
+Manifeste déclaratif des index MongoDB
+
+Les index sont décrits une seule fois ici puis appliqués :
+- par lots (create_indexes) pour chaque collection,
+- en parallèle sur toutes les collections,
+- uniquement pour les index absents (diff avec index_information),
+- une seule fois par déploiement, sous un verrou distribué stocké dans
+  MongoDB (collection 'deploy_locks'), au lieu d'une fois par worker.
+"""
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, timezone, timedelta
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conservation des messages classifiés (données d'entraînement, index TTL)
+REQUEST_CLASSIFICATION_RETENTION = timedelta(days=90)
+
+# Collections créées explicitement au démarrage
+REQUIRED_COLLECTIONS = ["users", "modules", "progress", "password_resets", "support_messages"]
+
+INDEX_MANIFEST: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel("email", unique=True),
+        IndexModel("username", unique=True),
+    ],
+    # Liste paginée par clé (created_at, _id), avec ou sans filtres subject / difficulty
+    "modules": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("subject", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("difficulty", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("subject", ASCENDING), ("difficulty", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Recherche (titre et description)
+        IndexModel([("title", TEXT), ("description", TEXT)]),
+        # Rafraîchissement incrémental de l'index de recherche (ModuleSearchService)
+        IndexModel("updated_at"),
+    ],
+    "progress": [
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING)], unique=True),
+        IndexModel("user_id"),
+        IndexModel("started_at"),
+    ],
+    "exams": [
+        IndexModel("module_id"),
+    ],
+    "exam_attempts": [
+        # Tentatives d'un utilisateur paginées par clé (started_at, _id)
+        IndexModel([("user_id", ASCENDING), ("started_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING), ("started_at", DESCENDING), ("_id", DESCENDING)]),
+        # Tentative en cours (completed_at absent) clôturée par find_one_and_update
+        IndexModel([("user_id", ASCENDING), ("exam_id", ASCENDING), ("completed_at", ASCENDING), ("started_at", DESCENDING)]),
+    ],
+    "quizzes": [
+        IndexModel("module_id", unique=True),
+        IndexModel("created_at"),
+    ],
+    "quiz_attempts": [
+        # Tentatives paginées par clé (completed_at, _id)
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING), ("completed_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel("completed_at"),
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING)]),
+    ],
+    "module_validations": [
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING)]),
+    ],
+    # Fichiers dédupliqués référencés par file_url
+    "resources": [
+        IndexModel([("module_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel("file_url"),
+    ],
+    # Signatures MinHash des réponses ouvertes (bandes LSH : index multikey)
+    "answer_signatures": [
+        IndexModel([("exam_id", ASCENDING), ("item_key", ASCENDING), ("bands", ASCENDING)]),
+        IndexModel("attempt_id"),
+        IndexModel("user_id"),
+    ],
+    "tds": [
+        IndexModel("module_id"),
+    ],
+    "tps": [
+        IndexModel("module_id"),
+    ],
+    "learning_profiles": [
+        IndexModel("user_id", unique=True),
+        IndexModel("current_level"),
+    ],
+    "pathways": [
+        IndexModel("subject"),
+        IndexModel("status"),
+        IndexModel("created_by"),
+    ],
+    "subscriptions": [
+        IndexModel("user_id"),
+        IndexModel("stripe_subscription_id", unique=True),
+        IndexModel("status"),
+    ],
+    # Journal des webhooks Stripe (_id = id de l'événement) : reprise des événements non traités
+    "stripe_events": [
+        IndexModel([("status", ASCENDING), ("created", ASCENDING)]),
+    ],
+    "ai_requests": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    # Cost Guard - suivi des coûts
+    "ai_usage": [
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel("created_at"),
+    ],
+    # Classifications GPT journalisées (entraînement du classifieur local)
+    "request_classifications": [
+        IndexModel("message_hash", unique=True),
+        # TTL : suppression automatique après REQUEST_CLASSIFICATION_RETENTION
+        IndexModel("created_at", expireAfterSeconds=int(REQUEST_CLASSIFICATION_RETENTION.total_seconds())),
+        IndexModel("user_id"),
+    ],
+    "user_history": [
+        # Historique paginé par clé (created_at, _id), avec ou sans filtre subject / module
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("subject", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Recherche exacte par empreinte de question normalisée
+        IndexModel([("user_id", ASCENDING), ("question_hash", ASCENDING), ("created_at", DESCENDING)]),
+        # Index inversé (multikey) pour la recherche par mots-clés
+        IndexModel([("user_id", ASCENDING), ("keywords", ASCENDING)]),
+        # Recherche de similarité
+        IndexModel([("question", TEXT)]),
+    ],
+    # Stats matérialisées de l'historique
+    "user_question_counts": [
+        IndexModel([("user_id", ASCENDING), ("question_hash", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("count", DESCENDING)]),
+    ],
+    # Un document par utilisateur (upserts atomiques)
+    "pedagogical_memory": [
+        IndexModel("user_id", unique=True),
+    ],
+    "gdpr_logs": [
+        IndexModel("user_id"),
+    ],
+    "password_resets": [
+        # TTL : expiration automatique à 'expires_at'
+        IndexModel("expires_at", expireAfterSeconds=0),
+        IndexModel("token", unique=True),
+    ],
+    # Messages de soutien paginés par clé (created_at, _id), filtre 'non lus' optionnel
+    "support_messages": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("read", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+}
+
+LOCK_COLLECTION = "deploy_locks"
+# Au-delà, un verrou 'running' est considéré abandonné (worker tué pendant la création)
+LOCK_TTL = timedelta(minutes=10)
+
+
+def manifest_version(manifest: Optional[Dict[str, List[IndexModel]]] = None) -> str:
+    """Empreinte du manifeste : change dès qu'un index est ajouté ou modifié"""
+    manifest = manifest or INDEX_MANIFEST
+    description = {
+        collection: sorted(json.dumps(index.document, sort_keys=True, default=str) for index in indexes)
+        for collection, indexes in manifest.items()
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def missing_indexes(indexes: List[IndexModel], existing: Dict[str, Any]) -> List[IndexModel]:
+    """Index du manifeste absents de index_information() (comparaison par nom)"""
+    return [index for index in indexes if index.document["name"] not in existing]
+
+
+def changed_ttl_indexes(indexes: List[IndexModel], existing: Dict[str, Any]) -> List[IndexModel]:
+    """Index TTL du manifeste déjà présents avec une autre durée (ou sans TTL)"""
+    return [
+        index for index in indexes
+        if index.document.get("expireAfterSeconds") is not None
+        and index.document["name"] in existing
+        and existing[index.document["name"]].get("expireAfterSeconds") != index.document["expireAfterSeconds"]
+    ]
+
+
+async def _apply_collection(
+    database, collection: str, indexes: List[IndexModel], exists: bool
+) -> Tuple[List[str], List[str]]:
+    existing = await database[collection].index_information() if exists else {}
+    failed = []
+    # Un index existant ne change pas de nom quand on lui ajoute un TTL : collMod
+    for index in changed_ttl_indexes(indexes, existing):
+        name = index.document["name"]
+        try:
+            await database.command(
+                "collMod", collection,
+                index={"name": name, "expireAfterSeconds": index.document["expireAfterSeconds"]}
+            )
+            logger.info(f"TTL de l'index '{name}' sur '{collection}' mis à jour")
+        except Exception as e:
+            failed.append(name)
+            logger.error(f"TTL de l'index '{name}' sur '{collection}' non modifié: {e}")
+    to_create = missing_indexes(indexes, existing)
+    if not to_create:
+        return [], failed
+    try:
+        created = await database[collection].create_indexes(to_create)
+    except Exception as e:
+        # Un index en conflit ne doit pas empêcher la création des autres
+        logger.warning(f"Création groupée des index de '{collection}' échouée ({e}), création index par index")
+        created = []
+        for index in to_create:
+            try:
+                created.extend(await database[collection].create_indexes([index]))
+            except Exception as index_error:
+                failed.append(index.document["name"])
+                logger.error(f"Index '{index.document['name']}' sur '{collection}' non créé: {index_error}")
+    if created:
+        logger.info(f"Index créés sur '{collection}': {', '.join(created)}")
+    return created, failed
+
+
+async def _apply_manifest(
+    database, manifest: Dict[str, List[IndexModel]]
+) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """Index créés et index en échec, par collection"""
+    collections = set(await database.list_collection_names())
+
+    for collection in REQUIRED_COLLECTIONS:
+        if collection not in collections:
+            try:
+                await database.create_collection(collection)
+                logger.info(f"Collection '{collection}' créée")
+            except Exception as e:
+                logger.debug(f"Création de la collection '{collection}': {e}")
+            collections.add(collection)
+
+    names = list(manifest)
+    results = await asyncio.gather(
+        *[_apply_collection(database, name, manifest[name], name in collections) for name in names],
+        return_exceptions=True
+    )
+
+    created: Dict[str, List[str]] = {}
+    failed: Dict[str, List[str]] = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"Erreur lors de l'application des index de '{name}': {result}")
+            failed[name] = [index.document["name"] for index in manifest[name]]
+            continue
+        created_names, failed_names = result
+        if created_names:
+            created[name] = created_names
+        if failed_names:
+            failed[name] = failed_names
+    return created, failed
+
+
+async def apply_index_manifest(database, manifest: Optional[Dict[str, List[IndexModel]]] = None) -> Dict[str, List[str]]:
+    """
+    Applique le manifeste (collections en parallèle, index manquants uniquement)
+
+    Returns:
+        Noms des index créés par collection
+    """
+    created, _ = await _apply_manifest(database, manifest or INDEX_MANIFEST)
+    return created
+
+
+async def ensure_indexes_once(
+    database,
+    force: bool = False,
+    manifest: Optional[Dict[str, List[IndexModel]]] = None
+) -> Optional[Dict[str, List[str]]]:
+    """
+    Applique le manifeste une seule fois par version, tous workers confondus
+
+    Le premier worker obtient le verrou et crée les index ; les autres
+    (et les redémarrages suivants) ne font qu'une lecture du verrou.
+    Si un index échoue, le verrou est libéré sans être marqué "done".
+
+    Returns:
+        Index créés, ou None si un autre worker s'en charge / l'a déjà fait
+    """
+    manifest = manifest or INDEX_MANIFEST
+    lock_id = f"indexes:{manifest_version(manifest)}"
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    now = datetime.now(timezone.utc)
+    locks = database[LOCK_COLLECTION]
+
+    if not force:
+        lock = await locks.find_one({"_id": lock_id})
+        if lock and lock.get("status") == "done":
+            logger.info("Index MongoDB déjà à jour pour ce déploiement")
+            return None
+        try:
+            await locks.insert_one({
+                "_id": lock_id,
+                "status": "running",
+                "owner": owner,
+                "started_at": now,
+                "expires_at": now + LOCK_TTL
+            })
+        except DuplicateKeyError:
+            # Reprendre un verrou abandonné, sinon laisser l'autre worker terminer
+            taken = await locks.find_one_and_update(
+                {"_id": lock_id, "status": "running", "expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "started_at": now, "expires_at": now + LOCK_TTL}}
+            )
+            if not taken:
+                logger.info("Index MongoDB en cours de création par un autre worker")
+                return None
+
+    try:
+        created, failed = await _apply_manifest(database, manifest)
+    except Exception:
+        # Libérer le verrou pour qu'un autre worker puisse réessayer
+        await locks.delete_one({"_id": lock_id, "owner": owner})
+        raise
+
+    if failed:
+        # Pas de "done" : le prochain démarrage retentera les index en échec
+        await locks.delete_one({"_id": lock_id, "owner": owner})
+        logger.error(f"Index MongoDB non créés, nouvel essai au prochain démarrage: {failed}")
+        return created
+
+    await locks.update_one(
+        {"_id": lock_id},
+        {
+            "$set": {"status": "done", "owner": owner, "completed_at": datetime.now(timezone.utc)},
+            "$unset": {"expires_at": ""}
+        },
+        upsert=True
+    )
+    logger.info(f"Manifeste d'index appliqué ({sum(len(v) for v in created.values())} index créés)")
+    return created
@@ -1,5 +1,6 @@
 """
 Script de migration PostgreSQL pour créer les tables
+et migrations de données MongoDB
 """
 from app.database.postgres import Base, engine
 from app.models.postgres_models import User, Course, Module, Enrollment, UserProgress
@@ -59,10 +60,90 @@ def drop_tables():
         raise
 
 
+async def backfill_user_history_question_hash(batch_size: int = 1000) -> int:
+    """
+    Renseigne 'question_hash' et 'keywords' sur les entrées d'historique existantes
+    
+    Les entrées sont traitées par lots (bulk_write) ; la migration peut être
+    relancée sans risque, seules les entrées incomplètes sont modifiées.
+    Les statistiques matérialisées sont ensuite invalidées pour être
+    reconstruites avec les compteurs par question.
+    
+    Returns:
+        Nombre d'entrées mises à jour
+    """
+    from pymongo import UpdateOne
+    from app.database.mongo import get_database
+    from app.repositories.user_history_repository import UserHistoryRepository
+    
+    database = get_database()
+    cursor = database.user_history.find(
+        {"$or": [{"question_hash": {"$exists": False}}, {"keywords": {"$exists": False}}]},
+        {"question": 1}
+    ).batch_size(batch_size)
+    
+    updated = 0
+    operations = []
+    async for entry in cursor:
+        question = entry.get("question") or ""
+        operations.append(UpdateOne(
+            {"_id": entry["_id"]},
+            {"$set": {
+                "question_hash": UserHistoryRepository.hash_question(question),
+                "keywords": UserHistoryRepository.extract_keywords(question)
+            }}
+        ))
+        if len(operations) >= batch_size:
+            result = await database.user_history.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+            logger.info(f"Historique: {updated} entrées migrées...")
+    
+    if operations:
+        result = await database.user_history.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+    
+    if updated:
+        await database.user_history_stats.delete_many({})
+        await database.user_question_counts.delete_many({})
+    
+    logger.info(f"✅ Empreintes de questions renseignées sur {updated} entrées d'historique")
+    return updated
+
+
+async def run_mongo_migrations():
+    """Exécute les migrations de données MongoDB"""
+    from app.database.mongo import connect_to_mongo, close_mongo_connection
+    
+    await connect_to_mongo()
+    try:
+        await backfill_user_history_question_hash()
+    finally:
+        await close_mongo_connection()
+
+
+async def run_index_bootstrap():
+    """Applique le manifeste d'index sans tenir compte du verrou de déploiement"""
+    from app.database.mongo import connect_to_mongo, close_mongo_connection, ensure_collections_and_indexes
+    
+    await connect_to_mongo()
+    try:
+        created = await ensure_collections_and_indexes(force=True)
+        logger.info(f"✅ Index créés: {created or 'aucun (déjà à jour)'}")
+    finally:
+        await close_mongo_connection()
+
+
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) > 1 and sys.argv[1] == "drop":
+    if len(sys.argv) > 1 and sys.argv[1] == "mongo":
+        import asyncio
+        asyncio.run(run_mongo_migrations())
+    elif len(sys.argv) > 1 and sys.argv[1] == "indexes":
+        import asyncio
+        asyncio.run(run_index_bootstrap())
+    elif len(sys.argv) > 1 and sys.argv[1] == "drop":
         print("⚠️  ATTENTION: Vous allez supprimer toutes les tables PostgreSQL!")
         confirm = input("Tapez 'yes' pour confirmer: ")
         if confirm.lower() == "yes":
@@ -54,6 +54,20 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     )
 
 
+async def ai_quota_exception_handler(request: Request, exc: Exception):
+    """Gère le dépassement du quota IA de l'utilisateur"""
+    logger.info(f"Quota IA atteint: {request.method} {request.url.path}")
+    
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={
+            "detail": str(exc) or "Quota IA atteint",
+            "status_code": 429
+        },
+        headers={"Content-Encoding": "identity"}  # Désactiver la compression pour éviter les problèmes GZip
+    )
+
+
 async def general_exception_handler(request: Request, exc: Exception):
     """Gère les exceptions générales"""
     import traceback
@@ -1,7 +1,7 @@
 """
 Modèles de données Pydantic
 """
-from pydantic import BaseModel, EmailStr, field_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -286,6 +286,37 @@ class QuizResponse(BaseModel):
     module_id: str
     quiz_id: Optional[str] = None
 
+# Tirage de questions pour une tentative : sans corrigé, envoyé seulement à la correction
+class QuizSampleQuestion(BaseModel):
+    index: int  # position dans la banque de questions du quiz
+    question: str
+    options: List[str]
+
+class QuizSampleResponse(BaseModel):
+    module_id: str
+    quiz_id: str
+    quiz_version: int
+    seed: int
+    num_questions: int
+    questions: List[QuizSampleQuestion]
+
+class QuizGradeRequest(BaseModel):
+    """Tirage (quiz_version, seed, num_questions renvoyés par /sample) et réponses"""
+    module_id: str
+    quiz_id: str
+    quiz_version: int
+    seed: int = Field(..., ge=0)
+    num_questions: int = Field(..., ge=1, le=50)
+    answers: Dict[int, int]  # {index de la question dans la banque: answer_index}
+    time_spent: int = Field(..., ge=0)  # en secondes
+
+class QuizCorrection(BaseModel):
+    index: int
+    answer: Optional[int] = None  # None : question sans réponse (comptée fausse)
+    correct_answer: int
+    is_correct: bool
+    explanation: Optional[str] = None
+
 # Modèle pour stocker le quiz en base de données
 class Quiz(BaseModel):
     id: str
@@ -328,10 +359,15 @@ class QuizAttempt(BaseModel):
     answers: Dict[int, int]
     started_at: datetime
     completed_at: datetime
-    
+
     class Config:
         from_attributes = True
 
+class QuizGradeResponse(BaseModel):
+    """Tentative corrigée par le serveur, avec le corrigé des questions répondues"""
+    attempt: QuizAttempt
+    corrections: List[QuizCorrection]
+
 class QuizStatistics(BaseModel):
     """Statistiques de quiz pour un utilisateur"""
     module_id: str
@@ -413,6 +449,7 @@ class ExamAnswer(BaseModel):
     """Réponse à une question d'examen"""
     question_index: int
     answer: int  # Index de la réponse choisie
+    part_index: Optional[int] = None  # Sous-question (questions multi-parties)
 
 class ExamSubmission(BaseModel):
     """Modèle pour soumettre les réponses d'un examen"""
@@ -605,6 +642,7 @@ class ResourceCreate(BaseModel):
     external_url: Optional[str] = None  # Pour les liens externes
     file_size: Optional[int] = None  # Taille en bytes
     file_name: Optional[str] = None  # Nom du fichier original
+    content_hash: Optional[str] = None  # SHA-256 du contenu (stockage dédupliqué)
     
     @field_validator('title')
     @classmethod
@@ -634,6 +672,7 @@ class Resource(BaseModel):
     external_url: Optional[str] = None
     file_size: Optional[int] = None
     file_name: Optional[str] = None
+    content_hash: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -46,6 +46,11 @@ if os.path.exists(models_file):
     QuizAttemptCreate = models_pydantic.QuizAttemptCreate
     QuizAttempt = models_pydantic.QuizAttempt
     QuizStatistics = models_pydantic.QuizStatistics
+    QuizSampleQuestion = models_pydantic.QuizSampleQuestion
+    QuizSampleResponse = models_pydantic.QuizSampleResponse
+    QuizGradeRequest = models_pydantic.QuizGradeRequest
+    QuizCorrection = models_pydantic.QuizCorrection
+    QuizGradeResponse = models_pydantic.QuizGradeResponse
     # Exam models
     ExamQuestion = models_pydantic.ExamQuestion
     ExamCreate = models_pydantic.ExamCreate
@@ -124,6 +129,11 @@ __all__ = [
     "QuizAttemptCreate",
     "QuizAttempt",
     "QuizStatistics",
+    "QuizSampleQuestion",
+    "QuizSampleResponse",
+    "QuizGradeRequest",
+    "QuizCorrection",
+    "QuizGradeResponse",
     # Exam models
     "ExamQuestion",
     "ExamCreate",
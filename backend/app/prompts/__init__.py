@@ -1,22 +1,9 @@
 """
 Module des prompts officiels Kairos
+
+Les réexports sont résolus à la première utilisation : importer
+app.prompts.assembly ne charge pas le (gros) module kairos_prompts.
 """
-from app.prompts.kairos_prompts import (
-    SYSTEM_PROMPT,
-    get_prompt,
-    get_system_prompt,
-    get_gamification_prompt,
-    get_recommendation_prompt,
-    get_curriculum_prompt,
-    get_learner_profile_prompt,
-    get_evaluation_prompt,
-    get_explainability_prompt,
-    get_lab_simulation_prompt,
-    get_gamification_advanced_prompt,
-    get_multi_agent_prompt,
-    get_analytics_prompt,
-    get_academic_content_prompt
-)
 
 __all__ = [
     "SYSTEM_PROMPT",
@@ -34,3 +21,10 @@ __all__ = [
     "get_analytics_prompt",
     "get_academic_content_prompt"
 ]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from app.prompts import kairos_prompts
+        return getattr(kairos_prompts, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
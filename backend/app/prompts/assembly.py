@@ -0,0 +1,250 @@
+"""
+Assemblage des messages envoyés à OpenAI, optimisé pour le cache de préfixe
+
+OpenAI met automatiquement en cache le plus long préfixe commun des
+prompts (à partir de 1024 tokens). Pour en profiter :
+- les prompts système sont des constantes internées, identiques octet pour
+  octet d'un appel à l'autre (aucune interpolation) ;
+- tout ce qui varie (contexte du module, langue) est placé dans un message
+  séparé, APRÈS le préfixe statique ;
+- l'historique de conversation suit, en ajout seul, puis le message courant ;
+  il est borné au budget de tokens du modèle (app/utils/token_counter.py).
+
+    [system: préfixe statique] [system: contexte] [historique...] [user]
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import sys
+
+# Nombre maximal de messages d'historique conservés
+MAX_HISTORY_MESSAGES = 10
+
+RESEARCH_PROMPT_EN = """You are Kaïrox Research AI, an expert assistant at the academic and applied research level.
+
+Your mission is to analyze complex problems, propose rigorous and innovative solutions, and provide high-level reasoning.
+
+Rules:
+- Maximum precision.
+- Strict mathematical and logical reasoning.
+- Solid conceptual references.
+- No excessive simplification.
+- Structured format like scientific report."""
+
+RESEARCH_PROMPT_FR = """Tu es Kaïrox Research AI, un assistant expert de niveau académique et recherche appliquée.
+
+Ta mission est d'analyser des problématiques complexes, de proposer des solutions rigoureuses et innovantes, et de fournir des raisonnements de haut niveau.
+
+Règles :
+- Précision maximale.
+- Raisonnement mathématique et logique strict.
+- Références conceptuelles solides.
+- Aucune simplification excessive.
+- Format structuré type rapport scientifique."""
+
+EXPERT_PROMPT_EN = """You are Kaïrox Expert, an advanced pedagogical assistant specialized in scientific reasoning and in-depth analysis.
+
+Your mission is to produce accurate, rigorous, and pedagogically sound responses in physics, chemistry, mathematics, and computer science.
+
+Rules:
+- Reason step by step.
+- Justify each conclusion.
+- Use clear mathematical notation if necessary.
+- Detect and correct reasoning errors.
+- Adapt difficulty to the indicated level.
+- Never respond vaguely.
+
+Expected outputs:
+- Detailed reasoning
+- Clear final solution
+- Pedagogical tips or common pitfalls"""
+
+EXPERT_PROMPT_FR = """Tu es Kaïrox Expert, un assistant pédagogique avancé spécialisé dans le raisonnement scientifique et l'analyse approfondie.
+
+Ta mission est de produire des réponses exactes, rigoureuses et pédagogiquement solides en physique, chimie, mathématiques et informatique.
+
+Règles :
+- Raisonne étape par étape.
+- Justifie chaque conclusion.
+- Utilise des notations mathématiques claires si nécessaire.
+- Détecte et corrige les erreurs de raisonnement.
+- Adapte la difficulté au niveau indiqué.
+- Ne réponds jamais de façon vague.
+
+Sorties attendues :
+- Raisonnement détaillé
+- Solution finale claire
+- Astuces pédagogiques ou pièges courants"""
+
+TUTOR_PROMPT_EN = """You are Kaïrox Tutor, a reliable, clear, and benevolent pedagogical assistant.
+Your mission is to explain concepts in physics, chemistry, mathematics, English, and computer science in a simple, structured way adapted to the learner's level.
+
+Rules:
+- Use clear and accessible language.
+- Explain step by step.
+- Ask questions only if necessary.
+- Give concrete examples.
+- Never unnecessarily complicate things.
+- If the question exceeds your level of certainty, propose a simplified explanation or recommend a deeper analysis.
+
+Format:
+- Short titles
+- Clear lists
+- Final summary in 2-3 lines"""
+
+TUTOR_PROMPT_FR = """Tu es Kaïrox Tutor, un assistant pédagogique fiable, clair et bienveillant.
+Ta mission est d'aider les étudiants à apprendre de manière naturelle et conversationnelle.
+
+RÈGLES DE CONVERSATION :
+- Sois naturel et conversationnel, comme un vrai tuteur humain
+- Adapte la longueur de ta réponse au contexte :
+  * Salutations simples (bonjour, salut, etc.) → Réponse brève et amicale (1-2 phrases max)
+  * Questions simples → Réponse concise et directe (2-4 phrases)
+  * Questions complexes → Réponse détaillée et structurée
+- Ne donne JAMAIS de longues listes ou structures rigides pour des messages simples
+- Utilise un langage clair et accessible
+- Explique étape par étape seulement si nécessaire
+- Pose des questions de suivi seulement si pertinent
+- Donne des exemples concrets quand utile
+- Ne complexifie jamais inutilement
+
+EXEMPLES :
+- Si l'utilisateur dit "bonjour" → Réponds simplement "Bonjour ! Comment puis-je t'aider aujourd'hui ?"
+- Si l'utilisateur pose une question → Réponds directement à la question de manière concise
+- Si l'utilisateur demande une explication détaillée → Alors tu peux être plus structuré"""
+
+VISION_PROMPT_FR = """Tu es Kaïrox Tutor, un assistant pédagogique fiable, clair et bienveillant.
+Ta mission est d'aider les étudiants à apprendre de manière naturelle et conversationnelle.
+
+RÈGLES DE CONVERSATION :
+- Sois naturel et conversationnel, comme un vrai tuteur humain
+- Adapte la longueur de ta réponse au contexte :
+  * Salutations simples (bonjour, salut, etc.) → Réponse brève et amicale (1-2 phrases max)
+  * Questions simples → Réponse concise et directe (2-4 phrases)
+  * Questions complexes → Réponse détaillée et structurée
+- Ne donne JAMAIS de longues listes ou structures rigides pour des messages simples
+
+ANALYSE DE DOCUMENTS (PDF, Word, PPT, Images) :
+- Si l'utilisateur envoie un document (PDF, image, Word, PPT), analyse-le EN DÉTAIL
+- Pour les exercices dans les documents, fournis une solution COMPLÈTE et ÉTAPE PAR ÉTAPE
+- Pour les exercices mathématiques, montre TOUS les calculs étape par étape
+- Réponds directement aux questions posées sur le document
+- Si le document contient plusieurs exercices, réponds à celui demandé par l'utilisateur
+- Utilise les informations du document pour donner des réponses précises et contextuelles
+
+RÈGLES GÉNÉRALES :
+- Utilise un langage clair et accessible
+- Explique étape par étape seulement si nécessaire
+- Donne des exemples concrets quand utile
+- Ne complexifie jamais inutilement
+
+EXEMPLES :
+- Si l'utilisateur dit "bonjour" → Réponds simplement "Bonjour ! Comment puis-je t'aider aujourd'hui ?"
+- Si l'utilisateur envoie un PDF avec "répondre à l'exercice 1" → Analyse le PDF, trouve l'exercice 1, et fournis une solution complète
+- Si l'utilisateur pose une question → Réponds directement à la question de manière concise"""
+
+# (mode, langue) -> préfixe statique, interné une fois au chargement du module
+STATIC_PROMPTS: Dict[Tuple[str, str], str] = {
+    key: sys.intern(prompt)
+    for key, prompt in {
+        ("research", "fr"): RESEARCH_PROMPT_FR,
+        ("research", "en"): RESEARCH_PROMPT_EN,
+        ("expert", "fr"): EXPERT_PROMPT_FR,
+        ("expert", "en"): EXPERT_PROMPT_EN,
+        ("tutor", "fr"): TUTOR_PROMPT_FR,
+        ("tutor", "en"): TUTOR_PROMPT_EN,
+        ("vision", "fr"): VISION_PROMPT_FR,
+    }.items()
+}
+
+
+def system_prompt(mode: str = "tutor", language: str = "fr") -> str:
+    """Préfixe statique pour un mode (research, expert, tutor, vision) et une langue"""
+    prompt = STATIC_PROMPTS.get((mode, language)) or STATIC_PROMPTS.get((mode, "fr"))
+    if prompt is None:
+        raise ValueError(f"Mode de prompt inconnu: {mode}")
+    return prompt
+
+
+def language_instruction(language: str) -> str:
+    return f"LANGUE : Réponds TOUJOURS en {language}"
+
+
+def build_messages(
+    user_content: Any,
+    mode: str = "tutor",
+    language: str = "fr",
+    context: Optional[str] = None,
+    history: Optional[List[Dict[str, Any]]] = None,
+    prompt_language: Optional[str] = None,
+    force_language: bool = False,
+    model: Optional[str] = None,
+    max_completion_tokens: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Construit la liste des messages avec un préfixe stable
+
+    Args:
+        user_content: Message courant (texte ou contenu multimodal)
+        mode: Préfixe statique à utiliser (research, expert, tutor, vision)
+        language: Langue de réponse
+        context: Contexte variable (module, document...), hors préfixe
+        history: Historique de conversation (seuls les derniers messages sont gardés)
+        prompt_language: Langue du préfixe (par défaut `language`)
+        force_language: Ajoute la consigne de langue dans le message variable
+        model: Modèle cible ; si fourni, l'historique est borné en tokens
+            (et non plus seulement en nombre de messages)
+        max_completion_tokens: Tokens réservés pour la réponse
+    """
+    messages: List[Dict[str, Any]] = [
+        {"role": "system", "content": system_prompt(mode, prompt_language or language)}
+    ]
+
+    variable_parts = []
+    if context:
+        variable_parts.append(context)
+    if force_language:
+        variable_parts.append(language_instruction(language))
+    if variable_parts:
+        messages.append({"role": "system", "content": "\n\n".join(variable_parts)})
+
+    user_message = {"role": "user", "content": user_content}
+    if history and model:
+        from app.utils.token_counter import count_messages_tokens, fit_history, history_budget
+        fixed_tokens = count_messages_tokens(messages + [user_message], model)
+        budget = history_budget(model, fixed_tokens, max_completion_tokens)
+        messages.extend(fit_history(history, model, budget, max_messages=MAX_HISTORY_MESSAGES))
+    elif history:
+        messages.extend(history[-MAX_HISTORY_MESSAGES:])
+
+    messages.append(user_message)
+    return messages
+
+
+# Clés fournies par les requêtes : cache borné
+@lru_cache(maxsize=256)
+def kairos_template(subject: str, topic: str, level: str = "intermediate") -> str:
+    """
+    Template Kairos précalculé et interné (app/prompts/kairos_prompts.py)
+
+    Le formatage (niveau) n'est fait qu'une fois par combinaison ; seuls les
+    remplacements par requête (concept) restent à faire par l'appelant.
+    """
+    from app.prompts.kairos_prompts import get_prompt
+    return sys.intern(get_prompt(subject, topic, level))
+
+
+@lru_cache(maxsize=None)
+def kairos_system_prompt() -> str:
+    """Prompt système Kairos global, interné"""
+    from app.prompts.kairos_prompts import SYSTEM_PROMPT
+    return sys.intern(SYSTEM_PROMPT)
+
+
+def cached_tokens(usage: Any) -> int:
+    """Tokens du prompt servis depuis le cache OpenAI (usage.prompt_tokens_details)"""
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
@@ -0,0 +1,78 @@
+"""
+Repository pour les signatures MinHash des réponses d'examen (détection de plagiat)
+"""
+from typing import List, Dict, Any
+from app.database import get_database
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerSignatureRepository:
+    """Signatures MinHash et bandes LSH, une ligne par réponse ouverte soumise"""
+
+    @staticmethod
+    async def replace_for_attempt(attempt_id: str, signatures: List[Dict[str, Any]]) -> int:
+        """Remplace les signatures d'une tentative (resoumission idempotente)"""
+        try:
+            db = get_database()
+            await db.answer_signatures.delete_many({"attempt_id": attempt_id})
+            if not signatures:
+                return 0
+            now = datetime.now(timezone.utc)
+            for signature in signatures:
+                signature["attempt_id"] = attempt_id
+                signature.setdefault("created_at", now)
+            result = await db.answer_signatures.insert_many(signatures, ordered=False)
+            return len(result.inserted_ids)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement des signatures: {e}")
+            raise
+
+    @staticmethod
+    async def find_candidates(
+        exam_id: str,
+        item_key: str,
+        bands: List[str],
+        exclude_attempt_id: str,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Réponses partageant au moins une bande LSH (index multikey sur 'bands')"""
+        try:
+            db = get_database()
+            cursor = db.answer_signatures.find(
+                {
+                    "exam_id": exam_id,
+                    "item_key": item_key,
+                    "bands": {"$in": bands},
+                    "attempt_id": {"$ne": exclude_attempt_id}
+                },
+                {"bands": 0}
+            ).limit(limit)
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche de réponses similaires: {e}")
+            return []
+
+    @staticmethod
+    async def find_by_attempt(attempt_id: str) -> List[Dict[str, Any]]:
+        """Signatures des réponses d'une tentative"""
+        try:
+            db = get_database()
+            cursor = db.answer_signatures.find({"attempt_id": attempt_id})
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des signatures de la tentative: {e}")
+            return []
+
+    @staticmethod
+    async def find_by_exam(exam_id: str) -> List[Dict[str, Any]]:
+        """Toutes les signatures d'un examen (analyse de cohorte)"""
+        try:
+            db = get_database()
+            cursor = db.answer_signatures.find({"exam_id": exam_id})
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des signatures de l'examen: {e}")
+            return []
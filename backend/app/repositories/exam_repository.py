@@ -1,10 +1,12 @@
 """
 Repository pour la gestion des examens
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.database import get_database
 from app.schemas import serialize_doc
+from app.utils.cursor_pagination import InvalidCursorError, paginate_with_cursor
 from datetime import datetime, timezone
 import logging
 
@@ -30,6 +32,22 @@ class ExamRepository:
             logger.error(f"Erreur lors de la recherche de l'examen: {e}")
             raise
 
+    @staticmethod
+    async def find_header_by_id(exam_id: str) -> Optional[Dict[str, Any]]:
+        """Trouve un examen sans ses questions (version et paramètres de notation)"""
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_id = InputSanitizer.sanitize_object_id(exam_id)
+            if not sanitized_id:
+                return None
+
+            db = get_database()
+            exam = await db.exams.find_one({"_id": ObjectId(sanitized_id)}, {"questions": 0})
+            return serialize_doc(exam) if exam else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche de l'examen: {e}")
+            raise
+
     @staticmethod
     async def find_by_module_id(module_id: str) -> Optional[Dict[str, Any]]:
         """Trouve l'examen d'un module"""
@@ -124,12 +142,45 @@ class ExamAttemptRepository:
 
     @staticmethod
     async def find_by_user(user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """Trouve toutes les tentatives d'un utilisateur"""
+        """Trouve les tentatives d'un utilisateur (les plus récentes)"""
+        attempts, _ = await ExamAttemptRepository.find_page_by_user(user_id, limit=limit)
+        return attempts
+
+    @staticmethod
+    async def find_page_by_user(
+        user_id: str,
+        module_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page des tentatives d'un utilisateur (filtre module optionnel),
+        paginée par clé (started_at, _id)
+
+        Returns:
+            (tentatives, cursor de la page suivante ou None)
+        """
         try:
+            query = {"user_id": user_id}
+            if module_id:
+                from app.utils.security import InputSanitizer
+                sanitized_module_id = InputSanitizer.sanitize_object_id(module_id)
+                if not sanitized_module_id:
+                    return [], None
+                query["module_id"] = sanitized_module_id
+
             db = get_database()
-            cursor = db.exam_attempts.find({"user_id": user_id}).sort("started_at", -1).limit(limit)
-            attempts = await cursor.to_list(length=limit)
-            return [serialize_doc(attempt) for attempt in attempts]
+            attempts, next_cursor = await paginate_with_cursor(
+                db.exam_attempts,
+                query,
+                limit,
+                sort_field="started_at",
+                cursor=cursor,
+                scope=f"exam_attempts:{user_id}:{module_id or ''}"
+            )
+            return [serialize_doc(attempt) for attempt in attempts], next_cursor
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors de la recherche des tentatives: {e}")
             raise
@@ -187,6 +238,41 @@ class ExamAttemptRepository:
             logger.error(f"Erreur lors de la création de la tentative: {e}")
             raise
 
+    @staticmethod
+    async def complete_open_attempt(
+        user_id: str,
+        exam_id: str,
+        update_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Clôture la tentative en cours (la plus récente) en une seule opération
+
+        find_one_and_update sur l'index (user_id, exam_id, completed_at) :
+        pas de lecture de toutes les tentatives, et deux soumissions
+        simultanées ne peuvent pas clôturer la même tentative.
+
+        Returns:
+            La tentative mise à jour, ou None si aucune tentative n'est en cours
+        """
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_exam_id = InputSanitizer.sanitize_object_id(exam_id)
+            if not sanitized_exam_id:
+                return None
+
+            db = get_database()
+            update_data.setdefault("completed_at", datetime.now(timezone.utc))
+            attempt = await db.exam_attempts.find_one_and_update(
+                {"user_id": user_id, "exam_id": sanitized_exam_id, "completed_at": None},
+                {"$set": update_data},
+                sort=[("started_at", -1)],
+                return_document=ReturnDocument.AFTER
+            )
+            return serialize_doc(attempt) if attempt else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la clôture de la tentative: {e}")
+            raise
+
     @staticmethod
     async def update(attempt_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Met à jour une tentative d'examen"""
@@ -1,11 +1,14 @@
 """
 Repository pour la gestion des modules
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from bson import ObjectId
+from datetime import datetime, timezone
 from app.database import get_database
 from app.schemas import serialize_doc
 from app.models import Subject, Difficulty
+from app.services.module_search_service import ModuleSearchService
+from app.utils.cursor_pagination import InvalidCursorError, paginate_with_cursor
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,15 +22,35 @@ class ModuleRepository:
         subject: Optional[Subject] = None,
         difficulty: Optional[Difficulty] = None,
         search: Optional[str] = None,
-        skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Récupère tous les modules avec filtres optionnels et recherche"""
+        """Récupère les modules avec filtres optionnels et recherche (une page)"""
+        modules, _ = await ModuleRepository.find_page(subject, difficulty, search, limit, cursor)
+        return modules
+
+    @staticmethod
+    async def find_page(
+        subject: Optional[Subject] = None,
+        difficulty: Optional[Difficulty] = None,
+        search: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page de modules, paginée par clé (created_at, _id)
+
+        Returns:
+            (modules, cursor de la page suivante ou None)
+
+        Raises:
+            InvalidCursorError: cursor falsifié ou émis pour une autre liste
+        """
         try:
             db = get_database()
             if db is None:
                 logger.error("Base de données non disponible")
-                return []
+                return [], None
             
             query = {}
             
@@ -36,21 +59,15 @@ class ModuleRepository:
             if difficulty:
                 query["difficulty"] = difficulty.value
             
-            # Recherche textuelle optimisée
+            # Recherche plein texte : index inversé en mémoire (accents, préfixes),
+            # la liste reste paginée par date sur les modules correspondants
             if search:
                 search_term = search.strip()[:100]  # Limiter la longueur
                 if search_term:
-                    # Utiliser regex pour la recherche (compatible même sans index texte)
-                    import re
-                    escaped_search = re.escape(search_term)
-                    search_regex = {"$regex": escaped_search, "$options": "i"}
-                    query["$or"] = [
-                        {"title": search_regex},
-                        {"description": search_regex}
-                    ]
-            
-            # Trier par created_at (plus rapide avec index)
-            sort_key = [("created_at", -1)]
+                    matching_ids = await ModuleSearchService.matching_ids(search_term)
+                    if not matching_ids:
+                        return [], None
+                    query["_id"] = {"$in": [ObjectId(module_id) for module_id in matching_ids]}
             
             # Projection pour exclure le contenu volumineux (optimisation performance)
             # Le contenu sera chargé uniquement si nécessaire (détail du module)
@@ -58,8 +75,16 @@ class ModuleRepository:
                 "content": 0  # Exclure le contenu volumineux de la liste
             }
             
-            cursor = db.modules.find(query, projection).skip(skip).limit(limit).sort(sort_key)
-            modules = await cursor.to_list(length=limit)
+            # Pagination par clé (created_at, _id), servie par les index du manifeste
+            modules, next_cursor = await paginate_with_cursor(
+                db.modules,
+                query,
+                limit,
+                sort_field="created_at",
+                cursor=cursor,
+                projection=projection,
+                scope=f"modules:{query.get('subject')}:{query.get('difficulty')}:{search or ''}"
+            )
             
             # Sérialiser les modules avec gestion d'erreurs et filtrage des sujets invalides
             serialized_modules = []
@@ -88,11 +113,13 @@ class ModuleRepository:
                     # Continuer avec les autres modules
                     continue
             
-            return serialized_modules
+            return serialized_modules, next_cursor
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des modules: {e}", exc_info=True)
             # Retourner une liste vide au lieu de lever une exception
-            return []
+            return [], None
     
     @staticmethod
     async def find_by_id(module_id: str) -> Optional[Dict[str, Any]]:
@@ -130,7 +157,9 @@ class ModuleRepository:
             db = get_database()
             result = await db.modules.insert_one(module_data)
             module_data["_id"] = result.inserted_id
-            return serialize_doc(module_data)
+            serialized = serialize_doc(module_data)
+            ModuleSearchService.on_module_saved(serialized)
+            return serialized
         except Exception as e:
             logger.error(f"Erreur lors de la création du module: {e}")
             raise
@@ -146,11 +175,18 @@ class ModuleRepository:
                 return None
             
             db = get_database()
+            # updated_at sert aussi au rafraîchissement de l'index de recherche des autres workers
+            update_data.setdefault("updated_at", datetime.now(timezone.utc))
             await db.modules.update_one(
                 {"_id": ObjectId(sanitized_id)},
                 {"$set": update_data}
             )
-            return await ModuleRepository.find_by_id(sanitized_id)
+            module = await ModuleRepository.find_by_id(sanitized_id)
+            ModuleSearchService.on_module_saved(module)
+            # Import local : lab_simulation_service importe ce module
+            from app.services.lab_simulation_service import LabSimulationService
+            LabSimulationService.invalidate_config_cache(sanitized_id)
+            return module
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour du module: {e}")
             raise
@@ -167,6 +203,9 @@ class ModuleRepository:
             
             db = get_database()
             result = await db.modules.delete_one({"_id": ObjectId(sanitized_id)})
+            ModuleSearchService.on_module_deleted(sanitized_id)
+            from app.services.lab_simulation_service import LabSimulationService
+            LabSimulationService.invalidate_config_cache(sanitized_id)
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Erreur lors de la suppression du module: {e}")
@@ -10,6 +10,9 @@ from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Nombre maximal de concepts conservés dans l'historique d'erreurs
+MAX_ERROR_HISTORY = 100
+
 
 class PedagogicalMemoryRepository:
     """Repository pour les opérations CRUD sur la mémoire pédagogique"""
@@ -51,124 +54,123 @@ class PedagogicalMemoryRepository:
     
     @staticmethod
     async def update(user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Met à jour la mémoire pédagogique"""
+        """Met à jour la mémoire pédagogique (un seul aller-retour, document retourné)"""
         try:
             from app.utils.security import InputSanitizer
+            from pymongo import ReturnDocument
             sanitized_user_id = InputSanitizer.sanitize_string(str(user_id)) if user_id else None
             if not sanitized_user_id:
                 return None
             
-            update_data["updated_at"] = datetime.now(timezone.utc)
+            now = datetime.now(timezone.utc)
+            update_data["updated_at"] = now
             
             db = get_database()
-            await db.pedagogical_memory.update_one(
+            memory = await db.pedagogical_memory.find_one_and_update(
                 {"user_id": sanitized_user_id},
-                {"$set": update_data},
-                upsert=True
+                {"$set": update_data, "$setOnInsert": {"created_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
-            return await PedagogicalMemoryRepository.find_by_user(sanitized_user_id)
+            return serialize_doc(memory) if memory else None
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour de la mémoire pédagogique: {e}")
             raise
     
     @staticmethod
     async def add_error(user_id: str, concept: str, error_type: str):
-        """Ajoute une erreur à l'historique"""
+        """
+        Ajoute une erreur à l'historique
+        
+        Concept déjà connu : un seul update_one positionnel ($inc, $addToSet).
+        Nouveau concept : $push borné par $slice, avec upsert du document.
+        """
         try:
             from app.utils.security import InputSanitizer
+            from pymongo.errors import DuplicateKeyError
             sanitized_user_id = InputSanitizer.sanitize_string(str(user_id)) if user_id else None
             if not sanitized_user_id:
                 return
             
             db = get_database()
-            memory = await db.pedagogical_memory.find_one({"user_id": sanitized_user_id})
+            now = datetime.now(timezone.utc)
             
-            if not memory:
-                # Créer la mémoire si elle n'existe pas
-                await db.pedagogical_memory.insert_one({
-                    "user_id": sanitized_user_id,
-                    "error_history": [],
-                    "subject_levels": {},
-                    "learning_style": {},
-                    "created_at": datetime.now(timezone.utc),
-                    "updated_at": datetime.now(timezone.utc)
-                })
-                memory = await db.pedagogical_memory.find_one({"user_id": sanitized_user_id})
-            
-            # Trouver ou créer l'entrée d'erreur pour ce concept
-            error_history = memory.get("error_history", [])
-            error_entry = None
-            for entry in error_history:
-                if entry.get("concept") == concept:
-                    error_entry = entry
-                    break
-            
-            if error_entry:
-                # Mettre à jour l'entrée existante
-                error_entry["error_count"] = error_entry.get("error_count", 0) + 1
-                error_entry["last_error_at"] = datetime.now(timezone.utc)
-                if error_type not in error_entry.get("error_types", []):
-                    error_entry.setdefault("error_types", []).append(error_type)
-            else:
-                # Créer une nouvelle entrée
-                error_history.append({
-                    "concept": concept,
-                    "error_count": 1,
-                    "last_error_at": datetime.now(timezone.utc),
-                    "error_types": [error_type]
-                })
-            
-            await db.pedagogical_memory.update_one(
-                {"user_id": sanitized_user_id},
-                {
-                    "$set": {
-                        "error_history": error_history,
-                        "updated_at": datetime.now(timezone.utc)
+            for _ in range(2):
+                result = await db.pedagogical_memory.update_one(
+                    {"user_id": sanitized_user_id, "error_history.concept": concept},
+                    {
+                        "$inc": {"error_history.$.error_count": 1},
+                        "$set": {"error_history.$.last_error_at": now, "updated_at": now},
+                        "$addToSet": {"error_history.$.error_types": error_type}
                     }
-                }
-            )
+                )
+                if result.matched_count:
+                    return
+                
+                try:
+                    await db.pedagogical_memory.update_one(
+                        {"user_id": sanitized_user_id, "error_history.concept": {"$ne": concept}},
+                        {
+                            "$push": {
+                                "error_history": {
+                                    "$each": [{
+                                        "concept": concept,
+                                        "error_count": 1,
+                                        "last_error_at": now,
+                                        "error_types": [error_type]
+                                    }],
+                                    "$slice": -MAX_ERROR_HISTORY
+                                }
+                            },
+                            "$set": {"updated_at": now},
+                            "$setOnInsert": {
+                                "subject_levels": {},
+                                "learning_style": {},
+                                "created_at": now
+                            }
+                        },
+                        upsert=True
+                    )
+                    return
+                except DuplicateKeyError:
+                    # Le concept a été ajouté entre-temps par une autre requête : incrémenter
+                    continue
         except Exception as e:
             logger.error(f"Erreur lors de l'ajout d'erreur à la mémoire: {e}")
     
     @staticmethod
     async def update_subject_level(user_id: str, subject: str, level: str, confidence_score: float):
-        """Met à jour le niveau d'une matière"""
+        """Met à jour le niveau d'une matière (un seul update_one avec upsert)"""
         try:
             from app.utils.security import InputSanitizer
             sanitized_user_id = InputSanitizer.sanitize_string(str(user_id)) if user_id else None
             if not sanitized_user_id:
                 return
             
-            db = get_database()
-            memory = await db.pedagogical_memory.find_one({"user_id": sanitized_user_id})
-            
-            if not memory:
-                await db.pedagogical_memory.insert_one({
-                    "user_id": sanitized_user_id,
-                    "subject_levels": {},
-                    "error_history": [],
-                    "learning_style": {},
-                    "created_at": datetime.now(timezone.utc),
-                    "updated_at": datetime.now(timezone.utc)
-                })
-                memory = await db.pedagogical_memory.find_one({"user_id": sanitized_user_id})
-            
-            subject_levels = memory.get("subject_levels", {})
-            subject_levels[subject] = {
-                "subject": subject,
-                "level": level,
-                "confidence_score": confidence_score,
-                "last_assessed_at": datetime.now(timezone.utc)
-            }
+            # Les clés MongoDB ne peuvent pas contenir '.' ni commencer par '$'
+            subject_key = subject.replace(".", "_").replace("$", "_")
+            now = datetime.now(timezone.utc)
             
+            db = get_database()
             await db.pedagogical_memory.update_one(
                 {"user_id": sanitized_user_id},
                 {
                     "$set": {
-                        "subject_levels": subject_levels,
-                        "updated_at": datetime.now(timezone.utc)
+                        f"subject_levels.{subject_key}": {
+                            "subject": subject,
+                            "level": level,
+                            "confidence_score": confidence_score,
+                            "last_assessed_at": now
+                        },
+                        "updated_at": now
+                    },
+                    "$setOnInsert": {
+                        "error_history": [],
+                        "learning_style": {},
+                        "created_at": now
                     }
-                }
+                },
+                upsert=True
             )
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour du niveau: {e}")
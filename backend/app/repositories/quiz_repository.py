@@ -1,21 +1,27 @@
 """
 Repository pour la gestion des quiz
 """
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timezone
 from bson import ObjectId
 from app.database import get_database
 from app.schemas import serialize_doc
+from app.utils.cursor_pagination import InvalidCursorError, paginate_with_cursor
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Champs envoyés au client pour répondre (sans corrigé) et champs du corrigé
+QUESTION_FIELDS = ("question", "options")
+ANSWER_KEY_FIELDS = ("correct_answer", "explanation")
+
 
 class QuizRepository:
     """Repository pour les opérations CRUD sur les quiz"""
     
     @staticmethod
-    async def find_by_module_id(module_id: str) -> Optional[Dict[str, Any]]:
-        """Trouve le quiz d'un module"""
+    async def find_by_module_id(module_id: str, question_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Trouve le quiz d'un module (question_limit : seules les N premières questions sont lues, via $slice)"""
         try:
             from app.utils.security import InputSanitizer
             # Valider l'ObjectId
@@ -24,12 +30,82 @@ class QuizRepository:
                 return None
             
             db = get_database()
-            quiz = await db.quizzes.find_one({"module_id": sanitized_id})
+            projection = {"questions": {"$slice": question_limit}} if question_limit is not None else None
+            quiz = await db.quizzes.find_one({"module_id": sanitized_id}, projection)
             return serialize_doc(quiz) if quiz else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche du quiz: {e}")
             raise
     
+    @staticmethod
+    async def find_summary(module_id: str) -> Optional[Dict[str, Any]]:
+        """Id, statut, version et nombre de questions du quiz d'un module, sans lire les questions"""
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_id = InputSanitizer.sanitize_object_id(module_id)
+            if not sanitized_id:
+                return None
+            
+            db = get_database()
+            result = await db.quizzes.aggregate([
+                {"$match": {"module_id": sanitized_id}},
+                {"$project": {
+                    "module_id": 1,
+                    "generation_status": 1,
+                    "updated_at": 1,
+                    "version": {"$ifNull": ["$version", 0]},
+                    "num_questions": {"$size": {"$ifNull": ["$questions", []]}}
+                }}
+            ]).to_list(length=1)
+            return serialize_doc(result[0]) if result else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche du quiz: {e}")
+            raise
+    
+    @staticmethod
+    async def find_questions_at(
+        module_id: str,
+        indexes: List[int],
+        fields: Tuple[str, ...] = QUESTION_FIELDS
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Questions d'indices donnés du quiz d'un module, réduites à 'fields'
+        
+        La sélection ($arrayElemAt) et la projection sont faites par MongoDB :
+        seules les questions demandées quittent la base, avec leur champ 'index'.
+        Les indices hors du quiz sont ignorés.
+        """
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_id = InputSanitizer.sanitize_object_id(module_id)
+            if not sanitized_id:
+                return None
+            
+            indexes = [int(i) for i in indexes if int(i) >= 0]
+            db = get_database()
+            result = await db.quizzes.aggregate([
+                {"$match": {"module_id": sanitized_id}},
+                {"$project": {
+                    "version": {"$ifNull": ["$version", 0]},
+                    "questions": {"$map": {
+                        "input": {"$filter": {
+                            "input": indexes,
+                            "as": "i",
+                            "cond": {"$lt": ["$$i", {"$size": {"$ifNull": ["$questions", []]}}]}
+                        }},
+                        "as": "i",
+                        "in": {"$let": {
+                            "vars": {"q": {"$arrayElemAt": ["$questions", "$$i"]}},
+                            "in": {"index": "$$i", **{field: f"$$q.{field}" for field in fields}}
+                        }}
+                    }}
+                }}
+            ]).to_list(length=1)
+            return serialize_doc(result[0]) if result else None
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture des questions du quiz: {e}")
+            raise
+    
     @staticmethod
     async def create(quiz_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crée un nouveau quiz"""
@@ -52,15 +128,125 @@ class QuizRepository:
                 return None
             
             db = get_database()
+            # Chaque mise à jour du contenu change la version (tirages en cours invalidés)
             await db.quizzes.update_one(
                 {"module_id": sanitized_id},
-                {"$set": update_data}
+                {"$set": update_data, "$inc": {"version": 1}}
             )
             return await QuizRepository.find_by_module_id(sanitized_id)
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour du quiz: {e}")
             raise
-    
+
+    @staticmethod
+    async def start_generation(module_id: str, stale_before: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Réserve la génération du quiz du module : le vide (créé si besoin), change
+        sa version et le marque en cours de génération
+
+        La réservation échoue si une génération plus récente que stale_before est
+        déjà en cours (deux élèves, double clic, force_regenerate).
+
+        Returns:
+            {"id", "version"} de la génération réservée, None si une génération est déjà en cours
+        """
+        try:
+            from app.utils.security import InputSanitizer
+            from pymongo import ReturnDocument
+            from pymongo.errors import DuplicateKeyError
+            sanitized_id = InputSanitizer.sanitize_object_id(module_id)
+            if not sanitized_id:
+                return None
+
+            now = datetime.now(timezone.utc)
+            db = get_database()
+            try:
+                quiz = await db.quizzes.find_one_and_update(
+                    {
+                        "module_id": sanitized_id,
+                        "$or": [
+                            {"generation_status": {"$ne": "generating"}},
+                            {"updated_at": {"$exists": False}},
+                            {"updated_at": {"$lt": stale_before}}
+                        ]
+                    },
+                    {
+                        "$set": {
+                            "questions": [],
+                            "num_questions": 0,
+                            "generation_status": "generating",
+                            "updated_at": now
+                        },
+                        "$inc": {"version": 1},
+                        "$setOnInsert": {"module_id": sanitized_id, "created_at": now}
+                    },
+                    projection={"version": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Le quiz existe et une génération récente est en cours (index unique sur module_id)
+                return None
+            return {"id": str(quiz["_id"]), "version": quiz["version"]}
+        except Exception as e:
+            logger.error(f"Erreur lors du démarrage de la génération du quiz: {e}")
+            raise
+
+    @staticmethod
+    async def append_questions(module_id: str, version: int, questions: List[Dict[str, Any]]) -> bool:
+        """
+        Ajoute des questions générées au quiz du module, pour la génération 'version'
+
+        Returns:
+            False si une autre génération a remplacé celle-ci
+        """
+        if not questions:
+            return True
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_id = InputSanitizer.sanitize_object_id(module_id)
+            if not sanitized_id:
+                return False
+
+            db = get_database()
+            result = await db.quizzes.update_one(
+                {"module_id": sanitized_id, "version": version},
+                {
+                    "$push": {"questions": {"$each": questions}},
+                    "$inc": {"num_questions": len(questions)},
+                    "$set": {"updated_at": datetime.now(timezone.utc)}
+                }
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Erreur lors de l'ajout des questions au quiz: {e}")
+            raise
+
+    @staticmethod
+    async def set_generation_status(module_id: str, version: int, status: str) -> bool:
+        """
+        Met à jour le statut de génération du quiz (generating, complete, incomplete),
+        pour la génération 'version'
+
+        Returns:
+            False si une autre génération a remplacé celle-ci
+        """
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_id = InputSanitizer.sanitize_object_id(module_id)
+            if not sanitized_id:
+                return False
+
+            db = get_database()
+            result = await db.quizzes.update_one(
+                {"module_id": sanitized_id, "version": version},
+                {"$set": {"generation_status": status, "updated_at": datetime.now(timezone.utc)}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour du statut de génération du quiz: {e}")
+            raise
+
     @staticmethod
     async def delete(module_id: str) -> bool:
         """Supprime le quiz d'un module"""
@@ -129,6 +315,43 @@ class QuizRepository:
             logger.error(f"Erreur lors de la recherche des tentatives: {e}")
             return []
     
+    @staticmethod
+    async def find_attempts_page(
+        user_id: str,
+        module_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page des tentatives de quiz d'un utilisateur pour un module,
+        paginée par clé (completed_at, _id), plus récentes en premier
+        
+        Returns:
+            (tentatives, cursor de la page suivante ou None)
+        """
+        try:
+            from app.utils.security import InputSanitizer
+            sanitized_user_id = InputSanitizer.sanitize_object_id(user_id)
+            sanitized_module_id = InputSanitizer.sanitize_object_id(module_id)
+            if not sanitized_user_id or not sanitized_module_id:
+                return [], None
+            
+            db = get_database()
+            attempts, next_cursor = await paginate_with_cursor(
+                db.quiz_attempts,
+                {"user_id": sanitized_user_id, "module_id": sanitized_module_id},
+                limit,
+                sort_field="completed_at",
+                cursor=cursor,
+                scope=f"quiz_attempts:{sanitized_user_id}:{sanitized_module_id}"
+            )
+            return [serialize_doc(attempt) for attempt in attempts], next_cursor
+        except InvalidCursorError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche des tentatives: {e}")
+            return [], None
+    
     @staticmethod
     async def get_statistics(user_id: str, module_id: str) -> Optional[Dict[str, Any]]:
         """Calcule les statistiques de quiz pour un utilisateur et un module"""
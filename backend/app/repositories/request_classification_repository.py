@@ -0,0 +1,67 @@
+"""
+Repository pour les classifications de requêtes produites par GPT (données d'entraînement)
+"""
+from typing import List, Dict, Any, Optional
+from app.database import get_database
+from datetime import datetime, timezone
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RequestClassificationRepository:
+    """Une ligne par message distinct classifié par GPT (catégorie 1 à 4)"""
+
+    @staticmethod
+    def message_hash(message: str) -> str:
+        normalized = " ".join(message.lower().split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    async def record(
+        message: str,
+        category: int,
+        context: Optional[str] = None,
+        local_category: Optional[int] = None,
+        local_confidence: Optional[float] = None,
+        user_id: Optional[str] = None
+    ) -> None:
+        """
+        Enregistre (ou met à jour) la classification GPT d'un message
+
+        user_id (auteur du message) rattache la ligne à l'export et à la
+        suppression RGPD ; elle expire sinon par l'index TTL sur created_at.
+        """
+        try:
+            db = get_database()
+            await db.request_classifications.update_one(
+                {"message_hash": RequestClassificationRepository.message_hash(message)},
+                {
+                    "$set": {
+                        "message": message,
+                        "context": context,
+                        "category": category,
+                        "local_category": local_category,
+                        "local_confidence": local_confidence,
+                        "user_id": user_id,
+                        "created_at": datetime.now(timezone.utc)
+                    }
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Classification non journalisée: {e}")
+
+    @staticmethod
+    async def find_all(limit: int = 100000) -> List[Dict[str, Any]]:
+        """Exemples d'entraînement (message, contexte, catégorie)"""
+        try:
+            db = get_database()
+            cursor = db.request_classifications.find(
+                {}, {"_id": 0, "message": 1, "context": 1, "category": 1}
+            ).sort("created_at", -1).limit(limit)
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des classifications: {e}")
+            return []
@@ -45,6 +45,16 @@ class ResourceRepository:
             logger.error(f"Erreur lors de la recherche de la ressource: {e}")
             raise
 
+    @staticmethod
+    async def count_by_file_url(file_url: str) -> int:
+        """Compte les ressources qui référencent un fichier stocké"""
+        try:
+            db = get_database()
+            return await db.resources.count_documents({"file_url": file_url})
+        except Exception as e:
+            logger.error(f"Erreur lors du comptage des références au fichier: {e}")
+            raise
+
     @staticmethod
     async def create(resource_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crée une nouvelle ressource"""
@@ -0,0 +1,110 @@
+"""
+Repository des événements Stripe reçus par webhook
+
+Chaque événement est enregistré une seule fois, avec l'identifiant Stripe
+comme _id : une nouvelle livraison du même événement est un doublon.
+Statuts : pending -> processing -> processed (ou failed, retenté jusqu'à MAX_ATTEMPTS).
+"""
+from typing import Optional, List, Dict, Any
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.database import get_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de traitements d'un événement avant abandon
+MAX_ATTEMPTS = 5
+# Un événement resté 'processing' plus longtemps appartient à un worker arrêté
+STALE_PROCESSING_SECONDS = 300
+
+
+class StripeEventRepository:
+    """Journal idempotent des événements Stripe"""
+
+    @staticmethod
+    async def insert_if_new(event_record: Dict[str, Any]) -> bool:
+        """
+        Enregistre un événement reçu
+
+        Returns:
+            False si l'événement a déjà été reçu (livraison en double)
+        """
+        try:
+            db = get_database()
+            await db.stripe_events.insert_one({
+                **event_record,
+                "status": "pending",
+                "attempts": 0,
+                "received_at": datetime.now(timezone.utc)
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            logger.error(f"Erreur enregistrement événement Stripe: {e}", exc_info=True)
+            raise
+
+    @staticmethod
+    async def claim(event_id: str) -> Optional[Dict[str, Any]]:
+        """Réserve un événement à traiter (None s'il est déjà traité ou pris par un autre worker)"""
+        try:
+            db = get_database()
+            stale_before = datetime.now(timezone.utc) - timedelta(seconds=STALE_PROCESSING_SECONDS)
+            return await db.stripe_events.find_one_and_update(
+                {
+                    "_id": event_id,
+                    "attempts": {"$lt": MAX_ATTEMPTS},
+                    "$or": [
+                        {"status": {"$in": ["pending", "failed"]}},
+                        {"status": "processing", "claimed_at": {"$lt": stale_before}}
+                    ]
+                },
+                {
+                    "$set": {"status": "processing", "claimed_at": datetime.now(timezone.utc)},
+                    "$inc": {"attempts": 1}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Erreur réservation événement Stripe {event_id}: {e}", exc_info=True)
+            raise
+
+    @staticmethod
+    async def mark_processed(event_id: str) -> None:
+        try:
+            db = get_database()
+            await db.stripe_events.update_one(
+                {"_id": event_id},
+                {"$set": {"status": "processed", "processed_at": datetime.now(timezone.utc)},
+                 "$unset": {"error": ""}}
+            )
+        except Exception as e:
+            logger.error(f"Erreur mise à jour événement Stripe {event_id}: {e}", exc_info=True)
+            raise
+
+    @staticmethod
+    async def mark_failed(event_id: str, error: str) -> None:
+        try:
+            db = get_database()
+            await db.stripe_events.update_one(
+                {"_id": event_id},
+                {"$set": {"status": "failed", "error": error[:500]}}
+            )
+        except Exception as e:
+            logger.error(f"Erreur mise à jour événement Stripe {event_id}: {e}", exc_info=True)
+
+    @staticmethod
+    async def find_unprocessed(limit: int = 500) -> List[Dict[str, Any]]:
+        """Événements en attente ou à retenter, dans l'ordre de création Stripe"""
+        try:
+            db = get_database()
+            cursor = db.stripe_events.find(
+                {"status": {"$in": ["pending", "failed", "processing"]}, "attempts": {"$lt": MAX_ATTEMPTS}},
+                {"_id": 1, "subscription_key": 1, "created": 1, "status": 1, "claimed_at": 1}
+            ).sort([("created", 1)]).limit(limit)
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Erreur lecture des événements Stripe en attente: {e}", exc_info=True)
+            return []
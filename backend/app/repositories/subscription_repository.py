@@ -5,6 +5,8 @@ from typing import Optional, Dict, Any
 from app.database import get_database
 from app.schemas import serialize_doc
 from bson import ObjectId
+from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -63,6 +65,79 @@ class SubscriptionRepository:
             logger.error(f"Erreur mise à jour abonnement: {e}", exc_info=True)
             raise
     
+    @staticmethod
+    async def apply_stripe_update(
+        stripe_subscription_id: str,
+        update_data: Dict[str, Any],
+        event_created: Optional[int],
+        watermark: str = "status_event_at",
+        set_on_insert: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """
+        Applique un événement Stripe à un abonnement (créé s'il n'existe pas encore)
+
+        Les événements sont appliqués dans l'ordre de leur date Stripe, comparée
+        au champ 'watermark' propre au type d'événement : 'status_event_at' pour
+        les changements de statut, 'payment_event_at' pour les factures payées.
+        Une facture récente ne fait donc pas ignorer un changement de statut plus
+        ancien. event_created=None : mise à jour inconditionnelle.
+
+        Returns:
+            False si l'événement était plus ancien que l'état enregistré
+        """
+        try:
+            db = get_database()
+            query: Dict[str, Any] = {"stripe_subscription_id": stripe_subscription_id}
+            update: Dict[str, Any] = {"$set": dict(update_data)}
+            if event_created is not None:
+                query["$or"] = [
+                    {watermark: {"$exists": False}},
+                    {watermark: {"$lte": event_created}}
+                ]
+                update["$set"][watermark] = event_created
+            update["$setOnInsert"] = {"created_at": datetime.now(timezone.utc), **(set_on_insert or {})}
+            await db.subscriptions.update_one(query, update, upsert=True)
+            return True
+        except DuplicateKeyError:
+            # L'abonnement existe avec un watermark plus récent : l'upsert a échoué sur l'index unique
+            logger.info(f"Événement Stripe obsolète ignoré pour l'abonnement {stripe_subscription_id}")
+            return False
+        except Exception as e:
+            logger.error(f"Erreur mise à jour abonnement: {e}", exc_info=True)
+            raise
+    
+    @staticmethod
+    async def activate_unless_status_event(stripe_subscription_id: str, event_created: int) -> bool:
+        """
+        Passe l'abonnement en "active" si aucun événement de statut n'a encore
+        fixé son statut (status_event_at absent) ; le checkout devient alors
+        l'événement de statut de référence
+        """
+        try:
+            db = get_database()
+            result = await db.subscriptions.update_one(
+                {"stripe_subscription_id": stripe_subscription_id, "status_event_at": {"$exists": False}},
+                {"$set": {"status": "active", "status_event_at": event_created}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Erreur activation abonnement: {e}", exc_info=True)
+            raise
+    
+    @staticmethod
+    async def find_user_id_by_stripe_id(stripe_subscription_id: str) -> Optional[str]:
+        """Utilisateur d'un abonnement Stripe (None si inconnu ou pas encore rattaché)"""
+        try:
+            db = get_database()
+            subscription = await db.subscriptions.find_one(
+                {"stripe_subscription_id": stripe_subscription_id},
+                {"user_id": 1}
+            )
+            return subscription.get("user_id") if subscription else None
+        except Exception as e:
+            logger.error(f"Erreur récupération abonnement: {e}", exc_info=True)
+            return None
+    
     @staticmethod
     async def get_by_user_id(user_id: str) -> Optional[Dict[str, Any]]:
         """Récupère l'abonnement d'un utilisateur"""
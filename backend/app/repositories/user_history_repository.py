@@ -1,18 +1,65 @@
 """
 Repository pour l'historique utilisateur (MongoDB)
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
 from app.database import get_database
 from app.models.user_history import HistoryEntry, Subject
+from app.utils.cursor_pagination import InvalidCursorError, paginate_with_cursor
+from pymongo import DESCENDING, ReturnDocument
+import hashlib
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Nombre de questions fréquentes renvoyées par get_stats
+MOST_ASKED_LIMIT = 10
+
+# Recalculs des stats tentés avant d'abandonner face aux incrémentations concurrentes
+REBUILD_ATTEMPTS = 3
+
+# Mots-clés indexés par entrée (index inversé multikey sur 'keywords')
+KEYWORD_MIN_LENGTH = 4
+MAX_KEYWORDS = 20
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _stats_key(value: str) -> str:
+    """Échappe une valeur utilisée comme clé de sous-document ("gpt-5.2" contient un point)"""
+    return str(value).replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def _unstats_key(key: str) -> str:
+    """Inverse de _stats_key"""
+    return key.replace("\uff0e", ".").replace("\uff04", "$")
+
 
 class UserHistoryRepository:
     """Repository pour gérer l'historique utilisateur"""
     
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Normalise une question (minuscules, espaces)"""
+        return " ".join(question.lower().split())
+    
+    @staticmethod
+    def hash_question(question: str) -> str:
+        """Empreinte de la question normalisée (comptage des questions fréquentes)"""
+        normalized = UserHistoryRepository.normalize_question(question)
+        return hashlib.md5(normalized.encode()).hexdigest()
+    
+    @staticmethod
+    def extract_keywords(question: str) -> List[str]:
+        """Mots-clés d'une question (mots de 4+ caractères, sans doublons)"""
+        keywords: List[str] = []
+        for word in _WORD_RE.findall(question.lower()):
+            if len(word) >= KEYWORD_MIN_LENGTH and word not in keywords:
+                keywords.append(word)
+                if len(keywords) >= MAX_KEYWORDS:
+                    break
+        return keywords
+    
     @staticmethod
     async def create_entry(entry: HistoryEntry) -> Dict[str, Any]:
         """Crée une entrée dans l'historique"""
@@ -20,6 +67,8 @@ class UserHistoryRepository:
             db = get_database()
             entry_dict = entry.dict()
             entry_dict["created_at"] = datetime.now(timezone.utc)
+            entry_dict["question_hash"] = UserHistoryRepository.hash_question(entry.question)
+            entry_dict["keywords"] = UserHistoryRepository.extract_keywords(entry.question)
             
             result = await db.user_history.insert_one(entry_dict)
             entry_dict["_id"] = result.inserted_id
@@ -35,11 +84,35 @@ class UserHistoryRepository:
         subject: Optional[Subject] = None,
         module_id: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0,
+        cursor: Optional[str] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None
     ) -> List[Dict[str, Any]]:
-        """Récupère l'historique d'un utilisateur"""
+        """Récupère l'historique d'un utilisateur (une page)"""
+        results, _ = await UserHistoryRepository.get_user_history_page(
+            user_id, subject, module_id, limit, cursor, start_date, end_date
+        )
+        return results
+    
+    @staticmethod
+    async def get_user_history_page(
+        user_id: str,
+        subject: Optional[Subject] = None,
+        module_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page de l'historique d'un utilisateur, paginée par clé (created_at, _id)
+        
+        Returns:
+            (entrées, cursor de la page suivante ou None)
+        
+        Raises:
+            InvalidCursorError: cursor falsifié ou émis pour une autre liste
+        """
         try:
             db = get_database()
             query = {"user_id": user_id}
@@ -59,31 +132,41 @@ class UserHistoryRepository:
                 else:
                     query["created_at"] = {"$lte": end_date}
             
-            cursor = db.user_history.find(query).sort("created_at", -1).skip(offset).limit(limit)
-            results = await cursor.to_list(length=limit)
+            results, next_cursor = await paginate_with_cursor(
+                db.user_history,
+                query,
+                limit,
+                sort_field="created_at",
+                cursor=cursor,
+                scope=f"user_history:{user_id}:{query.get('subject')}:{module_id or ''}"
+            )
             
             # Convertir ObjectId en string
             for result in results:
                 result["id"] = str(result["_id"])
                 del result["_id"]
             
-            return results
+            return results, next_cursor
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Erreur récupération historique: {e}", exc_info=True)
-            return []
+            return [], None
     
     @staticmethod
     async def find_exact_match(user_id: str, question: str) -> Optional[Dict[str, Any]]:
-        """Trouve une question exactement identique"""
+        """
+        Trouve une question exactement identique
+        
+        Recherche par égalité sur l'empreinte de la question normalisée,
+        servie par l'index (user_id, question_hash, created_at).
+        """
         try:
             db = get_database()
-            # Normaliser la question (minuscules, espaces)
-            normalized = " ".join(question.lower().split())
-            
             result = await db.user_history.find_one({
                 "user_id": user_id,
-                "question": {"$regex": f"^{normalized}$", "$options": "i"}
-            }, sort=[("created_at", -1)])
+                "question_hash": UserHistoryRepository.hash_question(question)
+            }, sort=[("created_at", DESCENDING)])
             
             if result:
                 result["id"] = str(result["_id"])
@@ -104,14 +187,14 @@ class UserHistoryRepository:
     ) -> List[Dict[str, Any]]:
         """
         Trouve des questions similaires en utilisant une recherche textuelle MongoDB
+        
+        Les résultats sont triés par pertinence (textScore).
         Pour une vraie similarité sémantique, on pourrait utiliser des embeddings
         """
         try:
             db = get_database()
-            normalized = " ".join(question.lower().split())
+            normalized = UserHistoryRepository.normalize_question(question)
             
-            # Recherche textuelle MongoDB (basique)
-            # Pour une vraie similarité sémantique, utiliser des embeddings vectoriels
             query = {
                 "$text": {"$search": normalized}
             }
@@ -119,7 +202,8 @@ class UserHistoryRepository:
             if user_id:
                 query["user_id"] = user_id
             
-            cursor = db.user_history.find(query).limit(limit)
+            score = {"score": {"$meta": "textScore"}}
+            cursor = db.user_history.find(query, score).sort([("score", score["score"])]).limit(limit)
             results = await cursor.to_list(length=limit)
             
             # Convertir ObjectId en string
@@ -139,24 +223,30 @@ class UserHistoryRepository:
         question: str,
         limit: int = 5
     ) -> List[Dict[str, Any]]:
-        """Recherche par mots-clés (fallback)"""
+        """
+        Recherche par mots-clés (fallback)
+        
+        Utilise l'index inversé multikey sur 'keywords' ; les entrées sont
+        classées par nombre de mots-clés communs, puis par date.
+        """
         try:
             db = get_database()
-            # Extraire les mots-clés (mots de 4+ caractères)
-            words = [w.lower() for w in question.split() if len(w) >= 4]
+            words = UserHistoryRepository.extract_keywords(question)
             
             if not words:
                 return []
             
-            query = {
-                "question": {"$regex": "|".join(words), "$options": "i"}
-            }
-            
+            query: Dict[str, Any] = {"keywords": {"$in": words}}
             if user_id:
                 query["user_id"] = user_id
             
-            cursor = db.user_history.find(query).sort("created_at", -1).limit(limit)
-            results = await cursor.to_list(length=limit)
+            pipeline = [
+                {"$match": query},
+                {"$addFields": {"score": {"$size": {"$setIntersection": ["$keywords", words]}}}},
+                {"$sort": {"score": -1, "created_at": -1}},
+                {"$limit": limit}
+            ]
+            results = await db.user_history.aggregate(pipeline).to_list(length=limit)
             
             for result in results:
                 result["id"] = str(result["_id"])
@@ -167,90 +257,243 @@ class UserHistoryRepository:
             logger.error(f"Erreur recherche par mots-clés: {e}", exc_info=True)
             return []
     
+    @staticmethod
+    def _empty_stats() -> Dict[str, Any]:
+        return {
+            "total_questions": 0,
+            "total_tokens": 0,
+            "total_cost_eur": 0.0,
+            "by_subject": {},
+            "by_model": {},
+            "most_asked_questions": []
+        }
+    
     @staticmethod
     async def get_stats(user_id: str) -> Dict[str, Any]:
-        """Récupère les statistiques de l'historique utilisateur"""
+        """
+        Récupère les statistiques de l'historique utilisateur
+        
+        Lecture O(1) du document matérialisé 'user_history_stats' (tenu à jour
+        par increment_stats) ; s'il n'existe pas encore (ou si un recalcul n'a
+        pas abouti), les stats sont recalculées par rebuild_stats puis matérialisées.
+        """
         try:
             db = get_database()
+            stats_doc = await db.user_history_stats.find_one({"_id": user_id})
+            if not stats_doc or stats_doc.get("rebuilding"):
+                return await UserHistoryRepository.rebuild_stats(user_id)
             
-            # Stats globales
-            total_pipeline = [
-                {"$match": {"user_id": user_id}},
-                {"$group": {
-                    "_id": None,
-                    "total_questions": {"$sum": 1},
-                    "total_tokens": {"$sum": "$tokens_used"},
-                    "total_cost": {"$sum": "$cost_eur"}
-                }}
-            ]
-            
-            total_stats = await db.user_history.aggregate(total_pipeline).to_list(length=1)
-            
-            # Stats par matière
-            subject_pipeline = [
-                {"$match": {"user_id": user_id, "subject": {"$exists": True}}},
-                {"$group": {
-                    "_id": "$subject",
-                    "count": {"$sum": 1}
-                }}
-            ]
-            
-            subject_stats = await db.user_history.aggregate(subject_pipeline).to_list(length=100)
-            by_subject = {stat["_id"]: stat["count"] for stat in subject_stats}
-            
-            # Stats par modèle
-            model_pipeline = [
-                {"$match": {"user_id": user_id}},
-                {"$group": {
-                    "_id": "$model_used",
-                    "count": {"$sum": 1}
-                }}
-            ]
-            
-            model_stats = await db.user_history.aggregate(model_pipeline).to_list(length=100)
-            by_model = {stat["_id"]: stat["count"] for stat in model_stats}
-            
-            # Questions les plus posées
-            frequent_pipeline = [
-                {"$match": {"user_id": user_id}},
-                {"$group": {
-                    "_id": "$question",
-                    "count": {"$sum": 1}
-                }},
-                {"$sort": {"count": -1}},
-                {"$limit": 10}
-            ]
-            
-            frequent_questions = await db.user_history.aggregate(frequent_pipeline).to_list(length=10)
-            most_asked = [
-                {"question": q["_id"], "count": q["count"]}
-                for q in frequent_questions
-            ]
-            
-            total = total_stats[0] if total_stats else {
-                "total_questions": 0,
-                "total_tokens": 0,
-                "total_cost": 0.0
-            }
+            cursor = db.user_question_counts.find(
+                {"user_id": user_id},
+                {"_id": 0, "question": 1, "count": 1}
+            ).sort("count", -1).limit(MOST_ASKED_LIMIT)
+            frequent_questions = await cursor.to_list(length=MOST_ASKED_LIMIT)
             
             return {
-                "total_questions": total.get("total_questions", 0),
-                "total_tokens": total.get("total_tokens", 0),
-                "total_cost_eur": total.get("total_cost", 0.0),
-                "by_subject": by_subject,
-                "by_model": by_model,
-                "most_asked_questions": most_asked
+                "total_questions": stats_doc.get("total_questions", 0),
+                "total_tokens": stats_doc.get("total_tokens", 0),
+                "total_cost_eur": stats_doc.get("total_cost", 0.0),
+                "by_subject": {
+                    _unstats_key(k): v for k, v in stats_doc.get("by_subject", {}).items()
+                },
+                "by_model": {
+                    _unstats_key(k): v for k, v in stats_doc.get("by_model", {}).items()
+                },
+                "most_asked_questions": [
+                    {"question": q["question"], "count": q["count"]}
+                    for q in frequent_questions
+                ]
             }
         except Exception as e:
             logger.error(f"Erreur récupération stats: {e}", exc_info=True)
-            return {
-                "total_questions": 0,
-                "total_tokens": 0,
-                "total_cost_eur": 0.0,
-                "by_subject": {},
-                "by_model": {},
-                "most_asked_questions": []
+            return UserHistoryRepository._empty_stats()
+    
+    @staticmethod
+    async def _aggregate_stats(user_id: str, before: datetime) -> Dict[str, Any]:
+        """
+        Totaux de l'historique (entrées antérieures à 'before') en une seule agrégation $facet
+
+        Le $match sur (user_id, created_at) (préfixe de l'index) n'est
+        exécuté qu'une fois pour toutes les facettes.
+        """
+        db = get_database()
+        pipeline = [
+            {"$match": {"user_id": user_id, "created_at": {"$lt": before}}},
+            {"$facet": {
+                "totals": [
+                    {"$group": {
+                        "_id": None,
+                        "total_questions": {"$sum": 1},
+                        "total_tokens": {"$sum": "$tokens_used"},
+                        "total_cost": {"$sum": "$cost_eur"}
+                    }}
+                ],
+                "by_subject": [
+                    {"$match": {"subject": {"$ne": None}}},
+                    {"$group": {"_id": "$subject", "count": {"$sum": 1}}}
+                ],
+                "by_model": [
+                    {"$group": {"_id": "$model_used", "count": {"$sum": 1}}}
+                ],
+            }}
+        ]
+        result = await db.user_history.aggregate(
+            pipeline, hint=[("user_id", 1), ("created_at", -1), ("_id", -1)]
+        ).to_list(length=1)
+        facets = result[0] if result else {}
+        
+        totals = facets.get("totals") or [{}]
+        return {
+            "total_questions": totals[0].get("total_questions", 0),
+            "total_tokens": totals[0].get("total_tokens", 0),
+            "total_cost": totals[0].get("total_cost", 0.0),
+            "by_subject": {stat["_id"]: stat["count"] for stat in facets.get("by_subject", [])},
+            "by_model": {stat["_id"]: stat["count"] for stat in facets.get("by_model", []) if stat["_id"]},
+        }
+    
+    @staticmethod
+    async def _rebuild_question_counts(user_id: str, before: datetime) -> None:
+        """Compteurs par question (entrées antérieures à 'before' disposant d'une empreinte), écrits avec $merge"""
+        db = get_database()
+        await db.user_question_counts.delete_many({"user_id": user_id})
+        await db.user_history.aggregate([
+            {"$match": {"user_id": user_id, "question_hash": {"$exists": True}, "created_at": {"$lt": before}}},
+            {"$group": {
+                "_id": "$question_hash",
+                "question": {"$first": "$question"},
+                "count": {"$sum": 1}
+            }},
+            {"$project": {
+                "_id": 0,
+                "user_id": {"$literal": user_id},
+                "question_hash": "$_id",
+                "question": 1,
+                "count": 1
+            }},
+            {"$merge": {
+                "into": "user_question_counts",
+                "on": ["user_id", "question_hash"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }}
+        ]).to_list(length=None)
+    
+    @staticmethod
+    async def rebuild_stats(user_id: str) -> Dict[str, Any]:
+        """
+        Recalcule les statistiques et les matérialise
+        
+        increment_stats incrémente 'version' : le document recalculé n'est
+        écrit que si la version n'a pas bougé pendant le calcul, sinon le
+        calcul est relancé (une incrémentation concurrente n'est jamais
+        écrasée). En attendant, le document porte 'rebuilding' et get_stats
+        relance la reconstruction.
+        
+        Le recalcul ne compte que les entrées antérieures à son instantané,
+        enregistré dans 'rebuilt_through' : increment_stats ignore ces entrées,
+        déjà comptées, même s'il s'exécute après l'écriture du recalcul.
+        """
+        db = get_database()
+        for _ in range(REBUILD_ATTEMPTS):
+            # $inc de 0 : crée 'version' (et le document) sans la modifier
+            state = await db.user_history_stats.find_one_and_update(
+                {"_id": user_id},
+                {"$inc": {"version": 0}, "$setOnInsert": {"rebuilding": True}},
+                projection={"version": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            version = state["version"]
+            # Instantané pris après la lecture de la version : une entrée plus récente
+            # est comptée par son increment_stats (qui invalide ce calcul s'il est en cours)
+            snapshot = datetime.now(timezone.utc)
+            
+            totals = await UserHistoryRepository._aggregate_stats(user_id, snapshot)
+            await UserHistoryRepository._rebuild_question_counts(user_id, snapshot)
+            
+            stats_doc = {
+                "total_questions": totals["total_questions"],
+                "total_tokens": totals["total_tokens"],
+                "total_cost": totals["total_cost"],
+                "by_subject": {_stats_key(k): v for k, v in totals["by_subject"].items()},
+                "by_model": {_stats_key(k): v for k, v in totals["by_model"].items()},
+                "version": version,
+                "rebuilt_through": snapshot,
+                "updated_at": datetime.now(timezone.utc)
+            }
+            result = await db.user_history_stats.replace_one({"_id": user_id, "version": version}, stats_doc)
+            if result.matched_count:
+                break
+        else:
+            await db.user_history_stats.update_one({"_id": user_id}, {"$set": {"rebuilding": True}})
+            logger.warning(f"Stats de l'historique de {user_id} modifiées pendant le recalcul, nouvel essai au prochain accès")
+        
+        cursor = db.user_question_counts.find(
+            {"user_id": user_id},
+            {"_id": 0, "question": 1, "count": 1}
+        ).sort("count", -1).limit(MOST_ASKED_LIMIT)
+        frequent_questions = await cursor.to_list(length=MOST_ASKED_LIMIT)
+        
+        return {
+            "total_questions": totals["total_questions"],
+            "total_tokens": totals["total_tokens"],
+            "total_cost_eur": totals["total_cost"],
+            "by_subject": totals["by_subject"],
+            "by_model": totals["by_model"],
+            "most_asked_questions": [
+                {"question": q["question"], "count": q["count"]}
+                for q in frequent_questions
+            ]
+        }
+    
+    @staticmethod
+    async def increment_stats(
+        user_id: str,
+        question: str,
+        model_used: Optional[str] = None,
+        subject: Optional[str] = None,
+        tokens_used: Optional[int] = None,
+        cost_eur: Optional[float] = None,
+        created_at: Optional[datetime] = None
+    ) -> bool:
+        """
+        Met à jour incrémentalement les statistiques matérialisées
+        
+        Sans document de stats existant, rien n'est écrit : le prochain
+        get_stats reconstruit l'ensemble (entrée courante comprise). Une entrée
+        antérieure au dernier recalcul ('rebuilt_through') y est déjà comptée.
+        """
+        try:
+            db = get_database()
+            inc: Dict[str, Any] = {
+                "total_questions": 1,
+                "total_tokens": tokens_used or 0,
+                "total_cost": cost_eur or 0.0,
             }
+            if subject:
+                inc[f"by_subject.{_stats_key(subject)}"] = 1
+            if model_used:
+                inc[f"by_model.{_stats_key(model_used)}"] = 1
+            
+            query: Dict[str, Any] = {"_id": user_id}
+            if created_at is not None:
+                query["rebuilt_through"] = {"$not": {"$gt": created_at}}
+            result = await db.user_history_stats.update_one(
+                query,
+                {"$inc": {**inc, "version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+            )
+            if result.matched_count == 0:
+                return False
+            
+            await db.user_question_counts.update_one(
+                {"user_id": user_id, "question_hash": UserHistoryRepository.hash_question(question)},
+                {"$inc": {"count": 1}, "$setOnInsert": {"question": question}},
+                upsert=True
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Erreur mise à jour stats historique: {e}")
+            return False
     
     @staticmethod
     async def delete_user_history(user_id: str) -> int:
@@ -258,6 +501,8 @@ class UserHistoryRepository:
         try:
             db = get_database()
             result = await db.user_history.delete_many({"user_id": user_id})
+            await db.user_history_stats.delete_one({"_id": user_id})
+            await db.user_question_counts.delete_many({"user_id": user_id})
             return result.deleted_count
         except Exception as e:
             logger.error(f"Erreur suppression historique: {e}", exc_info=True)
@@ -185,6 +185,42 @@ class UserRepository:
             logger.error(f"Erreur lors de la mise à jour de l'utilisateur: {e}")
             raise
     
+    @staticmethod
+    async def anonymize_user(user_id: str) -> bool:
+        """Anonymise un utilisateur (droit à l'oubli) en conservant le document pour les logs"""
+        try:
+            sanitized_id = InputSanitizer.sanitize_object_id(user_id)
+            if not sanitized_id:
+                return False
+            
+            db = get_database()
+            from datetime import datetime, timezone
+            result = await db.users.update_one(
+                {"_id": ObjectId(sanitized_id)},
+                {
+                    "$set": {
+                        "email": f"deleted_{sanitized_id}@anonymized.local",
+                        "username": f"deleted_{sanitized_id}",
+                        "first_name": "",
+                        "last_name": "",
+                        "date_of_birth": "",
+                        "country": "",
+                        "phone": "",
+                        "is_active": False,
+                        "anonymized_at": datetime.now(timezone.utc)
+                    },
+                    "$unset": {
+                        "hashed_password": "",
+                        "password_reset_token": "",
+                        "email_verification_token": ""
+                    }
+                }
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Erreur lors de l'anonymisation de l'utilisateur: {e}")
+            raise
+    
     @staticmethod
     async def find_all(skip: int = 0, limit: int = 100) -> list[Dict[str, Any]]:
         """Récupère tous les utilisateurs avec pagination (optimisé avec projection)"""
@@ -1,13 +1,17 @@
 """
 Routeur pour le tutorat IA - Refactorisé avec services
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from app.models import AIChatRequest, AIChatResponse, QuizGenerateRequest, QuizResponse, ImmersiveContextRequest, ImmersiveContextResponse
 # Authentification supprimée - toutes les routes sont publiques
 from app.services.ai_service import AIService
 from app.services.ai_routing_service import AIRoutingService
+from app.services.ai_gateway import AIQuotaExceededError
+from app.config import settings
+from app.utils.retry import request_deadline
+from app.utils.event_stream import event_stream_response
 import json
 import logging
 import asyncio
@@ -33,6 +37,26 @@ def safe_str(obj):
     except Exception:
         return "Erreur lors de la conversion en string"
 
+
+def _chat_deadline(research_mode: bool) -> float:
+    """Deadline globale (retries compris) d'un échange avec le tuteur"""
+    return settings.ai_research_deadline_seconds if research_mode else settings.ai_request_deadline_seconds
+
+
+async def _stream_with_deadline(stream, seconds: float):
+    """Applique la deadline de la requête à toute la durée du streaming"""
+    with request_deadline(seconds):
+        async for chunk in stream:
+            yield chunk
+
+def _quota_event(error: AIQuotaExceededError) -> str:
+    """Événement SSE signalant le quota IA atteint, suivi de la fin du flux"""
+    message = safe_str(error) or "Quota IA atteint"
+    return (
+        f"data: {json.dumps({'content': f'Erreur: {message}', 'error': 'quota_exceeded', 'status_code': 429})}\n\n"
+        "data: [DONE]\n\n"
+    )
+
 router = APIRouter()
 
 
@@ -68,15 +92,16 @@ async def chat_with_ai(request: AIChatRequest):
             logger.debug(f"Erreur récupération historique: {safe_str(e)}")
             conversation_history = None
     
-    result = await AIService.chat_with_ai(
-        message=request.message,
-        user_id=user_id,
-        module_id=request.module_id,
-        language=language,
-        expert_mode=request.expert_mode or False,
-        research_mode=request.research_mode or False,
-        conversation_history=conversation_history
-    )
+    with request_deadline(_chat_deadline(request.research_mode or False)):
+        result = await AIService.chat_with_ai(
+            message=request.message,
+            user_id=user_id,
+            module_id=request.module_id,
+            language=language,
+            expert_mode=request.expert_mode or False,
+            research_mode=request.research_mode or False,
+            conversation_history=conversation_history
+        )
     
     # Sauvegarder l'historique de conversation après chaque échange
     if user_id and result and result.get("response"):
@@ -184,14 +209,15 @@ async def chat_with_ai_stream(request: AIChatRequest):
     async def generate():
         full_response = ""  # Accumuler la réponse complète pour sauvegarder l'historique
         try:
-            async for chunk in AIRoutingService.chat_stream(
+            async for chunk in _stream_with_deadline(AIRoutingService.chat_stream(
                 message=request.message,
                 module_id=request.module_id,
                 context=context,
                 language=language,
                 force_model=force_model,
-                conversation_history=conversation_history
-            ):
+                conversation_history=conversation_history,
+                user_id=user_id
+            ), _chat_deadline(request.research_mode or False)):
                 # S'assurer que chunk est une string avant de le sérialiser (éviter les coroutines)
                 chunk_str = safe_str(chunk) if chunk else ""
                 if chunk_str and not chunk_str.startswith("Erreur:"):
@@ -241,6 +267,9 @@ async def chat_with_ai_stream(request: AIChatRequest):
                 except Exception as e:
                     logger.error(f"Erreur lors de la sauvegarde de l'historique: {safe_str(e)}", exc_info=True)
                     # Ne pas faire échouer la requête si la sauvegarde échoue
+        except AIQuotaExceededError as e:
+            # Réponse déjà commencée : le 429 est transmis dans le flux
+            yield _quota_event(e)
         except Exception as e:
             logger.error(f"Erreur dans generate(): {safe_str(e)}", exc_info=True)
             # S'assurer que l'erreur est bien convertie en string de manière sécurisée
@@ -409,14 +438,15 @@ async def chat_with_ai_stream_files(
             # Ajouter les images
             user_message_content.extend(image_contents)
             
-            async for chunk in AIRoutingService.chat_stream_with_vision(
+            async for chunk in _stream_with_deadline(AIRoutingService.chat_stream_with_vision(
                 message_content=user_message_content,
                 module_id=module_id,
                 context=context,
                 language=language,
                 force_model=force_model,
-                conversation_history=parsed_history
-            ):
+                conversation_history=parsed_history,
+                user_id=user_id
+            ), _chat_deadline(research_mode)):
                 chunk_str = safe_str(chunk) if chunk else ""
                 if chunk_str and not chunk_str.startswith("Erreur:"):
                     full_response += chunk_str  # Accumuler la réponse
@@ -463,6 +493,9 @@ async def chat_with_ai_stream_files(
                 except Exception as e:
                     logger.error(f"Erreur lors de la sauvegarde de l'historique: {safe_str(e)}", exc_info=True)
                     # Ne pas faire échouer la requête si la sauvegarde échoue
+        except AIQuotaExceededError as e:
+            # Réponse déjà commencée : le 429 est transmis dans le flux
+            yield _quota_event(e)
         except Exception as e:
             logger.error(f"Erreur dans generate(): {safe_str(e)}", exc_info=True)
             error_message = safe_str(e) if e else "Une erreur inconnue s'est produite"
@@ -511,3 +544,46 @@ async def generate_quiz(request: QuizGenerateRequest):
         num_questions=request.num_questions,
         difficulty=difficulty
     )
+
+
+async def _question_events(module_id: str, questions):
+    """Événements start / question / done d'une génération de questions en streaming"""
+    yield {"type": "start", "module_id": module_id}
+    count = 0
+    async for question in questions:
+        yield {"type": "question", "index": count, "question": question}
+        count += 1
+    yield {"type": "done", "num_questions": count}
+
+
+@router.post("/generate-quiz/stream")
+async def generate_quiz_stream(
+    request: QuizGenerateRequest,
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$", description="sse ou ndjson")
+):
+    """Génère un quiz personnalisé en streaming, question par question, sans l'enregistrer (route publique)"""
+    difficulty = request.difficulty.value if request.difficulty else None
+    questions = await AIService.stream_quiz_questions(
+        module_id=request.module_id,
+        num_questions=request.num_questions,
+        difficulty=difficulty
+    )
+    return event_stream_response(_question_events(request.module_id, questions), stream_format)
+
+
+@router.post("/generate-exam/stream")
+async def generate_exam_stream(
+    request: QuizGenerateRequest,
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$", description="sse ou ndjson")
+):
+    """
+    Aperçu en streaming des questions d'examen d'un module (route publique).
+    L'examen enregistré (partie pratique, PDF) reste produit par /api/exams.
+    """
+    difficulty = request.difficulty.value if request.difficulty else None
+    questions = await AIService.stream_exam_questions(
+        module_id=request.module_id,
+        num_questions=request.num_questions,
+        difficulty=difficulty
+    )
+    return event_stream_response(_question_events(request.module_id, questions), stream_format)
@@ -39,6 +39,42 @@ async def check_plagiarism(
         )
 
 
+@router.get("/exams/{exam_id}/plagiarism", response_model=Dict[str, Any])
+async def check_exam_plagiarism(
+    exam_id: str,
+    use_ai: bool = True,
+):
+    """
+    Analyse de plagiat sur toutes les tentatives d'un examen (MinHash/LSH, GPT pour les cas douteux)
+    """
+    try:
+        return await CheatingDetector.detect_exam_plagiarism(exam_id, use_ai=use_ai)
+    except Exception as e:
+        logger.error(f"Erreur lors de l'analyse de plagiat de l'examen: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de l'analyse: {str(e)}"
+        )
+
+
+@router.get("/exams/{exam_id}/attempts/{attempt_id}/similar", response_model=List[Dict[str, Any]])
+async def get_similar_attempts(
+    exam_id: str,
+    attempt_id: str,
+):
+    """
+    Réponses d'autres tentatives proches de celles d'une tentative (sans appel GPT)
+    """
+    try:
+        return await CheatingDetector.find_similar_attempts(exam_id, attempt_id)
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche de tentatives similaires: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur: {str(e)}"
+        )
+
+
 @router.post("/behavior-analysis", response_model=Dict[str, Any])
 async def analyze_behavior(
     answer_times: List[float],
@@ -1,7 +1,7 @@
 """
 Routeur pour les examens
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from app.models import (
@@ -12,6 +12,7 @@ from app.services.exam_service import ExamService
 # PDFService supprimé - fonctionnalité PDF désactivée pour l'instant
 from app.utils.permissions import get_current_user
 from app.utils.security import InputSanitizer
+from app.utils.cursor_pagination import InvalidCursorError, NEXT_CURSOR_HEADER
 import logging
 from datetime import datetime, timezone
 
@@ -137,12 +138,15 @@ async def submit_exam(
 
 @router.get("/attempts", response_model=List[ExamAttempt])
 async def get_my_exam_attempts(
+    response: Response,
     module_id: Optional[str] = Query(None, description="Filtrer par module"),
     limit: int = Query(50, ge=1, le=100, description="Limite de résultats"),
+    cursor: Optional[str] = Query(None, description="Cursor de la page suivante (en-tête X-Next-Cursor)"),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Récupère toutes les tentatives d'examen de l'utilisateur connecté
+    Récupère les tentatives d'examen de l'utilisateur connecté
+    (pagination par clé : cursor de la page suivante dans l'en-tête X-Next-Cursor)
     """
     try:
         sanitized_module_id = None
@@ -152,14 +156,19 @@ async def get_my_exam_attempts(
                 raise HTTPException(status_code=400, detail="ID de module invalide")
 
         user_id = str(current_user["id"])
-        attempts = await ExamService.get_user_exam_attempts(
+        attempts, next_cursor = await ExamService.get_user_exam_attempts_page(
             user_id=user_id,
             module_id=sanitized_module_id,
-            limit=limit
+            limit=limit,
+            cursor=cursor
         )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return attempts or []
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
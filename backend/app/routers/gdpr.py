@@ -2,9 +2,10 @@
 Routeur pour la conformité RGPD
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import Dict, Any
 from app.services.gdpr_service import GDPRService
+from app.utils.file_storage import is_safe_filename
 # Authentification supprimée - toutes les routes sont publiques
 import logging
 
@@ -13,23 +14,22 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.get("/export-data", response_model=Dict[str, Any])
+@router.get("/export-data")
 async def export_user_data(
 ):
     """
     Exporte toutes les données de l'utilisateur connecté
+
+    Archive ZIP (un fichier NDJSON par collection) générée en streaming.
     """
     try:
         user_id = "anonymous"  # Auth supprimée
-        
-        export_data = await GDPRService.export_user_data(user_id)
-        
-        # Retourner en JSON avec headers appropriés
-        return JSONResponse(
-            content=export_data,
+
+        return StreamingResponse(
+            GDPRService.stream_export_zip(user_id),
+            media_type="application/zip",
             headers={
-                "Content-Type": "application/json",
-                "Content-Disposition": f'attachment; filename="user_data_{user_id}.json"'
+                "Content-Disposition": f'attachment; filename="user_data_{user_id}.zip"'
             }
         )
     except Exception as e:
@@ -40,6 +40,82 @@ async def export_user_data(
         )
 
 
+@router.get("/export-data/summary", response_model=Dict[str, Any])
+async def export_user_data_summary(
+):
+    """
+    Nombre de documents exportables par collection
+    """
+    try:
+        user_id = "anonymous"  # Auth supprimée
+        return await GDPRService.export_user_data(user_id)
+    except Exception as e:
+        logger.error(f"Erreur lors du résumé d'export: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur: {str(e)}"
+        )
+
+
+@router.post("/export-data/async", status_code=status.HTTP_202_ACCEPTED)
+async def export_user_data_async(
+):
+    """
+    Lance la génération de l'archive en arrière-plan (comptes volumineux)
+    """
+    try:
+        from app.tasks.gdpr_export import export_user_data_async as export_task
+        user_id = "anonymous"  # Auth supprimée
+
+        task = export_task.delay(user_id)
+        return {"task_id": task.id, "status": "pending"}
+    except Exception as e:
+        logger.error(f"Erreur lors du lancement de l'export: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Export asynchrone indisponible"
+        )
+
+
+@router.get("/export-data/async/{task_id}", response_model=Dict[str, Any])
+async def get_export_status(
+    task_id: str,
+):
+    """
+    Statut d'un export lancé en arrière-plan
+    """
+    from app.celery_app import celery_app
+
+    result = celery_app.AsyncResult(task_id)
+    response: Dict[str, Any] = {"task_id": task_id, "status": result.status.lower()}
+    if result.successful():
+        response["download_url"] = f"/api/gdpr/export-data/files/{result.result['filename']}"
+    return response
+
+
+@router.get("/export-data/files/{filename}")
+async def download_export_file(
+    filename: str,
+):
+    """
+    Télécharge une archive générée en arrière-plan
+    """
+    from app.tasks.gdpr_export import EXPORT_DIR, is_expired
+
+    if not is_safe_filename(filename) or not filename.endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Nom de fichier invalide")
+
+    file_path = EXPORT_DIR / filename
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Export non trouvé")
+    if is_expired(file_path):
+        # Pas encore retiré par la tâche 'purge_expired_exports'
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export expiré, relancez l'export")
+
+    return FileResponse(path=str(file_path), filename=filename, media_type="application/zip")
+
+
 @router.delete("/delete-data", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_data(
 ):
@@ -48,15 +124,15 @@ async def delete_user_data(
     """
     try:
         user_id = "anonymous"  # Auth supprimée
-        
+
         success = await GDPRService.delete_user_data(user_id)
-        
+
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Erreur lors de la suppression"
             )
-        
+
         return None
     except HTTPException:
         raise
@@ -66,14 +142,3 @@ async def delete_user_data(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur: {str(e)}"
         )
-
-
-
-
-
-
-
-
-
-
-
@@ -65,17 +65,12 @@ async def generate_visualization(request: VisualizationRequest) -> Dict[str, Any
         # Parser la réponse JSON si possible
         visualization_data = {}
         try:
-            import json
+            from app.utils.json_cleaner import safe_json_loads
             response_text = response.get("response", "{}")
             # Essayer de trouver un JSON dans la réponse
             if isinstance(response_text, str):
-                # Chercher un bloc JSON dans la réponse
-                start = response_text.find('{')
-                end = response_text.rfind('}') + 1
-                if start >= 0 and end > start:
-                    json_text = response_text[start:end]
-                    visualization_data = json.loads(json_text)
-                else:
+                visualization_data = safe_json_loads(response_text)
+                if not isinstance(visualization_data, dict):
                     # Si pas de JSON, créer une structure par défaut
                     visualization_data = {
                         "explanation": response_text,
@@ -1,12 +1,14 @@
 """
 Routeur pour les modules d'apprentissage - Refactorisé avec services
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional, Dict, Any
 from app.models import Module, ModuleCreate, Subject, Difficulty
 from app.services.module_service import ModuleService
 from app.services.cached_module_service import CachedModuleService
+from app.services.module_search_service import ModuleSearchService
 from app.utils.security import InputSanitizer
+from app.utils.cursor_pagination import InvalidCursorError, NEXT_CURSOR_HEADER
 # Authentification supprimée - toutes les routes sont publiques
 import logging
 import asyncio
@@ -18,15 +20,17 @@ router = APIRouter()
 
 @router.get("/")
 async def get_modules(
+    response: Response,
     subject: Optional[Subject] = Query(None),
     difficulty: Optional[Difficulty] = Query(None),
     search: Optional[str] = Query(None, description="Recherche dans le titre et la description"),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=100)
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor de la page suivante (en-tête X-Next-Cursor)")
 ) -> List[Dict[str, Any]]:
     """
     Récupère la liste des modules avec filtres optionnels et recherche.
     Retourne uniquement les modules avec des sujets valides (mathematics, computer_science).
+    Pagination par clé : le cursor de la page suivante est renvoyé dans l'en-tête X-Next-Cursor.
     """
     try:
         # Sanitizer la recherche si fournie
@@ -36,24 +40,30 @@ async def get_modules(
         
         # Essayer d'abord avec le cache, puis sans cache en cas d'erreur
         try:
-            modules = await CachedModuleService.get_modules(
+            page = await CachedModuleService.get_modules_page(
                 subject=subject.value if subject else None,
                 difficulty=difficulty.value if difficulty else None,
                 search=sanitized_search,
-                skip=skip,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
+        except InvalidCursorError:
+            raise
         except Exception as cache_error:
             logger.warning(f"Erreur avec le cache, tentative sans cache: {cache_error}")
             # Essayer sans cache directement avec le service
-            modules = await ModuleService.get_modules(
+            page = await ModuleService.get_modules_page(
                 subject=subject,
                 difficulty=difficulty,
                 search=sanitized_search,
-                skip=skip,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
         
+        modules = page.get("modules")
+        if page.get("next_cursor"):
+            response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+        
         # Filtrer les modules pour ne garder que ceux avec des sujets valides
         # Optimisation: validation Pydantic seulement si nécessaire (éviter la validation complète pour chaque module)
         valid_modules = []
@@ -86,6 +96,8 @@ async def get_modules(
         
         logger.info(f"Retour de {len(valid_modules)} module(s) valide(s) sur {len(modules or [])} module(s) total(aux)")
         return valid_modules
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des modules: {e}", exc_info=True)
         # Retourner une liste vide en cas d'erreur plutôt qu'une erreur 500
@@ -273,8 +285,8 @@ async def _perform_content_generation(module_id: str) -> Dict[str, Any]:
             message_parts.append(f"{len(results['errors'])} erreur(s): {'; '.join(error_messages[:3])}")  # Limiter à 3 erreurs pour la lisibilité
         
         # Vérifier si le client OpenAI est disponible
-        from app.services.ai_service import client as openai_client
-        if not openai_client:
+        from app.services.ai_gateway import AIGateway
+        if not AIGateway.is_available():
             logger.error("Client OpenAI non initialisé - Vérifiez OPENAI_API_KEY dans .env")
             results["errors"].append({
                 "type": "openai_client",
@@ -524,6 +536,33 @@ async def initialize_demo_modules():
     }
 
 
+@router.get("/search")
+async def search_modules(
+    q: str = Query(..., min_length=1, max_length=100, description="Mots recherchés (le dernier peut être incomplet)"),
+    subject: Optional[Subject] = None,
+    difficulty: Optional[Difficulty] = None,
+    prefix: bool = Query(True, description="Compléter le dernier mot (saisie semi-automatique)"),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Recherche classée dans le catalogue (titres, leçons, objectifs, descriptions).
+    Insensible aux accents et à la casse ; les modules les plus pertinents en premier.
+    """
+    sanitized_query = InputSanitizer.sanitize_string(q, max_length=100)
+    try:
+        results = await ModuleSearchService.search(
+            sanitized_query,
+            limit=limit,
+            subject=subject.value if subject else None,
+            difficulty=difficulty.value if difficulty else None,
+            prefix=prefix
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche de modules: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="Recherche temporairement indisponible")
+    return {"query": q, "results": results, "total": len(results)}
+
+
 @router.get("/{module_id}", response_model=Module)
 async def get_module(module_id: str):
     """Récupère un module spécifique"""
@@ -17,6 +17,15 @@ async def get_router_stats():
     return PromptRouterService.get_category_stats()
 
 
+@router.get("/cache-stats", response_model=Dict[str, Any])
+async def get_prompt_cache_stats():
+    """
+    Part des tokens du prompt servis depuis le cache OpenAI (par fonctionnalité)
+    """
+    from app.services.ai_gateway import AIGateway
+    return AIGateway.prompt_cache_stats()
+
+
 @router.post("/classify")
 async def classify_message(
     message: str,
@@ -26,6 +35,7 @@ async def classify_message(
     Classifie un message pour tester le système
     """
     category = await PromptRouterService.classify_request(message, context)
+    local = PromptRouterService._classify_locally(message, context)
     model = PromptRouterService.CATEGORY_TO_MODEL.get(category, "gpt-5-mini")
     
     category_names = {
@@ -39,6 +49,7 @@ async def classify_message(
         "message": message,
         "category": category,
         "category_name": category_names.get(category, "Inconnue"),
-        "recommended_model": model
+        "recommended_model": model,
+        "local_prediction": {"category": local[0], "confidence": round(local[1], 4)} if local else None
     }
 
@@ -1,17 +1,22 @@
 """
 Routeur pour les quiz
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
 from app.models import (
     QuizResponse, 
     QuizGenerateRequest, 
     QuizAttemptCreate, 
     QuizAttempt, 
-    QuizStatistics
+    QuizStatistics,
+    QuizSampleResponse,
+    QuizGradeRequest,
+    QuizGradeResponse
 )
 from app.services.quiz_service import QuizService
 from app.services.cached_quiz_service import CachedQuizService
+from app.utils.cursor_pagination import InvalidCursorError, NEXT_CURSOR_HEADER
+from app.utils.event_stream import event_stream_response
 # Authentification supprimée - toutes les routes sont publiques
 
 router = APIRouter()
@@ -60,6 +65,26 @@ async def generate_quiz(
     )
 
 
+@router.post("/generate/stream")
+async def generate_quiz_stream(
+    request: QuizGenerateRequest,
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$", description="sse ou ndjson"),
+    force: bool = Query(False, description="Régénérer même si le quiz existe")
+):
+    """
+    Génère ou récupère le quiz d'un module en streaming.
+    Événements : start, question (une par question, dès qu'elle est générée), done.
+    """
+    difficulty = request.difficulty.value if request.difficulty else None
+    events = await CachedQuizService.stream_quiz(
+        module_id=request.module_id,
+        num_questions=request.num_questions,
+        difficulty=difficulty,
+        force_regenerate=force
+    )
+    return event_stream_response(events, stream_format)
+
+
 @router.post("/regenerate", response_model=QuizResponse)
 async def regenerate_quiz(
     request: QuizGenerateRequest
@@ -124,14 +149,75 @@ async def save_quiz_attempt(
     )
 
 
+@router.get("/module/{module_id}/sample", response_model=QuizSampleResponse)
+async def sample_module_quiz(
+    module_id: str,
+    num_questions: int = Query(20, ge=1, le=50, description="Nombre de questions tirées"),
+    seed: Optional[int] = Query(None, ge=0, description="Graine du tirage (reproductible)")
+):
+    """
+    Tire au sort les questions d'une tentative (route publique).
+    Les questions sont envoyées sans réponse ni explication : le corrigé est
+    renvoyé par POST /grade.
+    """
+    return await QuizService.sample_quiz(module_id=module_id, num_questions=num_questions, seed=seed)
+
+
+@router.post("/grade", response_model=QuizGradeResponse)
+async def grade_quiz_attempt(
+    request: QuizGradeRequest
+):
+    """Corrige une tentative côté serveur, l'enregistre et renvoie le corrigé (route publique)"""
+    user_id = "anonymous"  # Auth supprimée
+    
+    result = await QuizService.grade_attempt(
+        user_id=user_id,
+        module_id=request.module_id,
+        quiz_id=request.quiz_id,
+        quiz_version=request.quiz_version,
+        seed=request.seed,
+        num_questions=request.num_questions,
+        answers=request.answers,
+        time_spent=request.time_spent
+    )
+    attempt = result["attempt"]
+    return QuizGradeResponse(
+        attempt=QuizAttempt(
+            id=attempt.get("id", ""),
+            user_id=user_id,
+            module_id=request.module_id,
+            quiz_id=request.quiz_id,
+            score=attempt["score"],
+            time_spent=attempt["time_spent"],
+            num_questions=attempt["num_questions"],
+            num_correct=attempt["num_correct"],
+            answers=attempt["answers"],
+            started_at=attempt.get("started_at"),
+            completed_at=attempt.get("completed_at")
+        ),
+        corrections=result["corrections"]
+    )
+
+
 @router.get("/module/{module_id}/attempts", response_model=List[QuizAttempt])
 async def get_quiz_attempts(
-    module_id: str
+    module_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor de la page suivante (en-tête X-Next-Cursor)")
 ):
-    """Récupère toutes les tentatives de quiz pour un module (route publique)"""
+    """
+    Récupère les tentatives de quiz pour un module (route publique)
+    Pagination par clé : cursor de la page suivante dans l'en-tête X-Next-Cursor.
+    """
     user_id = "anonymous"  # Auth supprimée
     
-    attempts = await QuizService.get_user_attempts(user_id, module_id)
+    try:
+        attempts, next_cursor = await QuizService.get_user_attempts_page(user_id, module_id, limit, cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [
         QuizAttempt(
             id=str(attempt.get("_id", "")),
@@ -0,0 +1,114 @@
+"""
+Table déclarative des routeurs de l'API
+
+Chaque routeur appartient à un groupe de fonctionnalités. Seuls les groupes
+activés (variable ENABLED_FEATURES) sont importés : un déploiement
+« tutor » n'importe ni le code PDF (reportlab) ni le code de paiement (stripe).
+
+    ENABLED_FEATURES=all                    # défaut : tous les groupes
+    ENABLED_FEATURES=core,tutor             # tuteur IA uniquement
+    ENABLED_FEATURES=all,-payments          # tout sauf les paiements
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RouterSpec(NamedTuple):
+    module: str
+    prefix: str
+    tags: List[str]
+    feature: str
+
+
+# Ordre d'inclusion identique à l'ancien main.py (l'ordre des routes compte)
+ROUTERS: List[RouterSpec] = [
+    RouterSpec("auth", "/api/auth", ["Authentification"], "core"),
+    RouterSpec("modules", "/api/modules", ["Modules"], "core"),
+    RouterSpec("ai_tutor", "/api/ai", ["Kaïrox"], "tutor"),
+    RouterSpec("prompt_router", "/api/prompt-router", ["Prompt Router"], "tutor"),
+    RouterSpec("kairos_prompts", "/api/kairos", ["Kaïrox Prompts"], "kairos"),
+    RouterSpec("user_history", "/api/user-history", ["Historique Utilisateur"], "core"),
+    RouterSpec("progress", "/api/progress", ["Progression"], "core"),
+    RouterSpec("badges", "/api/badges", ["Badges"], "core"),
+    RouterSpec("favorites", "/api/favorites", ["Favoris"], "core"),
+    RouterSpec("recommendations", "/api/recommendations", ["Recommandations"], "core"),
+    RouterSpec("support", "/api/support", ["Support"], "core"),
+    RouterSpec("quiz", "/api/quiz", ["Quiz"], "assessment"),
+    RouterSpec("exam", "/api/exams", ["Examens"], "assessment"),
+    RouterSpec("validation", "/api/validations", ["Validations"], "assessment"),
+    RouterSpec("td", "/api/tds", ["Travaux Dirigés"], "documents"),
+    RouterSpec("tp", "/api/tps", ["Travaux Pratiques"], "documents"),
+    RouterSpec("resources", "/api/resources", ["Ressources"], "core"),
+    RouterSpec("adaptive_learning", "/api/adaptive-learning", ["Apprentissage Adaptatif"], "learning"),
+    RouterSpec("pathways", "/api/pathways", ["Parcours Intelligents"], "learning"),
+    RouterSpec("exercise_generator", "/api/exercise-generator", ["Génération Exercices"], "learning"),
+    RouterSpec("error_learning", "/api/error-learning", ["Apprendre par l'Erreur"], "learning"),
+    RouterSpec("analytics", "/api/analytics", ["Learning Analytics"], "learning"),
+    RouterSpec("anti_cheat", "/api/anti-cheat", ["Anti-Triche"], "assessment"),
+    RouterSpec("virtual_labs", "/api/virtual-labs", ["Laboratoires Virtuels"], "labs"),
+    RouterSpec("avatar", "/api/avatar", ["Avatar IA"], "learning"),
+    RouterSpec("gamification", "/api/gamification", ["Gamification"], "core"),
+    RouterSpec("collaboration", "/api/collaboration", ["Collaboration"], "learning"),
+    RouterSpec("gdpr", "/api/gdpr", ["RGPD"], "core"),
+    RouterSpec("subscriptions", "/api/subscriptions", ["Abonnements"], "payments"),
+    RouterSpec("openai_content", "/api", ["OpenAI Content Generation"], "documents"),
+    RouterSpec("feedback", "/api/feedback", ["Feedback Utilisateur"], "core"),
+    RouterSpec("pedagogical_memory", "/api/pedagogical-memory", ["Mémoire Pédagogique"], "tutor"),
+]
+
+FEATURE_GROUPS: Set[str] = {spec.feature for spec in ROUTERS}
+
+# Groupes toujours chargés, même s'ils sont absents de ENABLED_FEATURES
+REQUIRED_FEATURES: Set[str] = {"core"}
+
+
+def parse_features(value: Optional[str]) -> Set[str]:
+    """
+    Interprète ENABLED_FEATURES (liste séparée par des virgules)
+
+    'all' active tous les groupes, '-groupe' en retire un. Les groupes
+    inconnus sont ignorés avec un avertissement.
+    """
+    features: Set[str] = set()
+    excluded: Set[str] = set()
+    for item in (value or "all").split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        if item == "all":
+            features |= FEATURE_GROUPS
+        elif item.startswith("-"):
+            excluded.add(item[1:])
+        elif item in FEATURE_GROUPS:
+            features.add(item)
+        else:
+            logger.warning(f"Groupe de fonctionnalités inconnu ignoré: '{item}'")
+    return (features - excluded) | REQUIRED_FEATURES
+
+
+def routers_for(features: Iterable[str]) -> List[RouterSpec]:
+    """Routeurs des groupes activés, dans l'ordre d'inclusion"""
+    features = set(features)
+    return [spec for spec in ROUTERS if spec.feature in features]
+
+
+def include_routers(app, features: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Importe et inclut les routeurs des groupes activés
+
+    Returns:
+        Modules de routeurs inclus par groupe
+    """
+    included: Dict[str, List[str]] = {}
+    for spec in routers_for(features):
+        module = importlib.import_module(f"app.routers.{spec.module}")
+        app.include_router(module.router, prefix=spec.prefix, tags=spec.tags)
+        included.setdefault(spec.feature, []).append(spec.module)
+    logger.info(
+        "Groupes de fonctionnalités actifs: "
+        + ", ".join(f"{feature} ({len(modules)})" for feature, modules in sorted(included.items()))
+    )
+    return included
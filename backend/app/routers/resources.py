@@ -1,16 +1,26 @@
 """
 Routeur pour les Ressources de cours
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from typing import List, Optional
 from app.models import Resource, ResourceCreate, ResourceType
 from app.services.resource_service import ResourceService
 # Authentification supprimée - toutes les routes sont publiques
 from app.utils.security import InputSanitizer
 from app.database import get_database
+from app.utils.file_storage import (
+    store_upload,
+    compute_etag,
+    etag_matches,
+    parse_range_header,
+    iter_file_range,
+    is_safe_filename,
+    content_disposition,
+    FileTooLargeError,
+    RangeNotSatisfiableError,
+)
 import os
-import uuid
 import shutil
 from pathlib import Path
 import logging
@@ -71,16 +81,34 @@ async def get_module_resources(
 @router.get("/files/{filename}")
 async def download_resource_file(
     filename: str,
+    request: Request,
 ):
-    """Télécharge un fichier de ressource (route publique)"""
+    """
+    Télécharge un fichier de ressource (route publique)
+    
+    Supporte les requêtes Range (reprise de téléchargement, lecture vidéo)
+    et les ETags (If-None-Match -> 304).
+    """
+    if not is_safe_filename(filename):
+        raise HTTPException(status_code=400, detail="Nom de fichier invalide")
+    
     file_path = UPLOAD_DIR / filename
-    if not file_path.exists():
+    if not file_path.is_file():
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
+    etag = compute_etag(file_path)
+    cache_headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=3600",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    
     # Essayer de trouver la ressource pour obtenir le nom original du fichier
     try:
         db = get_database()
-        resource = await db.resources.find_one({"file_url": {"$regex": filename}})
+        resource = await db.resources.find_one({"file_url": f"/api/resources/files/{filename}"})
         if resource and resource.get("file_name"):
             download_filename = resource["file_name"]
         else:
@@ -106,10 +134,40 @@ async def download_resource_file(
     }
     media_type = media_type_map.get(file_ext, "application/octet-stream")
     
-    return FileResponse(
-        path=str(file_path),
-        filename=download_filename,
-        media_type=media_type
+    file_size = file_path.stat().st_size
+    # Le Range n'est honoré que si If-Range (s'il est fourni) correspond à l'ETag courant
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    
+    try:
+        byte_range = parse_range_header(range_header, file_size)
+    except RangeNotSatisfiableError:
+        return Response(
+            status_code=416,
+            headers={**cache_headers, "Content-Range": f"bytes */{file_size}"}
+        )
+    
+    if byte_range is None:
+        return FileResponse(
+            path=str(file_path),
+            filename=download_filename,
+            media_type=media_type,
+            headers=cache_headers
+        )
+    
+    start, end = byte_range
+    return StreamingResponse(
+        iter_file_range(file_path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            **cache_headers,
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": content_disposition(download_filename),
+        }
     )
 
 
@@ -161,42 +219,30 @@ async def upload_resource(
             detail=f"Type de fichier non autorisé pour {resource_type}. Extensions autorisées: {ALLOWED_EXTENSIONS.get(resource_type, [])}"
         )
     
-    # Vérifier la taille du fichier
-    file_content = await file.read()
-    file_size = len(file_content)
-    if file_size > MAX_FILE_SIZE:
+    # Sanitizer le module_id (avant l'écriture du fichier)
+    sanitized_module_id = InputSanitizer.sanitize_object_id(module_id)
+    if not sanitized_module_id:
+        logger.error(f"ID de module invalide: {module_id}")
+        raise HTTPException(status_code=400, detail="ID de module invalide")
+    
+    logger.info(f"Module ID sanitizé: {sanitized_module_id}")
+    
+    # Sauvegarder le fichier en streaming (taille vérifiée pendant la copie,
+    # stockage adressé par le SHA-256 du contenu)
+    file_ext = get_file_extension(file.filename)
+    try:
+        stored = await store_upload(file, UPLOAD_DIR, file_ext, MAX_FILE_SIZE)
+    except FileTooLargeError:
         raise HTTPException(
             status_code=400,
             detail=f"Fichier trop volumineux. Taille maximale: {MAX_FILE_SIZE / (1024 * 1024)} MB"
         )
-    
-    # Générer un nom de fichier unique
-    file_ext = get_file_extension(file.filename)
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    
-    # Sauvegarder le fichier
-    try:
-        # S'assurer que le dossier existe
-        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        file_path = UPLOAD_DIR / unique_filename
-        
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
-        logger.info(f"Fichier sauvegardé: {file_path.absolute()}")
     except Exception as e:
         logger.error(f"Erreur lors de la sauvegarde du fichier: {e}")
         import traceback
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Erreur lors de la sauvegarde du fichier: {str(e)}")
     
-    # Sanitizer le module_id
-    sanitized_module_id = InputSanitizer.sanitize_object_id(module_id)
-    if not sanitized_module_id:
-        logger.error(f"ID de module invalide: {module_id}")
-        raise HTTPException(status_code=400, detail="ID de module invalide")
-    
-    logger.info(f"Module ID sanitizé: {sanitized_module_id}")
-    
     # Créer la ressource
     try:
         resource_data = ResourceCreate(
@@ -204,9 +250,10 @@ async def upload_resource(
             title=title,
             description=description,
             resource_type=res_type,
-            file_url=f"/api/resources/files/{unique_filename}",
-            file_size=file_size,
-            file_name=file.filename
+            file_url=f"/api/resources/files/{stored.filename}",
+            file_size=stored.size,
+            file_name=file.filename,
+            content_hash=stored.sha256
         )
         logger.info(f"Données de ressource créées: {resource_data.dict()}")
         
@@ -263,16 +310,11 @@ async def delete_resource(
     if not sanitized_id:
         raise HTTPException(status_code=400, detail="ID de ressource invalide")
     
-    # Récupérer la ressource pour supprimer le fichier associé
-    resource = await ResourceService.get_resource(sanitized_id)
-    if resource.get("file_url"):
-        file_path = UPLOAD_DIR / Path(resource["file_url"]).name
-        if file_path.exists():
-            try:
-                file_path.unlink()
-            except Exception as e:
-                logger.error(f"Erreur lors de la suppression du fichier: {e}")
-    
+    await ResourceService.get_resource(sanitized_id)
     await ResourceService.delete_resource(sanitized_id)
+    
+    # Le stockage étant dédupliqué, un upload identique peut réutiliser le fichier
+    # à tout moment : les fichiers orphelins sont retirés par la tâche
+    # 'sweep_orphan_resource_files', après un délai de grâce
     return None
 
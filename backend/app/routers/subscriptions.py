@@ -105,7 +105,8 @@ async def stripe_webhook(
     stripe_signature: str = Header(None, alias="stripe-signature")
 ):
     """
-    Webhook Stripe pour gérer les événements de paiement
+    Webhook Stripe pour gérer les événements de paiement.
+    Acquitté dès la signature vérifiée et l'événement enregistré ; appliqué en arrière-plan.
     """
     try:
         payload = await request.body()
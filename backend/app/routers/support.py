@@ -1,12 +1,13 @@
 """
 Routeur pour le support et les messages de contact
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 from datetime import datetime
 from app.database import get_database
 from app.schemas import serialize_doc
+from app.utils.cursor_pagination import InvalidCursorError, NEXT_CURSOR_HEADER, paginate_with_cursor
 # Authentification supprimée - toutes les routes sont publiques
 import logging
 
@@ -79,11 +80,15 @@ async def create_support_message(message: SupportMessage):
 
 @router.get("/messages", response_model=List[SupportMessageResponse])
 async def get_support_messages(
-    skip: int = Query(0, ge=0),
+    response: Response,
     limit: int = Query(50, ge=1, le=100),
-    unread_only: bool = Query(False)
+    unread_only: bool = Query(False),
+    cursor: Optional[str] = Query(None, description="Cursor de la page suivante (en-tête X-Next-Cursor)")
 ):
-    """Récupère tous les messages de support (route publique)"""
+    """
+    Récupère les messages de support (route publique)
+    Pagination par clé : cursor de la page suivante dans l'en-tête X-Next-Cursor.
+    """
     try:
         db = get_database()
         
@@ -93,8 +98,16 @@ async def get_support_messages(
             filter_query["read"] = False
         
         # Récupérer les messages triés par date (plus récents en premier)
-        cursor = db.support_messages.find(filter_query).sort("created_at", -1).skip(skip).limit(limit)
-        messages = await cursor.to_list(length=limit)
+        messages, next_cursor = await paginate_with_cursor(
+            db.support_messages,
+            filter_query,
+            limit,
+            sort_field="created_at",
+            cursor=cursor,
+            scope=f"support_messages:{unread_only}"
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         # Sérialiser les messages
         result = []
@@ -103,6 +116,8 @@ async def get_support_messages(
             result.append(serialized)
         
         return result
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des messages de support: {e}")
         raise HTTPException(
@@ -1,7 +1,7 @@
 """
 Routeur pour l'historique utilisateur et le cache intelligent
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import Optional, List
 from app.models.user_history import (
     HistoryQuery, HistoryStats, SimilarQuestionRequest, SimilarQuestionResponse
@@ -9,29 +9,37 @@ from app.models.user_history import (
 from app.services.user_history_service import UserHistoryService
 from app.utils.permissions import get_current_user
 from app.models.user_history import Subject
+from app.utils.cursor_pagination import InvalidCursorError, NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 
 @router.get("/history", response_model=List[dict])
 async def get_history(
+    response: Response,
     subject: Optional[Subject] = Query(None),
     module_id: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Cursor de la page suivante (en-tête X-Next-Cursor)"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Récupère l'historique de l'utilisateur connecté
+    (pagination par clé : cursor de la page suivante dans l'en-tête X-Next-Cursor)
     """
     user_id = str(current_user["id"])
-    history = await UserHistoryService.get_user_history(
-        user_id=user_id,
-        subject=subject,
-        module_id=module_id,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        history, next_cursor = await UserHistoryService.get_user_history_page(
+            user_id=user_id,
+            subject=subject,
+            module_id=module_id,
+            limit=limit,
+            cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return history
 
 
@@ -2,7 +2,8 @@
 Routeur pour les laboratoires virtuels interactifs
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import Dict, Any
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
 from app.services.lab_simulation_service import LabSimulationService
 # Authentification supprimée - toutes les routes sont publiques
 import logging
@@ -12,6 +13,19 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+class SweepRequest(BaseModel):
+    """Balayage de paramètres : axes balayés + paramètres fixes"""
+    sweep: Dict[str, Any]
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+
+
+class TimeSeriesRequest(BaseModel):
+    """Simulation temporelle"""
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+    duration: Optional[float] = None
+    steps: int = 200
+
+
 @router.get("/config/{module_id}", response_model=Dict[str, Any])
 async def get_simulation_config(
     module_id: str,
@@ -68,12 +82,64 @@ async def calculate_simulation(
         )
 
 
+@router.post("/sweep/{module_id}", response_model=Dict[str, Any])
+async def calculate_sweep(
+    module_id: str,
+    request: SweepRequest,
+    simulation_type: str = Query("physics", pattern="^(physics|chemistry)$"),
+    encoding: str = Query("json", pattern="^(json|float32)$"),
+):
+    """
+    Calcule une simulation sur toute une plage/grille de paramètres en un appel
+    """
+    try:
+        return await LabSimulationService.calculate_sweep(
+            module_id=module_id,
+            sweep=request.sweep,
+            parameters=request.parameters,
+            simulation_type=simulation_type,
+            encoding=encoding
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors du balayage: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur: {str(e)}"
+        )
 
 
-
-
-
-
-
-
-
+@router.post("/timeseries/{module_id}", response_model=Dict[str, Any])
+async def simulate_time_series(
+    module_id: str,
+    request: TimeSeriesRequest,
+    simulation_type: str = Query("physics", pattern="^(physics|chemistry)$"),
+    encoding: str = Query("json", pattern="^(json|float32)$"),
+):
+    """
+    Calcule l'évolution temporelle d'une simulation (trajectoire, concentrations)
+    """
+    try:
+        return await LabSimulationService.simulate_time_series(
+            module_id=module_id,
+            parameters=request.parameters,
+            duration=request.duration,
+            steps=request.steps,
+            simulation_type=simulation_type,
+            encoding=encoding
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la simulation temporelle: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur: {str(e)}"
+        )
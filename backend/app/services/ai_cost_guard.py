@@ -2,7 +2,7 @@
 AI Cost Guard - Protection contre les coûts excessifs OpenAI
 Plafonds par utilisateur, plafond mensuel global, fallback automatique
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone, timedelta
 from app.database import get_database
 from app.config import settings
@@ -34,39 +34,24 @@ class AICostGuard:
             }
         """
         try:
-            db = get_database()
-            today = datetime.now(timezone.utc).date()
-            
-            # Récupérer les limites de l'utilisateur (depuis subscription ou défaut)
-            from app.services.subscription_service import SubscriptionService
-            plan = await SubscriptionService.get_user_plan(user_id)
-            
-            # Limites selon le plan
-            daily_limit = AICostGuard._get_daily_limit(plan)
+            # Plan et tokens du jour : droits en cache (EntitlementsService)
+            from app.services.entitlements_service import EntitlementsService, UNLIMITED
+            entitlements = await EntitlementsService.get(user_id)
+            daily_limit = entitlements.daily_token_limit
+            tokens_used_today = entitlements.tokens_used_today
             
-            # Compter les tokens utilisés aujourd'hui
-            start_of_day = datetime.combine(today, datetime.min.time()).replace(tzinfo=timezone.utc)
-            
-            daily_usage = await db.ai_usage.aggregate([
-                {
-                    "$match": {
-                        "user_id": user_id,
-                        "created_at": {"$gte": start_of_day}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": None,
-                        "total_tokens": {"$sum": "$tokens_used"}
-                    }
+            if daily_limit == UNLIMITED:
+                return {
+                    "allowed": True,
+                    "reason": "OK",
+                    "remaining_tokens": UNLIMITED,
+                    "fallback_model": None
                 }
-            ]).to_list(length=1)
             
-            tokens_used_today = daily_usage[0].get("total_tokens", 0) if daily_usage else 0
-            remaining_tokens = max(0, daily_limit - tokens_used_today)
+            remaining_tokens = entitlements.remaining_tokens
             
             # Vérifier si la requête est autorisée
-            if tokens_used_today + estimated_tokens > daily_limit:
+            if not entitlements.allows_tokens(estimated_tokens):
                 # Suggérer un modèle moins cher (mapper vers le vrai modèle)
                 fallback_model = map_to_real_model("gpt-5-mini") if estimated_tokens > 0 else None
                 
@@ -205,18 +190,27 @@ class AICostGuard:
             logger.error(f"Erreur enregistrement usage: {e}", exc_info=True)
     
     @staticmethod
-    async def estimate_tokens(message: str, context: Optional[str] = None) -> int:
+    async def record_usage_batch(rows: List[Dict[str, Any]]) -> None:
+        """Enregistre plusieurs lignes d'utilisation IA en une seule insertion"""
+        if not rows:
+            return
+        try:
+            db = get_database()
+            await db.ai_usage.insert_many(rows, ordered=False)
+        except Exception as e:
+            logger.error(f"Erreur enregistrement usage (lot de {len(rows)}): {e}", exc_info=True)
+    
+    @staticmethod
+    async def estimate_tokens(message: str, context: Optional[str] = None, model: str = "gpt-4o-mini") -> int:
         """
         Estime le nombre de tokens pour une requête
-        Approximation: ~4 caractères = 1 token
+        Tokenizer BPE local (tiktoken), approximation ~4 caractères = 1 token sinon
         """
-        total_chars = len(message)
+        from app.utils.token_counter import count_messages_tokens
+        messages = [{"role": "user", "content": message}]
         if context:
-            total_chars += len(context)
-        
-        # Ajouter ~20% pour les tokens système et formatage
-        estimated = int((total_chars / 4) * 1.2)
-        return max(estimated, 10)  # Minimum 10 tokens
+            messages.insert(0, {"role": "system", "content": context})
+        return max(count_messages_tokens(messages, model), 10)  # Minimum 10 tokens
     
     @staticmethod
     def _get_daily_limit(plan) -> int:
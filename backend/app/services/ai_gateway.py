@@ -0,0 +1,407 @@
+"""
+Passerelle IA unique - tous les appels OpenAI passent par ce module
+
+- un client AsyncOpenAI partagé (pool de connexions httpx)
+- un sémaphore de concurrence par modèle
+- retries avec backoff et un circuit breaker par modèle
+- comptage des tokens réels (response.usage), latence et coût
+- part des tokens du prompt servis depuis le cache OpenAI, par fonctionnalité
+- écriture des lignes 'ai_usage' par lots, en arrière-plan
+"""
+from typing import Dict, Any, List, Optional, AsyncIterator, Set
+from datetime import datetime, timezone
+from openai import AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from app.config import settings
+from app.utils.model_mapper import get_model_cost
+from app.utils.retry import retry_with_backoff, get_remaining_time, DeadlineExceededError
+from app.utils.circuit_breaker import get_circuit_breaker, CircuitBreaker
+from app.prompts.assembly import cached_tokens
+from app.utils.token_counter import count_messages_tokens
+import asyncio
+import time
+import weakref
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Erreurs temporaires pour lesquelles un nouvel essai est utile
+RETRYABLE_EXCEPTIONS = (APIConnectionError, APITimeoutError, RateLimitError)
+# Erreurs qui comptent comme une panne pour le circuit breaker (pas les 400/401 du client)
+BREAKER_EXCEPTIONS = RETRYABLE_EXCEPTIONS + (InternalServerError,)
+
+# Taille des lots d'insertion 'ai_usage' et délai maximal avant écriture
+USAGE_BATCH_SIZE = 50
+USAGE_FLUSH_INTERVAL = 5.0
+
+
+class AIQuotaExceededError(Exception):
+    """Le quota IA de l'utilisateur est atteint et aucun modèle de repli n'est disponible"""
+    pass
+
+
+class AIGatewayUnavailableError(Exception):
+    """Aucune clé OpenAI configurée (mode démo)"""
+    pass
+
+
+class _UsageRecorder:
+    """Tampon des lignes 'ai_usage', insérées par lots sans bloquer les requêtes"""
+
+    def __init__(self):
+        self._rows: List[Dict[str, Any]] = []
+        # Seul le délai est annulable : une écriture commencée n'est jamais interrompue
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self._rows.append(row)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Pas de boucle en cours : l'écriture aura lieu au prochain flush()
+            return
+        if len(self._rows) >= USAGE_BATCH_SIZE:
+            self._start_write()
+        elif self._timer is None or self._timer_loop is not loop:
+            # Un délai armé sur une boucle terminée (tâche Celery) ne se déclenchera jamais
+            self._timer = loop.call_later(USAGE_FLUSH_INTERVAL, self._start_write)
+            self._timer_loop = loop
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_loop = None
+
+    def _start_write(self) -> None:
+        self._cancel_timer()
+        task = asyncio.get_running_loop().create_task(self._write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self) -> int:
+        if not self._rows:
+            return 0
+        rows, self._rows = self._rows, []
+        from app.services.ai_cost_guard import AICostGuard
+        await AICostGuard.record_usage_batch(rows)
+        return len(rows)
+
+    async def flush(self) -> int:
+        """Écrit les lignes en attente (après les écritures déjà en cours) ; retourne le nombre de lignes insérées"""
+        self._cancel_timer()
+        loop = asyncio.get_running_loop()
+        in_flight = [task for task in self._writes if task.get_loop() is loop]
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        return await self._write()
+
+
+usage_recorder = _UsageRecorder()
+
+
+class AIGateway:
+    """Point d'entrée unique pour les appels OpenAI"""
+
+    # Un client et des sémaphores par boucle d'événements (les tâches Celery créent leur propre boucle) ;
+    # références faibles : les entrées disparaissent avec la boucle, jamais servies à une boucle recréée
+    _clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+    _semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+        weakref.WeakKeyDictionary()
+    )
+    # feature -> [tokens du prompt, tokens servis depuis le cache]
+    _prompt_cache_totals: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def is_available() -> bool:
+        """True si une clé OpenAI est configurée (sinon mode démo)"""
+        return bool(settings.openai_api_key)
+
+    @staticmethod
+    def _create_client() -> AsyncOpenAI:
+        import os
+        import httpx
+
+        proxy = getattr(settings, "openai_proxy", None)
+        proxy_url = proxy or os.environ.get("HTTP_PROXY") or os.environ.get("HTTPS_PROXY")
+
+        http_client_kwargs = {
+            "timeout": 60.0,
+            "limits": httpx.Limits(
+                max_keepalive_connections=settings.ai_max_keepalive_connections,
+                max_connections=settings.ai_max_connections
+            )
+        }
+        if proxy_url:
+            http_client_kwargs["proxy"] = proxy_url
+            logger.info(f"Proxy OpenAI configuré: {proxy_url}")
+
+        client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            http_client=httpx.AsyncClient(**http_client_kwargs),
+            max_retries=0  # Les retries sont gérés par la passerelle
+        )
+        logger.info("Client OpenAI (passerelle IA) initialisé")
+        return client
+
+    @staticmethod
+    def get_client() -> AsyncOpenAI:
+        """Retourne le client partagé de la boucle courante"""
+        if not AIGateway.is_available():
+            raise AIGatewayUnavailableError("OPENAI_API_KEY non configuré - Mode démo")
+        loop = asyncio.get_running_loop()
+        client = AIGateway._clients.get(loop)
+        if client is None:
+            client = AIGateway._create_client()
+            AIGateway._clients[loop] = client
+        return client
+
+    @staticmethod
+    def _semaphore(model: str) -> asyncio.Semaphore:
+        semaphores = AIGateway._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.ai_max_concurrency_per_model)
+            semaphores[model] = semaphore
+        return semaphore
+
+    @staticmethod
+    def _breaker(model: str) -> CircuitBreaker:
+        """Circuit breaker propre au modèle (partagé entre workers via Redis)"""
+        return get_circuit_breaker(
+            f"openai:chat:{model}",
+            failure_threshold=5,
+            success_threshold=2,
+            timeout=60.0,
+            half_open_max_calls=2,
+            expected_exception=BREAKER_EXCEPTIONS,
+            shared=True
+        )
+
+    @staticmethod
+    async def _resolve_model(model: str, user_id: Optional[str], estimated_tokens: int) -> str:
+        """Applique le quota utilisateur (AICostGuard) ; bascule sur le modèle de repli si besoin"""
+        if not user_id:
+            return model
+        from app.services.ai_cost_guard import AICostGuard
+        check = await AICostGuard.check_user_limit(user_id, estimated_tokens)
+        if check.get("allowed", True):
+            return model
+        fallback_model = check.get("fallback_model")
+        if fallback_model and fallback_model != model:
+            logger.info(f"Quota IA atteint pour {user_id}: bascule {model} -> {fallback_model}")
+            return fallback_model
+        raise AIQuotaExceededError(check.get("reason", "Quota IA atteint"))
+
+    @staticmethod
+    def _attempt_params(create_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Paramètres d'une tentative : le timeout ne dépasse pas la deadline de la requête"""
+        remaining = get_remaining_time()
+        if remaining is None:
+            return create_params
+        if remaining <= 0:
+            raise DeadlineExceededError("Deadline de la requête dépassée")
+        params = dict(create_params)
+        params["timeout"] = min(params.get("timeout") or remaining, remaining)
+        return params
+
+    @staticmethod
+    def _estimate_prompt_tokens(messages: List[Dict[str, Any]], model: str = "gpt-4o-mini") -> int:
+        return max(count_messages_tokens(messages, model), 10)
+
+    @staticmethod
+    def _record(
+        model: str,
+        feature: str,
+        started_at: float,
+        usage: Any,
+        user_id: Optional[str],
+        status: str = "success"
+    ) -> None:
+        """Métriques Prometheus + ligne 'ai_usage' (tokens réels renvoyés par l'API)"""
+        from app.utils.prometheus_metrics import MetricsCollector
+
+        duration = time.perf_counter() - started_at
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage else 0
+        cached_prompt_tokens = cached_tokens(usage)
+        total_tokens = prompt_tokens + completion_tokens
+        cost = (total_tokens / 1_000_000) * get_model_cost(model)
+
+        try:
+            MetricsCollector.record_ai_request(
+                model=model,
+                endpoint=feature,
+                duration=duration,
+                tokens_prompt=prompt_tokens,
+                tokens_completion=completion_tokens,
+                cost_eur=cost,
+                status=status,
+                tokens_cached=cached_prompt_tokens
+            )
+        except Exception as e:
+            logger.debug(f"Erreur enregistrement métriques IA: {e}")
+
+        if prompt_tokens:
+            totals = AIGateway._prompt_cache_totals.setdefault(feature, [0, 0])
+            totals[0] += prompt_tokens
+            totals[1] += cached_prompt_tokens
+
+        if status == "success" and total_tokens:
+            if user_id:
+                from app.services.entitlements_service import EntitlementsService
+                EntitlementsService.record_tokens(user_id, total_tokens)
+            usage_recorder.add({
+                "user_id": user_id or "system",
+                "model": model,
+                "feature": feature,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cached_tokens": cached_prompt_tokens,
+                "tokens_used": total_tokens,
+                "cost_eur": cost,
+                "latency_ms": int(duration * 1000),
+                "created_at": datetime.now(timezone.utc)
+            })
+
+    @staticmethod
+    async def chat_completion(
+        *,
+        feature: str,
+        user_id: Optional[str] = None,
+        max_retries: int = 3,
+        **create_params: Any
+    ) -> Any:
+        """
+        Appel chat.completions.create via la passerelle
+
+        Args:
+            feature: nom de la fonctionnalité appelante (métriques et 'ai_usage')
+            user_id: utilisateur à qui imputer la consommation (quota vérifié si fourni)
+            max_retries: nombre maximal de tentatives pour les erreurs temporaires
+            **create_params: paramètres OpenAI (model, messages, timeout, ...)
+        """
+        client = AIGateway.get_client()
+        model = await AIGateway._resolve_model(
+            create_params["model"], user_id,
+            AIGateway._estimate_prompt_tokens(create_params.get("messages", []), create_params["model"])
+        )
+        create_params["model"] = model
+
+        async def call_openai():
+            async with AIGateway._semaphore(model):
+                return await client.chat.completions.create(**AIGateway._attempt_params(create_params))
+
+        async def protected_call():
+            return await retry_with_backoff(
+                call_openai,
+                max_retries=max_retries,
+                initial_delay=1.0,
+                max_delay=10.0,
+                exceptions=RETRYABLE_EXCEPTIONS,
+                operation=f"openai:{feature}"
+            )
+
+        started_at = time.perf_counter()
+        try:
+            response = await AIGateway._breaker(model).call(protected_call)
+        except Exception as e:
+            AIGateway._record(model, feature, started_at, None, user_id, status=type(e).__name__)
+            raise
+
+        AIGateway._record(model, feature, started_at, getattr(response, "usage", None), user_id)
+        return response
+
+    @staticmethod
+    async def stream_chat_completion(
+        *,
+        feature: str,
+        user_id: Optional[str] = None,
+        max_retries: int = 3,
+        **create_params: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Appel en streaming via la passerelle ; produit les chunks OpenAI
+
+        L'usage réel est demandé via stream_options.include_usage (dernier chunk).
+        """
+        client = AIGateway.get_client()
+        model = await AIGateway._resolve_model(
+            create_params["model"], user_id,
+            AIGateway._estimate_prompt_tokens(create_params.get("messages", []), create_params["model"])
+        )
+        create_params["model"] = model
+        create_params["stream"] = True
+        create_params.setdefault("stream_options", {"include_usage": True})
+
+        async def open_stream():
+            return await client.chat.completions.create(**AIGateway._attempt_params(create_params))
+
+        async def protected_open():
+            return await retry_with_backoff(
+                open_stream,
+                max_retries=max_retries,
+                initial_delay=1.0,
+                max_delay=10.0,
+                exceptions=RETRYABLE_EXCEPTIONS,
+                operation=f"openai:{feature}"
+            )
+
+        started_at = time.perf_counter()
+        usage = None
+        status = "success"
+        async with AIGateway._semaphore(model):
+            try:
+                stream = await AIGateway._breaker(model).call(protected_open)
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    yield chunk
+            except Exception as e:
+                status = type(e).__name__
+                raise
+            finally:
+                AIGateway._record(model, feature, started_at, usage, user_id, status=status)
+
+    @staticmethod
+    def prompt_cache_stats() -> Dict[str, Any]:
+        """Part des tokens du prompt servis depuis le cache OpenAI, par fonctionnalité (processus courant)"""
+        features = {
+            feature: {
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached,
+                "cached_ratio": round(cached / prompt_tokens, 4) if prompt_tokens else 0.0
+            }
+            for feature, (prompt_tokens, cached) in AIGateway._prompt_cache_totals.items()
+        }
+        prompt_total = sum(f["prompt_tokens"] for f in features.values())
+        cached_total = sum(f["cached_tokens"] for f in features.values())
+        return {
+            "prompt_tokens": prompt_total,
+            "cached_tokens": cached_total,
+            "cached_ratio": round(cached_total / prompt_total, 4) if prompt_total else 0.0,
+            "features": features
+        }
+
+    @staticmethod
+    async def flush_usage() -> int:
+        """Écrit immédiatement les lignes 'ai_usage' en attente"""
+        return await usage_recorder.flush()
+
+    @staticmethod
+    async def close() -> None:
+        """Vide le tampon d'usage et ferme le client de la boucle courante"""
+        try:
+            await usage_recorder.flush()
+        except Exception as e:
+            logger.warning(f"Erreur écriture usage IA à l'arrêt: {e}")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        AIGateway._semaphores.pop(loop, None)
+        client = AIGateway._clients.pop(loop, None)
+        if client is not None:
+            await client.close()
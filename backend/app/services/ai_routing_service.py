@@ -3,9 +3,9 @@ Service de routing intelligent pour GPT-5.1 et GPT-5-mini
 Optimisé pour 100k utilisateurs avec gestion de charge
 """
 from typing import Dict, Any, Optional, AsyncGenerator, List
-from openai import OpenAI, Stream
-from openai.types.chat import ChatCompletionChunk
 from app.config import settings
+from app.services.ai_gateway import AIGateway, AIQuotaExceededError
+from app.prompts.assembly import build_messages
 from app.utils.model_mapper import map_to_real_model
 import logging
 import asyncio
@@ -18,38 +18,6 @@ GPT_5_2_MODEL = "gpt-5.2"  # Expert - Raisonnement complexe (Examens, TD avancé
 GPT_5_MINI_MODEL = "gpt-5-mini"  # Principal - Pédagogique (TD standards, quiz, explications)
 GPT_5_NANO_MODEL = "gpt-5-nano"  # Rapide - Économique (QCM, flash-cards, vérifications)
 
-# Client OpenAI
-client = None
-
-def _initialize_openai_client():
-    """Initialise le client OpenAI"""
-    global client
-    if settings.openai_api_key:
-        try:
-            import httpx
-            
-            http_client_kwargs = {
-                "timeout": 60.0,  # Timeout plus long pour GPT-5.1
-                "limits": httpx.Limits(max_keepalive_connections=10, max_connections=50)
-            }
-            
-            proxy = getattr(settings, "openai_proxy", None)
-            if proxy:
-                http_client_kwargs["proxy"] = proxy
-            
-            http_client = httpx.Client(**http_client_kwargs)
-            client = OpenAI(
-                api_key=settings.openai_api_key,
-                http_client=http_client
-            )
-            logger.info("Client OpenAI initialisé avec succès")
-        except Exception as e:
-            logger.error(f"Erreur lors de l'initialisation OpenAI: {e}")
-            client = None
-    else:
-        logger.warning("OpenAI API key non configurée")
-
-_initialize_openai_client()
 
 
 class AIRoutingService:
@@ -106,7 +74,8 @@ class AIRoutingService:
     
     @staticmethod
     async def select_model(message: str, context: Optional[str] = None, 
-                    force_model: Optional[str] = None, use_prompt_router: bool = True) -> str:
+                    force_model: Optional[str] = None, use_prompt_router: bool = True,
+                    user_id: Optional[str] = None) -> str:
         """
         Sélectionne le modèle approprié
         
@@ -115,6 +84,7 @@ class AIRoutingService:
             context: Contexte optionnel
             force_model: Modèle forcé
             use_prompt_router: Si True, utilise le prompt router (recommandé)
+            user_id: Auteur du message
         """
         if force_model:
             return force_model
@@ -123,7 +93,7 @@ class AIRoutingService:
         if use_prompt_router:
             try:
                 from app.services.prompt_router_service import PromptRouterService
-                model = await PromptRouterService.route_to_model(message, context, force_model)
+                model = await PromptRouterService.route_to_model(message, context, force_model, user_id)
                 logger.info(f"Modèle sélectionné via Prompt Router: {model}")
                 return model
             except Exception as e:
@@ -161,13 +131,14 @@ class AIRoutingService:
         context: Optional[str] = None,
         language: str = "fr",
         force_model: Optional[str] = None,
-        conversation_history: Optional[List[Dict[str, Any]]] = None
+        conversation_history: Optional[List[Dict[str, Any]]] = None,
+        user_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """
         Chat avec streaming et support de la vision (images).
         message_content est une liste d'objets avec type "text" ou "image_url".
         """
-        if not client:
+        if not AIGateway.is_available():
             yield "Mode démo activé. OpenAI non configuré."
             return
         
@@ -179,73 +150,35 @@ class AIRoutingService:
             logger.debug(f"Modèle '{model}' mappé vers '{actual_model}' (modèle réel OpenAI)")
         
         try:
-            # Construire le contexte système
-            system_prompt = f"""Tu es Kaïrox Tutor, un assistant pédagogique fiable, clair et bienveillant.
-Ta mission est d'aider les étudiants à apprendre de manière naturelle et conversationnelle.
-
-RÈGLES DE CONVERSATION :
-- Sois naturel et conversationnel, comme un vrai tuteur humain
-- Adapte la longueur de ta réponse au contexte :
-  * Salutations simples (bonjour, salut, etc.) → Réponse brève et amicale (1-2 phrases max)
-  * Questions simples → Réponse concise et directe (2-4 phrases)
-  * Questions complexes → Réponse détaillée et structurée
-- Ne donne JAMAIS de longues listes ou structures rigides pour des messages simples
-
-ANALYSE DE DOCUMENTS (PDF, Word, PPT, Images) :
-- Si l'utilisateur envoie un document (PDF, image, Word, PPT), analyse-le EN DÉTAIL
-- Pour les exercices dans les documents, fournis une solution COMPLÈTE et ÉTAPE PAR ÉTAPE
-- Pour les exercices mathématiques, montre TOUS les calculs étape par étape
-- Réponds directement aux questions posées sur le document
-- Si le document contient plusieurs exercices, réponds à celui demandé par l'utilisateur
-- Utilise les informations du document pour donner des réponses précises et contextuelles
-
-RÈGLES GÉNÉRALES :
-- Utilise un langage clair et accessible
-- Explique étape par étape seulement si nécessaire
-- Donne des exemples concrets quand utile
-- Ne complexifie jamais inutilement
-
-EXEMPLES :
-- Si l'utilisateur dit "bonjour" → Réponds simplement "Bonjour ! Comment puis-je t'aider aujourd'hui ?"
-- Si l'utilisateur envoie un PDF avec "répondre à l'exercice 1" → Analyse le PDF, trouve l'exercice 1, et fournis une solution complète
-- Si l'utilisateur pose une question → Réponds directement à la question de manière concise
-
-LANGUE : Réponds TOUJOURS en {language}"""
-
-            if context:
-                system_prompt += f"\n\nContexte: {context}"
-            
-            # Construire la liste des messages avec l'historique de conversation
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Ajouter l'historique de conversation si disponible
-            if conversation_history:
-                recent_history = conversation_history[-10:] if len(conversation_history) > 10 else conversation_history
-                messages.extend(recent_history)
-            
-            # Ajouter le message actuel avec images
-            messages.append({
-                "role": "user",
-                "content": message_content
-            })
+            # Préfixe système statique ; contexte et langue dans un message séparé
+            max_tokens_value = 4000
+            messages = build_messages(
+                message_content,
+                mode="vision",
+                language=language,
+                context=f"Contexte: {context}" if context else None,
+                history=conversation_history,
+                prompt_language="fr",
+                force_language=True,
+                model=actual_model,
+                max_completion_tokens=max_tokens_value
+            )
             
             # Créer le stream avec le modèle de vision
             from app.services.ai_service import _get_max_tokens_param, _get_temperature_param
-            max_tokens_value = 4000
             temperature_value = 0.7
             create_params = {
                 "model": actual_model,  # Utiliser le modèle réel mappé
                 "messages": messages,
-                "stream": True,
                 "timeout": 120.0
             }
             create_params.update(_get_max_tokens_param(actual_model, max_tokens_value))
             create_params.update(_get_temperature_param(actual_model, temperature_value))
             
-            stream: Stream[ChatCompletionChunk] = client.chat.completions.create(**create_params)
+            stream = AIGateway.stream_chat_completion(feature="chat_vision", user_id=user_id, **create_params)
             
             # Streamer les réponses
-            for chunk in stream:
+            async for chunk in stream:
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
                     if delta and delta.content:
@@ -259,6 +192,8 @@ LANGUE : Réponds TOUJOURS en {language}"""
                                 logger.error(f"Erreur conversion chunk content: {e}")
                                 yield ""
                     
+        except AIQuotaExceededError:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors du streaming chat avec vision: {e}", exc_info=True)
             import inspect
@@ -280,77 +215,32 @@ LANGUE : Réponds TOUJOURS en {language}"""
         context: Optional[str] = None,
         language: str = "fr",
         force_model: Optional[str] = None,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """Chat avec streaming pour meilleure UX avec support de l'historique de conversation"""
-        if not client:
+        if not AIGateway.is_available():
             # Mode démo
             yield "Mode démo activé. OpenAI non configuré."
             return
         
-        model = await AIRoutingService.select_model(message, context, force_model)
+        model = await AIRoutingService.select_model(message, context, force_model, user_id=user_id)
         
         try:
-            # Construire le contexte système selon le modèle
-            if model == GPT_5_2_MODEL:
-                # Prompt Expert pour GPT-5.2
-                system_prompt = f"""Tu es Kaïrox Expert, un assistant pédagogique avancé spécialisé dans le raisonnement scientifique et l'analyse approfondie.
-
-Ta mission est de produire des réponses exactes, rigoureuses et pédagogiquement solides en physique, chimie, mathématiques et informatique.
-
-Règles :
-- Raisonne étape par étape.
-- Justifie chaque conclusion.
-- Utilise des notations mathématiques claires si nécessaire.
-- Détecte et corrige les erreurs de raisonnement.
-- Adapte la difficulté au niveau indiqué.
-- Ne réponds jamais de façon vague.
-
-Sorties attendues :
-- Raisonnement détaillé
-- Solution finale claire
-- Astuces pédagogiques ou pièges courants
-
-LANGUE : Réponds TOUJOURS en {language}"""
-            else:
-                # Prompt Tutor standard pour GPT-5-mini
-                system_prompt = f"""Tu es Kaïrox Tutor, un assistant pédagogique fiable, clair et bienveillant.
-Ta mission est d'aider les étudiants à apprendre de manière naturelle et conversationnelle.
-
-RÈGLES DE CONVERSATION :
-- Sois naturel et conversationnel, comme un vrai tuteur humain
-- Adapte la longueur de ta réponse au contexte :
-  * Salutations simples (bonjour, salut, etc.) → Réponse brève et amicale (1-2 phrases max)
-  * Questions simples → Réponse concise et directe (2-4 phrases)
-  * Questions complexes → Réponse détaillée et structurée
-- Ne donne JAMAIS de longues listes ou structures rigides pour des messages simples
-- Utilise un langage clair et accessible
-- Explique étape par étape seulement si nécessaire
-- Pose des questions de suivi seulement si pertinent
-- Donne des exemples concrets quand utile
-- Ne complexifie jamais inutilement
-
-EXEMPLES :
-- Si l'utilisateur dit "bonjour" → Réponds simplement "Bonjour ! Comment puis-je t'aider aujourd'hui ?"
-- Si l'utilisateur pose une question → Réponds directement à la question de manière concise
-- Si l'utilisateur demande une explication détaillée → Alors tu peux être plus structuré
-
-LANGUE : Réponds TOUJOURS en {language}"""
-
-            if context:
-                system_prompt += f"\n\nContexte: {context}"
-            
-            # Construire la liste des messages avec l'historique de conversation
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Ajouter l'historique de conversation si disponible
-            if conversation_history:
-                # Limiter l'historique aux 10 derniers échanges pour éviter de dépasser les limites de tokens
-                recent_history = conversation_history[-10:] if len(conversation_history) > 10 else conversation_history
-                messages.extend(recent_history)
-            
-            # Ajouter le message actuel
-            messages.append({"role": "user", "content": message})
+            # Préfixe système statique selon le modèle ; contexte et langue après,
+            # historique borné au budget de tokens du modèle
+            max_tokens_value = 4000 if model == GPT_5_2_MODEL else (2000 if model == GPT_5_MINI_MODEL else 1000)
+            messages = build_messages(
+                message,
+                mode="expert" if model == GPT_5_2_MODEL else "tutor",
+                language=language,
+                context=f"Contexte: {context}" if context else None,
+                history=conversation_history,
+                prompt_language="fr",
+                force_language=True,
+                model=model,
+                max_completion_tokens=max_tokens_value
+            )
             
             # Mapper le modèle fictif vers le vrai modèle OpenAI
             actual_model = map_to_real_model(model)
@@ -359,22 +249,20 @@ LANGUE : Réponds TOUJOURS en {language}"""
             
             # Créer le stream
             from app.services.ai_service import _get_max_tokens_param, _get_temperature_param
-            max_tokens_value = 4000 if model == GPT_5_2_MODEL else (2000 if model == GPT_5_MINI_MODEL else 1000)
             temperature_value = 0.3 if model == GPT_5_2_MODEL else (0.7 if model == GPT_5_MINI_MODEL else 0.8)
             create_params = {
                 "model": actual_model,  # Utiliser le modèle réel mappé
                 "messages": messages,
-                "stream": True,
                 "timeout": 120.0 if model == GPT_5_2_MODEL else (60.0 if model == GPT_5_MINI_MODEL else 30.0)
             }
             # Ajouter temperature seulement si le modèle le supporte
             create_params.update(_get_temperature_param(actual_model, temperature_value))
             create_params.update(_get_max_tokens_param(actual_model, max_tokens_value))
             
-            stream: Stream[ChatCompletionChunk] = client.chat.completions.create(**create_params)
+            stream = AIGateway.stream_chat_completion(feature="chat_stream", user_id=user_id, **create_params)
             
             # Streamer les réponses
-            for chunk in stream:
+            async for chunk in stream:
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
                     if delta and delta.content:
@@ -390,6 +278,8 @@ LANGUE : Réponds TOUJOURS en {language}"""
                                 logger.error(f"Erreur conversion chunk content: {e}")
                                 yield ""
                     
+        except AIQuotaExceededError:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors du streaming chat: {e}", exc_info=True)
             # S'assurer que l'erreur est bien convertie en string (éviter les coroutines)
@@ -412,79 +302,34 @@ LANGUE : Réponds TOUJOURS en {language}"""
         context: Optional[str] = None,
         language: str = "fr",
         force_model: Optional[str] = None,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """Chat standard (non-streaming) avec support de l'historique de conversation"""
-        if not client:
+        if not AIGateway.is_available():
             return {
                 "response": "Mode démo activé. OpenAI non configuré.",
                 "model_used": "demo",
                 "suggestions": []
             }
         
-        model = await AIRoutingService.select_model(message, context, force_model)
+        model = await AIRoutingService.select_model(message, context, force_model, user_id=user_id)
         
         try:
-            # Construire le contexte système selon le modèle
-            if model == GPT_5_2_MODEL:
-                # Prompt Expert pour GPT-5.2
-                system_prompt = f"""Tu es Kaïrox Expert, un assistant pédagogique avancé spécialisé dans le raisonnement scientifique et l'analyse approfondie.
-
-Ta mission est de produire des réponses exactes, rigoureuses et pédagogiquement solides en physique, chimie, mathématiques et informatique.
-
-Règles :
-- Raisonne étape par étape.
-- Justifie chaque conclusion.
-- Utilise des notations mathématiques claires si nécessaire.
-- Détecte et corrige les erreurs de raisonnement.
-- Adapte la difficulté au niveau indiqué.
-- Ne réponds jamais de façon vague.
-
-Sorties attendues :
-- Raisonnement détaillé
-- Solution finale claire
-- Astuces pédagogiques ou pièges courants
-
-LANGUE : Réponds TOUJOURS en {language}"""
-            else:
-                # Prompt Tutor standard pour GPT-5-mini
-                system_prompt = f"""Tu es Kaïrox Tutor, un assistant pédagogique fiable, clair et bienveillant.
-Ta mission est d'aider les étudiants à apprendre de manière naturelle et conversationnelle.
-
-RÈGLES DE CONVERSATION :
-- Sois naturel et conversationnel, comme un vrai tuteur humain
-- Adapte la longueur de ta réponse au contexte :
-  * Salutations simples (bonjour, salut, etc.) → Réponse brève et amicale (1-2 phrases max)
-  * Questions simples → Réponse concise et directe (2-4 phrases)
-  * Questions complexes → Réponse détaillée et structurée
-- Ne donne JAMAIS de longues listes ou structures rigides pour des messages simples
-- Utilise un langage clair et accessible
-- Explique étape par étape seulement si nécessaire
-- Pose des questions de suivi seulement si pertinent
-- Donne des exemples concrets quand utile
-- Ne complexifie jamais inutilement
-
-EXEMPLES :
-- Si l'utilisateur dit "bonjour" → Réponds simplement "Bonjour ! Comment puis-je t'aider aujourd'hui ?"
-- Si l'utilisateur pose une question → Réponds directement à la question de manière concise
-- Si l'utilisateur demande une explication détaillée → Alors tu peux être plus structuré
-
-LANGUE : Réponds TOUJOURS en {language}"""
-            
-            if context:
-                system_prompt += f"\n\nContexte: {context}"
-            
-            # Construire la liste des messages avec l'historique de conversation
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Ajouter l'historique de conversation si disponible
-            if conversation_history:
-                # Limiter l'historique aux 10 derniers échanges pour éviter de dépasser les limites de tokens
-                recent_history = conversation_history[-10:] if len(conversation_history) > 10 else conversation_history
-                messages.extend(recent_history)
-            
-            # Ajouter le message actuel
-            messages.append({"role": "user", "content": message})
+            # Préfixe système statique selon le modèle ; contexte et langue après,
+            # historique borné au budget de tokens du modèle
+            max_tokens_value = 4000 if model == GPT_5_2_MODEL else (2000 if model == GPT_5_MINI_MODEL else 1000)
+            messages = build_messages(
+                message,
+                mode="expert" if model == GPT_5_2_MODEL else "tutor",
+                language=language,
+                context=f"Contexte: {context}" if context else None,
+                history=conversation_history,
+                prompt_language="fr",
+                force_language=True,
+                model=model,
+                max_completion_tokens=max_tokens_value
+            )
             
             # Mapper le modèle fictif vers le vrai modèle OpenAI
             actual_model = map_to_real_model(model)
@@ -492,7 +337,6 @@ LANGUE : Réponds TOUJOURS en {language}"""
                 logger.debug(f"Modèle '{model}' mappé vers '{actual_model}' (modèle réel OpenAI)")
             
             from app.services.ai_service import _get_max_tokens_param, _get_temperature_param
-            max_tokens_value = 4000 if model == GPT_5_2_MODEL else (2000 if model == GPT_5_MINI_MODEL else 1000)
             temperature_value = 0.3 if model == GPT_5_2_MODEL else (0.7 if model == GPT_5_MINI_MODEL else 0.8)
             create_params = {
                 "model": actual_model,  # Utiliser le modèle réel mappé
@@ -503,13 +347,15 @@ LANGUE : Réponds TOUJOURS en {language}"""
             create_params.update(_get_temperature_param(actual_model, temperature_value))
             create_params.update(_get_max_tokens_param(actual_model, max_tokens_value))
             
-            response = client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="chat_routing", user_id=user_id, **create_params)
             
             return {
                 "response": response.choices[0].message.content,
                 "model_used": model,
                 "suggestions": []
             }
+        except AIQuotaExceededError:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors du chat: {e}")
             return {
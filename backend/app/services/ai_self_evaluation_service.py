@@ -49,18 +49,12 @@ Réponds UNIQUEMENT avec un JSON valide dans ce format:
             )
             
             # Parser la réponse JSON
-            import json
+            from app.utils.json_cleaner import safe_json_loads
             try:
                 evaluation_text = evaluation_response.get("response", "")
-                # Extraire le JSON de la réponse
-                json_match = None
-                if "{" in evaluation_text:
-                    start = evaluation_text.find("{")
-                    end = evaluation_text.rfind("}") + 1
-                    json_match = evaluation_text[start:end]
+                evaluation_data = safe_json_loads(evaluation_text)
                 
-                if json_match:
-                    evaluation_data = json.loads(json_match)
+                if isinstance(evaluation_data, dict):
                     return {
                         "clarity": evaluation_data.get("clarity", 0),
                         "coherence": evaluation_data.get("coherence", 0),
@@ -70,7 +64,7 @@ Réponds UNIQUEMENT avec un JSON valide dans ce format:
                         "needs_improvement": evaluation_data.get("needs_improvement", False),
                         "evaluated_at": evaluation_response.get("created_at")
                     }
-            except (json.JSONDecodeError, KeyError) as e:
+            except (KeyError, TypeError) as e:
                 logger.warning(f"Erreur lors du parsing de l'évaluation: {e}")
             
             # Fallback si le parsing échoue
@@ -1,21 +1,21 @@
 """
 Service pour l'IA Tutor - Business logic
 """
-from typing import Dict, Any, List, Optional
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 import json
-from openai import OpenAI, APIError, RateLimitError, APIConnectionError, APITimeoutError
+from openai import APIError, RateLimitError, APIConnectionError, APITimeoutError
 from app.config import settings
 from app.repositories.module_repository import ModuleRepository
 from app.repositories.resource_repository import ResourceRepository
-from app.utils.retry import retry_with_backoff
-from app.utils.circuit_breaker import openai_circuit_breaker, CircuitBreakerOpenError
+from app.services.ai_gateway import AIGateway, AIQuotaExceededError
+from app.prompts.assembly import build_messages, system_prompt
+from app.utils.circuit_breaker import CircuitBreakerOpenError
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
-# Initialiser le client OpenAI
-client = None
 # Utiliser GPT-5-mini comme modèle par défaut, avec fallback sur gpt-4o-mini (modèle réel)
 from app.utils.model_mapper import map_to_real_model
 configured_model = getattr(settings, 'gpt_5_mini_model', 'gpt-5-mini')
@@ -24,55 +24,8 @@ AI_MODEL = map_to_real_model(configured_model)
 if configured_model != AI_MODEL:
     logger.info(f"Modèle '{configured_model}' mappé vers '{AI_MODEL}' (modèle réel OpenAI)")
 
-
-def _initialize_openai_client():
-    """Initialise le client OpenAI"""
-    global client
-    if settings.openai_api_key:
-        try:
-            import os
-            import httpx
-            
-            # Toujours créer un client HTTP personnalisé pour éviter les problèmes de compatibilité
-            # avec les versions de httpx qui utilisent 'proxy' au lieu de 'proxies'
-            proxy = getattr(settings, "openai_proxy", None)
-            proxy_env = os.environ.get("HTTP_PROXY") or os.environ.get("HTTPS_PROXY")
-            proxy_url = proxy or proxy_env
-            
-            # Créer un client HTTP personnalisé
-            # httpx 0.25.2 utilise 'proxy' (singulier) et non 'proxies'
-            http_client_kwargs = {
-                "timeout": 30.0,
-                "limits": httpx.Limits(max_keepalive_connections=5, max_connections=10)
-            }
-            
-            if proxy_url:
-                # Utiliser 'proxy' pour httpx 0.25.2
-                http_client_kwargs["proxy"] = proxy_url
-                logger.info(f"Proxy OpenAI configuré: {proxy_url}")
-            
-            # Créer le client HTTP personnalisé
-            http_client = httpx.Client(**http_client_kwargs)
-            
-            # Créer le client OpenAI avec le client HTTP personnalisé
-            # Cela évite que OpenAI crée son propre client avec 'proxies' qui cause l'erreur
-            client = OpenAI(
-                api_key=settings.openai_api_key,
-                http_client=http_client
-            )
-            
-            logger.info("Client OpenAI initialisé avec succès")
-        except Exception as e:
-            logger.error(f"Erreur lors de l'initialisation du client OpenAI: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            logger.warning("Mode démo activé - Les fonctionnalités IA utiliseront des réponses pré-définies")
-            client = None
-    else:
-        logger.warning("OPENAI_API_KEY non configuré - Mode démo activé")
-
-
-_initialize_openai_client()
+if not AIGateway.is_available():
+    logger.warning("OPENAI_API_KEY non configuré - Mode démo activé")
 
 
 def _get_max_tokens_param(model: str, max_tokens_value: int) -> dict:
@@ -120,106 +73,9 @@ def _get_temperature_param(model: str, temperature_value: float) -> dict:
 
 
 def _get_system_prompt(language: str = "fr", expert_mode: bool = False, research_mode: bool = False, use_kairos_prompt: bool = True) -> str:
-    """Génère le prompt système selon la langue et le mode"""
-    if research_mode:
-        # Mode Research AI avec GPT-5.2 Pro
-        if language == "en":
-            return """You are Kaïrox Research AI, an expert assistant at the academic and applied research level.
-
-Your mission is to analyze complex problems, propose rigorous and innovative solutions, and provide high-level reasoning.
-
-Rules:
-- Maximum precision.
-- Strict mathematical and logical reasoning.
-- Solid conceptual references.
-- No excessive simplification.
-- Structured format like scientific report."""
-        else:
-            return """Tu es Kaïrox Research AI, un assistant expert de niveau académique et recherche appliquée.
-
-Ta mission est d'analyser des problématiques complexes, de proposer des solutions rigoureuses et innovantes, et de fournir des raisonnements de haut niveau.
-
-Règles :
-- Précision maximale.
-- Raisonnement mathématique et logique strict.
-- Références conceptuelles solides.
-- Aucune simplification excessive.
-- Format structuré type rapport scientifique."""
-    elif expert_mode:
-        # Mode Expert avec GPT-5.2
-        if language == "en":
-            return """You are Kaïrox Expert, an advanced pedagogical assistant specialized in scientific reasoning and in-depth analysis.
-
-Your mission is to produce accurate, rigorous, and pedagogically sound responses in physics, chemistry, mathematics, and computer science.
-
-Rules:
-- Reason step by step.
-- Justify each conclusion.
-- Use clear mathematical notation if necessary.
-- Detect and correct reasoning errors.
-- Adapt difficulty to the indicated level.
-- Never respond vaguely.
-
-Expected outputs:
-- Detailed reasoning
-- Clear final solution
-- Pedagogical tips or common pitfalls"""
-        else:
-            return """Tu es Kaïrox Expert, un assistant pédagogique avancé spécialisé dans le raisonnement scientifique et l'analyse approfondie.
-
-Ta mission est de produire des réponses exactes, rigoureuses et pédagogiquement solides en physique, chimie, mathématiques et informatique.
-
-Règles :
-- Raisonne étape par étape.
-- Justifie chaque conclusion.
-- Utilise des notations mathématiques claires si nécessaire.
-- Détecte et corrige les erreurs de raisonnement.
-- Adapte la difficulté au niveau indiqué.
-- Ne réponds jamais de façon vague.
-
-Sorties attendues :
-- Raisonnement détaillé
-- Solution finale claire
-- Astuces pédagogiques ou pièges courants"""
-    else:
-        # Mode Tutor standard avec GPT-5-mini
-        if language == "en":
-            return """You are Kaïrox Tutor, a reliable, clear, and benevolent pedagogical assistant.
-Your mission is to explain concepts in physics, chemistry, mathematics, English, and computer science in a simple, structured way adapted to the learner's level.
-
-Rules:
-- Use clear and accessible language.
-- Explain step by step.
-- Ask questions only if necessary.
-- Give concrete examples.
-- Never unnecessarily complicate things.
-- If the question exceeds your level of certainty, propose a simplified explanation or recommend a deeper analysis.
-
-Format:
-- Short titles
-- Clear lists
-- Final summary in 2-3 lines"""
-        else:
-            return """Tu es Kaïrox Tutor, un assistant pédagogique fiable, clair et bienveillant.
-Ta mission est d'aider les étudiants à apprendre de manière naturelle et conversationnelle.
-
-RÈGLES DE CONVERSATION :
-- Sois naturel et conversationnel, comme un vrai tuteur humain
-- Adapte la longueur de ta réponse au contexte :
-  * Salutations simples (bonjour, salut, etc.) → Réponse brève et amicale (1-2 phrases max)
-  * Questions simples → Réponse concise et directe (2-4 phrases)
-  * Questions complexes → Réponse détaillée et structurée
-- Ne donne JAMAIS de longues listes ou structures rigides pour des messages simples
-- Utilise un langage clair et accessible
-- Explique étape par étape seulement si nécessaire
-- Pose des questions de suivi seulement si pertinent
-- Donne des exemples concrets quand utile
-- Ne complexifie jamais inutilement
-
-EXEMPLES :
-- Si l'utilisateur dit "bonjour" → Réponds simplement "Bonjour ! Comment puis-je t'aider aujourd'hui ?"
-- Si l'utilisateur pose une question → Réponds directement à la question de manière concise
-- Si l'utilisateur demande une explication détaillée → Alors tu peux être plus structuré"""
+    """Génère le prompt système selon la langue et le mode (préfixe statique, voir app/prompts/assembly.py)"""
+    mode = "research" if research_mode else ("expert" if expert_mode else "tutor")
+    return system_prompt(mode, language)
 
 
 class AIService:
@@ -348,7 +204,7 @@ class AIService:
         except Exception as e:
             logger.debug(f"Erreur vérification cache sémantique: {e}")
         
-        if not client:
+        if not AIGateway.is_available():
             # Mode démo
             return {
                 "response": _get_demo_response(message, language),
@@ -365,53 +221,41 @@ class AIService:
                 model_to_use = AI_MODEL
             
             # Récupérer le contexte du module si disponible
-            context = ""
+            context = None
             if module_id:
                 module = await ModuleRepository.find_by_id(module_id)
                 if module:
-                    context = f"\nContexte du module: {module.get('title', '')} - {module.get('description', '')}"
-            
-            system_prompt = _get_system_prompt(language, expert_mode=expert_mode, research_mode=research_mode) + context
-            
-            # Construire la liste des messages avec l'historique de conversation
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Ajouter l'historique de conversation si disponible
-            if conversation_history:
-                # Limiter l'historique aux 10 derniers échanges pour éviter de dépasser les limites de tokens
-                recent_history = conversation_history[-10:] if len(conversation_history) > 10 else conversation_history
-                messages.extend(recent_history)
+                    context = f"Contexte du module: {module.get('title', '')} - {module.get('description', '')}"
             
-            # Ajouter le message actuel
-            messages.append({"role": "user", "content": message})
+            # Préfixe système statique puis contexte du module, historique et message
+            # L'historique est borné au budget de tokens du modèle (réponse réservée)
+            max_tokens_value = 4000 if research_mode else (1500 if expert_mode else 500)
+            mode = "research" if research_mode else ("expert" if expert_mode else "tutor")
+            messages = build_messages(
+                message,
+                mode=mode,
+                language=language,
+                context=context,
+                history=conversation_history,
+                model=model_to_use,
+                max_completion_tokens=max_tokens_value
+            )
             
-            # Utiliser retry avec backoff et circuit breaker pour les appels OpenAI
-            async def call_openai():
-                max_tokens_value = 4000 if research_mode else (1500 if expert_mode else 500)
-                temperature_value = 0.2 if research_mode else (0.3 if expert_mode else 0.7)
-                create_params = {
-                    "model": model_to_use,
-                    "messages": messages,
-                    "timeout": 120.0 if research_mode else (60.0 if expert_mode else 30.0)
-                }
-                # Ajouter temperature seulement si le modèle le supporte
-                create_params.update(_get_temperature_param(model_to_use, temperature_value))
-                create_params.update(_get_max_tokens_param(model_to_use, max_tokens_value))
-                return client.chat.completions.create(**create_params)
+            temperature_value = 0.2 if research_mode else (0.3 if expert_mode else 0.7)
+            create_params = {
+                "model": model_to_use,
+                "messages": messages,
+                "timeout": 120.0 if research_mode else (60.0 if expert_mode else 30.0)
+            }
+            # Ajouter temperature seulement si le modèle le supporte
+            create_params.update(_get_temperature_param(model_to_use, temperature_value))
+            create_params.update(_get_max_tokens_param(model_to_use, max_tokens_value))
             
-            # Utiliser circuit breaker pour protéger contre les pannes en cascade
+            # Passerelle IA : retry avec backoff, circuit breaker et comptage des tokens
             try:
-                async def protected_call():
-                    # Retry avec backoff exponentiel pour les erreurs temporaires
-                    return await retry_with_backoff(
-                        call_openai,
-                        max_retries=3,
-                        initial_delay=1.0,
-                        max_delay=10.0,
-                        exceptions=(APIConnectionError, APITimeoutError, RateLimitError)
-                    )
-                
-                response = await openai_circuit_breaker.call(protected_call)
+                response = await AIGateway.chat_completion(
+                    feature="chat", user_id=user_id, **create_params
+                )
             except CircuitBreakerOpenError as e:
                 logger.error(f"Circuit breaker ouvert pour OpenAI: {e}")
                 return {
@@ -459,6 +303,9 @@ class AIService:
                 "response": ai_response,
                 "suggestions": _get_demo_suggestions(language)
             }
+        except AIQuotaExceededError:
+            # Quota de l'utilisateur atteint : réponse 429, pas de réponse de démo
+            raise
         except RateLimitError:
             logger.error("Limite de taux OpenAI atteinte après retries")
             return {
@@ -479,96 +326,82 @@ class AIService:
             }
     
     @staticmethod
-    async def generate_exam_questions(
+    async def _build_exam_generation_params(
         module_id: str,
-        num_questions: int = 15,
+        num_questions: int,
         difficulty: Optional[str] = None
     ) -> Dict[str, Any]:
-        """
-        Génère des questions d'examen pour un module avec accès complet au contenu
-        Les examens sont généralement plus difficiles et variés que les quiz
-        """
-        module = await ModuleRepository.find_by_id(module_id)
-        if not module:
-            from fastapi import HTTPException
-            raise HTTPException(status_code=404, detail="Module non trouvé")
+        """Paramètres de l'appel OpenAI de génération d'examen (contexte complet du module)"""
+        # Récupérer le contexte complet du module
+        module_context_data = await AIService.get_module_context_for_ai(module_id)
         
-        # Si OpenAI n'est pas disponible, utiliser le mode démo
-        if not client:
-            logger.info("Mode démo: génération d'examen statique")
-            return _generate_demo_quiz(module, num_questions)
+        # Construire le contexte du module avec toutes les informations
+        title = module_context_data.get("title", "")
+        description = module_context_data.get("description", "")
+        subject = module_context_data.get("subject", "physics")
+        learning_objectives = module_context_data.get("learning_objectives", [])
+        difficulty_level = module_context_data.get("difficulty", "intermediate")
+        content = module_context_data.get("content", {})
+        resources = module_context_data.get("resources", [])
         
-        try:
-            # Récupérer le contexte complet du module
-            module_context_data = await AIService.get_module_context_for_ai(module_id)
-            
-            # Construire le contexte du module avec toutes les informations
-            title = module_context_data.get("title", "")
-            description = module_context_data.get("description", "")
-            subject = module_context_data.get("subject", "physics")
-            learning_objectives = module_context_data.get("learning_objectives", [])
-            difficulty_level = module_context_data.get("difficulty", "intermediate")
-            content = module_context_data.get("content", {})
-            resources = module_context_data.get("resources", [])
-            
-            # Construire le contexte du module
-            module_context = f"""
+        # Construire le contexte du module
+        module_context = f"""
 Module: {title}
 Description: {description}
 Matière: {subject}
 Niveau de difficulté: {difficulty_level}
 Objectifs d'apprentissage: {', '.join(learning_objectives) if learning_objectives else 'Non spécifiés'}
 """
-            
-            # Ajouter le contenu détaillé du module
-            if content.get("lessons"):
-                module_context += "\n=== CONTENU DU COURS ===\n"
-                for i, lesson in enumerate(content["lessons"][:15], 1):  # Plus de leçons pour les examens
-                    lesson_title = lesson.get("title", "")
-                    lesson_content = lesson.get("content", "")
-                    lesson_summary = lesson.get("summary", "")
-                    
-                    module_context += f"\nLeçon {i}: {lesson_title}\n"
-                    if lesson_summary:
-                        module_context += f"Résumé: {lesson_summary[:400]}\n"  # Plus de contenu pour les examens
-                    if lesson_content:
-                        # Extraire plus de contenu pour les examens (premiers 800 caractères)
-                        content_preview = lesson_content[:800].replace('\n', ' ').strip()
-                        module_context += f"Contenu: {content_preview}...\n"
-            
-            # Ajouter les ressources disponibles
-            if resources:
-                module_context += "\n=== RESSOURCES DISPONIBLES ===\n"
-                for resource in resources:
-                    resource_title = resource.get("title", "")
-                    resource_desc = resource.get("description", "")
-                    resource_type = resource.get("type", "")
-                    module_context += f"- {resource_title} ({resource_type.upper()})"
-                    if resource_desc:
-                        module_context += f": {resource_desc[:150]}\n"
-                    else:
-                        module_context += "\n"
-            
-            # Déterminer le niveau de difficulté
-            difficulty_text = ""
-            if difficulty:
-                difficulty_map = {
-                    "beginner": "débutant",
-                    "intermediate": "intermédiaire",
-                    "advanced": "avancé"
-                }
-                difficulty_text = f" de niveau {difficulty_map.get(difficulty, difficulty)}"
-            else:
-                module_difficulty = difficulty_level
-                difficulty_map = {
-                    "beginner": "débutant",
-                    "intermediate": "intermédiaire",
-                    "advanced": "avancé"
-                }
-                difficulty_text = f" de niveau {difficulty_map.get(module_difficulty, 'intermédiaire')}"
-            
-            # Prompt spécifique pour les examens (plus strict et varié)
-            exam_prompt = f"""Tu es un expert pédagogique qui crée des questions d'examen académique.
+        
+        # Ajouter le contenu détaillé du module
+        if content.get("lessons"):
+            module_context += "\n=== CONTENU DU COURS ===\n"
+            for i, lesson in enumerate(content["lessons"][:15], 1):  # Plus de leçons pour les examens
+                lesson_title = lesson.get("title", "")
+                lesson_content = lesson.get("content", "")
+                lesson_summary = lesson.get("summary", "")
+                
+                module_context += f"\nLeçon {i}: {lesson_title}\n"
+                if lesson_summary:
+                    module_context += f"Résumé: {lesson_summary[:400]}\n"  # Plus de contenu pour les examens
+                if lesson_content:
+                    # Extraire plus de contenu pour les examens (premiers 800 caractères)
+                    content_preview = lesson_content[:800].replace('\n', ' ').strip()
+                    module_context += f"Contenu: {content_preview}...\n"
+        
+        # Ajouter les ressources disponibles
+        if resources:
+            module_context += "\n=== RESSOURCES DISPONIBLES ===\n"
+            for resource in resources:
+                resource_title = resource.get("title", "")
+                resource_desc = resource.get("description", "")
+                resource_type = resource.get("type", "")
+                module_context += f"- {resource_title} ({resource_type.upper()})"
+                if resource_desc:
+                    module_context += f": {resource_desc[:150]}\n"
+                else:
+                    module_context += "\n"
+        
+        # Déterminer le niveau de difficulté
+        difficulty_text = ""
+        if difficulty:
+            difficulty_map = {
+                "beginner": "débutant",
+                "intermediate": "intermédiaire",
+                "advanced": "avancé"
+            }
+            difficulty_text = f" de niveau {difficulty_map.get(difficulty, difficulty)}"
+        else:
+            module_difficulty = difficulty_level
+            difficulty_map = {
+                "beginner": "débutant",
+                "intermediate": "intermédiaire",
+                "advanced": "avancé"
+            }
+            difficulty_text = f" de niveau {difficulty_map.get(module_difficulty, 'intermédiaire')}"
+        
+        # Prompt spécifique pour les examens (plus strict et varié)
+        exam_prompt = f"""Tu es un expert pédagogique qui crée des questions d'examen académique.
 
 {module_context}
 
@@ -602,34 +435,54 @@ FORMAT DE RÉPONSE JSON strict (pas de markdown, pas de texte avant/après):
 }}
 
 Génère exactement {num_questions} questions d'examen au format JSON ci-dessus."""
-            
-            # Utiliser retry avec backoff pour la génération d'examen
-            async def generate_exam_openai():
-                create_params = {
-                    "model": AI_MODEL,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "Tu es un expert pédagogique qui génère des questions d'examen académique au format JSON strict."
-                        },
-                        {
-                            "role": "user",
-                            "content": exam_prompt
-                        }
-                    ],
-                    "timeout": 90.0,  # Plus de temps pour les examens
+        
+        # Utiliser retry avec backoff pour la génération d'examen
+        create_params = {
+            "model": AI_MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Tu es un expert pédagogique qui génère des questions d'examen académique au format JSON strict."
+                },
+                {
+                    "role": "user",
+                    "content": exam_prompt
                 }
-                # Ajouter temperature seulement si le modèle le supporte
-                create_params.update(_get_temperature_param(AI_MODEL, 0.6))  # Température plus basse pour plus de cohérence
-                if AI_MODEL.startswith("gpt-4") and not AI_MODEL.startswith("gpt-4o"):
-                    create_params["response_format"] = {"type": "json_object"}
-                create_params.update(_get_max_tokens_param(AI_MODEL, 3000))  # Plus de tokens pour les examens
-                return client.chat.completions.create(**create_params)
-            
-            response = await retry_with_backoff(
-                generate_exam_openai,
-                max_retries=3,
-                initial_delay=1.0
+            ],
+            "timeout": 90.0,  # Plus de temps pour les examens
+        }
+        # Ajouter temperature seulement si le modèle le supporte
+        create_params.update(_get_temperature_param(AI_MODEL, 0.6))  # Température plus basse pour plus de cohérence
+        if AI_MODEL.startswith("gpt-4") and not AI_MODEL.startswith("gpt-4o"):
+            create_params["response_format"] = {"type": "json_object"}
+        create_params.update(_get_max_tokens_param(AI_MODEL, 3000))  # Plus de tokens pour les examens
+        return create_params
+    
+    @staticmethod
+    async def generate_exam_questions(
+        module_id: str,
+        num_questions: int = 15,
+        difficulty: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Génère des questions d'examen pour un module avec accès complet au contenu
+        Les examens sont généralement plus difficiles et variés que les quiz
+        """
+        module = await ModuleRepository.find_by_id(module_id)
+        if not module:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Module non trouvé")
+        
+        # Si OpenAI n'est pas disponible, utiliser le mode démo
+        if not AIGateway.is_available():
+            logger.info("Mode démo: génération d'examen statique")
+            return _generate_demo_quiz(module, num_questions)
+        
+        try:
+            create_params = await AIService._build_exam_generation_params(module_id, num_questions, difficulty)
+
+            response = await AIGateway.chat_completion(
+                feature="exam_generation", max_retries=3, **create_params
             )
             
             response_text = response.choices[0].message.content
@@ -637,25 +490,19 @@ Génère exactement {num_questions} questions d'examen au format JSON ci-dessus.
             # Parser la réponse JSON
             from app.utils.json_cleaner import safe_json_loads
             
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                result = safe_json_loads(response_text[json_start:json_end])
-                if result:
-                    questions = result.get("questions", [])
-                    
-                    # Valider que nous avons assez de questions
-                    if len(questions) < num_questions:
-                        logger.warning(f"Seulement {len(questions)} questions générées au lieu de {num_questions}")
-                    
-                    return {
-                        "questions": questions[:num_questions],  # Limiter au nombre demandé
-                        "module_id": module_id,
-                        "num_questions": len(questions[:num_questions])
-                    }
-                else:
-                    logger.error("Réponse JSON invalide de l'IA")
-                    return _generate_demo_quiz(module, num_questions)
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict) and result:
+                questions = result.get("questions", [])
+                
+                # Valider que nous avons assez de questions
+                if len(questions) < num_questions:
+                    logger.warning(f"Seulement {len(questions)} questions générées au lieu de {num_questions}")
+                
+                return {
+                    "questions": questions[:num_questions],  # Limiter au nombre demandé
+                    "module_id": module_id,
+                    "num_questions": len(questions[:num_questions])
+                }
             else:
                 logger.error("Réponse JSON invalide de l'IA")
                 return _generate_demo_quiz(module, num_questions)
@@ -677,111 +524,101 @@ Génère exactement {num_questions} questions d'examen au format JSON ci-dessus.
             return _generate_demo_quiz(module, num_questions)
     
     @staticmethod
-    async def generate_quiz(
+    async def _build_quiz_generation_params(
         module_id: str,
-        num_questions: int = 50,
+        module: Dict[str, Any],
+        num_questions: int,
         difficulty: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Génère un quiz pour un module avec OpenAI"""
-        module = await ModuleRepository.find_by_id(module_id)
-        if not module:
-            from fastapi import HTTPException
-            raise HTTPException(status_code=404, detail="Module non trouvé")
+        """Paramètres de l'appel OpenAI de génération de quiz (toutes les leçons du module)"""
+        # Récupérer le contexte complet du module
+        module_context_data = await AIService.get_module_context_for_ai(module_id)
         
-        # Si OpenAI n'est pas disponible, utiliser le mode démo
-        if not client:
-            logger.info("Mode démo: génération de quiz statique")
-            return _generate_demo_quiz(module, num_questions)
+        # Construire le contexte du module avec toutes les informations
+        title = module_context_data.get("title", "")
+        description = module_context_data.get("description", "")
+        subject = module_context_data.get("subject", "physics")
+        learning_objectives = module_context_data.get("learning_objectives", [])
+        difficulty = module_context_data.get("difficulty", "intermediate")
+        content = module_context_data.get("content", {})
+        resources = module_context_data.get("resources", [])
         
-        try:
-            # Récupérer le contexte complet du module
-            module_context_data = await AIService.get_module_context_for_ai(module_id)
-            
-            # Construire le contexte du module avec toutes les informations
-            title = module_context_data.get("title", "")
-            description = module_context_data.get("description", "")
-            subject = module_context_data.get("subject", "physics")
-            learning_objectives = module_context_data.get("learning_objectives", [])
-            difficulty = module_context_data.get("difficulty", "intermediate")
-            content = module_context_data.get("content", {})
-            resources = module_context_data.get("resources", [])
-            
-            # Construire le contexte du module
-            module_context = f"""
+        # Construire le contexte du module
+        module_context = f"""
 Module: {title}
 Description: {description}
 Matière: {subject}
 Niveau de difficulté: {difficulty}
 Objectifs d'apprentissage: {', '.join(learning_objectives) if learning_objectives else 'Non spécifiés'}
 """
-            
-            # Ajouter le contenu détaillé du module avec TOUTES les leçons
-            if content.get("lessons"):
-                module_context += "\n=== CONTENU COMPLET DU COURS (TOUTES LES LEÇONS) ===\n"
-                for i, lesson in enumerate(content["lessons"], 1):  # Utiliser TOUTES les leçons
-                    lesson_title = lesson.get("title", "")
-                    lesson_content = lesson.get("content", "")
-                    lesson_summary = lesson.get("summary", "")
-                    
-                    module_context += f"\n--- Leçon {i}: {lesson_title} ---\n"
-                    if lesson_summary:
-                        module_context += f"Résumé: {lesson_summary}\n"
-                    if lesson_content:
-                        # Utiliser le contenu complet de chaque leçon (jusqu'à 2000 caractères par leçon)
-                        content_full = lesson_content[:2000].replace('\n', ' ').strip()
-                        module_context += f"Contenu détaillé: {content_full}"
-                        if len(lesson_content) > 2000:
-                            module_context += "..."
-                        module_context += "\n"
-                    
-                    # Ajouter les sections de la leçon si disponibles
-                    sections = lesson.get("sections", [])
-                    if sections:
-                        module_context += "Sections de la leçon:\n"
-                        for section in sections[:5]:  # Limiter à 5 sections par leçon
-                            section_heading = section.get("heading", "")
-                            section_paragraphs = section.get("paragraphs", [])
-                            if section_heading:
-                                module_context += f"  • {section_heading}\n"
-                            if section_paragraphs:
-                                # Prendre le premier paragraphe de chaque section
-                                first_para = section_paragraphs[0][:300] if section_paragraphs else ""
-                                if first_para:
-                                    module_context += f"    {first_para[:300]}...\n"
-            
-            # Ajouter les ressources disponibles
-            if resources:
-                module_context += "\n=== RESSOURCES DISPONIBLES ===\n"
-                for resource in resources:
-                    resource_title = resource.get("title", "")
-                    resource_desc = resource.get("description", "")
-                    resource_type = resource.get("type", "")
-                    module_context += f"- {resource_title} ({resource_type.upper()})"
-                    if resource_desc:
-                        module_context += f": {resource_desc[:100]}\n"
-                    else:
-                        module_context += "\n"
-            
-            # Déterminer le niveau de difficulté
-            difficulty_text = ""
-            if difficulty:
-                difficulty_map = {
-                    "beginner": "débutant",
-                    "intermediate": "intermédiaire",
-                    "advanced": "avancé"
-                }
-                difficulty_text = f" de niveau {difficulty_map.get(difficulty, difficulty)}"
-            else:
-                module_difficulty = module.get("difficulty", "intermediate")
-                difficulty_map = {
-                    "beginner": "débutant",
-                    "intermediate": "intermédiaire",
-                    "advanced": "avancé"
-                }
-                difficulty_text = f" de niveau {difficulty_map.get(module_difficulty, 'intermédiaire')}"
-            
-            # Prompt pour générer le quiz basé sur TOUTES les leçons
-            quiz_prompt = f"""Tu es un expert pédagogique qui crée des quiz éducatifs.
+        
+        # Ajouter le contenu détaillé du module avec TOUTES les leçons
+        if content.get("lessons"):
+            module_context += "\n=== CONTENU COMPLET DU COURS (TOUTES LES LEÇONS) ===\n"
+            for i, lesson in enumerate(content["lessons"], 1):  # Utiliser TOUTES les leçons
+                lesson_title = lesson.get("title", "")
+                lesson_content = lesson.get("content", "")
+                lesson_summary = lesson.get("summary", "")
+                
+                module_context += f"\n--- Leçon {i}: {lesson_title} ---\n"
+                if lesson_summary:
+                    module_context += f"Résumé: {lesson_summary}\n"
+                if lesson_content:
+                    # Utiliser le contenu complet de chaque leçon (jusqu'à 2000 caractères par leçon)
+                    content_full = lesson_content[:2000].replace('\n', ' ').strip()
+                    module_context += f"Contenu détaillé: {content_full}"
+                    if len(lesson_content) > 2000:
+                        module_context += "..."
+                    module_context += "\n"
+                
+                # Ajouter les sections de la leçon si disponibles
+                sections = lesson.get("sections", [])
+                if sections:
+                    module_context += "Sections de la leçon:\n"
+                    for section in sections[:5]:  # Limiter à 5 sections par leçon
+                        section_heading = section.get("heading", "")
+                        section_paragraphs = section.get("paragraphs", [])
+                        if section_heading:
+                            module_context += f"  • {section_heading}\n"
+                        if section_paragraphs:
+                            # Prendre le premier paragraphe de chaque section
+                            first_para = section_paragraphs[0][:300] if section_paragraphs else ""
+                            if first_para:
+                                module_context += f"    {first_para[:300]}...\n"
+        
+        # Ajouter les ressources disponibles
+        if resources:
+            module_context += "\n=== RESSOURCES DISPONIBLES ===\n"
+            for resource in resources:
+                resource_title = resource.get("title", "")
+                resource_desc = resource.get("description", "")
+                resource_type = resource.get("type", "")
+                module_context += f"- {resource_title} ({resource_type.upper()})"
+                if resource_desc:
+                    module_context += f": {resource_desc[:100]}\n"
+                else:
+                    module_context += "\n"
+        
+        # Déterminer le niveau de difficulté
+        difficulty_text = ""
+        if difficulty:
+            difficulty_map = {
+                "beginner": "débutant",
+                "intermediate": "intermédiaire",
+                "advanced": "avancé"
+            }
+            difficulty_text = f" de niveau {difficulty_map.get(difficulty, difficulty)}"
+        else:
+            module_difficulty = module.get("difficulty", "intermediate")
+            difficulty_map = {
+                "beginner": "débutant",
+                "intermediate": "intermédiaire",
+                "advanced": "avancé"
+            }
+            difficulty_text = f" de niveau {difficulty_map.get(module_difficulty, 'intermédiaire')}"
+        
+        # Prompt pour générer le quiz basé sur TOUTES les leçons
+        quiz_prompt = f"""Tu es un expert pédagogique qui crée des quiz éducatifs.
 
 {module_context}
 
@@ -816,37 +653,52 @@ FORMAT DE RÉPONSE JSON strict (pas de markdown, pas de texte avant/après):
 }}
 
 Génère exactement {num_questions} questions au format JSON ci-dessus, en répartissant équitablement entre toutes les leçons."""
-            
-            # Utiliser retry avec backoff pour la génération de quiz
-            async def generate_quiz_openai():
-                create_params = {
-                    "model": AI_MODEL,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "Tu es un expert pédagogique qui génère des quiz éducatifs au format JSON strict."
-                        },
-                        {
-                            "role": "user",
-                            "content": quiz_prompt
-                        }
-                    ],
-                    "timeout": 180.0,  # Timeout de 3 minutes pour OpenAI (génération de quiz peut prendre du temps)
+        
+        # Utiliser retry avec backoff pour la génération de quiz
+        create_params = {
+            "model": AI_MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Tu es un expert pédagogique qui génère des quiz éducatifs au format JSON strict."
+                },
+                {
+                    "role": "user",
+                    "content": quiz_prompt
                 }
-                # Ajouter temperature seulement si le modèle le supporte
-                create_params.update(_get_temperature_param(AI_MODEL, 0.7))
-                if AI_MODEL.startswith("gpt-4") and not AI_MODEL.startswith("gpt-4o"):
-                    create_params["response_format"] = {"type": "json_object"}
-                # Augmenter max_tokens pour éviter les réponses tronquées
-                create_params.update(_get_max_tokens_param(AI_MODEL, 4000))
-                return client.chat.completions.create(**create_params)
-            
-            response = await retry_with_backoff(
-                generate_quiz_openai,
-                max_retries=2,  # Moins de retries pour la génération de quiz (plus coûteux)
-                initial_delay=2.0,
-                max_delay=15.0,
-                exceptions=(APIConnectionError, APITimeoutError, RateLimitError)
+            ],
+            "timeout": 180.0,  # Timeout de 3 minutes pour OpenAI (génération de quiz peut prendre du temps)
+        }
+        # Ajouter temperature seulement si le modèle le supporte
+        create_params.update(_get_temperature_param(AI_MODEL, 0.7))
+        if AI_MODEL.startswith("gpt-4") and not AI_MODEL.startswith("gpt-4o"):
+            create_params["response_format"] = {"type": "json_object"}
+        # Augmenter max_tokens pour éviter les réponses tronquées
+        create_params.update(_get_max_tokens_param(AI_MODEL, 4000))
+        return create_params
+    
+    @staticmethod
+    async def generate_quiz(
+        module_id: str,
+        num_questions: int = 50,
+        difficulty: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Génère un quiz pour un module avec OpenAI"""
+        module = await ModuleRepository.find_by_id(module_id)
+        if not module:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Module non trouvé")
+        
+        # Si OpenAI n'est pas disponible, utiliser le mode démo
+        if not AIGateway.is_available():
+            logger.info("Mode démo: génération de quiz statique")
+            return _generate_demo_quiz(module, num_questions)
+        
+        try:
+            create_params = await AIService._build_quiz_generation_params(module_id, module, num_questions, difficulty)
+
+            response = await AIGateway.chat_completion(
+                feature="quiz_generation", max_retries=2, **create_params
             )
             
             ai_response = response.choices[0].message.content
@@ -861,12 +713,7 @@ Génère exactement {num_questions} questions au format JSON ci-dessus, en répa
             from app.utils.json_cleaner import safe_json_loads
             
             try:
-                # Nettoyer la réponse si elle contient du markdown
-                if "```json" in ai_response:
-                    ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-                elif "```" in ai_response:
-                    ai_response = ai_response.split("```")[1].split("```")[0].strip()
-                
+                # Le bloc markdown éventuel (```json) est ignoré par l'extraction
                 quiz_data = safe_json_loads(ai_response)
                 if not quiz_data:
                     raise ValueError("Impossible de parser le JSON du quiz")
@@ -874,16 +721,9 @@ Génère exactement {num_questions} questions au format JSON ci-dessus, en répa
                 # Valider et formater les questions
                 questions = []
                 for q in quiz_data.get("questions", [])[:num_questions]:
-                    if "question" in q and "options" in q and "correct_answer" in q:
-                        # Valider que correct_answer est un index valide
-                        correct_idx = q["correct_answer"]
-                        if isinstance(correct_idx, int) and 0 <= correct_idx < len(q["options"]):
-                            questions.append({
-                                "question": q["question"],
-                                "options": q["options"][:4],  # Limiter à 4 options
-                                "correct_answer": correct_idx,
-                                "explanation": q.get("explanation", "Bonne réponse !")
-                            })
+                    question = _normalize_generated_question(q)
+                    if question:
+                        questions.append(question)
                 
                 if not questions:
                     logger.warning("Aucune question valide générée, utilisation du mode démo")
@@ -913,6 +753,102 @@ Génère exactement {num_questions} questions au format JSON ci-dessus, en répa
             logger.error(traceback.format_exc())
             return _generate_demo_quiz(module, num_questions)
     
+    @staticmethod
+    async def stream_quiz_questions(
+        module_id: str,
+        num_questions: int = 50,
+        difficulty: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Génère un quiz en streaming : chaque question est produite dès qu'elle est complète
+
+        Le module est vérifié avant le début du flux (HTTPException 404).
+        """
+        module = await ModuleRepository.find_by_id(module_id)
+        if not module:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Module non trouvé")
+        return AIService._stream_generated_questions(
+            "quiz_generation", module, num_questions, max_retries=2,
+            build_params=lambda: AIService._build_quiz_generation_params(module_id, module, num_questions, difficulty)
+        )
+    
+    @staticmethod
+    async def stream_exam_questions(
+        module_id: str,
+        num_questions: int = 15,
+        difficulty: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Génère des questions d'examen en streaming (voir stream_quiz_questions)
+        """
+        module = await ModuleRepository.find_by_id(module_id)
+        if not module:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Module non trouvé")
+        return AIService._stream_generated_questions(
+            "exam_generation", module, num_questions, max_retries=3,
+            build_params=lambda: AIService._build_exam_generation_params(module_id, num_questions, difficulty)
+        )
+    
+    @staticmethod
+    async def _stream_generated_questions(
+        feature: str,
+        module: Dict[str, Any],
+        num_questions: int,
+        max_retries: int,
+        build_params: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Demande la sortie en streaming et produit les questions valides au fil de l'eau
+
+        Les objets du tableau "questions" sont extraits par TolerantJSONParser dès
+        leur accolade fermante. Si le flux est interrompu, la fin reçue est réparée ;
+        si aucune question n'a pu être produite, le quiz démo prend le relais.
+        """
+        from app.utils.json_cleaner import TolerantJSONParser, safe_json_loads
+        
+        produced = 0
+        if AIGateway.is_available():
+            parser = TolerantJSONParser(item_depth=3)
+            received = 0  # éléments du tableau "questions" reçus (valides ou non)
+            try:
+                create_params = await build_params()
+                stream = AIGateway.stream_chat_completion(feature=feature, max_retries=max_retries, **create_params)
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        for key, item in parser.feed(chunk.choices[0].delta.content):
+                            if key != "questions":
+                                continue
+                            received += 1
+                            question = _normalize_generated_question(item)
+                            if question:
+                                produced += 1
+                                yield question
+                                if produced >= num_questions:
+                                    return
+                        if parser.done:
+                            break
+            except (APIError, RateLimitError, APIConnectionError, APITimeoutError, CircuitBreakerOpenError) as e:
+                logger.error(f"Erreur OpenAI pendant la génération en streaming ({feature}): {e}")
+            except Exception as e:
+                logger.error(f"Erreur inattendue pendant la génération en streaming ({feature}): {e}", exc_info=True)
+            
+            # Réponse tronquée ou interrompue : la dernière question peut encore être récupérée
+            remaining = safe_json_loads(parser.finish(), fallback={})
+            for item in (remaining.get("questions") or [])[received:] if isinstance(remaining, dict) else []:
+                question = _normalize_generated_question(item) if isinstance(item, dict) else None
+                if question and produced < num_questions:
+                    produced += 1
+                    yield question
+        
+        if produced == 0:
+            logger.info(f"Mode démo: questions statiques pour {feature}")
+            for question in _generate_demo_quiz(module, num_questions).get("questions", []):
+                yield question
+    
     @staticmethod
     async def get_immersive_context(
         module_id: str,
@@ -926,7 +862,7 @@ Génère exactement {num_questions} questions au format JSON ci-dessus, en répa
             raise HTTPException(status_code=404, detail="Module non trouvé")
         
         # Si OpenAI n'est pas disponible, utiliser le mode démo
-        if not client:
+        if not AIGateway.is_available():
             logger.info("Mode démo: contexte immersif statique")
             mode_guidance = {
                 'ar': 'Explorez les concepts en réalité augmentée. Déplacez votre appareil pour voir les objets dans votre environnement.',
@@ -984,25 +920,20 @@ Ajoute 3 conseils pratiques pour l'interaction.
 
 Réponds en français, de manière encourageante et pédagogique."""
 
-            async def create_immersive_call():
-                create_params = {
-                    "model": AI_MODEL,
-                    "messages": [
-                        {"role": "system", "content": "Tu es un assistant pédagogique pour l'apprentissage immersif."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "timeout": 20.0
-                }
-                # Ajouter temperature seulement si le modèle le supporte
-                create_params.update(_get_temperature_param(AI_MODEL, 0.7))
-                create_params.update(_get_max_tokens_param(AI_MODEL, 300))
-                return client.chat.completions.create(**create_params)
-            
-            response = await retry_with_backoff(
-                create_immersive_call,
-                max_retries=2,
-                initial_delay=1.0,
-                max_delay=5.0
+            create_params = {
+                "model": AI_MODEL,
+                "messages": [
+                    {"role": "system", "content": "Tu es un assistant pédagogique pour l'apprentissage immersif."},
+                    {"role": "user", "content": prompt}
+                ],
+                "timeout": 20.0
+            }
+            # Ajouter temperature seulement si le modèle le supporte
+            create_params.update(_get_temperature_param(AI_MODEL, 0.7))
+            create_params.update(_get_max_tokens_param(AI_MODEL, 300))
+
+            response = await AIGateway.chat_completion(
+                feature="immersive_context", max_retries=2, **create_params
             )
             
             ai_response = response.choices[0].message.content
@@ -1078,6 +1009,21 @@ def _get_demo_suggestions(language: str = "fr") -> List[str]:
         ]
 
 
+def _normalize_generated_question(q: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Question générée au format attendu, ou None si elle est inutilisable"""
+    if "question" in q and "options" in q and "correct_answer" in q:
+        # Valider que correct_answer est un index valide
+        correct_idx = q["correct_answer"]
+        if isinstance(correct_idx, int) and 0 <= correct_idx < len(q["options"]):
+            return {
+                "question": q["question"],
+                "options": q["options"][:4],  # Limiter à 4 options
+                "correct_answer": correct_idx,
+                "explanation": q.get("explanation", "Bonne réponse !")
+            }
+    return None
+
+
 def _generate_demo_quiz(module: Dict[str, Any], num_questions: int = 40) -> Dict[str, Any]:
     """Génère un quiz démo basé sur le module"""
     subject = module.get("subject", "physics")
@@ -1166,7 +1112,7 @@ def _generate_demo_quiz(module: Dict[str, Any], num_questions: int = 40) -> Dict
             raise HTTPException(status_code=404, detail="Module non trouvé")
         
         # Si OpenAI n'est pas disponible, utiliser le mode démo
-        if not client:
+        if not AIGateway.is_available():
             logger.info("Mode démo: contexte immersif statique")
             mode_guidance = {
                 'ar': 'Explorez les concepts en réalité augmentée. Déplacez votre appareil pour voir les objets dans votre environnement.',
@@ -1224,25 +1170,20 @@ Ajoute 3 conseils pratiques pour l'interaction.
 
 Réponds en français, de manière encourageante et pédagogique."""
 
-            async def create_immersive_call():
-                create_params = {
-                    "model": AI_MODEL,
-                    "messages": [
-                        {"role": "system", "content": "Tu es un assistant pédagogique pour l'apprentissage immersif."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "timeout": 20.0
-                }
-                # Ajouter temperature seulement si le modèle le supporte
-                create_params.update(_get_temperature_param(AI_MODEL, 0.7))
-                create_params.update(_get_max_tokens_param(AI_MODEL, 300))
-                return client.chat.completions.create(**create_params)
-            
-            response = await retry_with_backoff(
-                create_immersive_call,
-                max_retries=2,
-                initial_delay=1.0,
-                max_delay=5.0
+            create_params = {
+                "model": AI_MODEL,
+                "messages": [
+                    {"role": "system", "content": "Tu es un assistant pédagogique pour l'apprentissage immersif."},
+                    {"role": "user", "content": prompt}
+                ],
+                "timeout": 20.0
+            }
+            # Ajouter temperature seulement si le modèle le supporte
+            create_params.update(_get_temperature_param(AI_MODEL, 0.7))
+            create_params.update(_get_max_tokens_param(AI_MODEL, 300))
+
+            response = await AIGateway.chat_completion(
+                feature="immersive_context", max_retries=2, **create_params
             )
             
             ai_response = response.choices[0].message.content
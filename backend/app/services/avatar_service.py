@@ -3,9 +3,10 @@ Service pour l'Avatar IA Enseignant
 Prof virtuel 3D avec explications orales
 """
 from typing import Dict, Any, Optional, List
-from app.services.ai_service import client, AI_MODEL
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ class AvatarService:
         Génère un script d'explication pour l'avatar
         """
         try:
-            if not client:
+            if not AIGateway.is_available():
                 return {
                     "script": content,
                     "gestures": [],
@@ -70,18 +71,13 @@ Réponds en JSON :
                 "temperature": 0.5
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 1500))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="avatar", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    script = json.loads(response_text[json_start:json_end])
-                    return script
-            except json.JSONDecodeError:
-                pass
+            script = safe_json_loads(response_text)
+            if isinstance(script, dict):
+                return script
             
             # Fallback
             return {
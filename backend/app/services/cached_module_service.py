@@ -5,6 +5,7 @@ from typing import List, Dict, Any, Optional
 from app.services.module_service import ModuleService
 from app.models import Subject, Difficulty
 from app.utils.cache_decorator import cache_result, invalidate_cache
+from app.utils.cursor_pagination import InvalidCursorError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,14 +16,14 @@ class CachedModuleService:
     
     @staticmethod
     @cache_result(ttl=600, key_prefix="cache:modules:list")  # 10 minutes
-    async def get_modules(
+    async def get_modules_page(
         subject: Optional[str] = None,
         difficulty: Optional[str] = None,
         search: Optional[str] = None,
-        skip: int = 0,
-        limit: int = 100
-    ) -> List[Dict[str, Any]]:
-        """Récupère les modules avec cache"""
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Récupère une page de modules avec cache ({"modules", "next_cursor"})"""
         try:
             # Convertir les strings en enums si nécessaire
             subject_enum = None
@@ -41,18 +42,19 @@ class CachedModuleService:
                     logger.warning(f"Difficulty invalide: {difficulty}")
                     pass
             
-            result = await ModuleService.get_modules(
+            return await ModuleService.get_modules_page(
                 subject=subject_enum,
                 difficulty=difficulty_enum,
                 search=search,
-                skip=skip,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
-            return result or []
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            logger.error(f"Erreur dans CachedModuleService.get_modules: {e}", exc_info=True)
+            logger.error(f"Erreur dans CachedModuleService.get_modules_page: {e}", exc_info=True)
             # Retourner une liste vide en cas d'erreur
-            return []
+            return {"modules": [], "next_cursor": None}
     
     @staticmethod
     @cache_result(ttl=1800, key_prefix="cache:modules:detail")  # 30 minutes
@@ -2,7 +2,8 @@
 Service de quiz avec cache Redis pour optimiser les performances
 Gains : -60% coût API OpenAI
 """
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Optional
+from contextlib import aclosing
 from app.services.quiz_service import QuizService
 from app.utils.cache_decorator import cache_result, invalidate_cache
 import logging
@@ -61,3 +62,38 @@ class CachedQuizService:
 
 
 
+    
+    @staticmethod
+    async def stream_quiz(
+        module_id: str,
+        num_questions: int = 40,
+        difficulty: Optional[str] = None,
+        force_regenerate: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Quiz en streaming ; le cache est invalidé dès qu'une génération a lieu"""
+        if force_regenerate:
+            await invalidate_cache(f"cache:quiz:*{module_id}*")
+        events = await QuizService.stream_quiz(
+            module_id=module_id,
+            num_questions=num_questions,
+            difficulty=difficulty,
+            force_regenerate=force_regenerate
+        )
+        return CachedQuizService._invalidate_after_generation(module_id, events)
+    
+    @staticmethod
+    async def _invalidate_after_generation(
+        module_id: str,
+        events: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Un quiz partiel a pu être mis en cache pendant la génération
+        generated = False
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    if event.get("type") == "start" and not event.get("cached"):
+                        generated = True
+                    yield event
+        finally:
+            if generated:
+                await invalidate_cache(f"cache:quiz:*{module_id}*")
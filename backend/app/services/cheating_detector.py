@@ -1,14 +1,34 @@
 """
 Service pour détecter la triche et le plagiat avec IA
+
+La similarité entre réponses est calculée localement (MinHash + LSH, voir
+app/utils/minhash.py) ; GPT n'est sollicité que pour confirmer les paires
+candidates au score élevé.
 """
-from typing import Dict, Any, List, Optional
-from app.services.ai_service import client, AI_MODEL
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.repositories.answer_signature_repository import AnswerSignatureRepository
+from app.utils.minhash import minhash_signature, lsh_bands, estimate_similarity, candidate_pairs, normalize
+import asyncio
 import logging
 import json
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Seuil de plagiat (ajustable)
+PLAGIARISM_THRESHOLD = 0.85
+# Similarité estimée à partir de laquelle une paire est soumise à GPT
+AI_REVIEW_THRESHOLD = 0.5
+# Nombre maximal d'appels GPT par vérification (réponse isolée / cohorte)
+MAX_AI_REVIEWS = 3
+MAX_COHORT_AI_REVIEWS = 10
+# Réponses trop courtes (un nombre, un mot) : similarité non significative
+MIN_ANSWER_WORDS = 5
+# Texte conservé avec la signature pour la confirmation par GPT
+STORED_TEXT_LENGTH = 4000
+
 
 class CheatingDetector:
     """Détecteur de triche et plagiat"""
@@ -21,40 +41,58 @@ class CheatingDetector:
     ) -> Dict[str, Any]:
         """
         Détecte la similarité avec d'autres réponses (plagiat)
+        
+        Toutes les réponses sont comparées localement par MinHash ; seules les
+        MAX_AI_REVIEWS plus proches au-delà de AI_REVIEW_THRESHOLD sont
+        confirmées par GPT.
         """
         try:
-            if not client or not other_answers:
+            if not other_answers:
                 return {
                     "similarity_score": 0.0,
                     "is_plagiarized": False,
                     "similar_answers": []
                 }
             
-            # Calculer similarité avec chaque autre réponse
-            similarities = []
-            for other_answer in other_answers[:10]:  # Limiter à 10 pour performance
-                similarity = await CheatingDetector._calculate_similarity(
-                    user_answer,
-                    other_answer,
-                    question
-                )
-                similarities.append({
+            user_signature = minhash_signature(user_answer)
+            similarities = [
+                {
                     "answer": other_answer[:100],  # Tronquer pour réponse
-                    "similarity": similarity
-                })
+                    "similarity": estimate_similarity(user_signature, minhash_signature(other_answer)),
+                    "_full": other_answer
+                }
+                for other_answer in other_answers
+            ]
+            
+            # Confirmer par GPT uniquement les candidates au score élevé
+            candidates = sorted(
+                (s for s in similarities if s["similarity"] >= AI_REVIEW_THRESHOLD),
+                key=lambda s: s["similarity"],
+                reverse=True
+            )[:MAX_AI_REVIEWS]
+            if candidates and AIGateway.is_available():
+                reviewed = await asyncio.gather(*[
+                    CheatingDetector._calculate_similarity(user_answer, c["_full"], question)
+                    for c in candidates
+                ])
+                for candidate, score in zip(candidates, reviewed):
+                    candidate["similarity"] = score
+                    candidate["reviewed_by_ai"] = True
+            
+            for s in similarities:
+                s.pop("_full", None)
             
             # Trouver la similarité maximale
             max_similarity = max(s["similarity"] for s in similarities) if similarities else 0.0
-            
-            # Seuil de plagiat (ajustable)
-            plagiarism_threshold = 0.85
-            is_plagiarized = max_similarity >= plagiarism_threshold
+            is_plagiarized = max_similarity >= PLAGIARISM_THRESHOLD
             
             return {
                 "similarity_score": max_similarity,
                 "is_plagiarized": is_plagiarized,
-                "similar_answers": [s for s in similarities if s["similarity"] >= plagiarism_threshold],
-                "confidence": "high" if max_similarity > 0.9 else "medium" if max_similarity > 0.7 else "low"
+                "similar_answers": [s for s in similarities if s["similarity"] >= PLAGIARISM_THRESHOLD],
+                "confidence": "high" if max_similarity > 0.9 else "medium" if max_similarity > 0.7 else "low",
+                "compared_answers": len(similarities),
+                "ai_reviews": len(candidates) if AIGateway.is_available() else 0
             }
             
         except Exception as e:
@@ -65,6 +103,128 @@ class CheatingDetector:
                 "similar_answers": []
             }
     
+    @staticmethod
+    def _open_answers(answers: Optional[List[Any]]) -> List[Tuple[str, str]]:
+        """(clé de l'exercice, texte) des réponses ouvertes assez longues pour être comparées"""
+        items = []
+        for position, answer in enumerate(answers or []):
+            if isinstance(answer, dict):
+                key = answer.get("exercise_index", answer.get("question_index", position))
+                text = answer.get("answer") or answer.get("solution") or answer.get("text") or answer.get("content")
+            else:
+                key, text = position, answer
+            if isinstance(text, str) and len(normalize(text)) >= MIN_ANSWER_WORDS:
+                items.append((str(key), text))
+        return items
+    
+    @staticmethod
+    async def index_attempt_answers(
+        exam_id: str,
+        attempt_id: str,
+        user_id: str,
+        answers: Optional[List[Any]]
+    ) -> int:
+        """
+        Calcule et enregistre les signatures MinHash des réponses d'une tentative
+        
+        Appelé à la soumission : l'analyse de la cohorte ne recalcule rien.
+        """
+        signatures = []
+        for item_key, text in CheatingDetector._open_answers(answers):
+            signature = minhash_signature(text)
+            signatures.append({
+                "exam_id": exam_id,
+                "user_id": user_id,
+                "item_key": item_key,
+                "signature": signature,
+                "bands": lsh_bands(signature),
+                "text": text[:STORED_TEXT_LENGTH]
+            })
+        return await AnswerSignatureRepository.replace_for_attempt(attempt_id, signatures)
+    
+    @staticmethod
+    async def find_similar_attempts(exam_id: str, attempt_id: str) -> List[Dict[str, Any]]:
+        """
+        Réponses d'autres tentatives proches de celles d'une tentative (sans GPT)
+        
+        Les candidates sont trouvées par l'index sur les bandes LSH : le coût
+        ne dépend pas du nombre total de tentatives de l'examen.
+        """
+        matches = []
+        for own in await AnswerSignatureRepository.find_by_attempt(attempt_id):
+            candidates = await AnswerSignatureRepository.find_candidates(
+                exam_id, own["item_key"], own["bands"], exclude_attempt_id=attempt_id
+            )
+            for candidate in candidates:
+                if candidate.get("user_id") == own.get("user_id"):
+                    continue
+                similarity = estimate_similarity(own["signature"], candidate["signature"])
+                if similarity >= AI_REVIEW_THRESHOLD:
+                    matches.append({
+                        "item_key": own["item_key"],
+                        "attempt_id": candidate.get("attempt_id"),
+                        "user_id": candidate.get("user_id"),
+                        "estimated_similarity": similarity
+                    })
+        return sorted(matches, key=lambda m: m["estimated_similarity"], reverse=True)
+    
+    @staticmethod
+    async def detect_exam_plagiarism(exam_id: str, use_ai: bool = True) -> Dict[str, Any]:
+        """
+        Analyse toutes les tentatives d'un examen
+        
+        Les paires candidates sont obtenues par bandes LSH (pas de comparaison
+        de toutes les paires), puis classées par similarité MinHash estimée ;
+        seules les MAX_COHORT_AI_REVIEWS meilleures sont confirmées par GPT.
+        """
+        signatures = await AnswerSignatureRepository.find_by_exam(exam_id)
+        by_id = {str(s["_id"]): s for s in signatures}
+        
+        groups: Dict[str, Dict[str, List[str]]] = {}
+        for key, s in by_id.items():
+            groups.setdefault(s["item_key"], {})[key] = s["bands"]
+        
+        suspects = []
+        for item_key, bands_by_key in groups.items():
+            for first, second in candidate_pairs(bands_by_key):
+                a, b = by_id[first], by_id[second]
+                if a.get("user_id") == b.get("user_id"):
+                    continue
+                similarity = estimate_similarity(a["signature"], b["signature"])
+                if similarity >= AI_REVIEW_THRESHOLD:
+                    suspects.append((similarity, item_key, a, b))
+        suspects.sort(key=lambda x: x[0], reverse=True)
+        
+        reviewed: List[Optional[float]] = [None] * len(suspects)
+        if use_ai and AIGateway.is_available():
+            to_review = suspects[:MAX_COHORT_AI_REVIEWS]
+            scores = await asyncio.gather(*[
+                CheatingDetector._calculate_similarity(a.get("text", ""), b.get("text", ""), f"Exercice {item_key}")
+                for _, item_key, a, b in to_review
+            ])
+            reviewed[:len(scores)] = scores
+        
+        flagged = []
+        for (estimated, item_key, a, b), ai_score in zip(suspects, reviewed):
+            similarity = ai_score if ai_score is not None else estimated
+            if similarity >= PLAGIARISM_THRESHOLD:
+                flagged.append({
+                    "item_key": item_key,
+                    "attempt_ids": [a.get("attempt_id"), b.get("attempt_id")],
+                    "user_ids": [a.get("user_id"), b.get("user_id")],
+                    "estimated_similarity": estimated,
+                    "similarity": similarity,
+                    "reviewed_by_ai": ai_score is not None
+                })
+        
+        return {
+            "exam_id": exam_id,
+            "answers_indexed": len(signatures),
+            "candidate_pairs": len(suspects),
+            "ai_reviews": sum(1 for score in reviewed if score is not None),
+            "flagged": flagged
+        }
+    
     @staticmethod
     async def analyze_behavior_anomalies(
         user_id: str,
@@ -137,7 +297,7 @@ class CheatingDetector:
         question: str
     ) -> float:
         """Calcule la similarité entre deux réponses avec IA"""
-        if not client:
+        if not AIGateway.is_available():
             # Similarité basique (Levenshtein simplifié)
             return CheatingDetector._basic_similarity(answer1, answer2)
         
@@ -168,7 +328,7 @@ Nombre uniquement :"""
                 "temperature": 0.1
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 10))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="cheating_detection", **create_params)
             
             similarity_text = response.choices[0].message.content.strip()
             try:
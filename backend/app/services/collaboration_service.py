@@ -6,7 +6,9 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
 from app.repositories.collaboration_repository import CollaborationRepository
 from app.repositories.learning_profile_repository import LearningProfileRepository
-from app.services.ai_service import client, AI_MODEL
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 import logging
 import json
 
@@ -66,7 +68,7 @@ class CollaborationService:
         module_id: str
     ) -> Dict[str, str]:
         """Attribue les rôles avec IA"""
-        if not client or not profiles:
+        if not AIGateway.is_available() or not profiles:
             # Attribution basique
             roles = ["leader", "researcher", "presenter", "reviewer"]
             return {
@@ -118,18 +120,13 @@ Réponds en JSON :
                 "temperature": 0.5
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 500))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="collaboration", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    result = json.loads(response_text[json_start:json_end])
-                    return result.get("roles", {})
-            except json.JSONDecodeError:
-                pass
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict):
+                return result.get("roles", {})
             
             # Fallback
             roles_list = ["leader", "researcher", "presenter", "reviewer"]
@@ -155,7 +152,7 @@ Réponds en JSON :
         Génère un feedback collectif pour le groupe
         """
         try:
-            if not client:
+            if not AIGateway.is_available():
                 return {
                     "feedback": "Bon travail de groupe !",
                     "strengths": ["Collaboration efficace"],
@@ -201,18 +198,13 @@ Réponds en JSON :
                 "temperature": 0.5
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 800))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="collaboration", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    feedback = json.loads(response_text[json_start:json_end])
-                    return feedback
-            except json.JSONDecodeError:
-                pass
+            feedback = safe_json_loads(response_text)
+            if isinstance(feedback, dict):
+                return feedback
             
             return {
                 "feedback": "Travail de groupe analysé.",
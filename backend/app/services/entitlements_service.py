@@ -0,0 +1,288 @@
+"""
+Droits d'un utilisateur : plan, fonctionnalités et quotas restants
+
+Une seule lecture répond à toutes les questions de contrôle d'accès
+(SubscriptionService, AICostGuard) au lieu d'une requête 'subscriptions'
+et d'un comptage par question :
+- cache en mémoire (LOCAL_TTL secondes) devant Redis (REDIS_TTL), MongoDB sinon
+- compteurs (requêtes IA du mois, tokens du jour) tenus à jour par incréments
+  (HINCRBY dans Redis, partagé entre workers) ; remis à zéro au changement
+  de mois ou de jour sans relecture
+- invalidé par les webhooks Stripe (PaymentService) et l'annulation d'abonnement ;
+  les autres workers voient le changement au plus LOCAL_TTL secondes plus tard
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+from app.models.subscription import SubscriptionPlan, PlanLimits
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TTL = 30
+LOCAL_MAX_ENTRIES = 10000
+REDIS_TTL = 3600
+REDIS_PREFIX = "entitlements:"
+# Valeur des limites illimitées (convention de PlanLimits et AICostGuard)
+UNLIMITED = -1
+
+
+@lru_cache(maxsize=None)
+def _plan_limits(plan: SubscriptionPlan) -> PlanLimits:
+    from app.services.subscription_service import SubscriptionService
+    return SubscriptionService.get_plan_limits(plan)
+
+
+@lru_cache(maxsize=None)
+def _plan_features(plan: SubscriptionPlan) -> frozenset:
+    return frozenset(_plan_limits(plan).features)
+
+
+def _periods(now: Optional[datetime] = None) -> Tuple[str, str]:
+    """(mois, jour) UTC en cours : '2026-10', '2026-10-19'"""
+    now = now or datetime.now(timezone.utc)
+    return now.strftime("%Y-%m"), now.strftime("%Y-%m-%d")
+
+
+@dataclass
+class Entitlements:
+    """Plan et consommation d'un utilisateur pour la période en cours"""
+    user_id: str
+    plan: SubscriptionPlan
+    month: str
+    day: str
+    ai_requests_used: int = 0
+    tokens_used_today: int = 0
+
+    @property
+    def limits(self) -> PlanLimits:
+        return _plan_limits(self.plan)
+
+    @property
+    def features(self) -> Set[str]:
+        return _plan_features(self.plan)
+
+    def can_access(self, feature: str) -> bool:
+        return feature in self.features
+
+    @property
+    def ai_requests_remaining(self) -> int:
+        limit = self.limits.ai_requests_per_month
+        if limit == UNLIMITED:
+            return UNLIMITED
+        return max(0, limit - self.ai_requests_used)
+
+    @property
+    def daily_token_limit(self) -> int:
+        from app.services.ai_cost_guard import AICostGuard
+        return AICostGuard._get_daily_limit(self.plan)
+
+    @property
+    def remaining_tokens(self) -> int:
+        limit = self.daily_token_limit
+        if limit == UNLIMITED:
+            return UNLIMITED
+        return max(0, limit - self.tokens_used_today)
+
+    def ai_limit_status(self) -> Dict[str, Any]:
+        """Réponse de SubscriptionService.check_ai_limit"""
+        limit = self.limits.ai_requests_per_month
+        if limit == UNLIMITED:
+            return {"allowed": True, "remaining": UNLIMITED, "limit": UNLIMITED, "plan": self.plan.value}
+        remaining = self.ai_requests_remaining
+        return {
+            "allowed": remaining > 0,
+            "remaining": remaining,
+            "limit": limit,
+            "plan": self.plan.value,
+            "used": self.ai_requests_used
+        }
+
+    def allows_tokens(self, estimated_tokens: int) -> bool:
+        limit = self.daily_token_limit
+        return limit == UNLIMITED or self.tokens_used_today + estimated_tokens <= limit
+
+    def roll_over(self, month: str, day: str) -> bool:
+        """Remet les compteurs à zéro au changement de période ; True si modifié"""
+        changed = False
+        if self.month != month:
+            self.month, self.ai_requests_used, changed = month, 0, True
+        if self.day != day:
+            self.day, self.tokens_used_today, changed = day, 0, True
+        return changed
+
+    def to_redis(self) -> Dict[str, str]:
+        return {
+            "plan": self.plan.value,
+            "month": self.month,
+            "day": self.day,
+            "ai_requests_used": str(self.ai_requests_used),
+            "tokens_used_today": str(self.tokens_used_today),
+        }
+
+    @classmethod
+    def from_redis(cls, user_id: str, data: Dict[str, str]) -> "Entitlements":
+        return cls(
+            user_id=user_id,
+            plan=SubscriptionPlan(data["plan"]),
+            month=data["month"],
+            day=data["day"],
+            ai_requests_used=int(data.get("ai_requests_used", 0)),
+            tokens_used_today=int(data.get("tokens_used_today", 0)),
+        )
+
+
+class EntitlementsService:
+    """Cache des droits par utilisateur (mémoire -> Redis -> MongoDB)"""
+
+    # user_id -> (expiration monotonic, droits)
+    _local: "OrderedDict[str, Tuple[float, Entitlements]]" = OrderedDict()
+
+    @staticmethod
+    def _redis():
+        from app.utils.cache import get_redis
+        return get_redis()
+
+    @staticmethod
+    def _remember(entitlements: Entitlements) -> None:
+        local = EntitlementsService._local
+        local[entitlements.user_id] = (time.monotonic() + LOCAL_TTL, entitlements)
+        local.move_to_end(entitlements.user_id)
+        while len(local) > LOCAL_MAX_ENTRIES:
+            local.popitem(last=False)
+
+    @staticmethod
+    async def get(user_id: str) -> Entitlements:
+        """
+        Droits de l'utilisateur (une seule lecture, le plus souvent en mémoire)
+
+        Raises:
+            Exception: MongoDB indisponible et aucune copie en cache
+        """
+        month, day = _periods()
+        entry = EntitlementsService._local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            entitlements = entry[1]
+            entitlements.roll_over(month, day)
+            return entitlements
+
+        entitlements = await EntitlementsService._load_from_redis(user_id)
+        if entitlements is not None:
+            if entitlements.roll_over(month, day):
+                await EntitlementsService._store_redis(entitlements)
+        else:
+            entitlements = await EntitlementsService._build(user_id, month, day)
+            await EntitlementsService._store_redis(entitlements)
+        EntitlementsService._remember(entitlements)
+        return entitlements
+
+    @staticmethod
+    async def _load_from_redis(user_id: str) -> Optional[Entitlements]:
+        redis = EntitlementsService._redis()
+        if not redis:
+            return None
+        try:
+            data = await redis.hgetall(REDIS_PREFIX + user_id)
+            return Entitlements.from_redis(user_id, data) if data else None
+        except Exception as e:
+            logger.debug(f"Erreur lecture droits Redis: {e}")
+            return None
+
+    @staticmethod
+    async def _store_redis(entitlements: Entitlements) -> None:
+        redis = EntitlementsService._redis()
+        if not redis:
+            return
+        try:
+            key = REDIS_PREFIX + entitlements.user_id
+            await redis.hset(key, mapping=entitlements.to_redis())
+            await redis.expire(key, REDIS_TTL)
+        except Exception as e:
+            logger.debug(f"Erreur écriture droits Redis: {e}")
+
+    @staticmethod
+    async def _build(user_id: str, month: str, day: str) -> Entitlements:
+        """Lit le plan et compte la consommation de la période dans MongoDB"""
+        from app.database import get_database
+        from app.repositories.subscription_repository import SubscriptionRepository
+
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        subscription, ai_requests_used, daily_usage = await asyncio.gather(
+            SubscriptionRepository.get_active_subscription(user_id),
+            db.ai_requests.count_documents({"user_id": user_id, "created_at": {"$gte": start_of_month}}),
+            db.ai_usage.aggregate([
+                {"$match": {"user_id": user_id, "created_at": {"$gte": start_of_day}}},
+                {"$group": {"_id": None, "total_tokens": {"$sum": "$tokens_used"}}}
+            ]).to_list(length=1)
+        )
+
+        plan = SubscriptionPlan.FREE
+        if subscription:
+            try:
+                plan = SubscriptionPlan(subscription.get("plan", "free"))
+            except ValueError:
+                logger.warning(f"Plan inconnu pour {user_id}: {subscription.get('plan')}")
+        return Entitlements(
+            user_id=user_id,
+            plan=plan,
+            month=month,
+            day=day,
+            ai_requests_used=ai_requests_used,
+            tokens_used_today=daily_usage[0].get("total_tokens", 0) if daily_usage else 0
+        )
+
+    @staticmethod
+    async def _increment(user_id: str, field: str, amount: int) -> None:
+        redis = EntitlementsService._redis()
+        if not redis:
+            return
+        try:
+            key = REDIS_PREFIX + user_id
+            # Pas de création de clé partielle : sans droits en cache, le prochain get() recompte
+            if await redis.exists(key):
+                await redis.hincrby(key, field, amount)
+        except Exception as e:
+            logger.debug(f"Erreur incrément droits Redis: {e}")
+
+    @staticmethod
+    async def record_ai_request(user_id: str) -> None:
+        """Compte une requête IA dans le quota mensuel"""
+        entry = EntitlementsService._local.get(user_id)
+        if entry is not None:
+            entry[1].ai_requests_used += 1
+        await EntitlementsService._increment(user_id, "ai_requests_used", 1)
+
+    @staticmethod
+    def record_tokens(user_id: str, tokens: int) -> None:
+        """Compte des tokens consommés dans le quota du jour (appelable hors coroutine)"""
+        entry = EntitlementsService._local.get(user_id)
+        if entry is not None:
+            entry[1].tokens_used_today += tokens
+        if EntitlementsService._redis():
+            try:
+                asyncio.get_running_loop().create_task(
+                    EntitlementsService._increment(user_id, "tokens_used_today", tokens)
+                )
+            except RuntimeError:
+                pass
+
+    @staticmethod
+    async def invalidate(user_id: str) -> None:
+        """Oublie les droits d'un utilisateur (changement d'abonnement)"""
+        EntitlementsService._local.pop(user_id, None)
+        redis = EntitlementsService._redis()
+        if not redis:
+            return
+        try:
+            await redis.delete(REDIS_PREFIX + user_id)
+        except Exception as e:
+            logger.warning(f"Erreur invalidation droits Redis pour {user_id}: {e}")
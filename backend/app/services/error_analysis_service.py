@@ -3,7 +3,9 @@ Service pour analyser les erreurs et générer des explications ciblées
 Mode "Apprendre par l'erreur"
 """
 from typing import Dict, Any, List, Optional
-from app.services.ai_service import client, AI_MODEL
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 import logging
 import json
 
@@ -24,7 +26,7 @@ class ErrorAnalysisService:
         Analyse une erreur et génère une explication ciblée
         """
         try:
-            if not client:
+            if not AIGateway.is_available():
                 return ErrorAnalysisService._get_demo_analysis()
             
             prompt = f"""Analyse cette erreur d'apprentissage et génère une explication ciblée :
@@ -64,18 +66,13 @@ Réponds en JSON :
                 "temperature": 0.3
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 800))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="error_analysis", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    analysis = json.loads(response_text[json_start:json_end])
-                    return analysis
-            except json.JSONDecodeError:
-                pass
+            analysis = safe_json_loads(response_text)
+            if isinstance(analysis, dict):
+                return analysis
             
             return ErrorAnalysisService._get_demo_analysis()
             
@@ -0,0 +1,147 @@
+"""
+Correction des examens par clé de réponses précompilée
+
+La clé (bonnes réponses et points de chaque question ou sous-question) est
+compilée une fois par examen et par version, puis mise en cache : en fin
+d'examen, toute une promotion soumet dans la même minute et chaque
+soumission n'est plus qu'un passage sur une table précalculée, sans
+relire les questions de l'examen.
+
+Questions supportées :
+- QCM simple : {"correct_answer": 2, "points": 1.0}
+- pondérée : {"correct_answer": 0, "points": 2.0, "weight": 1.5}
+- multi-parties : {"parts": [{"correct_answer": 1, "points": 0.5}, ...]}
+  (chaque partie est notée séparément, réponse avec 'part_index')
+"""
+from collections import OrderedDict
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Nombre de clés compilées conservées en mémoire
+ANSWER_KEY_CACHE_SIZE = 256
+
+_answer_row = attrgetter("question_index", "part_index", "answer")
+
+
+class CompiledAnswerKey:
+    """Clé de réponses aplatie : une entrée par question ou partie de question"""
+
+    __slots__ = ("exam_id", "version", "slots", "table")
+
+    def __init__(self, exam_id: str, version: str, questions: List[Dict[str, Any]]):
+        self.exam_id = exam_id
+        self.version = version
+        # (question_index, part_index) -> position dans la table
+        self.slots: Dict[Tuple[int, Optional[int]], int] = {}
+        # position -> (question_index, part_index, bonne réponse, points pondérés)
+        self.table: List[Tuple[int, Optional[int], Any, float]] = []
+
+        for question_index, question in enumerate(questions):
+            weight = float(question.get("weight", 1.0))
+            parts = question.get("parts") if isinstance(question.get("parts"), list) else None
+            entries = enumerate(parts) if parts else [(None, question)]
+            for part_index, entry in entries:
+                self.slots[(question_index, part_index)] = len(self.table)
+                self.table.append((
+                    question_index,
+                    part_index,
+                    entry.get("correct_answer"),
+                    float(entry.get("points", 1.0)) * weight
+                ))
+
+    def grade(self, answers: Iterable[Any]) -> Dict[str, Any]:
+        """
+        Note une soumission
+
+        Args:
+            answers: objets ou dicts avec question_index, answer et part_index optionnel
+
+        Returns:
+            score, max_score (questions répondues) et détail par réponse
+        """
+        score = 0.0
+        max_score = 0.0
+        # position -> détail (ordre de soumission ; une réponse en double remplace la précédente)
+        details: Dict[int, Dict[str, Any]] = {}
+        lookup = self.slots.get
+        table = self.table
+        for answer in answers:
+            if isinstance(answer, dict):
+                question_index = answer.get("question_index")
+                part_index = answer.get("part_index")
+                value = answer.get("answer")
+            else:
+                question_index, part_index, value = _answer_row(answer)
+            slot = lookup((question_index, part_index))
+            if slot is None:
+                # Question hors examen ou partie inconnue : ignorée
+                continue
+            if slot in details:
+                previous = details.pop(slot)
+                score -= previous["points"]
+                max_score -= table[slot][3]
+
+            _, _, correct_answer, points = table[slot]
+            max_score += points
+            if correct_answer is not None and value == correct_answer:
+                score += points
+                detail = {"question_index": question_index, "answer": value, "correct": True, "points": points}
+            else:
+                detail = {
+                    "question_index": question_index,
+                    "answer": value,
+                    "correct": False,
+                    "points": 0.0,
+                    "correct_answer": correct_answer
+                }
+            if part_index is not None:
+                detail["part_index"] = part_index
+            details[slot] = detail
+
+        return {"score": score, "max_score": max_score, "answers": list(details.values())}
+
+
+class ExamGrader:
+    """Cache des clés de réponses compilées, par examen et par version"""
+
+    _cache: "OrderedDict[Tuple[str, str], CompiledAnswerKey]" = OrderedDict()
+
+    @staticmethod
+    def exam_version(exam: Dict[str, Any]) -> str:
+        """Version d'un examen : change à chaque mise à jour du document"""
+        return str(exam.get("updated_at") or exam.get("created_at") or "")
+
+    @staticmethod
+    def get_cached(exam_id: str, version: str) -> Optional[CompiledAnswerKey]:
+        key = ExamGrader._cache.get((exam_id, version))
+        if key is not None:
+            ExamGrader._cache.move_to_end((exam_id, version))
+        return key
+
+    @staticmethod
+    def compile(exam: Dict[str, Any]) -> CompiledAnswerKey:
+        """Compile (ou récupère en cache) la clé de réponses d'un examen"""
+        exam_id = str(exam.get("id") or exam.get("_id"))
+        version = ExamGrader.exam_version(exam)
+        cached = ExamGrader.get_cached(exam_id, version)
+        if cached is not None:
+            return cached
+
+        answer_key = CompiledAnswerKey(exam_id, version, exam.get("questions", []))
+        ExamGrader._cache[(exam_id, version)] = answer_key
+        if len(ExamGrader._cache) > ANSWER_KEY_CACHE_SIZE:
+            ExamGrader._cache.popitem(last=False)
+        logger.debug(f"Clé de réponses compilée pour l'examen {exam_id} ({len(answer_key.table)} réponses)")
+        return answer_key
+
+    @staticmethod
+    def invalidate(exam_id: Optional[str] = None) -> None:
+        """Vide le cache (d'un examen ou complet)"""
+        if exam_id is None:
+            ExamGrader._cache.clear()
+            return
+        for key in [k for k in ExamGrader._cache if k[0] == exam_id]:
+            ExamGrader._cache.pop(key, None)
@@ -1,17 +1,19 @@
 """
 Service pour la gestion des examens - Business logic
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timezone
 from app.repositories.exam_repository import ExamRepository, ExamAttemptRepository
 from app.repositories.module_repository import ModuleRepository
 from app.repositories.progress_repository import ProgressRepository
 from app.repositories.quiz_repository import QuizRepository
 from app.services.ai_service import AIService
+from app.services.exam_grading import ExamGrader
+from app.utils.cursor_pagination import InvalidCursorError
 from app.models import ExamCreate, ExamQuestion, ExamSubmission, ExamAnswer
 from fastapi import HTTPException
-import logging
 import asyncio
+import logging
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +48,7 @@ class ExamService:
             
             if has_quiz:
                 # Pour les modules avec quiz : vérifier que l'utilisateur a réussi 90% du quiz
-                quiz = await QuizRepository.find_by_module_id(module_id)
+                quiz = await QuizRepository.find_by_module_id(module_id, question_limit=0)
                 if not quiz:
                     return {
                         "can_take_exam": False,
@@ -378,7 +380,8 @@ class ExamService:
             
             # Générer 3-5 exercices structurés de niveau examen national
             import json
-            from app.services.ai_service import client, AI_MODEL
+            from app.services.ai_service import AI_MODEL
+            from app.services.ai_gateway import AIGateway
             
             prompt = f"""Tu es un PROFESSEUR DE MATHÉMATIQUES EXPERT qui compose des examens de niveau NATIONAL.
 
@@ -474,7 +477,6 @@ IMPORTANT :
 - Niveau EXIGEANT et PROFESSIONNEL
 - Génère exactement 3 à 5 exercices MAJEURS au format JSON ci-dessus."""
 
-            # client.chat.completions.create() est synchrone, utiliser asyncio.to_thread
             from app.services.ai_service import _get_max_tokens_param
             create_params = {
                 "model": AI_MODEL,
@@ -486,17 +488,11 @@ IMPORTANT :
             }
             # Utiliser _get_max_tokens_param pour gérer max_tokens vs max_completion_tokens
             create_params.update(_get_max_tokens_param(AI_MODEL, 6000))
-            response = await asyncio.to_thread(client.chat.completions.create, **create_params)
+            response = await AIGateway.chat_completion(feature="exam_generation", **create_params)
             
             content = response.choices[0].message.content.strip()
             
-            # Nettoyer le contenu JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            # Parser le JSON
+            # Parser le JSON (le bloc markdown éventuel est ignoré par l'extraction)
             from app.utils.json_cleaner import safe_json_loads
             exercises_data = safe_json_loads(content)
             
@@ -606,46 +602,30 @@ IMPORTANT :
         Soumet les réponses d'un examen et calcule le score
         """
         try:
-            # Récupérer l'examen
-            exam = await ExamRepository.find_by_id(submission.exam_id)
+            # En-tête de l'examen (sans les questions) : la clé de réponses
+            # compilée est réutilisée tant que la version de l'examen ne change pas
+            exam = await ExamRepository.find_header_by_id(submission.exam_id)
             if not exam:
                 raise HTTPException(status_code=404, detail="Examen non trouvé")
 
-            questions = exam.get("questions", [])
+            answer_key = ExamGrader.get_cached(str(exam["id"]), ExamGrader.exam_version(exam))
+            if answer_key is None:
+                full_exam = await ExamRepository.find_by_id(submission.exam_id)
+                if not full_exam:
+                    raise HTTPException(status_code=404, detail="Examen non trouvé")
+                answer_key = ExamGrader.compile(full_exam)
+
             passing_score = exam.get("passing_score", 70.0)
             module_id = exam.get("module_id")
             exam_type = exam.get("exam_type", "standard")
             qcm_weight = exam.get("qcm_weight", 1.0)
             practical_weight = exam.get("practical_weight", 0.0)
 
-            # Calculer le score de la partie QCM
-            qcm_score = 0.0
-            qcm_max_score = 0.0
-            answers_detail = []
-
-            for answer in submission.answers:
-                question_index = answer.question_index
-                if question_index < len(questions):
-                    question = questions[question_index]
-                    points = question.get("points", 1.0)
-                    qcm_max_score += points
-
-                    if answer.answer == question.get("correct_answer", -1):
-                        qcm_score += points
-                        answers_detail.append({
-                            "question_index": question_index,
-                            "answer": answer.answer,
-                            "correct": True,
-                            "points": points
-                        })
-                    else:
-                        answers_detail.append({
-                            "question_index": question_index,
-                            "answer": answer.answer,
-                            "correct": False,
-                            "points": 0.0,
-                            "correct_answer": question.get("correct_answer")
-                        })
+            # Calculer le score de la partie QCM (une passe sur les réponses, table de la clé précalculée)
+            grading = answer_key.grade(submission.answers)
+            qcm_score = grading["score"]
+            qcm_max_score = grading["max_score"]
+            answers_detail = grading["answers"]
 
             # Pour les examens de mathématiques, calculer aussi le score pratique
             practical_score = 0.0
@@ -687,26 +667,7 @@ IMPORTANT :
             
             passed = percentage >= passing_score
 
-            # Trouver la tentative la plus récente pour cet examen et cet utilisateur
-            attempts = await ExamAttemptRepository.find_by_user_and_exam(user_id, submission.exam_id)
-            if not attempts:
-                raise HTTPException(
-                    status_code=404,
-                    detail="Tentative d'examen non trouvée. Veuillez démarrer une tentative d'abord."
-                )
-
-            # Prendre la tentative la plus récente qui n'est pas encore complétée
-            latest_attempt = None
-            for attempt in attempts:
-                if not attempt.get("completed_at"):
-                    latest_attempt = attempt
-                    break
-
-            if not latest_attempt:
-                # Créer une nouvelle tentative si aucune n'est en cours
-                latest_attempt = await ExamService.start_exam_attempt(user_id, submission.exam_id)
-
-            # Mettre à jour la tentative
+            # Données de clôture de la tentative
             update_data = {
                 "score": total_score,
                 "max_score": max_score,
@@ -726,19 +687,50 @@ IMPORTANT :
                 if practical_answers:
                     update_data["practical_answers"] = practical_answers
 
-            updated_attempt = await ExamAttemptRepository.update(latest_attempt["id"], update_data)
+            # Clôturer la tentative en cours en une seule opération atomique
+            updated_attempt = await ExamAttemptRepository.complete_open_attempt(
+                user_id, submission.exam_id, update_data
+            )
+            if not updated_attempt:
+                # Aucune tentative en cours : en démarrer une (prérequis vérifiés) puis la clôturer
+                await ExamService.start_exam_attempt(user_id, submission.exam_id)
+                updated_attempt = await ExamAttemptRepository.complete_open_attempt(
+                    user_id, submission.exam_id, update_data
+                )
+            if not updated_attempt:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Tentative d'examen non trouvée. Veuillez démarrer une tentative d'abord."
+                )
+
+            # Signatures de plagiat et validation du module en parallèle
+            async def index_answers():
+                # Signatures MinHash des réponses ouvertes (détection de plagiat sur la cohorte)
+                if not practical_answers:
+                    return
+                try:
+                    from app.services.cheating_detector import CheatingDetector
+                    await CheatingDetector.index_attempt_answers(
+                        submission.exam_id, updated_attempt["id"], user_id, practical_answers
+                    )
+                except Exception as e:
+                    logger.warning(f"Signatures de plagiat non enregistrées: {e}")
 
-            # Si l'examen est réussi, valider le module
-            module_validated = False
-            if passed:
+            async def validate():
+                # Si l'examen est réussi, valider le module
+                if not passed:
+                    return False
                 from app.services.validation_service import ValidationService
-                module_validated = await ValidationService.validate_module(
+                return await ValidationService.validate_module(
                     user_id=user_id,
                     module_id=module_id,
-                    exam_attempt_id=latest_attempt["id"],
-                    score=percentage
+                    exam_attempt_id=updated_attempt["id"],
+                    score=percentage,
+                    attempt=updated_attempt
                 )
 
+            _, module_validated = await asyncio.gather(index_answers(), validate())
+
             return {
                 "attempt_id": updated_attempt["id"],
                 "score": total_score,
@@ -767,21 +759,30 @@ IMPORTANT :
         """
         Récupère les tentatives d'examen d'un utilisateur (optimisé avec limite)
         """
+        attempts, _ = await ExamService.get_user_exam_attempts_page(user_id, module_id, limit)
+        return attempts
+
+    @staticmethod
+    async def get_user_exam_attempts_page(
+        user_id: str,
+        module_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page des tentatives d'examen d'un utilisateur et cursor de la page suivante
+        """
         try:
             if not user_id:
-                return []
-            
-            # Limiter à 50 par défaut pour la performance
-            actual_limit = min(limit, 50)
+                return [], None
             
-            if module_id:
-                attempts = await ExamAttemptRepository.find_by_user_and_module(user_id, module_id)
-                # Limiter les résultats même si la méthode ne le fait pas
-                return attempts[:actual_limit] if attempts else []
-            
-            attempts = await ExamAttemptRepository.find_by_user(user_id, limit=actual_limit)
-            return attempts or []
+            # Limiter à 50 par page pour la performance
+            return await ExamAttemptRepository.find_page_by_user(
+                user_id, module_id=module_id, limit=min(limit, 50), cursor=cursor
+            )
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des tentatives: {e}", exc_info=True)
             # Retourner une liste vide en cas d'erreur plutôt qu'une exception
-            return []
+            return [], None
@@ -4,7 +4,9 @@ Service pour générer automatiquement des exercices TD/TP avec solutions
 from typing import List, Dict, Any, Optional
 from app.models import Subject, Difficulty
 from app.repositories.module_repository import ModuleRepository
-from app.services.ai_service import client, AI_MODEL, AIService
+from app.services.ai_service import AI_MODEL, AIService
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 import logging
 import json
 
@@ -78,7 +80,7 @@ class ExerciseGeneratorService:
         Génère une solution détaillée pour un exercice
         """
         try:
-            if not client:
+            if not AIGateway.is_available():
                 return {
                     "solution": "Solution détaillée générée automatiquement.",
                     "steps": ["Étape 1", "Étape 2", "Étape 3"],
@@ -118,18 +120,13 @@ Réponds en JSON :
                 "temperature": 0.3
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 1500))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="exercise_generation", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    solution = json.loads(response_text[json_start:json_end])
-                    return solution
-            except json.JSONDecodeError:
-                pass
+            solution = safe_json_loads(response_text)
+            if isinstance(solution, dict):
+                return solution
             
             # Fallback
             return {
@@ -154,7 +151,7 @@ Réponds en JSON :
         exercise_type: str
     ) -> List[Dict[str, Any]]:
         """Génère des exercices/étapes avec l'IA"""
-        if not client:
+        if not AIGateway.is_available():
             return ExerciseGeneratorService._generate_demo_exercises(
                 num_items,
                 difficulty,
@@ -286,30 +283,24 @@ Génère exactement {num_items} étapes au format JSON ci-dessus."""
                 "temperature": 0.7
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 2000))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="exercise_generation", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    result = json.loads(response_text[json_start:json_end])
-                    
-                    if exercise_type == "td":
-                        exercises = result.get("exercises", [])
-                        # Générer les solutions pour chaque exercice
-                        for exercise in exercises:
-                            solution = await ExerciseGeneratorService.generate_solution(
-                                exercise,
-                                "td"
-                            )
-                            exercise["solution"] = solution
-                        return exercises
-                    else:
-                        return result.get("steps", [])
-            except json.JSONDecodeError:
-                pass
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict):
+                if exercise_type == "td":
+                    exercises = result.get("exercises", [])
+                    # Générer les solutions pour chaque exercice
+                    for exercise in exercises:
+                        solution = await ExerciseGeneratorService.generate_solution(
+                            exercise,
+                            "td"
+                        )
+                        exercise["solution"] = solution
+                    return exercises
+                else:
+                    return result.get("steps", [])
             
             # Fallback
             return ExerciseGeneratorService._generate_demo_exercises(
@@ -2,73 +2,274 @@
 Service pour la conformité RGPD avancée
 Export données, droit à l'oubli automatisé
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
 from datetime import datetime, timezone
+from bson import ObjectId
 from app.repositories.user_repository import UserRepository
-from app.repositories.progress_repository import ProgressRepository as ProgressRepo
-from app.repositories.learning_profile_repository import LearningProfileRepository
+from app.utils.security import InputSanitizer
+import io
+import zipfile
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+# Collections contenant des données personnelles : (collection, champ référençant l'utilisateur)
+USER_DATA_COLLECTIONS: List[Tuple[str, str]] = [
+    ("progress", "user_id"),
+    ("learning_profiles", "user_id"),
+    ("pedagogical_memory", "user_id"),
+    ("user_history", "user_id"),
+    ("user_history_stats", "_id"),
+    ("user_question_counts", "user_id"),
+    ("quiz_attempts", "user_id"),
+    ("exam_attempts", "user_id"),
+    ("answer_signatures", "user_id"),
+    ("module_validations", "user_id"),
+    ("ai_usage", "user_id"),
+    ("ai_requests", "user_id"),
+    ("request_classifications", "user_id"),
+    ("user_quests", "user_id"),
+    ("badges", "user_id"),
+    ("favorites", "user_id"),
+    ("feedback", "user_id"),
+    ("subscriptions", "user_id"),
+]
+
+# Exportées mais conservées à la suppression (obligations comptables)
+RETAINED_COLLECTIONS = {"subscriptions"}
+
+# Champs sensibles jamais exportés
+USER_EXCLUDED_FIELDS = {"hashed_password": 0, "password_reset_token": 0, "email_verification_token": 0}
+
+EXPORT_BATCH_SIZE = 500
+DELETE_BATCH_SIZE = 1000
+# Taille de tampon au-delà de laquelle les octets du ZIP sont envoyés au client
+EXPORT_FLUSH_BYTES = 256 * 1024
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """
+    Flux non positionnable dans lequel zipfile écrit l'archive
+
+    zipfile utilise alors des data descriptors : l'archive peut être
+    envoyée au fur et à mesure sans jamais être conservée en mémoire.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+        return len(chunk)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _to_ndjson_line(document: Dict[str, Any]) -> bytes:
+    return (json.dumps(document, default=_json_default, ensure_ascii=False) + "\n").encode("utf-8")
+
 
 class GDPRService:
     """Service RGPD"""
-    
+
+    @staticmethod
+    async def _user_queries(user_id: str) -> List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Construit (collection, filtre, projection) pour chaque collection de l'utilisateur"""
+        from app.database import get_database
+        db = get_database()
+
+        queries: List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]] = []
+        sanitized_id = InputSanitizer.sanitize_object_id(user_id)
+        if sanitized_id:
+            user_filter = {"_id": ObjectId(sanitized_id)}
+            queries.append(("users", user_filter, USER_EXCLUDED_FIELDS))
+            user = await db.users.find_one(user_filter, {"email": 1})
+            if user and user.get("email"):
+                queries.append(("support_messages", {"email": user["email"]}, None))
+
+        for collection, field in USER_DATA_COLLECTIONS:
+            queries.append((collection, {field: user_id}, None))
+        return queries
+
+    @staticmethod
+    async def stream_export_zip(user_id: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+        """
+        Exporte toutes les données d'un utilisateur sous forme d'archive ZIP en streaming
+
+        Chaque collection est lue avec un curseur (batch_size) et écrite dans un
+        fichier NDJSON de l'archive ; la mémoire utilisée reste constante quel
+        que soit le volume de données.
+        """
+        from app.database import get_database
+        db = get_database()
+
+        buffer = _ZipStreamBuffer()
+        counts: Dict[str, int] = {}
+
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for collection, query, projection in await GDPRService._user_queries(user_id):
+                count = 0
+                with archive.open(f"{collection}.ndjson", mode="w", force_zip64=True) as entry:
+                    cursor = db[collection].find(query, projection).batch_size(batch_size)
+                    async for document in cursor:
+                        entry.write(_to_ndjson_line(document))
+                        count += 1
+                        if buffer.size >= EXPORT_FLUSH_BYTES:
+                            yield buffer.drain()
+                counts[collection] = count
+                if buffer.size:
+                    yield buffer.drain()
+
+            manifest = {
+                "user_id": user_id,
+                "export_date": datetime.now(timezone.utc).isoformat(),
+                "format": "ndjson+zip",
+                "version": "2.0",
+                "collections": counts
+            }
+            archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+
+        yield buffer.drain()
+
     @staticmethod
     async def export_user_data(user_id: str) -> Dict[str, Any]:
         """
-        Exporte toutes les données d'un utilisateur
+        Exporte toutes les données d'un utilisateur (résumé JSON)
+
+        Retourne le nombre de documents par collection ; les données elles-mêmes
+        sont servies par stream_export_zip.
         """
         try:
-            # Récupérer toutes les données utilisateur
-            user = await UserRepository.find_by_id(user_id)
-            progress = await ProgressRepo.find_by_user(user_id, limit=1000)
-            profile = await LearningProfileRepository.find_by_user_id(user_id)
-            
-            export_data = {
+            from app.database import get_database
+            db = get_database()
+
+            counts = {}
+            for collection, query, _ in await GDPRService._user_queries(user_id):
+                counts[collection] = await db[collection].count_documents(query)
+
+            return {
                 "user_id": user_id,
                 "export_date": datetime.now(timezone.utc).isoformat(),
-                "user_data": user,
-                "progress_data": progress,
-                "learning_profile": profile,
-                "format": "json",
-                "version": "1.0"
+                "collections": counts,
+                "format": "ndjson+zip",
+                "version": "2.0"
             }
-            
-            return export_data
-            
+
         except Exception as e:
             logger.error(f"Erreur lors de l'export: {e}", exc_info=True)
             raise
-    
+
+    @staticmethod
+    async def _delete_in_batches(collection: str, query: Dict[str, Any], batch_size: int) -> int:
+        """Supprime les documents par lots d'_id (n'occupe pas la base avec un delete_many géant)"""
+        from app.database import get_database
+        db = get_database()
+
+        deleted = 0
+        while True:
+            cursor = db[collection].find(query, {"_id": 1}).limit(batch_size)
+            ids = [document["_id"] async for document in cursor]
+            if not ids:
+                return deleted
+            result = await db[collection].delete_many({"_id": {"$in": ids}})
+            deleted += result.deleted_count
+
     @staticmethod
-    async def delete_user_data(user_id: str) -> bool:
+    async def delete_user_data(user_id: str, batch_size: int = DELETE_BATCH_SIZE) -> bool:
         """
         Supprime toutes les données d'un utilisateur (droit à l'oubli)
+
+        Suppression en cascade, par lots, et reprenable : l'avancement est
+        enregistré dans 'gdpr_deletions' et une nouvelle exécution reprend
+        aux collections non encore traitées (ou repart de zéro si la
+        précédente s'est terminée).
         """
         try:
-            # Supprimer progress
             from app.database import get_database
+            from pymongo import ReturnDocument
             db = get_database()
-            await db.progress.delete_many({"user_id": user_id})
-            
-            # Supprimer learning profile
-            await db.learning_profiles.delete_many({"user_id": user_id})
-            
+
+            # Une suppression terminée repart de zéro : des données ont pu être
+            # créées depuis (toutes les routes partagent l'utilisateur "anonymous")
+            await db.gdpr_deletions.update_one(
+                {"_id": user_id, "status": "completed"},
+                {
+                    "$set": {"completed_collections": [], "deleted_counts": {}, "started_at": datetime.now(timezone.utc)},
+                    "$unset": {"completed_at": ""}
+                }
+            )
+            state = await db.gdpr_deletions.find_one_and_update(
+                {"_id": user_id},
+                {
+                    "$setOnInsert": {"completed_collections": [], "started_at": datetime.now(timezone.utc)},
+                    "$set": {"status": "in_progress"}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            completed = set(state.get("completed_collections", []))
+
+            steps = [
+                (collection, {field: user_id})
+                for collection, field in USER_DATA_COLLECTIONS
+                if collection not in RETAINED_COLLECTIONS
+            ]
+            # Messages de support (liés par email), avant l'anonymisation
+            sanitized_id = InputSanitizer.sanitize_object_id(user_id)
+            if sanitized_id and "support_messages" not in completed:
+                user = await db.users.find_one({"_id": ObjectId(sanitized_id)}, {"email": 1})
+                if user and user.get("email"):
+                    steps.append(("support_messages", {"email": user["email"]}))
+
+            for collection, query in steps:
+                if collection in completed:
+                    continue
+                deleted = await GDPRService._delete_in_batches(collection, query, batch_size)
+                await db.gdpr_deletions.update_one(
+                    {"_id": user_id},
+                    {
+                        "$addToSet": {"completed_collections": collection},
+                        "$set": {f"deleted_counts.{collection}": deleted}
+                    }
+                )
+                logger.info(f"RGPD: {deleted} documents supprimés de '{collection}' pour {user_id}")
+
             # Supprimer user (anonymiser plutôt que supprimer pour logs)
-            await UserRepository.anonymize_user(user_id)
-            
+            if sanitized_id:
+                await UserRepository.anonymize_user(sanitized_id)
+
+            await db.gdpr_deletions.update_one(
+                {"_id": user_id},
+                {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc)}}
+            )
+
             # Journaliser la suppression
             await GDPRService._log_deletion(user_id)
-            
+
             return True
-            
+
         except Exception as e:
             logger.error(f"Erreur lors de la suppression: {e}", exc_info=True)
             return False
-    
+
     @staticmethod
     async def _log_deletion(user_id: str):
         """Journalise une suppression"""
@@ -83,14 +284,3 @@ class GDPRService:
             })
         except Exception as e:
             logger.error(f"Erreur journalisation: {e}", exc_info=True)
-
-
-
-
-
-
-
-
-
-
-
@@ -4,6 +4,7 @@ Service pour gérer les prompts officiels Kairos
 from typing import Dict, Any, Optional, List
 import json
 import logging
+from app.prompts.assembly import kairos_template, kairos_system_prompt
 from app.prompts.kairos_prompts import (
     SYSTEM_PROMPT,
     get_prompt,
@@ -37,7 +38,7 @@ class KairosPromptService:
     @staticmethod
     def get_system_prompt() -> str:
         """Retourne le prompt système global Kairos"""
-        return get_system_prompt()
+        return kairos_system_prompt()
     
     @staticmethod
     def get_subject_prompt(
@@ -59,7 +60,7 @@ class KairosPromptService:
             Le prompt formaté
         """
         try:
-            prompt = get_prompt(subject, topic, level)
+            prompt = kairos_template(subject, topic, level)
             if concept:
                 prompt = prompt.replace("{concept}", concept)
             return prompt
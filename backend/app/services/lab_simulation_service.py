@@ -2,17 +2,36 @@
 Service pour les laboratoires virtuels interactifs
 Simulations physique et chimie
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from app.repositories.module_repository import ModuleRepository
+import numpy as np
+import base64
+import copy
+import time
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+# Durée de vie des configurations en cache (par module et type de simulation)
+CONFIG_CACHE_TTL = 300
+
+# Limites des calculs vectorisés (taille de la grille et nombre de pas de temps)
+MAX_SWEEP_POINTS = 250_000
+MAX_TIME_STEPS = 10_000
+
+GRAVITY_CONSTANT = 6.67430e-11
+EARTH_GRAVITY = 9.81
+PI = 3.14159
+MU0 = 4 * PI * 1e-7
+
 
 class LabSimulationService:
     """Service pour simulations de laboratoire"""
     
+    # (module_id, simulation_type) -> (expiration, config)
+    _config_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+    
     @staticmethod
     async def get_simulation_config(
         module_id: str,
@@ -20,26 +39,46 @@ class LabSimulationService:
     ) -> Dict[str, Any]:
         """
         Récupère la configuration de simulation pour un module
+        
+        La configuration ne dépend que du module : elle est mise en cache
+        en mémoire (CONFIG_CACHE_TTL) pour éviter une lecture MongoDB par calcul.
         """
+        cache_key = (module_id, simulation_type)
+        cached = LabSimulationService._config_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return copy.deepcopy(cached[1])
+        
         try:
             module = await ModuleRepository.find_by_id(module_id)
             if not module:
                 raise ValueError(f"Module {module_id} non trouvé")
             
-            subject = module.get("subject")
-            
             # Configuration selon le type de simulation
             if simulation_type == "physics":
-                return LabSimulationService._get_physics_config(module)
+                config = LabSimulationService._get_physics_config(module)
             elif simulation_type == "chemistry":
-                return LabSimulationService._get_chemistry_config(module)
+                config = LabSimulationService._get_chemistry_config(module)
             else:
-                return LabSimulationService._get_generic_config(module)
+                config = LabSimulationService._get_generic_config(module)
+            
+            LabSimulationService._config_cache[cache_key] = (
+                time.monotonic() + CONFIG_CACHE_TTL, config
+            )
+            return copy.deepcopy(config)
                 
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de config simulation: {e}", exc_info=True)
             raise
     
+    @staticmethod
+    def invalidate_config_cache(module_id: Optional[str] = None) -> None:
+        """Vide le cache des configurations (d'un module ou de tous)"""
+        if module_id is None:
+            LabSimulationService._config_cache.clear()
+            return
+        for key in [k for k in LabSimulationService._config_cache if k[0] == module_id]:
+            del LabSimulationService._config_cache[key]
+    
     @staticmethod
     def _get_physics_config(module: Dict[str, Any]) -> Dict[str, Any]:
         """Configuration pour simulation physique"""
@@ -254,14 +293,255 @@ class LabSimulationService:
             "temperature": temp,
             "formula_used": "rate = k * [A] * [B] * f(T)"
         }
-
-
-
-
-
-
-
-
-
-
-
+    
+    # ------------------------------------------------------------------
+    # Balayage de paramètres et mode temporel (calculs vectorisés NumPy)
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _axis_size(spec: Any) -> int:
+        """Nombre de valeurs d'un axe de balayage, calculé sans rien allouer"""
+        if isinstance(spec, dict) and "values" in spec:
+            spec = spec["values"]
+        elif isinstance(spec, dict):
+            try:
+                return int(spec.get("num", 50))
+            except (TypeError, ValueError):
+                raise ValueError("Le nombre de points d'un axe ('num') doit être un entier")
+        try:
+            return len(spec)
+        except TypeError:
+            raise ValueError("Chaque axe de balayage doit être une liste non vide de valeurs")
+    
+    @staticmethod
+    def _axis_values(spec: Any) -> np.ndarray:
+        """Valeurs d'un axe de balayage : liste explicite ou {"start", "stop", "num"}"""
+        if isinstance(spec, dict) and "values" in spec:
+            values = np.asarray(spec["values"], dtype=np.float64)
+        elif isinstance(spec, dict):
+            num = LabSimulationService._axis_size(spec)
+            if num > MAX_SWEEP_POINTS:
+                raise ValueError(f"Axe trop grand ({num} points, max {MAX_SWEEP_POINTS})")
+            try:
+                values = np.linspace(float(spec["start"]), float(spec["stop"]), num)
+            except KeyError as e:
+                raise ValueError(f"Axe de balayage incomplet: {e} manquant")
+        else:
+            values = np.asarray(spec, dtype=np.float64)
+        if values.ndim != 1 or values.size == 0:
+            raise ValueError("Chaque axe de balayage doit être une liste non vide de valeurs")
+        return values
+    
+    @staticmethod
+    def _encode_array(values: np.ndarray, encoding: str) -> Any:
+        """
+        Encode un tableau : liste JSON ou float32 little-endian en base64
+        
+        En JSON, les valeurs non finies (division par zéro, débordement) deviennent
+        None : inf / nan ne sont pas du JSON valide. En float32 elles sont
+        conservées telles quelles (IEEE 754).
+        """
+        if encoding == "float32":
+            return base64.b64encode(np.ascontiguousarray(values, dtype="<f4").tobytes()).decode("ascii")
+        finite = np.isfinite(values)
+        if finite.all():
+            return values.tolist()
+        return np.where(finite, values, None).tolist()
+    
+    @staticmethod
+    def _gravity_kernel(p: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            force = GRAVITY_CONSTANT * (p["mass1"] * p["mass2"]) / (p["distance"] ** 2)
+        return {"force": force}
+    
+    @staticmethod
+    def _electricity_kernel(p: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        voltage, current = p["voltage"], p["current"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            resistance = np.where(current != 0, voltage / current, p["resistance"])
+        return {"resistance": resistance, "power": voltage * current}
+    
+    @staticmethod
+    def _magnetism_kernel(p: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            field_strength = MU0 * p["current"] / (2 * PI * p["distance"])
+        return {"field_strength": field_strength}
+    
+    @staticmethod
+    def _reaction_kernel(p: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        rate = p["reactant1_concentration"] * p["reactant2_concentration"] * (1 + p["temperature"] / 100)
+        return {"reaction_rate": rate}
+    
+    # Type de simulation -> (noyau vectorisé, paramètres numériques et valeurs par défaut)
+    _KERNELS = {
+        "gravity": ("_gravity_kernel", {"mass1": 10, "mass2": 10, "distance": 100}),
+        "electricity": ("_electricity_kernel", {"voltage": 12, "current": 2, "resistance": 6}),
+        "magnetism": ("_magnetism_kernel", {"magnetic_field": 1, "current": 2, "distance": 1}),
+        "chemical_reaction": ("_reaction_kernel", {
+            "reactant1_concentration": 1, "reactant2_concentration": 1, "temperature": 25
+        }),
+    }
+    
+    @staticmethod
+    async def calculate_sweep(
+        module_id: str,
+        sweep: Dict[str, Any],
+        parameters: Optional[Dict[str, Any]] = None,
+        simulation_type: str = "physics",
+        encoding: str = "json"
+    ) -> Dict[str, Any]:
+        """
+        Calcule une simulation sur une grille de paramètres en un seul appel
+        
+        Args:
+            sweep: axes balayés, ex. {"distance": {"start": 1, "stop": 1000, "num": 200}}
+                   ou {"mass1": {"values": [1, 10, 100]}} ; plusieurs axes forment une grille
+            parameters: valeurs fixes des autres paramètres
+            encoding: "json" (listes) ou "float32" (base64, little-endian)
+        
+        Returns:
+            Axes, forme de la grille et tableaux de résultats (ordre C, indexation "ij")
+        """
+        config = await LabSimulationService.get_simulation_config(module_id, simulation_type)
+        kernel_spec = LabSimulationService._KERNELS.get(config["type"])
+        if not kernel_spec:
+            raise ValueError(f"Balayage non disponible pour la simulation '{config['type']}'")
+        if not sweep:
+            raise ValueError("Au moins un paramètre à balayer est requis")
+        
+        kernel_name, defaults = kernel_spec
+        unknown = set(sweep) - set(defaults)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus pour '{config['type']}': {sorted(unknown)}")
+        
+        axis_names = list(sweep)
+        # Taille de la grille vérifiée avant toute allocation
+        total_points = 1
+        for name in axis_names:
+            size = LabSimulationService._axis_size(sweep[name])
+            if size < 1:
+                raise ValueError("Chaque axe de balayage doit être une liste non vide de valeurs")
+            total_points *= size
+            if total_points > MAX_SWEEP_POINTS:
+                raise ValueError(f"Grille trop grande (plus de {MAX_SWEEP_POINTS} points)")
+        axes = [LabSimulationService._axis_values(sweep[name]) for name in axis_names]
+        shape = tuple(axis.size for axis in axes)
+        
+        fixed = {**defaults, **(parameters or {})}
+        grids = dict(zip(axis_names, np.meshgrid(*axes, indexing="ij")))
+        inputs = {
+            name: grids[name] if name in grids else np.float64(fixed[name])
+            for name in defaults
+        }
+        outputs = getattr(LabSimulationService, kernel_name)(inputs)
+        
+        return {
+            "type": config["type"],
+            "encoding": encoding,
+            "shape": list(shape),
+            "axes": {
+                name: LabSimulationService._encode_array(axis, encoding)
+                for name, axis in zip(axis_names, axes)
+            },
+            "fixed_parameters": {k: v for k, v in fixed.items() if k not in sweep},
+            "results": {
+                name: LabSimulationService._encode_array(np.broadcast_to(values, shape).ravel(), encoding)
+                for name, values in outputs.items()
+            }
+        }
+    
+    @staticmethod
+    def _projectile_trajectory(params: Dict[str, Any], t: np.ndarray) -> Dict[str, np.ndarray]:
+        """Trajectoire d'un projectile (sans frottement), tronquée à l'impact au sol"""
+        v0 = float(params.get("initial_velocity", 20))
+        angle = np.radians(float(params.get("angle", 45)))
+        h0 = float(params.get("height", 0))
+        g = float(params.get("gravity", EARTH_GRAVITY))
+        
+        vx, vy = v0 * np.cos(angle), v0 * np.sin(angle)
+        # Instant d'impact (y = 0) : le projectile reste ensuite immobile au sol
+        if g > 0:
+            t_impact = (vy + np.sqrt(max(vy ** 2 + 2 * g * h0, 0.0))) / g
+        else:
+            t_impact = np.inf
+        flying = t < t_impact
+        t_flight = np.minimum(t, t_impact)
+        x = vx * t_flight
+        y = np.where(flying, np.maximum(h0 + vy * t_flight - 0.5 * g * t_flight ** 2, 0.0), 0.0)
+        return {
+            "x": x,
+            "y": y,
+            "vx": np.where(flying, vx, 0.0),
+            "vy": np.where(flying, vy - g * t, 0.0)
+        }
+    
+    @staticmethod
+    def _reaction_kinetics(params: Dict[str, Any], t: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Concentrations d'une réaction A + B -> P d'ordre 2 (rate = k[A][B])
+        
+        Solution analytique ; k suit la même dépendance en température que
+        _calculate_reaction.
+        """
+        a0 = float(params.get("reactant1_concentration", 1))
+        b0 = float(params.get("reactant2_concentration", 1))
+        k = 1 + float(params.get("temperature", 25)) / 100
+        delta = b0 - a0
+        
+        if abs(delta) < 1e-12:
+            a = a0 / (1 + a0 * k * t)
+        else:
+            with np.errstate(over="ignore"):
+                a = a0 * delta / (b0 * np.exp(delta * k * t) - a0)
+        a = np.nan_to_num(a, nan=0.0, posinf=0.0, neginf=0.0)
+        return {
+            "reactant1_concentration": a,
+            "reactant2_concentration": a + delta,
+            "product_concentration": a0 - a,
+            "reaction_rate": k * a * (a + delta)
+        }
+    
+    _TIME_SERIES = {
+        "gravity": ("_projectile_trajectory", 4.0),
+        "chemical_reaction": ("_reaction_kinetics", 10.0),
+    }
+    
+    @staticmethod
+    async def simulate_time_series(
+        module_id: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        duration: Optional[float] = None,
+        steps: int = 200,
+        simulation_type: str = "physics",
+        encoding: str = "json"
+    ) -> Dict[str, Any]:
+        """
+        Calcule l'évolution temporelle d'une simulation (trajectoire, cinétique)
+        
+        Tous les pas de temps sont évalués en une opération vectorisée.
+        """
+        config = await LabSimulationService.get_simulation_config(module_id, simulation_type)
+        series_spec = LabSimulationService._TIME_SERIES.get(config["type"])
+        if not series_spec:
+            raise ValueError(f"Mode temporel non disponible pour la simulation '{config['type']}'")
+        if steps < 2 or steps > MAX_TIME_STEPS:
+            raise ValueError(f"Le nombre de pas doit être compris entre 2 et {MAX_TIME_STEPS}")
+        
+        method_name, default_duration = series_spec
+        duration = float(duration) if duration else default_duration
+        if duration <= 0:
+            raise ValueError("La durée doit être positive")
+        
+        t = np.linspace(0.0, duration, steps)
+        series = getattr(LabSimulationService, method_name)(parameters or {}, t)
+        
+        return {
+            "type": config["type"],
+            "encoding": encoding,
+            "steps": steps,
+            "time": LabSimulationService._encode_array(t, encoding),
+            "series": {
+                name: LabSimulationService._encode_array(values, encoding)
+                for name, values in series.items()
+            }
+        }
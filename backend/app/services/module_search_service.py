@@ -0,0 +1,341 @@
+"""
+Moteur de recherche du catalogue de modules
+
+Index inversé en mémoire (par processus) des modules et de leurs leçons :
+- normalisation : minuscules, accents retirés, pluriels simples ramenés au singulier
+- classement BM25 sur des champs pondérés (titre, leçons, objectifs, description)
+- saisie semi-automatique : le dernier mot de la requête est complété par préfixe
+- mises à jour incrémentales à chaque écriture de module (ModuleRepository),
+  et rafraîchissement périodique pour les écritures faites par d'autres workers
+- résultats mis en cache par requête normalisée, invalidés à chaque modification
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import math
+import time
+
+from app.utils.minhash import normalize
+
+logger = logging.getLogger(__name__)
+
+# Poids des champs indexés
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "lessons": 2.0,
+    "learning_objectives": 1.5,
+    "description": 1.0,
+}
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Un terme complété par préfixe compte un peu moins qu'un terme exact
+PREFIX_FACTOR = 0.8
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 50
+# Délai entre deux vérifications des écritures faites par les autres workers
+REFRESH_INTERVAL_SECONDS = 30
+QUERY_CACHE_SIZE = 512
+MAX_QUERY_LENGTH = 100
+
+STOPWORDS = frozenset({
+    # Français
+    "le", "la", "les", "un", "une", "des", "du", "de", "d", "l", "et", "ou", "a", "au", "aux",
+    "en", "dans", "par", "pour", "sur", "avec", "sans", "ce", "ces", "cet", "cette", "est",
+    "que", "qui", "quoi", "se", "sa", "son", "ses",
+    # Anglais
+    "the", "an", "of", "and", "or", "to", "in", "on", "for", "with", "is", "what", "how",
+})
+
+# Projection des champs utiles à l'index (sans le contenu volumineux des leçons)
+INDEX_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "subject": 1,
+    "difficulty": 1,
+    "learning_objectives": 1,
+    "content.lessons.title": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+
+def _stem(token: str) -> str:
+    """Pluriels simples : 'fonctions' -> 'fonction', 'reseaux' -> 'reseau'"""
+    if len(token) > 4 and token[-1] in "sx":
+        return token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Termes indexés d'un texte (accents retirés, mots vides exclus)"""
+    return [_stem(word) for word in normalize(text) if word not in STOPWORDS]
+
+
+def _module_fields(module: Dict[str, Any]) -> Dict[str, str]:
+    content = module.get("content") or {}
+    lessons = content.get("lessons") if isinstance(content, dict) else None
+    lesson_titles = [
+        lesson.get("title", "") for lesson in (lessons or []) if isinstance(lesson, dict)
+    ]
+    return {
+        "title": module.get("title") or "",
+        "lessons": " ".join(lesson_titles),
+        "learning_objectives": " ".join(module.get("learning_objectives") or []),
+        "description": module.get("description") or "",
+    }
+
+
+class ModuleSearchIndex:
+    """Index inversé BM25 (structure en mémoire, sans accès à la base)"""
+
+    def __init__(self):
+        # terme -> {module_id: fréquence pondérée}
+        self.postings: Dict[str, Dict[str, float]] = {}
+        # module_id -> (longueur pondérée, termes, métadonnées)
+        self.documents: Dict[str, Tuple[float, Set[str], Dict[str, Any]]] = {}
+        self.total_length = 0.0
+        self._vocabulary: Optional[List[str]] = None
+        # Incrémentée à chaque modification (invalide le cache des requêtes)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def upsert(self, module: Dict[str, Any]) -> None:
+        module_id = str(module.get("id") or module.get("_id"))
+        self.remove(module_id)
+
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, text in _module_fields(module).items():
+            weight = FIELD_WEIGHTS[field]
+            for term in analyze(text):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[module_id] = frequency
+        meta = {
+            "id": module_id,
+            "title": module.get("title"),
+            "description": module.get("description"),
+            "subject": module.get("subject"),
+            "difficulty": module.get("difficulty"),
+        }
+        self.documents[module_id] = (length, set(frequencies), meta)
+        self.total_length += length
+        self._vocabulary = None
+        self.generation += 1
+
+    def remove(self, module_id: str) -> bool:
+        document = self.documents.pop(module_id, None)
+        if document is None:
+            return False
+        length, terms, _ = document
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(module_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= length
+        self._vocabulary = None
+        self.generation += 1
+        return True
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect_left(self._vocabulary, prefix)
+        expansions = []
+        for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            expansions.append(term)
+        return expansions
+
+    def _bm25(self, term: str) -> Dict[str, float]:
+        postings = self.postings.get(term)
+        if not postings:
+            return {}
+        n = len(self.documents)
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        average_length = self.total_length / n if n else 1.0
+        scores = {}
+        for module_id, frequency in postings.items():
+            length = self.documents[module_id][0]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            scores[module_id] = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        prefix: bool = True,
+        subject: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Modules correspondant à la requête, du plus pertinent au moins pertinent
+
+        Tous les mots doivent correspondre (le dernier par préfixe si prefix=True) ;
+        si aucun module ne les contient tous, les correspondances partielles sont renvoyées.
+        """
+        # Le dernier mot n'est pas ramené au singulier : c'est un début de mot en cours de saisie
+        raw_words = [w for w in normalize(query[:MAX_QUERY_LENGTH]) if w not in STOPWORDS]
+        if not raw_words:
+            return []
+
+        per_word: List[Dict[str, float]] = []
+        for i, word in enumerate(raw_words):
+            is_last = i == len(raw_words) - 1
+            scores = dict(self._bm25(_stem(word)))
+            if prefix and is_last and len(word) >= MIN_PREFIX_LENGTH:
+                for term in self._expand_prefix(word):
+                    for module_id, score in self._bm25(term).items():
+                        score *= PREFIX_FACTOR
+                        if score > scores.get(module_id, 0.0):
+                            scores[module_id] = score
+            per_word.append(scores)
+
+        matching = set(per_word[0])
+        for scores in per_word[1:]:
+            matching &= set(scores)
+        if not matching:
+            matching = set().union(*per_word)
+
+        results = []
+        for module_id in matching:
+            meta = self.documents[module_id][2]
+            if subject and meta.get("subject") != subject:
+                continue
+            if difficulty and meta.get("difficulty") != difficulty:
+                continue
+            results.append((module_id, sum(scores.get(module_id, 0.0) for scores in per_word)))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
+
+    def metadata(self, module_id: str) -> Dict[str, Any]:
+        return self.documents[module_id][2]
+
+
+class ModuleSearchService:
+    """Index partagé par le processus, chargé depuis MongoDB et tenu à jour"""
+
+    _index = ModuleSearchIndex()
+    _built = False
+    _synced_at: Optional[datetime] = None
+    _checked_at = 0.0
+    _lock: Optional[asyncio.Lock] = None
+    _cache: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def _get_lock() -> asyncio.Lock:
+        if ModuleSearchService._lock is None:
+            ModuleSearchService._lock = asyncio.Lock()
+        return ModuleSearchService._lock
+
+    @staticmethod
+    async def rebuild() -> int:
+        """Reconstruit l'index à partir de tous les modules"""
+        from app.database import get_database
+        db = get_database()
+        synced_at = datetime.now(timezone.utc)
+        modules = await db.modules.find({}, INDEX_PROJECTION).to_list(length=None)
+
+        index = ModuleSearchIndex()
+        for module in modules:
+            index.upsert(module)
+        index.generation = ModuleSearchService._index.generation + 1
+        ModuleSearchService._index = index
+        ModuleSearchService._built = True
+        ModuleSearchService._synced_at = synced_at
+        ModuleSearchService._checked_at = time.monotonic()
+        ModuleSearchService._cache.clear()
+        logger.info(f"Index de recherche des modules construit ({len(index)} modules)")
+        return len(index)
+
+    @staticmethod
+    async def _refresh() -> None:
+        """Applique les écritures faites par les autres workers depuis la dernière synchronisation"""
+        from app.database import get_database
+        db = get_database()
+        since = ModuleSearchService._synced_at
+        synced_at = datetime.now(timezone.utc)
+        changed = await db.modules.find(
+            {"$or": [{"updated_at": {"$gt": since}}, {"created_at": {"$gt": since}}]},
+            INDEX_PROJECTION
+        ).to_list(length=None)
+        for module in changed:
+            ModuleSearchService._index.upsert(module)
+        ModuleSearchService._synced_at = synced_at
+        ModuleSearchService._checked_at = time.monotonic()
+
+        # Suppressions faites ailleurs : détectées par le nombre de modules
+        if await db.modules.count_documents({}) != len(ModuleSearchService._index):
+            await ModuleSearchService.rebuild()
+
+    @staticmethod
+    async def ensure_fresh() -> None:
+        if ModuleSearchService._built and (
+            time.monotonic() - ModuleSearchService._checked_at < REFRESH_INTERVAL_SECONDS
+        ):
+            return
+        async with ModuleSearchService._get_lock():
+            if not ModuleSearchService._built:
+                await ModuleSearchService.rebuild()
+            elif time.monotonic() - ModuleSearchService._checked_at >= REFRESH_INTERVAL_SECONDS:
+                await ModuleSearchService._refresh()
+
+    @staticmethod
+    def on_module_saved(module: Dict[str, Any]) -> None:
+        """Mise à jour incrémentale après création ou modification d'un module"""
+        if ModuleSearchService._built and module:
+            ModuleSearchService._index.upsert(module)
+
+    @staticmethod
+    def on_module_deleted(module_id: str) -> None:
+        if ModuleSearchService._built:
+            ModuleSearchService._index.remove(module_id)
+
+    @staticmethod
+    async def search(
+        query: str,
+        limit: int = 20,
+        subject: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        prefix: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Recherche classée dans le catalogue
+
+        Returns:
+            Modules (id, title, description, subject, difficulty, score), plus pertinents en premier
+        """
+        await ModuleSearchService.ensure_fresh()
+        index = ModuleSearchService._index
+        normalized = " ".join(normalize(query[:MAX_QUERY_LENGTH]))
+        key = (index.generation, normalized, subject, difficulty, prefix)
+
+        cached = ModuleSearchService._cache.get(key)
+        if cached is None:
+            cached = [
+                {**index.metadata(module_id), "score": round(score, 4)}
+                for module_id, score in index.search(normalized, prefix, subject, difficulty)
+            ]
+            ModuleSearchService._cache[key] = cached
+            if len(ModuleSearchService._cache) > QUERY_CACHE_SIZE:
+                ModuleSearchService._cache.popitem(last=False)
+        else:
+            ModuleSearchService._cache.move_to_end(key)
+        return cached[:limit]
+
+    @staticmethod
+    async def matching_ids(query: str, limit: int = 1000) -> List[str]:
+        """Identifiants des modules correspondant à la requête (filtre de la liste paginée)"""
+        results = await ModuleSearchService.search(query, limit=limit)
+        return [result["id"] for result in results]
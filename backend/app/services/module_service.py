@@ -4,6 +4,7 @@ Service pour la gestion des modules - Business logic
 from typing import List, Dict, Any, Optional
 from app.repositories.module_repository import ModuleRepository
 from app.models import ModuleCreate, Subject, Difficulty
+from app.utils.cursor_pagination import InvalidCursorError
 from datetime import datetime
 import logging
 
@@ -14,21 +15,23 @@ class ModuleService:
     """Service pour la gestion des modules"""
     
     @staticmethod
-    async def get_modules(
+    async def get_modules_page(
         subject: Optional[Subject] = None,
         difficulty: Optional[Difficulty] = None,
         search: Optional[str] = None,
-        skip: int = 0,
-        limit: int = 100
-    ) -> List[Dict[str, Any]]:
-        """Récupère les modules avec filtres et recherche"""
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Récupère une page de modules avec filtres et recherche ({"modules", "next_cursor"})"""
         try:
-            result = await ModuleRepository.find_all(subject, difficulty, search, skip, limit)
-            return result or []
+            modules, next_cursor = await ModuleRepository.find_page(subject, difficulty, search, limit, cursor)
+            return {"modules": modules or [], "next_cursor": next_cursor}
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            logger.error(f"Erreur dans ModuleService.get_modules: {e}", exc_info=True)
+            logger.error(f"Erreur dans ModuleService.get_modules_page: {e}", exc_info=True)
             # Retourner une liste vide en cas d'erreur
-            return []
+            return {"modules": [], "next_cursor": None}
     
     @staticmethod
     async def get_module(module_id: str) -> Dict[str, Any]:
@@ -3,46 +3,15 @@ Service OpenAI pour générer du contenu pédagogique (TD, TP, Quiz)
 Application d'apprentissage immersive
 """
 from typing import Dict, Any, List, Optional
-from openai import OpenAI, APIError, RateLimitError
 from app.config import settings
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 from app.repositories.module_repository import ModuleRepository
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
-# Initialiser le client OpenAI
-client = None
-
-def _initialize_openai_client():
-    """Initialise le client OpenAI"""
-    global client
-    if settings.openai_api_key:
-        try:
-            import httpx
-            http_client_kwargs = {
-                "timeout": 120.0,
-                "limits": httpx.Limits(max_keepalive_connections=5, max_connections=10)
-            }
-            
-            proxy = getattr(settings, "openai_proxy", None)
-            if proxy:
-                http_client_kwargs["proxy"] = proxy
-            
-            http_client = httpx.Client(**http_client_kwargs)
-            client = OpenAI(
-                api_key=settings.openai_api_key,
-                http_client=http_client
-            )
-            logger.info("✅ Client OpenAI initialisé pour génération de contenu")
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de l'initialisation OpenAI: {e}")
-            client = None
-    else:
-        logger.warning("⚠️ OpenAI API key non configurée")
-
-_initialize_openai_client()
-
 
 class OpenAIContentGenerator:
     """Service pour générer du contenu pédagogique avec OpenAI"""
@@ -68,7 +37,7 @@ class OpenAIContentGenerator:
         Returns:
             Dict avec le TD généré
         """
-        if not client:
+        if not AIGateway.is_available():
             logger.warning("OpenAI non configuré, retour d'un TD exemple")
             return {
                 "title": f"TD - {module_title}",
@@ -131,7 +100,7 @@ FORMAT: JSON valide uniquement, pas de markdown"""
                 "temperature": 0.7,
             }
             create_params.update(_get_max_tokens_param(settings.gpt_5_mini_model, 3000))
-            response = client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="td_generation", **create_params)
             
             content = response.choices[0].message.content.strip()
             
@@ -144,7 +113,9 @@ FORMAT: JSON valide uniquement, pas de markdown"""
                 content = content[:-3]
             content = content.strip()
             
-            td_data = json.loads(content)
+            td_data = safe_json_loads(content)
+            if not isinstance(td_data, dict):
+                raise json.JSONDecodeError("Aucun objet JSON exploitable", content, 0)
             logger.info(f"✅ TD généré pour {module_title}")
             return td_data
             
@@ -177,7 +148,7 @@ FORMAT: JSON valide uniquement, pas de markdown"""
         Returns:
             Dict avec le TP généré
         """
-        if not client:
+        if not AIGateway.is_available():
             logger.warning("OpenAI non configuré, retour d'un TP exemple")
             return {
                 "title": f"TP - {module_title}",
@@ -278,7 +249,7 @@ FORMAT: JSON valide uniquement, pas de markdown"""
                 "temperature": 0.3 if model_to_use == settings.gpt_5_2_model else 0.7,
             }
             create_params.update(_get_max_tokens_param(model_to_use, max_tokens_value))
-            response = client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="tp_generation", **create_params)
             
             content = response.choices[0].message.content.strip()
             
@@ -291,7 +262,9 @@ FORMAT: JSON valide uniquement, pas de markdown"""
                 content = content[:-3]
             content = content.strip()
             
-            tp_data = json.loads(content)
+            tp_data = safe_json_loads(content)
+            if not isinstance(tp_data, dict):
+                raise json.JSONDecodeError("Aucun objet JSON exploitable", content, 0)
             logger.info(f"✅ TP généré pour {module_title}")
             return tp_data
             
@@ -326,7 +299,7 @@ FORMAT: JSON valide uniquement, pas de markdown"""
         Returns:
             Liste de questions de quiz
         """
-        if not client:
+        if not AIGateway.is_available():
             logger.warning("OpenAI non configuré, retour de questions exemple")
             return [
                 {
@@ -384,7 +357,7 @@ FORMAT: JSON valide uniquement, tableau de questions"""
                 "temperature": 0.8,
             }
             create_params.update(_get_max_tokens_param(nano_model, 2000))
-            response = client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="quiz_generation", **create_params)
             
             content = response.choices[0].message.content.strip()
             
@@ -435,7 +408,7 @@ FORMAT: JSON valide uniquement, tableau de questions"""
         Returns:
             Dict avec la réponse et suggestions
         """
-        if not client:
+        if not AIGateway.is_available():
             return {
                 "response": "Mode démo: OpenAI non configuré. Configurez OPENAI_API_KEY pour activer l'assistant IA.",
                 "suggestions": []
@@ -495,7 +468,7 @@ LANGUE: Réponds TOUJOURS en {language}"""
                 "temperature": 0.7,
             }
             create_params.update(_get_max_tokens_param(settings.gpt_5_mini_model, 1000))
-            response = client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="student_chat", **create_params)
             
             ai_response = response.choices[0].message.content.strip()
             
@@ -2,51 +2,20 @@
 Service OpenAI pour générer du contenu pédagogique avec les modèles GPT-5.2, GPT-5-mini, GPT-5-nano
 Selon les spécifications fournies
 """
-import asyncio
 import json
 import logging
 from typing import Dict, Any, List, Optional
-from openai import OpenAI, APIError, RateLimitError, APIConnectionError, APITimeoutError
 from app.config import settings
 from app.repositories.module_repository import ModuleRepository
-from app.utils.retry import retry_with_backoff
+from app.services.ai_gateway import AIGateway
 from app.models import Subject, Difficulty, QuizQuestion, TDExercise, TPStep
 
 logger = logging.getLogger(__name__)
 
-# Initialiser le client OpenAI
-openai_client = None
 GPT_5_2_MODEL = "gpt-5.2"  # Expert - Raisonnement complexe
 GPT_5_MINI_MODEL = "gpt-5-mini"  # Principal - Pédagogique
 GPT_5_NANO_MODEL = "gpt-5-nano"  # Rapide - Économique
 
-def _initialize_openai_client():
-    """Initialise le client OpenAI"""
-    global openai_client
-    if settings.openai_api_key:
-        try:
-            import httpx
-            http_client_kwargs = {
-                "timeout": 120.0,
-                "limits": httpx.Limits(max_keepalive_connections=10, max_connections=50)
-            }
-            proxy = getattr(settings, "openai_proxy", None)
-            if proxy:
-                http_client_kwargs["proxy"] = proxy
-            http_client = httpx.Client(**http_client_kwargs)
-            openai_client = OpenAI(
-                api_key=settings.openai_api_key,
-                http_client=http_client
-            )
-            logger.info("✅ Client OpenAI initialisé avec succès")
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de l'initialisation OpenAI: {e}")
-            openai_client = None
-    else:
-        logger.warning("⚠️ OpenAI API key non configurée")
-
-_initialize_openai_client()
-
 
 class OpenAIContentGeneratorV2:
     """Service pour la génération de contenu éducatif avec les modèles GPT-5.2, GPT-5-mini, GPT-5-nano"""
@@ -59,35 +28,23 @@ class OpenAIContentGeneratorV2:
         max_tokens: int = 2000,
         response_format: Optional[Dict[str, str]] = None
     ) -> str:
-        """Appelle l'API OpenAI avec retry"""
-        if not openai_client:
+        """Appelle l'API OpenAI via la passerelle IA (retry, circuit breaker, comptage des tokens)"""
+        if not AIGateway.is_available():
             raise ValueError("OpenAI client non initialisé. Vérifiez OPENAI_API_KEY.")
         
-        async def _do_call():
-            from app.services.ai_service import _get_max_tokens_param
-            params = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-            }
-            # Utiliser _get_max_tokens_param pour gérer max_tokens vs max_completion_tokens
-            params.update(_get_max_tokens_param(model, max_tokens))
-            if response_format:
-                params["response_format"] = response_format
-            
-            response = await asyncio.to_thread(
-                openai_client.chat.completions.create,
-                **params
-            )
-            return response.choices[0].message.content
+        from app.services.ai_service import _get_max_tokens_param
+        params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        # Utiliser _get_max_tokens_param pour gérer max_tokens vs max_completion_tokens
+        params.update(_get_max_tokens_param(model, max_tokens))
+        if response_format:
+            params["response_format"] = response_format
         
-        return await retry_with_backoff(
-            _do_call,
-            max_retries=3,
-            initial_delay=1.0,
-            max_delay=10.0,
-            exceptions=(APIConnectionError, APITimeoutError, RateLimitError)
-        )
+        response = await AIGateway.chat_completion(feature="content_generation", **params)
+        return response.choices[0].message.content
     
     @staticmethod
     async def generate_td_advanced(
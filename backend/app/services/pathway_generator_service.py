@@ -18,7 +18,9 @@ from app.repositories.module_repository import ModuleRepository
 from app.repositories.progress_repository import ProgressRepository as ProgressRepo
 from app.repositories.learning_profile_repository import LearningProfileRepository
 from app.services.prerequisite_detector import PrerequisiteDetector
-from app.services.ai_service import client, AI_MODEL
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 import logging
 import json
 
@@ -212,7 +214,7 @@ class PathwayGeneratorService:
         """
         Utilise l'IA pour ordonner les modules de manière optimale
         """
-        if not client or len(modules) <= 1:
+        if not AIGateway.is_available() or len(modules) <= 1:
             # Si pas d'IA ou un seul module, retourner tel quel
             return modules
         
@@ -259,35 +261,30 @@ Réponds UNIQUEMENT avec un JSON contenant les IDs dans l'ordre optimal :
                 "temperature": 0.3
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 1000))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="pathway_generation", **create_params)
             
             response_text = response.choices[0].message.content
             
             # Extraire le JSON
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    result = json.loads(response_text[json_start:json_end])
-                    ordered_ids = result.get("ordered_module_ids", [])
-                    
-                    # Créer un mapping ID -> module
-                    module_map = {m.get("id"): m for m in modules}
-                    
-                    # Réordonner selon l'ordre IA
-                    ordered_modules = []
-                    for module_id in ordered_ids:
-                        if module_id in module_map:
-                            ordered_modules.append(module_map[module_id])
-                    
-                    # Ajouter les modules non ordonnés par l'IA
-                    for module in modules:
-                        if module.get("id") not in ordered_ids:
-                            ordered_modules.append(module)
-                    
-                    return ordered_modules
-            except json.JSONDecodeError:
-                pass
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict):
+                ordered_ids = result.get("ordered_module_ids", [])
+                
+                # Créer un mapping ID -> module
+                module_map = {m.get("id"): m for m in modules}
+                
+                # Réordonner selon l'ordre IA
+                ordered_modules = []
+                for module_id in ordered_ids:
+                    if module_id in module_map:
+                        ordered_modules.append(module_map[module_id])
+                
+                # Ajouter les modules non ordonnés par l'IA
+                for module in modules:
+                    if module.get("id") not in ordered_ids:
+                        ordered_modules.append(module)
+                
+                return ordered_modules
             
             # Fallback : ordre par difficulté
             return sorted(modules, key=lambda m: {
@@ -312,7 +309,7 @@ Réponds UNIQUEMENT avec un JSON contenant les IDs dans l'ordre optimal :
         num_modules: int
     ) -> tuple[str, str]:
         """Génère un titre et une description pour le parcours"""
-        if not client:
+        if not AIGateway.is_available():
             return (
                 f"Parcours {subject.value.capitalize()} - Niveau {target_level.value}",
                 f"Un parcours complet de {num_modules} modules pour maîtriser {subject.value} au niveau {target_level.value}."
@@ -340,18 +337,13 @@ Réponds en JSON :
                 "temperature": 0.7
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 300))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="pathway_generation", **create_params)
             
             response_text = response.choices[0].message.content
             
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    result = json.loads(response_text[json_start:json_end])
-                    return result.get("title", ""), result.get("description", "")
-            except json.JSONDecodeError:
-                pass
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict):
+                return result.get("title", ""), result.get("description", "")
             
             # Fallback
             return (
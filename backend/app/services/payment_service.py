@@ -1,28 +1,54 @@
 """
 Service pour les paiements Stripe
 Intégration complète avec Stripe pour abonnements
+
+Le SDK stripe est synchrone : ses appels réseau sont exécutés dans un thread
+(asyncio.to_thread) pour ne pas bloquer la boucle d'événements. Les webhooks
+sont acquittés dès la signature vérifiée et l'événement enregistré ; leur
+application est faite par StripeWebhookQueue.
 """
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone
-try:
-    import stripe
-except ImportError:
-    stripe = None
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.warning("Stripe non installé - fonctionnalités de paiement désactivées")
 from app.config import settings
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialiser Stripe si disponible
-if stripe:
-    stripe.api_key = getattr(settings, 'stripe_secret_key', None)
-    if not stripe.api_key:
-        logger.warning("STRIPE_SECRET_KEY non configuré - Fonctionnalités de paiement désactivées")
-else:
-    logger.warning("Stripe non installé - Installez avec: pip install stripe")
+# Module stripe chargé au premier paiement (False = non installé)
+_stripe = None
+
+
+def _get_stripe():
+    """
+    Importe et configure stripe à la première utilisation
+
+    L'import de stripe est coûteux : il n'est payé que par les workers
+    qui traitent effectivement un paiement.
+    """
+    global _stripe
+    if _stripe is None:
+        try:
+            import stripe
+            stripe.api_key = getattr(settings, 'stripe_secret_key', None)
+            if not stripe.api_key:
+                logger.warning("STRIPE_SECRET_KEY non configuré - Fonctionnalités de paiement désactivées")
+            _stripe = stripe
+        except ImportError:
+            logger.warning("Stripe non installé - Installez avec: pip install stripe")
+            _stripe = False
+    return _stripe or None
+
+
+def subscription_key(event: Dict[str, Any]) -> str:
+    """Abonnement concerné par un événement (clé d'ordonnancement), ou l'id de l'événement"""
+    obj = event.get("data", {}).get("object", {})
+    if event.get("type", "").startswith("customer.subscription."):
+        key = obj.get("id")
+    else:
+        key = obj.get("subscription")
+    return key or event["id"]
 
 
 class PaymentService:
@@ -38,6 +64,7 @@ class PaymentService:
         """
         Crée une session de checkout Stripe pour un abonnement
         """
+        stripe = _get_stripe()
         try:
             if not stripe:
                 raise ValueError("Stripe non installé. Installez avec: pip install stripe")
@@ -63,8 +90,9 @@ class PaymentService:
             
             price_info = prices[plan]
             
-            # Créer la session de checkout
-            checkout_session = stripe.checkout.Session.create(
+            # Créer la session de checkout (appel HTTP synchrone, hors boucle)
+            checkout_session = await asyncio.to_thread(
+                stripe.checkout.Session.create,
                 customer_email=None,  # Sera rempli par l'utilisateur
                 payment_method_types=['card'],
                 line_items=[{
@@ -116,135 +144,167 @@ class PaymentService:
     @staticmethod
     async def handle_webhook(payload: bytes, signature: str) -> Dict[str, Any]:
         """
-        Traite un webhook Stripe
+        Reçoit un webhook Stripe : vérifie la signature, enregistre l'événement
+        et le met en file. Répond sans attendre son application.
+
+        Raises:
+            ValueError: signature invalide ou payload illisible (400)
         """
+        stripe = _get_stripe()
+        if not stripe:
+            return {"status": "ignored", "reason": "stripe_not_installed"}
+
+        webhook_secret = getattr(settings, 'stripe_webhook_secret', None)
+        if not webhook_secret:
+            logger.warning("STRIPE_WEBHOOK_SECRET non configuré")
+            return {"status": "ignored", "reason": "webhook_secret_not_configured"}
+
+        # HMAC local, sans appel réseau : exécuté directement
         try:
-            if not stripe:
-                return {"status": "ignored", "reason": "stripe_not_installed"}
-            
-            webhook_secret = getattr(settings, 'stripe_webhook_secret', None)
-            if not webhook_secret:
-                logger.warning("STRIPE_WEBHOOK_SECRET non configuré")
-                return {"status": "ignored", "reason": "webhook_secret_not_configured"}
-            
-            event = stripe.Webhook.construct_event(
-                payload, signature, webhook_secret
-            )
-            
-            # Gérer les événements
-            if event['type'] == 'checkout.session.completed':
-                session = event['data']['object']
-                await PaymentService._handle_subscription_created(session)
-            elif event['type'] == 'customer.subscription.updated':
-                subscription = event['data']['object']
-                await PaymentService._handle_subscription_updated(subscription)
-            elif event['type'] == 'customer.subscription.deleted':
-                subscription = event['data']['object']
-                await PaymentService._handle_subscription_cancelled(subscription)
-            elif event['type'] == 'invoice.payment_succeeded':
-                invoice = event['data']['object']
-                await PaymentService._handle_payment_succeeded(invoice)
-            elif event['type'] == 'invoice.payment_failed':
-                invoice = event['data']['object']
-                await PaymentService._handle_payment_failed(invoice)
-            
-            return {"status": "processed", "event_type": event['type']}
-            
-        except ValueError as e:
+            stripe.WebhookSignature.verify_header(payload, signature, webhook_secret)
+            event = json.loads(payload)
+        except stripe.error.SignatureVerificationError as e:
+            logger.warning(f"Signature webhook Stripe invalide: {e}")
+            raise ValueError("Signature Stripe invalide")
+        except (ValueError, UnicodeDecodeError) as e:
             logger.error(f"Erreur webhook: {e}", exc_info=True)
-            raise
-        except Exception as e:
-            logger.error(f"Erreur traitement webhook: {e}", exc_info=True)
-            return {"status": "error", "error": str(e)}
-    
+            raise ValueError("Payload Stripe invalide")
+        if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+            raise ValueError("Payload Stripe invalide")
+
+        from app.repositories.stripe_event_repository import StripeEventRepository
+        from app.services.stripe_webhook_queue import StripeWebhookQueue
+
+        key = subscription_key(event)
+        is_new = await StripeEventRepository.insert_if_new({
+            "_id": event["id"],
+            "type": event["type"],
+            "created": event.get("created", 0),
+            "subscription_key": key,
+            "event": event
+        })
+        if not is_new:
+            logger.info(f"Événement Stripe {event['id']} déjà reçu - ignoré")
+            return {"status": "duplicate", "event_type": event["type"]}
+
+        StripeWebhookQueue.enqueue(event["id"], key)
+        return {"status": "queued", "event_type": event["type"]}
+
     @staticmethod
-    async def _handle_subscription_created(session: Dict[str, Any]):
+    async def apply_event(event: Dict[str, Any]) -> None:
+        """
+        Applique un événement Stripe aux abonnements (appelé par StripeWebhookQueue)
+
+        Les erreurs sont propagées pour que l'événement soit retenté.
+        """
+        event_type = event["type"]
+        obj = event["data"]["object"]
+        created = event.get("created", 0)
+        if event_type == 'checkout.session.completed':
+            await PaymentService._handle_subscription_created(obj, created)
+        elif event_type == 'customer.subscription.updated':
+            await PaymentService._handle_subscription_updated(obj, created)
+        elif event_type == 'customer.subscription.deleted':
+            await PaymentService._handle_subscription_cancelled(obj, created)
+        elif event_type == 'invoice.payment_succeeded':
+            await PaymentService._handle_payment_succeeded(obj, created)
+        elif event_type == 'invoice.payment_failed':
+            await PaymentService._handle_payment_failed(obj, created)
+
+        # Le plan ou le statut a pu changer : droits en cache à relire
+        from app.repositories.subscription_repository import SubscriptionRepository
+        from app.services.entitlements_service import EntitlementsService
+        user_id = (obj.get('metadata') or {}).get('user_id')
+        stripe_subscription_id = subscription_key(event)
+        if not user_id and stripe_subscription_id != event["id"]:
+            user_id = await SubscriptionRepository.find_user_id_by_stripe_id(stripe_subscription_id)
+        if user_id:
+            await EntitlementsService.invalidate(user_id)
+
+    @staticmethod
+    async def _handle_subscription_created(session: Dict[str, Any], created: int):
         """Gère la création d'un abonnement"""
-        try:
-            user_id = session['metadata'].get('user_id')
-            plan = session['metadata'].get('plan')
-            subscription_id = session.get('subscription')
-            
-            if user_id and plan:
-                from app.repositories.subscription_repository import SubscriptionRepository
-                await SubscriptionRepository.create_subscription({
-                    "user_id": user_id,
-                    "plan": plan,
-                    "stripe_subscription_id": subscription_id,
-                    "stripe_customer_id": session.get('customer'),
-                    "status": "active",
-                    "start_date": datetime.now(timezone.utc),
-                    "auto_renew": True,
-                    "created_at": datetime.now(timezone.utc)
-                })
-                logger.info(f"Abonnement créé pour utilisateur {user_id}, plan {plan}")
-        except Exception as e:
-            logger.error(f"Erreur lors de la création d'abonnement: {e}", exc_info=True)
-    
+        user_id = (session.get('metadata') or {}).get('user_id')
+        plan = (session.get('metadata') or {}).get('plan')
+        subscription_id = session.get('subscription')
+        if not (user_id and plan):
+            return
+
+        from app.repositories.subscription_repository import SubscriptionRepository
+        identity = {
+            "user_id": user_id,
+            "plan": plan,
+            "stripe_customer_id": session.get('customer'),
+            "auto_renew": True,
+            "start_date": datetime.now(timezone.utc)
+        }
+        if subscription_id:
+            # Les événements de l'abonnement ou des factures peuvent arriver avant le
+            # checkout : l'identité est toujours écrite, le statut "active" seulement
+            # si aucun événement de statut (abonnement, échec de paiement) ne l'a déjà fixé
+            await SubscriptionRepository.apply_stripe_update(subscription_id, identity, event_created=None)
+            await SubscriptionRepository.activate_unless_status_event(subscription_id, created)
+        else:
+            await SubscriptionRepository.create_subscription({
+                **identity,
+                "stripe_subscription_id": None,
+                "status": "active",
+                "created_at": datetime.now(timezone.utc)
+            })
+        logger.info(f"Abonnement créé pour utilisateur {user_id}, plan {plan}")
+
     @staticmethod
-    async def _handle_subscription_updated(subscription: Dict[str, Any]):
+    async def _handle_subscription_updated(subscription: Dict[str, Any], created: int):
         """Gère la mise à jour d'un abonnement"""
-        try:
-            subscription_id = subscription.get('id')
-            status = subscription.get('status')
-            
-            from app.repositories.subscription_repository import SubscriptionRepository
-            await SubscriptionRepository.update_by_stripe_id(
-                subscription_id,
-                {"status": status}
-            )
+        subscription_id = subscription.get('id')
+        status = subscription.get('status')
+
+        from app.repositories.subscription_repository import SubscriptionRepository
+        if await SubscriptionRepository.apply_stripe_update(
+            subscription_id, {"status": status}, created
+        ):
             logger.info(f"Abonnement {subscription_id} mis à jour: {status}")
-        except Exception as e:
-            logger.error(f"Erreur lors de la mise à jour: {e}", exc_info=True)
-    
+
     @staticmethod
-    async def _handle_subscription_cancelled(subscription: Dict[str, Any]):
+    async def _handle_subscription_cancelled(subscription: Dict[str, Any], created: int):
         """Gère l'annulation d'un abonnement"""
-        try:
-            subscription_id = subscription.get('id')
-            
-            from app.repositories.subscription_repository import SubscriptionRepository
-            await SubscriptionRepository.update_by_stripe_id(
-                subscription_id,
-                {
-                    "status": "cancelled",
-                    "end_date": datetime.now(timezone.utc)
-                }
-            )
+        subscription_id = subscription.get('id')
+
+        from app.repositories.subscription_repository import SubscriptionRepository
+        if await SubscriptionRepository.apply_stripe_update(
+            subscription_id,
+            {"status": "cancelled", "end_date": datetime.now(timezone.utc)},
+            created
+        ):
             logger.info(f"Abonnement {subscription_id} annulé")
-        except Exception as e:
-            logger.error(f"Erreur lors de l'annulation: {e}", exc_info=True)
-    
+
     @staticmethod
-    async def _handle_payment_succeeded(invoice: Dict[str, Any]):
+    async def _handle_payment_succeeded(invoice: Dict[str, Any], created: int):
         """Gère un paiement réussi"""
-        try:
-            subscription_id = invoice.get('subscription')
-            if subscription_id:
-                from app.repositories.subscription_repository import SubscriptionRepository
-                await SubscriptionRepository.update_by_stripe_id(
-                    subscription_id,
-                    {"last_payment_date": datetime.now(timezone.utc)}
-                )
-                logger.info(f"Paiement réussi pour abonnement {subscription_id}")
-        except Exception as e:
-            logger.error(f"Erreur lors du traitement du paiement: {e}", exc_info=True)
-    
+        subscription_id = invoice.get('subscription')
+        if subscription_id:
+            from app.repositories.subscription_repository import SubscriptionRepository
+            await SubscriptionRepository.apply_stripe_update(
+                subscription_id,
+                {"last_payment_date": datetime.now(timezone.utc)},
+                created,
+                watermark="payment_event_at"
+            )
+            logger.info(f"Paiement réussi pour abonnement {subscription_id}")
+
     @staticmethod
-    async def _handle_payment_failed(invoice: Dict[str, Any]):
+    async def _handle_payment_failed(invoice: Dict[str, Any], created: int):
         """Gère un échec de paiement"""
-        try:
-            subscription_id = invoice.get('subscription')
-            if subscription_id:
-                from app.repositories.subscription_repository import SubscriptionRepository
-                await SubscriptionRepository.update_by_stripe_id(
-                    subscription_id,
-                    {"status": "payment_failed"}
-                )
-                logger.warning(f"Échec de paiement pour abonnement {subscription_id}")
-        except Exception as e:
-            logger.error(f"Erreur lors du traitement de l'échec: {e}", exc_info=True)
-    
+        subscription_id = invoice.get('subscription')
+        if subscription_id:
+            from app.repositories.subscription_repository import SubscriptionRepository
+            await SubscriptionRepository.apply_stripe_update(
+                subscription_id,
+                {"status": "payment_failed"},
+                created
+            )
+            logger.warning(f"Échec de paiement pour abonnement {subscription_id}")
+
     @staticmethod
     async def cancel_subscription(user_id: str) -> bool:
         """
@@ -258,8 +318,10 @@ class PaymentService:
                 return False
             
             stripe_subscription_id = subscription.get('stripe_subscription_id')
+            stripe = _get_stripe() if stripe_subscription_id else None
             if stripe_subscription_id and stripe:
-                stripe.Subscription.modify(
+                await asyncio.to_thread(
+                    stripe.Subscription.modify,
                     stripe_subscription_id,
                     cancel_at_period_end=True
                 )
@@ -268,10 +330,11 @@ class PaymentService:
                 stripe_subscription_id,
                 {"auto_renew": False}
             )
+            from app.services.entitlements_service import EntitlementsService
+            await EntitlementsService.invalidate(user_id)
             
             return True
             
         except Exception as e:
             logger.error(f"Erreur lors de l'annulation: {e}", exc_info=True)
             return False
-
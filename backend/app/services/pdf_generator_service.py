@@ -2,7 +2,8 @@
 Service pour générer automatiquement des TD et TP en format PDF
 """
 from typing import Dict, Any, List, Optional
-from app.services.ai_service import AIService, client, AI_MODEL
+from app.services.ai_service import AIService, AI_MODEL
+from app.services.ai_gateway import AIGateway
 from app.services.exercise_generator_service import ExerciseGeneratorService
 from app.repositories.td_repository import TDRepository
 from app.repositories.tp_repository import TPRepository
@@ -248,7 +249,7 @@ class PDFGeneratorService:
         lesson_summary: Optional[str] = None
     ) -> Dict[str, Any]:
         """Génère le contenu d'un TD via l'IA basé sur une leçon"""
-        if not client:
+        if not AIGateway.is_available():
             error_msg = "OpenAI client non disponible - Vérifiez que OPENAI_API_KEY est configuré dans .env et redémarrez le backend"
             logger.error(error_msg)
             logger.error("La génération TD/TP nécessite une clé API OpenAI valide")
@@ -355,11 +356,10 @@ Génère le TD avec EXACTEMENT 6 à 10 exercices au format JSON ci-dessus."""
             if not AI_MODEL.startswith("gpt-3.5"):
                 create_params["response_format"] = {"type": "json_object"}
             
-            # client.chat.completions.create() est synchrone, utiliser asyncio.to_thread
             logger.info(f"Appel OpenAI pour génération TD - Modèle: {AI_MODEL}, Leçon: {lesson_title}")
             logger.info(f"Paramètres de l'appel: model={AI_MODEL}, messages_count={len(create_params['messages'])}")
             try:
-                response = await asyncio.to_thread(client.chat.completions.create, **create_params)
+                response = await AIGateway.chat_completion(feature="td_generation", **create_params)
                 logger.info(f"✅ Réponse OpenAI reçue pour '{lesson_title}'")
             except Exception as api_error:
                 logger.error(f"❌ ERREUR API OpenAI lors de l'appel: {type(api_error).__name__}: {api_error}")
@@ -386,38 +386,25 @@ Génère le TD avec EXACTEMENT 6 à 10 exercices au format JSON ci-dessus."""
             
             logger.debug(f"Premiers 200 caractères: {response_text[:200]}")
             
-            # Parser le JSON
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            logger.info(f"Recherche JSON: start={json_start}, end={json_end}")
+            # Parser le JSON (extraction de l'objet et réparation en une passe)
+            logger.info(f"Parsing JSON ({len(response_text)} caractères)")
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict) and result:
+                exercises = result.get('exercises', [])
+                num_exercises = len(exercises)
+                
+                # Valider que le nombre d'exercices est entre 6 et 10
+                if num_exercises < 6:
+                    logger.warning(f"⚠️ Seulement {num_exercises} exercices générés pour le chapitre '{lesson_title}', attendu 6 à 10")
+                elif num_exercises > 10:
+                    logger.warning(f"⚠️ {num_exercises} exercices générés pour le chapitre '{lesson_title}', attendu 6 à 10 (sera utilisé tel quel)")
+                else:
+                    logger.info(f"✅ TD généré avec succès - {num_exercises} exercices (conforme : 6-10)")
+                
+                return result
             
-            if json_start >= 0 and json_end > json_start:
-                json_content = response_text[json_start:json_end]
-                logger.info(f"Parsing JSON ({len(json_content)} caractères)")
-                try:
-                    result = safe_json_loads(json_content)
-                    if result:
-                        exercises = result.get('exercises', [])
-                        num_exercises = len(exercises)
-                        
-                        # Valider que le nombre d'exercices est entre 6 et 10
-                        if num_exercises < 6:
-                            logger.warning(f"⚠️ Seulement {num_exercises} exercices générés pour le chapitre '{lesson_title}', attendu 6 à 10")
-                        elif num_exercises > 10:
-                            logger.warning(f"⚠️ {num_exercises} exercices générés pour le chapitre '{lesson_title}', attendu 6 à 10 (sera utilisé tel quel)")
-                        else:
-                            logger.info(f"✅ TD généré avec succès - {num_exercises} exercices (conforme : 6-10)")
-                        
-                        return result
-                    else:
-                        logger.error(f"❌ Impossible de parser le JSON du TD")
-                        logger.error(f"Contenu problématique: {json_content[:1000]}")
-                        return None
-                except Exception as parse_error:
-                    logger.error(f"❌ Erreur inattendue lors du parsing: {parse_error}", exc_info=True)
-                    return None
-            
-            logger.warning(f"⚠️ JSON non trouvé dans la réponse. Réponse: {response_text[:500]}")
+            logger.error(f"❌ Impossible de parser le JSON du TD")
+            logger.error(f"Contenu problématique: {response_text[:1000]}")
             return None
             
         except Exception as e:
@@ -432,7 +419,7 @@ Génère le TD avec EXACTEMENT 6 à 10 exercices au format JSON ci-dessus."""
         lesson_summary: Optional[str] = None
     ) -> Dict[str, Any]:
         """Génère le contenu d'un TP via l'IA basé sur une leçon"""
-        if not client:
+        if not AIGateway.is_available():
             error_msg = "OpenAI client non disponible - Vérifiez que OPENAI_API_KEY est configuré dans .env et redémarrez le backend"
             logger.error(error_msg)
             logger.error("La génération TD/TP nécessite une clé API OpenAI valide")
@@ -560,11 +547,10 @@ Génère le TP au format JSON ci-dessus."""
             if not actual_model.startswith("gpt-3.5"):
                 create_params["response_format"] = {"type": "json_object"}
             
-            # client.chat.completions.create() est synchrone, utiliser asyncio.to_thread
             logger.info(f"Appel OpenAI pour génération TP - Modèle: {actual_model}, Leçon: {lesson_title}")
             logger.info(f"Paramètres de l'appel TP: model={actual_model}, messages_count={len(create_params['messages'])}")
             try:
-                response = await asyncio.to_thread(client.chat.completions.create, **create_params)
+                response = await AIGateway.chat_completion(feature="tp_generation", **create_params)
                 logger.info(f"✅ Réponse OpenAI reçue pour TP '{lesson_title}'")
             except Exception as api_error:
                 logger.error(f"❌ ERREUR API OpenAI lors de l'appel TP: {type(api_error).__name__}: {api_error}")
@@ -591,20 +577,13 @@ Génère le TP au format JSON ci-dessus."""
             logger.debug(f"Réponse OpenAI reçue ({len(response_text)} caractères) pour '{lesson_title}'")
             
             # Parser le JSON
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                json_content = response_text[json_start:json_end]
-                result = safe_json_loads(json_content)
-                if result:
-                    logger.info(f"TP généré avec succès pour '{lesson_title}' - {len(result.get('steps', []))} étapes")
-                    return result
-                else:
-                    logger.error(f"Erreur de parsing JSON pour le TP de '{lesson_title}'")
-                    logger.error(f"Contenu JSON problématique: {json_content[:500]}")
-                    return None
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict) and result:
+                logger.info(f"TP généré avec succès pour '{lesson_title}' - {len(result.get('steps', []))} étapes")
+                return result
             
-            logger.warning(f"Impossible de trouver du JSON dans la réponse pour le TP de '{lesson_title}'. Réponse: {response_text[:500]}")
+            logger.error(f"Erreur de parsing JSON pour le TP de '{lesson_title}'")
+            logger.error(f"Contenu JSON problématique: {response_text[:500]}")
             return None
             
         except Exception as e:
@@ -1121,7 +1100,7 @@ Génère le TP au format JSON ci-dessus."""
         logger.info(f"Début de la génération pour {len(new_lessons)} leçon(s)")
         
         # Vérifier que le client OpenAI est disponible
-        if not client:
+        if not AIGateway.is_available():
             error_msg = "Client OpenAI non initialisé. Vérifiez que OPENAI_API_KEY est configuré dans .env et redémarrez le backend."
             logger.error(error_msg)
             results["errors"].append({
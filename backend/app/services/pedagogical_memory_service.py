@@ -1,21 +1,92 @@
 """
 Service pour la gestion de la mémoire pédagogique utilisateur
 """
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from app.repositories.pedagogical_memory_repository import PedagogicalMemoryRepository
+import copy
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Durée de vie (secondes) d'un instantané de mémoire en cache par utilisateur
+SNAPSHOT_CACHE_TTL = 30
+# Nombre maximal d'utilisateurs dont l'instantané est gardé (les moins récemment lus sont évincés)
+SNAPSHOT_CACHE_SIZE = 10000
+
+DEFAULT_LEARNING_STYLE = {
+    "preferred_format": "balanced",
+    "detail_level": "medium",
+    "examples_preference": True,
+    "visual_aids_preference": True
+}
+
 
 class PedagogicalMemoryService:
     """Service pour la gestion de la mémoire pédagogique"""
     
+    # Instantanés en mémoire : user_id -> (expiration, document)
+    _snapshot_cache: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+
+    @staticmethod
+    async def get_snapshot(user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Charge la mémoire pédagogique une seule fois pour toute la requête
+
+        Le document est conservé SNAPSHOT_CACHE_TTL secondes par utilisateur ;
+        les mutations passant par ce service invalident l'instantané.
+        """
+        cache = PedagogicalMemoryService._snapshot_cache
+        cached = cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            cache.move_to_end(user_id)
+            return copy.deepcopy(cached[1])
+
+        memory = await PedagogicalMemoryRepository.find_by_user(user_id)
+        cache[user_id] = (time.monotonic() + SNAPSHOT_CACHE_TTL, memory)
+        cache.move_to_end(user_id)
+        if len(cache) > SNAPSHOT_CACHE_SIZE:
+            cache.popitem(last=False)
+        return copy.deepcopy(memory)
+
+    @staticmethod
+    def invalidate_snapshot(user_id: Optional[str] = None) -> None:
+        """Vide l'instantané d'un utilisateur (ou de tous)"""
+        if user_id is None:
+            PedagogicalMemoryService._snapshot_cache.clear()
+        else:
+            PedagogicalMemoryService._snapshot_cache.pop(user_id, None)
+
+    @staticmethod
+    def _subject_level(memory: Optional[Dict[str, Any]], subject: str) -> str:
+        subject_levels = (memory or {}).get("subject_levels") or {}
+        subject_key = subject.replace(".", "_").replace("$", "_")
+        entry = subject_levels.get(subject_key) or subject_levels.get(subject)
+        return entry.get("level", "beginner") if entry else "beginner"
+
+    @staticmethod
+    def _learning_style(memory: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if memory and "learning_style" in memory:
+            return memory.get("learning_style", {})
+        return dict(DEFAULT_LEARNING_STYLE)
+
+    @staticmethod
+    def _frequent_errors(memory: Optional[Dict[str, Any]], limit: int) -> list:
+        error_history = (memory or {}).get("error_history") or []
+        # Trier par nombre d'erreurs décroissant
+        sorted_errors = sorted(
+            error_history,
+            key=lambda x: x.get("error_count", 0),
+            reverse=True
+        )
+        return sorted_errors[:limit]
+
     @staticmethod
     async def get_memory(user_id: str) -> Optional[Dict[str, Any]]:
         """Récupère la mémoire pédagogique d'un utilisateur"""
         try:
-            return await PedagogicalMemoryRepository.find_by_user(user_id)
+            return await PedagogicalMemoryService.get_snapshot(user_id)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de la mémoire: {e}")
             return None
@@ -24,12 +95,8 @@ class PedagogicalMemoryService:
     async def get_subject_level(user_id: str, subject: str) -> str:
         """Récupère le niveau d'un utilisateur pour une matière"""
         try:
-            memory = await PedagogicalMemoryRepository.find_by_user(user_id)
-            if memory and "subject_levels" in memory:
-                subject_levels = memory.get("subject_levels", {})
-                if subject in subject_levels:
-                    return subject_levels[subject].get("level", "beginner")
-            return "beginner"
+            memory = await PedagogicalMemoryService.get_snapshot(user_id)
+            return PedagogicalMemoryService._subject_level(memory, subject)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du niveau: {e}")
             return "beginner"
@@ -38,39 +105,18 @@ class PedagogicalMemoryService:
     async def get_learning_style(user_id: str) -> Dict[str, Any]:
         """Récupère le style d'apprentissage préféré"""
         try:
-            memory = await PedagogicalMemoryRepository.find_by_user(user_id)
-            if memory and "learning_style" in memory:
-                return memory.get("learning_style", {})
-            return {
-                "preferred_format": "balanced",
-                "detail_level": "medium",
-                "examples_preference": True,
-                "visual_aids_preference": True
-            }
+            memory = await PedagogicalMemoryService.get_snapshot(user_id)
+            return PedagogicalMemoryService._learning_style(memory)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du style: {e}")
-            return {
-                "preferred_format": "balanced",
-                "detail_level": "medium",
-                "examples_preference": True,
-                "visual_aids_preference": True
-            }
+            return dict(DEFAULT_LEARNING_STYLE)
     
     @staticmethod
     async def get_frequent_errors(user_id: str, limit: int = 5) -> list:
         """Récupère les erreurs fréquentes d'un utilisateur"""
         try:
-            memory = await PedagogicalMemoryRepository.find_by_user(user_id)
-            if memory and "error_history" in memory:
-                error_history = memory.get("error_history", [])
-                # Trier par nombre d'erreurs décroissant
-                sorted_errors = sorted(
-                    error_history,
-                    key=lambda x: x.get("error_count", 0),
-                    reverse=True
-                )
-                return sorted_errors[:limit]
-            return []
+            memory = await PedagogicalMemoryService.get_snapshot(user_id)
+            return PedagogicalMemoryService._frequent_errors(memory, limit)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des erreurs: {e}")
             return []
@@ -82,6 +128,8 @@ class PedagogicalMemoryService:
             await PedagogicalMemoryRepository.add_error(user_id, concept, error_type)
         except Exception as e:
             logger.error(f"Erreur lors de l'enregistrement d'erreur: {e}")
+        finally:
+            PedagogicalMemoryService.invalidate_snapshot(user_id)
     
     @staticmethod
     async def update_level(user_id: str, subject: str, level: str, confidence_score: float = 0.5):
@@ -92,15 +140,17 @@ class PedagogicalMemoryService:
             )
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour du niveau: {e}")
+        finally:
+            PedagogicalMemoryService.invalidate_snapshot(user_id)
     
     @staticmethod
     async def adapt_explanation(user_id: str, subject: str) -> Dict[str, Any]:
-        """Adapte l'explication selon la mémoire pédagogique"""
+        """Adapte l'explication selon la mémoire pédagogique (une seule lecture du document)"""
         try:
-            memory = await PedagogicalMemoryService.get_memory(user_id)
-            level = await PedagogicalMemoryService.get_subject_level(user_id, subject)
-            learning_style = await PedagogicalMemoryService.get_learning_style(user_id)
-            frequent_errors = await PedagogicalMemoryService.get_frequent_errors(user_id, 3)
+            memory = await PedagogicalMemoryService.get_snapshot(user_id)
+            level = PedagogicalMemoryService._subject_level(memory, subject)
+            learning_style = PedagogicalMemoryService._learning_style(memory)
+            frequent_errors = PedagogicalMemoryService._frequent_errors(memory, 3)
             
             # Déterminer le niveau de détail
             detail_level = learning_style.get("detail_level", "medium")
@@ -6,7 +6,9 @@ from typing import List, Dict, Any, Optional
 from app.models.pathway import PrerequisiteAnalysis
 from app.repositories.module_repository import ModuleRepository
 from app.repositories.progress_repository import ProgressRepository as ProgressRepo
-from app.services.ai_service import client, AI_MODEL
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.utils.json_cleaner import safe_json_loads
 import logging
 import json
 
@@ -82,7 +84,7 @@ class PrerequisiteDetector:
         """
         Utilise l'IA pour détecter les prérequis d'un module
         """
-        if not client:
+        if not AIGateway.is_available():
             # Mode démo - retourner des prérequis basiques basés sur le sujet
             return await PrerequisiteDetector._detect_basic_prerequisites(module)
         
@@ -143,26 +145,21 @@ Si aucun prérequis n'est nécessaire, retourne une liste vide."""
                 "temperature": 0.3
             }
             create_params.update(_get_max_tokens_param(AI_MODEL, 500))
-            response = await client.chat.completions.create(**create_params)
+            response = await AIGateway.chat_completion(feature="prerequisite_detection", **create_params)
             
             response_text = response.choices[0].message.content
             
             # Extraire le JSON
-            try:
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    result = json.loads(response_text[json_start:json_end])
-                    prerequisites = result.get("prerequisites", [])
-                    # Valider que les IDs existent
-                    valid_prereqs = []
-                    for prereq_id in prerequisites:
-                        prereq_module = await ModuleRepository.find_by_id(prereq_id)
-                        if prereq_module:
-                            valid_prereqs.append(prereq_id)
-                    return valid_prereqs
-            except json.JSONDecodeError:
-                pass
+            result = safe_json_loads(response_text)
+            if isinstance(result, dict):
+                prerequisites = result.get("prerequisites", [])
+                # Valider que les IDs existent
+                valid_prereqs = []
+                for prereq_id in prerequisites:
+                    prereq_module = await ModuleRepository.find_by_id(prereq_id)
+                    if prereq_module:
+                        valid_prereqs.append(prereq_id)
+                return valid_prereqs
             
             # Fallback vers détection basique
             return await PrerequisiteDetector._detect_basic_prerequisites(module)
@@ -1,10 +1,13 @@
 """
 Service de routing intelligent avec prompt de classification
-Utilise GPT-5-mini pour classifier les requêtes et optimiser l'utilisation des modèles
+Classifieur local en priorité, GPT-5-mini en repli quand sa confiance est insuffisante
 """
-from typing import Dict, Any, Optional
-from app.services.ai_service import client, AI_MODEL
+from typing import Dict, Any, Optional, Set, Tuple
+from app.services.ai_service import AI_MODEL
+from app.services.ai_gateway import AIGateway
+from app.services.request_classifier import get_classifier
 from app.config import settings
+import asyncio
 import logging
 import hashlib
 import json
@@ -45,6 +48,18 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
     # Cache TTL (1 heure)
     CACHE_TTL = 3600
     
+    # Décisions et évaluation fantôme du classifieur local (par processus)
+    _local_stats: Dict[str, Any] = {
+        "local_decisions": 0,
+        "gpt_decisions": 0,
+        "compared": 0,
+        "agreed": 0,
+        "confident_compared": 0,
+        "confident_agreed": 0,
+        "confusion": {}
+    }
+    _pending_logs: Set["asyncio.Task"] = set()
+    
     @staticmethod
     def _get_cache_key(message: str) -> str:
         """Génère une clé de cache pour la requête"""
@@ -92,9 +107,59 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
             logger.warning(f"Erreur lors de la sauvegarde du cache: {e}")
     
     @staticmethod
-    async def classify_request(message: str, context: Optional[str] = None) -> int:
+    def _record_comparison(gpt_category: int, local_category: int, confidence: float) -> None:
+        """Évaluation fantôme : accord entre GPT et le classifieur local"""
+        stats = PromptRouterService._local_stats
+        agreed = gpt_category == local_category
+        stats["compared"] += 1
+        stats["agreed"] += int(agreed)
+        if confidence >= settings.request_classifier_min_confidence:
+            stats["confident_compared"] += 1
+            stats["confident_agreed"] += int(agreed)
+        key = f"{gpt_category}->{local_category}"
+        stats["confusion"][key] = stats["confusion"].get(key, 0) + 1
+
+    @staticmethod
+    def _log_for_training(message: str, context: Optional[str], category: int,
+                          local: Optional[Tuple[int, float]], user_id: Optional[str] = None) -> None:
+        """Journalise la classification GPT en arrière-plan (entraînement du classifieur local)"""
+        from app.repositories.request_classification_repository import RequestClassificationRepository
+        try:
+            task = asyncio.get_running_loop().create_task(RequestClassificationRepository.record(
+                message,
+                category,
+                context=context,
+                local_category=local[0] if local else None,
+                local_confidence=local[1] if local else None,
+                user_id=user_id
+            ))
+        except RuntimeError:
+            return
+        PromptRouterService._pending_logs.add(task)
+        task.add_done_callback(PromptRouterService._pending_logs.discard)
+
+    @staticmethod
+    def _classify_locally(message: str, context: Optional[str]) -> Optional[Tuple[int, float]]:
+        """(catégorie, confiance) du classifieur local, None s'il n'est pas disponible"""
+        if settings.request_classifier_mode == "gpt":
+            return None
+        classifier = get_classifier()
+        if classifier is None:
+            return None
+        try:
+            return classifier.predict(message, context)
+        except Exception as e:
+            logger.warning(f"Erreur du classifieur local: {e}")
+            return None
+
+    @staticmethod
+    async def classify_request(message: str, context: Optional[str] = None, user_id: Optional[str] = None) -> int:
         """
-        Classifie une requête utilisateur en utilisant GPT-5-mini
+        Classifie une requête utilisateur
+        
+        Le classifieur local répond directement si sa confiance est suffisante
+        (mode "local") ; sinon GPT-5-mini classifie et le résultat sert à
+        évaluer puis réentraîner le classifieur local.
         
         Retourne:
         1: Explication simple / aide rapide
@@ -108,10 +173,39 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
         if cached_category:
             return cached_category
         
-        # Si pas de client OpenAI, retourner catégorie par défaut (simple)
-        if not client:
-            logger.warning("Client OpenAI non disponible - Classification par défaut: 1")
-            return 1
+        local = PromptRouterService._classify_locally(message, context)
+        if (
+            local is not None
+            and settings.request_classifier_mode == "local"
+            and local[1] >= settings.request_classifier_min_confidence
+        ):
+            PromptRouterService._local_stats["local_decisions"] += 1
+            logger.debug(f"Requête classifiée localement: catégorie {local[0]} (confiance {local[1]:.2f})")
+            return local[0]
+        
+        category = await PromptRouterService._classify_with_gpt(message, context)
+        if category is None:
+            # GPT indisponible ou en erreur : classification locale, sinon catégorie par défaut (simple)
+            return local[0] if local is not None else 1
+        
+        PromptRouterService._local_stats["gpt_decisions"] += 1
+        if local is not None:
+            PromptRouterService._record_comparison(category, local[0], local[1])
+        PromptRouterService._log_for_training(message, context, category, local, user_id)
+        
+        # Sauvegarder dans le cache
+        await PromptRouterService._save_to_cache(cache_key, category)
+        
+        logger.info(f"Requête classifiée: catégorie {category} (modèle: {PromptRouterService.CATEGORY_TO_MODEL[category]})")
+        return category
+    
+    @staticmethod
+    async def _classify_with_gpt(message: str, context: Optional[str] = None) -> Optional[int]:
+        """Classification par GPT-5-mini (None si le client est indisponible ou en erreur)"""
+        # Si pas de client OpenAI, pas de classification GPT
+        if not AIGateway.is_available():
+            logger.warning("Client OpenAI non disponible - Classification par défaut")
+            return None
         
         try:
             # Construire le prompt de classification
@@ -120,8 +214,6 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
                 classification_message += f"\n\nContexte: {context}"
             
             # Appel à GPT-5-mini pour la classification (rapide et économique)
-            # S'assurer que client.chat.completions.create() est appelé correctement
-            # et ne retourne pas une coroutine
             try:
                 from app.services.ai_service import _get_max_tokens_param
                 create_params = {
@@ -134,15 +226,12 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
                     "timeout": 10.0
                 }
                 create_params.update(_get_max_tokens_param(AI_MODEL, 5))
-                response = client.chat.completions.create(**create_params)
-                # Vérifier que la réponse n'est pas une coroutine
-                import inspect
-                if inspect.iscoroutine(response):
-                    logger.error("client.chat.completions.create() a retourné une coroutine au lieu d'une réponse")
-                    return 1  # Retourner catégorie par défaut
+                response = await AIGateway.chat_completion(
+                    feature="request_classification", max_retries=1, **create_params
+                )
             except Exception as create_error:
                 logger.error(f"Erreur lors de l'appel OpenAI dans classify_request: {create_error}", exc_info=True)
-                return 1  # Retourner catégorie par défaut en cas d'erreur
+                return None
             
             # Extraire le numéro de la réponse
             response_text = response.choices[0].message.content.strip()
@@ -159,22 +248,18 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
                 logger.warning(f"Classification invalide '{response_text}', utilisation par défaut: 1")
                 category = 1
             
-            # Sauvegarder dans le cache
-            await PromptRouterService._save_to_cache(cache_key, category)
-            
-            logger.info(f"Requête classifiée: catégorie {category} (modèle: {PromptRouterService.CATEGORY_TO_MODEL[category]})")
             return category
             
         except Exception as e:
             logger.error(f"Erreur lors de la classification: {e}", exc_info=True)
-            # En cas d'erreur, retourner catégorie par défaut (simple)
-            return 1
+            return None
     
     @staticmethod
     async def route_to_model(
         message: str,
         context: Optional[str] = None,
-        force_model: Optional[str] = None
+        force_model: Optional[str] = None,
+        user_id: Optional[str] = None
     ) -> str:
         """
         Route une requête vers le modèle approprié en utilisant la classification
@@ -183,6 +268,7 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
             message: Message de l'utilisateur
             context: Contexte optionnel
             force_model: Modèle forcé (ignore la classification)
+            user_id: Auteur du message (journal d'entraînement rattaché au RGPD)
         
         Returns:
             Nom du modèle à utiliser
@@ -193,7 +279,7 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
             return force_model
         
         # Classifier la requête
-        category = await PromptRouterService.classify_request(message, context)
+        category = await PromptRouterService.classify_request(message, context, user_id)
         
         # Mapper la catégorie au modèle
         model = PromptRouterService.CATEGORY_TO_MODEL.get(category, "gpt-5-mini")
@@ -211,6 +297,30 @@ Retourne uniquement le numéro correspondant (1, 2, 3 ou 4)."""
                 4: {"name": "Analyse approfondie / diagnostic pédagogique", "model": "gpt-5.2"}
             },
             "cache_enabled": REDIS_AVAILABLE,
-            "cache_ttl": PromptRouterService.CACHE_TTL
+            "cache_ttl": PromptRouterService.CACHE_TTL,
+            "local_classifier": PromptRouterService.get_local_classifier_stats()
+        }
+    
+    @staticmethod
+    def get_local_classifier_stats() -> Dict[str, Any]:
+        """Décisions locales vs GPT et taux d'accord de l'évaluation fantôme"""
+        stats = PromptRouterService._local_stats
+        decisions = stats["local_decisions"] + stats["gpt_decisions"]
+        return {
+            "mode": settings.request_classifier_mode,
+            "loaded": get_classifier() is not None,
+            "min_confidence": settings.request_classifier_min_confidence,
+            "local_decisions": stats["local_decisions"],
+            "gpt_decisions": stats["gpt_decisions"],
+            "local_ratio": round(stats["local_decisions"] / decisions, 4) if decisions else 0.0,
+            "compared": stats["compared"],
+            "agreement_rate": round(stats["agreed"] / stats["compared"], 4) if stats["compared"] else None,
+            # Accord sur les prédictions qui auraient évité l'appel GPT (confiance >= seuil)
+            "confident_compared": stats["confident_compared"],
+            "confident_agreement_rate": (
+                round(stats["confident_agreed"] / stats["confident_compared"], 4)
+                if stats["confident_compared"] else None
+            ),
+            "confusion": dict(stats["confusion"])
         }
 
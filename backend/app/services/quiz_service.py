@@ -1,9 +1,11 @@
 """
 Service pour la gestion des quiz - Business logic
 """
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timezone
-from app.repositories.quiz_repository import QuizRepository
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+import random
+from app.repositories.quiz_repository import ANSWER_KEY_FIELDS, QuizRepository
 from app.repositories.module_repository import ModuleRepository
 from app.services.ai_service import AIService
 from app.models import QuizCreate, QuizQuestion
@@ -11,10 +13,32 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Questions générées écrites en base par lot pendant le streaming
+PERSIST_BATCH = 5
+# Génération sans nouvelle question depuis ce délai : considérée abandonnée (worker arrêté)
+GENERATION_STALE_AFTER = timedelta(minutes=5)
+
 
 class QuizService:
     """Service pour la gestion des quiz"""
     
+    @staticmethod
+    async def get_quiz_module(module_id: str) -> Dict[str, Any]:
+        """Retourne le module s'il existe et propose des quiz (informatique uniquement)"""
+        module = await ModuleRepository.find_by_id(module_id)
+        if not module:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Module non trouvé")
+        
+        module_subject = module.get("subject", "").lower()
+        if module_subject != "computer_science":
+            from fastapi import HTTPException
+            raise HTTPException(
+                status_code=403, 
+                detail="Les quiz sont disponibles uniquement pour les modules d'informatique"
+            )
+        return module
+    
     @staticmethod
     async def get_or_generate_quiz(
         module_id: str,
@@ -28,91 +52,156 @@ class QuizService:
         """
         try:
             # Vérifier que le module existe et est d'informatique
-            module = await ModuleRepository.find_by_id(module_id)
-            if not module:
-                from fastapi import HTTPException
-                raise HTTPException(status_code=404, detail="Module non trouvé")
-            
-            module_subject = module.get("subject", "").lower()
-            if module_subject != "computer_science":
-                from fastapi import HTTPException
-                raise HTTPException(
-                    status_code=403, 
-                    detail="Les quiz sont disponibles uniquement pour les modules d'informatique"
-                )
+            await QuizService.get_quiz_module(module_id)
             
-            # Vérifier si un quiz existe déjà pour ce module
+            # Vérifier si un quiz existe déjà pour ce module (une génération interrompue est refaite)
             if not force_regenerate:
-                existing_quiz = await QuizRepository.find_by_module_id(module_id)
-                if existing_quiz:
+                # Seules les num_questions premières questions sont lues ($slice)
+                existing_quiz = await QuizRepository.find_by_module_id(module_id, question_limit=num_questions)
+                _raise_if_generating(existing_quiz)
+                if _quiz_state(existing_quiz) == "complete":
                     logger.info(f"Quiz existant trouvé pour le module {module_id}")
-                    # Retourner le quiz existant, en limitant le nombre de questions si nécessaire
                     questions = existing_quiz.get("questions", [])
-                    if num_questions < len(questions):
-                        questions = questions[:num_questions]
                     
                     return {
                         "questions": questions,
                         "module_id": module_id,
-                        "quiz_id": str(existing_quiz.get("_id", "")),
+                        "quiz_id": existing_quiz.get("id", ""),
                         "num_questions": len(questions)
                     }
             
-            # Générer un nouveau quiz via l'IA
+            # Générer un nouveau quiz via l'IA (génération réservée : 409 si une autre est en cours)
             logger.info(f"Génération d'un nouveau quiz pour le module {module_id}")
-            ai_quiz = await AIService.generate_quiz(
-                module_id=module_id,
-                num_questions=num_questions,
-                difficulty=difficulty
-            )
-            
-            # Sauvegarder le quiz en base de données
-            quiz_data = {
-                "module_id": module_id,
-                "questions": ai_quiz.get("questions", []),
-                "num_questions": len(ai_quiz.get("questions", [])),
-                "created_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc)
-            }
-            
-            # Si un quiz existe déjà, le mettre à jour, sinon en créer un nouveau
-            if await QuizRepository.exists(module_id):
-                await QuizRepository.update(module_id, {
-                    "questions": quiz_data["questions"],
-                    "num_questions": quiz_data["num_questions"],
-                    "updated_at": quiz_data["updated_at"]
-                })
-                saved_quiz = await QuizRepository.find_by_module_id(module_id)
-            else:
-                saved_quiz = await QuizRepository.create(quiz_data)
+            generation = await _claim_generation(module_id)
+            try:
+                ai_quiz = await AIService.generate_quiz(
+                    module_id=module_id,
+                    num_questions=num_questions,
+                    difficulty=difficulty
+                )
+                questions = ai_quiz.get("questions", [])
+                await QuizRepository.append_questions(module_id, generation["version"], questions)
+                await QuizRepository.set_generation_status(module_id, generation["version"], "complete")
+            except BaseException:
+                await _mark_incomplete(module_id, generation["version"])
+                raise
             
             return {
-                "questions": saved_quiz.get("questions", []),
+                "questions": questions,
                 "module_id": module_id,
-                "quiz_id": str(saved_quiz.get("_id", "")),
-                "num_questions": saved_quiz.get("num_questions", len(saved_quiz.get("questions", [])))
+                "quiz_id": generation["id"],
+                "num_questions": len(questions)
             }
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération/génération du quiz: {e}")
             raise
     
+    @staticmethod
+    async def stream_quiz(
+        module_id: str,
+        num_questions: int = 50,
+        difficulty: Optional[str] = None,
+        force_regenerate: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Version streaming de get_or_generate_quiz : événements start, question, done
+
+        Les vérifications (module, matière) sont faites avant le début du flux.
+        Un quiz complet est envoyé tel quel, une génération en cours donne un 409 ;
+        sinon chaque question générée est envoyée dès qu'elle est complète et
+        enregistrée par lots de PERSIST_BATCH.
+        """
+        await QuizService.get_quiz_module(module_id)
+        
+        if not force_regenerate:
+            existing_quiz = await QuizRepository.find_by_module_id(module_id, question_limit=num_questions)
+            _raise_if_generating(existing_quiz)
+            if _quiz_state(existing_quiz) == "complete":
+                logger.info(f"Quiz existant trouvé pour le module {module_id}")
+                return QuizService._stream_existing_quiz(module_id, existing_quiz, num_questions)
+        
+        generation = await _claim_generation(module_id)
+        try:
+            question_stream = await AIService.stream_quiz_questions(
+                module_id=module_id,
+                num_questions=num_questions,
+                difficulty=difficulty
+            )
+        except BaseException:
+            await _mark_incomplete(module_id, generation["version"])
+            raise
+        return QuizService._stream_generated_quiz(module_id, generation, num_questions, question_stream)
+    
+    @staticmethod
+    async def _stream_existing_quiz(
+        module_id: str,
+        quiz: Dict[str, Any],
+        num_questions: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Envoie un quiz déjà enregistré sous forme d'événements"""
+        quiz_id = quiz.get("id", "")
+        questions = quiz.get("questions", [])[:num_questions]
+        yield {"type": "start", "module_id": module_id, "quiz_id": quiz_id, "num_questions": len(questions), "cached": True}
+        for index, question in enumerate(questions):
+            yield {"type": "question", "index": index, "question": question}
+        yield {
+            "type": "done",
+            "quiz_id": quiz_id,
+            "num_questions": len(questions),
+            "status": quiz.get("generation_status", "complete")
+        }
+    
+    @staticmethod
+    async def _stream_generated_quiz(
+        module_id: str,
+        generation: Dict[str, Any],
+        num_questions: int,
+        question_stream: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Enregistre et envoie les questions au fil de la génération
+        
+        La génération a été réservée par stream_quiz (generation : id et version) ;
+        le quiz est marqué "generating" pendant le flux, "complete" à la fin. Si le
+        client se déconnecte ou si la génération échoue, les questions déjà reçues
+        sont conservées et le quiz est marqué "incomplete" (regénéré au prochain
+        appel). Les écritures ne touchent que la version réservée.
+        """
+        logger.info(f"Génération en streaming d'un nouveau quiz pour le module {module_id}")
+        quiz_id, version = generation["id"], generation["version"]
+        batch: List[Dict[str, Any]] = []
+        count = 0
+        completed = False
+        try:
+            yield {"type": "start", "module_id": module_id, "quiz_id": quiz_id, "num_questions": num_questions, "cached": False}
+            async with aclosing(question_stream):
+                async for question in question_stream:
+                    if len(batch) >= PERSIST_BATCH:
+                        await QuizRepository.append_questions(module_id, version, batch)
+                        batch = []
+                    batch.append(question)
+                    count += 1
+                    yield {"type": "question", "index": count - 1, "question": question}
+            await QuizRepository.append_questions(module_id, version, batch)
+            batch = []
+            await QuizRepository.set_generation_status(module_id, version, "complete")
+            completed = True
+            yield {"type": "done", "quiz_id": quiz_id, "num_questions": count, "status": "complete"}
+        finally:
+            if not completed:
+                logger.warning(f"Génération du quiz interrompue pour le module {module_id} ({count} questions)")
+                try:
+                    await QuizRepository.append_questions(module_id, version, batch)
+                    await QuizRepository.set_generation_status(module_id, version, "incomplete")
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'enregistrement du quiz interrompu: {e}")
+    
     @staticmethod
     async def get_quiz(module_id: str) -> Dict[str, Any]:
         """Récupère le quiz d'un module"""
         # Vérifier que le module est d'informatique
-        module = await ModuleRepository.find_by_id(module_id)
-        if not module:
-            from fastapi import HTTPException
-            raise HTTPException(status_code=404, detail="Module non trouvé")
-        
-        module_subject = module.get("subject", "").lower()
-        if module_subject != "computer_science":
-            from fastapi import HTTPException
-            raise HTTPException(
-                status_code=403, 
-                detail="Les quiz sont disponibles uniquement pour les modules d'informatique"
-            )
+        await QuizService.get_quiz_module(module_id)
         
         quiz = await QuizRepository.find_by_module_id(module_id)
         if not quiz:
@@ -120,6 +209,101 @@ class QuizService:
             raise HTTPException(status_code=404, detail="Quiz non trouvé pour ce module")
         return quiz
     
+    @staticmethod
+    async def sample_quiz(
+        module_id: str,
+        num_questions: int = 20,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Tire au sort les questions d'une tentative dans la banque du quiz
+        
+        Les indices sont tirés ici (reproductibles avec 'seed'), puis MongoDB ne
+        renvoie que ces questions, sans corrigé : correct_answer et explication ne
+        sont envoyés qu'à la correction (grade_attempt).
+        """
+        await QuizService.get_quiz_module(module_id)
+        
+        summary = await QuizRepository.find_summary(module_id)
+        _raise_if_generating(summary)
+        if _quiz_state(summary) != "complete" or not summary.get("num_questions"):
+            # Pas encore de banque de questions : la générer
+            await QuizService.get_or_generate_quiz(module_id)
+            summary = await QuizRepository.find_summary(module_id)
+        if _quiz_state(summary) != "complete" or not summary.get("num_questions"):
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Quiz non trouvé pour ce module")
+        
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        indexes = _sample_indexes(summary["num_questions"], num_questions, seed)
+        quiz = await QuizRepository.find_questions_at(module_id, indexes)
+        return {
+            "module_id": module_id,
+            "quiz_id": summary.get("id", ""),
+            "quiz_version": summary.get("version", 0),
+            "seed": seed,
+            "num_questions": len(indexes),
+            "questions": quiz.get("questions", []) if quiz else []
+        }
+    
+    @staticmethod
+    async def grade_attempt(
+        user_id: str,
+        module_id: str,
+        quiz_id: str,
+        quiz_version: int,
+        seed: int,
+        num_questions: int,
+        answers: Dict[int, int],
+        time_spent: int
+    ) -> Dict[str, Any]:
+        """
+        Corrige une tentative côté serveur et l'enregistre
+        
+        Les questions du tirage sont recalculées à partir de seed / num_questions
+        (comme dans sample_quiz) : le score porte sur toutes ces questions, une
+        question sans réponse compte comme fausse et les réponses hors tirage sont
+        ignorées. 409 si le quiz a été régénéré depuis le tirage (quiz_version).
+        """
+        summary = await QuizRepository.find_summary(module_id)
+        if not summary or not summary.get("num_questions"):
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="Quiz non trouvé pour ce module")
+        if quiz_id != summary.get("id") or quiz_version != summary.get("version", 0):
+            from fastapi import HTTPException
+            raise HTTPException(status_code=409, detail="Le quiz a été régénéré depuis le tirage des questions")
+        
+        indexes = _sample_indexes(summary["num_questions"], num_questions, seed)
+        answer_keys = await QuizRepository.find_questions_at(module_id, indexes, ANSWER_KEY_FIELDS)
+        if not answer_keys or answer_keys.get("version", 0) != quiz_version:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=409, detail="Le quiz a été régénéré depuis le tirage des questions")
+        
+        corrections = []
+        for key in answer_keys.get("questions", []):
+            answer = answers.get(key["index"])
+            corrections.append({
+                "index": key["index"],
+                "answer": answer,
+                "correct_answer": key.get("correct_answer"),
+                "is_correct": answer is not None and answer == key.get("correct_answer"),
+                "explanation": key.get("explanation")
+            })
+        
+        num_correct = sum(1 for correction in corrections if correction["is_correct"])
+        attempt = await QuizService.save_attempt(
+            user_id=user_id,
+            module_id=module_id,
+            quiz_id=quiz_id,
+            answers={c["index"]: c["answer"] for c in corrections if c["answer"] is not None},
+            score=round(num_correct * 100 / len(corrections), 2),
+            time_spent=time_spent,
+            num_questions=len(corrections),
+            num_correct=num_correct
+        )
+        return {"attempt": attempt, "corrections": corrections}
+    
     @staticmethod
     async def delete_quiz(module_id: str) -> bool:
         """Supprime le quiz d'un module"""
@@ -169,7 +353,7 @@ class QuizService:
                 "user_id": user_id,
                 "module_id": module_id,
                 "quiz_id": quiz_id,
-                "answers": answers,
+                "answers": {str(index): answer for index, answer in answers.items()},  # clés BSON en chaînes
                 "score": score,
                 "time_spent": time_spent,
                 "num_questions": num_questions,
@@ -190,11 +374,79 @@ class QuizService:
         """Récupère toutes les tentatives de quiz d'un utilisateur pour un module"""
         return await QuizRepository.find_attempts_by_user_and_module(user_id, module_id)
     
+    @staticmethod
+    async def get_user_attempts_page(
+        user_id: str,
+        module_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Page des tentatives de quiz d'un utilisateur pour un module et cursor suivant"""
+        return await QuizRepository.find_attempts_page(user_id, module_id, limit, cursor)
+    
     @staticmethod
     async def get_statistics(user_id: str, module_id: str) -> Optional[Dict[str, Any]]:
         """Récupère les statistiques de quiz pour un utilisateur et un module"""
         return await QuizRepository.get_statistics(user_id, module_id)
 
 
+def _sample_indexes(total: int, count: int, seed: int) -> List[int]:
+    """count indices distincts de [0, total) dans un ordre aléatoire déterminé par seed"""
+    return random.Random(seed).sample(range(total), min(count, total))
+
+
+def _quiz_state(quiz: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    État d'un quiz enregistré : "complete" (utilisable), "generating" (génération
+    en cours), "stale" (génération interrompue ou abandonnée, à refaire) ou None
+    
+    Les quiz antérieurs au streaming n'ont pas de generation_status : complets.
+    """
+    if not quiz:
+        return None
+    status = quiz.get("generation_status", "complete")
+    if status == "complete":
+        return "complete"
+    if status == "generating":
+        updated_at = quiz.get("updated_at")
+        if isinstance(updated_at, str):
+            updated_at = datetime.fromisoformat(updated_at)
+        if isinstance(updated_at, datetime):
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - updated_at < GENERATION_STALE_AFTER:
+                return "generating"
+    return "stale"
+
+
+def _generation_conflict():
+    from fastapi import HTTPException
+    return HTTPException(
+        status_code=409,
+        detail="Le quiz de ce module est en cours de génération, réessayez dans quelques instants",
+        headers={"Retry-After": "10"}
+    )
+
+
+def _raise_if_generating(quiz: Optional[Dict[str, Any]]) -> None:
+    """409 si une génération du quiz est en cours (le quiz partiel n'est pas servi)"""
+    if _quiz_state(quiz) == "generating":
+        raise _generation_conflict()
+
+
+async def _claim_generation(module_id: str) -> Dict[str, Any]:
+    """Réserve la génération du quiz (id et version) ; 409 si une génération récente est en cours"""
+    generation = await QuizRepository.start_generation(
+        module_id, datetime.now(timezone.utc) - GENERATION_STALE_AFTER
+    )
+    if generation is None:
+        raise _generation_conflict()
+    return generation
 
 
+async def _mark_incomplete(module_id: str, version: int) -> None:
+    """Génération échouée avant d'aboutir : le quiz sera regénéré au prochain appel"""
+    try:
+        await QuizRepository.set_generation_status(module_id, version, "incomplete")
+    except Exception as e:
+        logger.error(f"Erreur lors de l'enregistrement du quiz interrompu: {e}")
@@ -0,0 +1,189 @@
+"""
+Classifieur local des requêtes (catégories 1 à 4 du Prompt Router)
+
+Régression logistique multinomiale sur des features hachées :
+- unigrammes et bigrammes de mots normalisés (minuscules, sans accents),
+  français comme anglais, projetés dans HASH_BUCKETS colonnes (crc32)
+- features denses issues de AIRoutingService._estimate_complexity
+
+Les poids sont entraînés hors ligne (scripts/train_request_classifier.py)
+à partir des classifications GPT journalisées dans 'request_classifications'
+et stockés dans un petit fichier NumPy (.npz). La prédiction est une somme
+de quelques lignes de la matrice de poids : quelques microsecondes, contre
+un appel GPT complet avant le début du streaming.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import math
+import zlib
+
+import numpy as np
+
+from app.utils.minhash import normalize
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = (1, 2, 3, 4)
+HASH_BUCKETS = 1 << 14
+DENSE_FEATURES = ("complexity_score", "is_complex", "is_research", "message_length", "context_length")
+MODEL_VERSION = 1
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent.parent / "data" / "request_classifier.npz"
+
+
+def _dense_features(message: str, context: Optional[str]) -> List[float]:
+    from app.services.ai_routing_service import AIRoutingService
+    complexity = AIRoutingService._estimate_complexity(message, context)
+    return [
+        complexity["score"] / 100.0,
+        float(complexity["is_complex"]),
+        float(complexity["is_research"]),
+        math.log1p(complexity["message_length"]) / 10.0,
+        math.log1p(complexity["context_length"]) / 10.0,
+    ]
+
+
+def hashed_features(message: str) -> np.ndarray:
+    """Colonnes (uniques) des unigrammes et bigrammes du message"""
+    words = normalize(message)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) % HASH_BUCKETS for gram in grams),
+        dtype=np.int64,
+        count=len(grams)
+    ))
+
+
+def extract_features(message: str, context: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(colonnes hachées, features denses) d'une requête"""
+    return hashed_features(message), np.asarray(_dense_features(message, context), dtype=np.float32)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+class RequestClassifier:
+    """Modèle chargé : poids hachés, poids denses et biais"""
+
+    def __init__(self, sparse_weights: np.ndarray, dense_weights: np.ndarray, bias: np.ndarray):
+        self.sparse_weights = sparse_weights.astype(np.float32, copy=False)
+        self.dense_weights = dense_weights.astype(np.float32, copy=False)
+        self.bias = bias.astype(np.float32, copy=False)
+
+    def predict_proba(self, message: str, context: Optional[str] = None) -> np.ndarray:
+        columns, dense = extract_features(message, context)
+        logits = self.bias + dense @ self.dense_weights
+        if columns.size:
+            logits = logits + self.sparse_weights[columns].sum(axis=0)
+        return _softmax(logits)
+
+    def predict(self, message: str, context: Optional[str] = None) -> Tuple[int, float]:
+        """(catégorie, confiance)"""
+        proba = self.predict_proba(message, context)
+        best = int(proba.argmax())
+        return CATEGORIES[best], float(proba[best])
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            version=np.int64(MODEL_VERSION),
+            hash_buckets=np.int64(HASH_BUCKETS),
+            sparse_weights=self.sparse_weights,
+            dense_weights=self.dense_weights,
+            bias=self.bias
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "RequestClassifier":
+        with np.load(Path(path)) as data:
+            if int(data["version"]) != MODEL_VERSION or int(data["hash_buckets"]) != HASH_BUCKETS:
+                raise ValueError("Fichier de poids incompatible avec cette version du classifieur")
+            return cls(data["sparse_weights"], data["dense_weights"], data["bias"])
+
+
+def train(
+    samples: Iterable[Dict[str, Any]],
+    epochs: int = 200,
+    learning_rate: float = 0.5,
+    l2: float = 1e-4
+) -> RequestClassifier:
+    """
+    Entraîne le classifieur (descente de gradient sur l'entropie croisée)
+
+    Args:
+        samples: dicts {"message", "context" (optionnel), "category" (1-4)}
+    """
+    rows: List[int] = []
+    columns: List[int] = []
+    dense: List[List[float]] = []
+    labels: List[int] = []
+    for i, sample in enumerate(samples):
+        hashed, dense_row = extract_features(sample["message"], sample.get("context"))
+        rows.extend([i] * hashed.size)
+        columns.extend(hashed.tolist())
+        dense.append(dense_row.tolist())
+        labels.append(CATEGORIES.index(int(sample["category"])))
+
+    n = len(labels)
+    if n == 0:
+        raise ValueError("Aucun exemple d'entraînement")
+    rows_arr = np.asarray(rows, dtype=np.int64)
+    columns_arr = np.asarray(columns, dtype=np.int64)
+    dense_arr = np.asarray(dense, dtype=np.float64)
+    targets = np.zeros((n, len(CATEGORIES)))
+    targets[np.arange(n), labels] = 1.0
+
+    sparse_weights = np.zeros((HASH_BUCKETS, len(CATEGORIES)))
+    dense_weights = np.zeros((len(DENSE_FEATURES), len(CATEGORIES)))
+    bias = np.zeros(len(CATEGORIES))
+
+    for _ in range(epochs):
+        logits = dense_arr @ dense_weights + bias
+        np.add.at(logits, rows_arr, sparse_weights[columns_arr])
+        error = (_softmax(logits) - targets) / n
+
+        sparse_grad = np.zeros_like(sparse_weights)
+        np.add.at(sparse_grad, columns_arr, error[rows_arr])
+        sparse_weights -= learning_rate * (sparse_grad + l2 * sparse_weights)
+        dense_weights -= learning_rate * (dense_arr.T @ error + l2 * dense_weights)
+        bias -= learning_rate * error.sum(axis=0)
+
+    return RequestClassifier(sparse_weights, dense_weights, bias)
+
+
+_classifier: Optional[RequestClassifier] = None
+_load_attempted = False
+
+
+def get_classifier() -> Optional[RequestClassifier]:
+    """Classifieur chargé une fois par processus (None si aucun fichier de poids)"""
+    global _classifier, _load_attempted
+    if _load_attempted:
+        return _classifier
+    _load_attempted = True
+
+    from app.config import settings
+    path = Path(settings.request_classifier_path or DEFAULT_MODEL_PATH)
+    if not path.exists():
+        logger.info(f"Pas de poids pour le classifieur local ({path}) - classification par GPT")
+        return None
+    try:
+        _classifier = RequestClassifier.load(path)
+        logger.info(f"Classifieur local chargé depuis {path}")
+    except Exception as e:
+        logger.warning(f"Classifieur local non chargé ({path}): {e}")
+    return _classifier
+
+
+def set_classifier(classifier: Optional[RequestClassifier]) -> None:
+    """Remplace le classifieur chargé (rechargement à chaud, tests)"""
+    global _classifier, _load_attempted
+    _classifier = classifier
+    _load_attempted = True
@@ -0,0 +1,155 @@
+"""
+File de traitement des webhooks Stripe
+
+Le webhook répond dès l'événement enregistré (StripeEventRepository) ; son
+application aux abonnements est faite ici, en arrière-plan :
+- WORKER_COUNT files, une tâche par file : les événements d'un même abonnement
+  vont toujours dans la même file et sont appliqués un par un, dans l'ordre reçu
+- idempotence : un événement est réservé (claim) avant traitement, une seconde
+  livraison ou une seconde mise en file ne l'applique pas deux fois
+- en cas d'erreur l'événement est retenté avec un délai croissant
+- au démarrage, les événements non traités (arrêt, plantage) sont remis en file,
+  ceux encore réservés par un worker arrêté dès l'expiration de leur réservation
+"""
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
+import asyncio
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+WORKER_COUNT = 4
+# Délai avant un nouvel essai : RETRY_BASE_DELAY * 2^(essais - 1)
+RETRY_BASE_DELAY = 2.0
+# Attente maximale des événements en cours à l'arrêt
+DRAIN_TIMEOUT = 10.0
+
+
+class StripeWebhookQueue:
+    """Files par abonnement et tâches de traitement (une instance par processus)"""
+
+    _queues: List[asyncio.Queue] = []
+    _workers: List[asyncio.Task] = []
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _retries: Dict[str, asyncio.TimerHandle] = {}
+
+    @staticmethod
+    def _ensure_workers() -> None:
+        loop = asyncio.get_running_loop()
+        if StripeWebhookQueue._loop is loop and StripeWebhookQueue._workers:
+            return
+        StripeWebhookQueue._loop = loop
+        StripeWebhookQueue._queues = [asyncio.Queue() for _ in range(WORKER_COUNT)]
+        StripeWebhookQueue._workers = [
+            loop.create_task(StripeWebhookQueue._worker(queue))
+            for queue in StripeWebhookQueue._queues
+        ]
+
+    @staticmethod
+    def enqueue(event_id: str, subscription_key: str) -> None:
+        """Met un événement en file (celle de son abonnement)"""
+        StripeWebhookQueue._ensure_workers()
+        shard = zlib.crc32(subscription_key.encode("utf-8")) % WORKER_COUNT
+        StripeWebhookQueue._queues[shard].put_nowait((event_id, subscription_key))
+
+    @staticmethod
+    async def _worker(queue: asyncio.Queue) -> None:
+        while True:
+            event_id, subscription_key = await queue.get()
+            try:
+                await StripeWebhookQueue.process(event_id, subscription_key)
+            except Exception as e:
+                logger.error(f"Erreur file webhooks Stripe ({event_id}): {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    @staticmethod
+    async def process(event_id: str, subscription_key: str = "") -> bool:
+        """
+        Applique un événement s'il n'a pas déjà été traité
+
+        Returns:
+            True si l'événement a été appliqué par cet appel
+        """
+        from app.repositories.stripe_event_repository import StripeEventRepository, MAX_ATTEMPTS
+        from app.services.payment_service import PaymentService
+
+        record = await StripeEventRepository.claim(event_id)
+        if record is None:
+            return False
+        try:
+            await PaymentService.apply_event(record["event"])
+        except Exception as e:
+            attempts = record.get("attempts", 1)
+            logger.error(f"Échec application événement Stripe {event_id} (essai {attempts}): {e}", exc_info=True)
+            await StripeEventRepository.mark_failed(event_id, str(e))
+            if attempts < MAX_ATTEMPTS:
+                StripeWebhookQueue._schedule_retry(event_id, subscription_key, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+            return False
+        await StripeEventRepository.mark_processed(event_id)
+        return True
+
+    @staticmethod
+    def _schedule_retry(event_id: str, subscription_key: str, delay: float) -> None:
+        def retry() -> None:
+            StripeWebhookQueue._retries.pop(event_id, None)
+            StripeWebhookQueue.enqueue(event_id, subscription_key)
+
+        StripeWebhookQueue._retries[event_id] = asyncio.get_running_loop().call_later(delay, retry)
+
+    @staticmethod
+    async def resume_pending() -> int:
+        """
+        Remet en file les événements reçus mais non traités (au démarrage)
+
+        Un événement resté 'processing' (worker arrêté pendant son traitement)
+        ne peut être repris qu'une fois sa réservation expirée : il est remis
+        en file à ce moment-là plutôt que tout de suite.
+        """
+        from app.repositories.stripe_event_repository import StripeEventRepository, STALE_PROCESSING_SECONDS
+        events = await StripeEventRepository.find_unprocessed()
+        now = datetime.now(timezone.utc)
+        for event in events:
+            subscription_key = event.get("subscription_key") or event["_id"]
+            claimed_at = event.get("claimed_at")
+            if event.get("status") == "processing" and claimed_at is not None:
+                if claimed_at.tzinfo is None:
+                    claimed_at = claimed_at.replace(tzinfo=timezone.utc)
+                delay = STALE_PROCESSING_SECONDS - (now - claimed_at).total_seconds() + 1
+                if delay > 0:
+                    StripeWebhookQueue._schedule_retry(event["_id"], subscription_key, delay)
+                    continue
+            StripeWebhookQueue.enqueue(event["_id"], subscription_key)
+        if events:
+            logger.info(f"{len(events)} événement(s) Stripe remis en file")
+        return len(events)
+
+    @staticmethod
+    async def drain(timeout: float = DRAIN_TIMEOUT) -> bool:
+        """Attend que les files soient vides ; False si le délai est dépassé"""
+        if not StripeWebhookQueue._queues:
+            return True
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in StripeWebhookQueue._queues)),
+                timeout
+            )
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    @staticmethod
+    async def close() -> None:
+        """Termine les événements en cours puis arrête les tâches (les autres seront repris au démarrage)"""
+        for handle in StripeWebhookQueue._retries.values():
+            handle.cancel()
+        StripeWebhookQueue._retries.clear()
+        if not await StripeWebhookQueue.drain():
+            logger.warning("Arrêt avec des événements Stripe en file - ils seront repris au démarrage")
+        for worker in StripeWebhookQueue._workers:
+            worker.cancel()
+        await asyncio.gather(*StripeWebhookQueue._workers, return_exceptions=True)
+        StripeWebhookQueue._workers = []
+        StripeWebhookQueue._queues = []
+        StripeWebhookQueue._loop = None
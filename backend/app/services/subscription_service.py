@@ -4,7 +4,7 @@ Service pour les abonnements et monétisation
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone, timedelta
 from app.models.subscription import SubscriptionPlan, SubscriptionStatus, PlanLimits
-from app.repositories.subscription_repository import SubscriptionRepository
+from app.services.entitlements_service import EntitlementsService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,11 +49,7 @@ class SubscriptionService:
     async def get_user_plan(user_id: str) -> SubscriptionPlan:
         """Récupère le plan d'un utilisateur"""
         try:
-            subscription = await SubscriptionRepository.get_active_subscription(user_id)
-            if subscription:
-                plan_str = subscription.get("plan", "free")
-                return SubscriptionPlan(plan_str)
-            return SubscriptionPlan.FREE
+            return (await EntitlementsService.get(user_id)).plan
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du plan: {e}", exc_info=True)
             return SubscriptionPlan.FREE
@@ -62,44 +58,10 @@ class SubscriptionService:
     async def check_ai_limit(user_id: str) -> Dict[str, Any]:
         """
         Vérifie si l'utilisateur peut faire une requête IA
-        Compte les requêtes du mois en cours
+        Compte les requêtes du mois en cours (compteur des droits en cache)
         """
         try:
-            plan = await SubscriptionService.get_user_plan(user_id)
-            limits = SubscriptionService.get_plan_limits(plan)
-            
-            # Si illimité
-            if limits.ai_requests_per_month == -1:
-                return {
-                    "allowed": True,
-                    "remaining": -1,
-                    "limit": -1,
-                    "plan": plan.value
-                }
-            
-            # Compter les requêtes du mois en cours
-            from app.database import get_database
-            db = get_database()
-            
-            start_of_month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            # Compter les requêtes IA ce mois (à partir des logs ou collection dédiée)
-            ai_requests_count = await db.ai_requests.count_documents({
-                "user_id": user_id,
-                "created_at": {"$gte": start_of_month}
-            })
-            
-            remaining = max(0, limits.ai_requests_per_month - ai_requests_count)
-            allowed = remaining > 0
-            
-            return {
-                "allowed": allowed,
-                "remaining": remaining,
-                "limit": limits.ai_requests_per_month,
-                "plan": plan.value,
-                "used": ai_requests_count
-            }
-            
+            return (await EntitlementsService.get(user_id)).ai_limit_status()
         except Exception as e:
             logger.error(f"Erreur lors de la vérification de limite: {e}", exc_info=True)
             # En cas d'erreur, autoriser (fail open)
@@ -124,6 +86,7 @@ class SubscriptionService:
                 "endpoint": endpoint,
                 "created_at": datetime.now(timezone.utc)
             })
+            await EntitlementsService.record_ai_request(user_id)
             
             return True
         except Exception as e:
@@ -136,13 +99,8 @@ class SubscriptionService:
         Vérifie si l'utilisateur peut accéder à une fonctionnalité
         """
         try:
-            plan = await SubscriptionService.get_user_plan(user_id)
-            limits = SubscriptionService.get_plan_limits(plan)
-            
-            return feature in limits.features
-            
+            return (await EntitlementsService.get(user_id)).can_access(feature)
         except Exception as e:
             logger.error(f"Erreur lors de la vérification d'accès: {e}", exc_info=True)
             # En cas d'erreur, refuser l'accès (fail closed)
             return False
-
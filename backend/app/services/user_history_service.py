@@ -1,7 +1,7 @@
 """
 Service pour gérer l'historique utilisateur et le cache intelligent
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timezone, timedelta
 from app.repositories.user_history_repository import UserHistoryRepository
 from app.models.user_history import HistoryEntry, Subject, SimilarQuestionRequest, SimilarQuestionResponse
@@ -21,7 +21,7 @@ class UserHistoryService:
     @staticmethod
     def _get_cache_key(user_id: str, question: str) -> str:
         """Génère une clé de cache pour une question utilisateur"""
-        normalized = " ".join(question.lower().split())
+        normalized = UserHistoryRepository.normalize_question(question)
         hash_obj = hashlib.md5(f"{user_id}:{normalized}".encode())
         return f"user_history:{hash_obj.hexdigest()}"
     
@@ -145,6 +145,16 @@ class UserHistoryService:
         # 2. Sauvegarder dans MongoDB
         try:
             stored_entry = await UserHistoryRepository.create_entry(entry)
+            # Statistiques matérialisées (lecture O(1) par get_stats)
+            await UserHistoryRepository.increment_stats(
+                user_id,
+                question,
+                model_used=model_used,
+                subject=subject.value if subject else None,
+                tokens_used=tokens_used,
+                cost_eur=cost_eur,
+                created_at=stored_entry["created_at"]
+            )
         except Exception as e:
             logger.error(f"Erreur sauvegarde historique: {e}", exc_info=True)
             stored_entry = entry.dict()
@@ -163,7 +173,7 @@ class UserHistoryService:
         subject: Optional[Subject] = None,
         module_id: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
+        cursor: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Récupère l'historique d'un utilisateur"""
         return await UserHistoryRepository.get_user_history(
@@ -171,7 +181,24 @@ class UserHistoryService:
             subject=subject,
             module_id=module_id,
             limit=limit,
-            offset=offset
+            cursor=cursor
+        )
+    
+    @staticmethod
+    async def get_user_history_page(
+        user_id: str,
+        subject: Optional[Subject] = None,
+        module_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Page de l'historique d'un utilisateur et cursor de la page suivante"""
+        return await UserHistoryRepository.get_user_history_page(
+            user_id=user_id,
+            subject=subject,
+            module_id=module_id,
+            limit=limit,
+            cursor=cursor
         )
     
     @staticmethod
@@ -18,10 +18,13 @@ class ValidationService:
         user_id: str,
         module_id: str,
         exam_attempt_id: str,
-        score: float
+        score: float,
+        attempt: Optional[Dict[str, Any]] = None
     ) -> bool:
         """
         Valide un module pour un utilisateur après réussite d'un examen
+        
+        attempt: tentative déjà chargée par l'appelant (évite une relecture)
         """
         try:
             # Vérifier si le module est déjà validé
@@ -31,7 +34,8 @@ class ValidationService:
                 return True
 
             # Vérifier que la tentative d'examen existe et est réussie
-            attempt = await ExamAttemptRepository.find_by_id(exam_attempt_id)
+            if attempt is None or attempt.get("id") != exam_attempt_id:
+                attempt = await ExamAttemptRepository.find_by_id(exam_attempt_id)
             if not attempt:
                 raise HTTPException(
                     status_code=404,
@@ -0,0 +1,48 @@
+"""
+Tâches Celery de nettoyage des fichiers uploadés
+"""
+from app.celery_app import celery_app
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Dossier des fichiers de ressources (stockage dédupliqué, voir app/utils/file_storage.py)
+RESOURCE_DIR = Path("uploads/resources")
+RESOURCE_FILE_URL_PREFIX = "/api/resources/files/"
+
+# Délai avant qu'un fichier non référencé soit supprimé (couvre les uploads en cours)
+ORPHAN_GRACE_SECONDS = 24 * 3600
+
+
+async def _sweep_resource_files() -> int:
+    """Supprime les fichiers de ressources qui ne sont plus référencés"""
+    from app.database import db, connect_to_mongo
+    from app.repositories.resource_repository import ResourceRepository
+    from app.utils.file_storage import sweep_orphans
+
+    if db.database is None:
+        await connect_to_mongo()
+
+    async def is_referenced(filename: str) -> bool:
+        return await ResourceRepository.count_by_file_url(f"{RESOURCE_FILE_URL_PREFIX}{filename}") > 0
+
+    return await sweep_orphans(RESOURCE_DIR, is_referenced, ORPHAN_GRACE_SECONDS)
+
+
+@celery_app.task(name="sweep_orphan_resource_files", bind=True, max_retries=3, default_retry_delay=300)
+def sweep_orphan_resource_files(self):
+    """Retire les fichiers de ressources orphelins (planifiée par Celery beat)"""
+    try:
+        import asyncio
+        loop = asyncio.get_event_loop()
+        if loop.is_closed():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+
+        removed = loop.run_until_complete(_sweep_resource_files())
+        logger.info(f"{removed} fichier(s) de ressource orphelin(s) supprimé(s)")
+        return {"status": "completed", "removed": removed}
+    except Exception as e:
+        logger.error(f"Erreur lors du nettoyage des fichiers orphelins: {e}", exc_info=True)
+        raise self.retry(exc=e)
@@ -0,0 +1,88 @@
+"""
+Tâches Celery pour l'export RGPD des comptes volumineux
+"""
+from app.celery_app import celery_app
+from pathlib import Path
+from typing import Optional
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Dossier des archives d'export générées en arrière-plan
+EXPORT_DIR = Path("uploads/exports")
+
+# Durée de conservation d'une archive (elle contient toutes les données de l'utilisateur)
+EXPORT_RETENTION_SECONDS = 24 * 3600
+
+
+def is_expired(path: Path, now: Optional[float] = None) -> bool:
+    """True si l'archive (ou le fichier temporaire) a dépassé la durée de conservation"""
+    return (now or time.time()) - path.stat().st_mtime > EXPORT_RETENTION_SECONDS
+
+
+def purge_expired_exports() -> int:
+    """Supprime les archives expirées et les fichiers temporaires abandonnés ; retourne le nombre supprimé"""
+    if not EXPORT_DIR.exists():
+        return 0
+    now = time.time()
+    removed = 0
+    for path in EXPORT_DIR.iterdir():
+        try:
+            if path.is_file() and is_expired(path, now):
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Impossible de supprimer l'export expiré {path.name}: {e}")
+    return removed
+
+
+async def _write_export(user_id: str) -> dict:
+    """Écrit l'archive ZIP de l'utilisateur sur disque, par blocs"""
+    import aiofiles
+    import aiofiles.os
+    from app.database import db, connect_to_mongo
+    from app.services.gdpr_service import GDPRService
+
+    if db.database is None:
+        await connect_to_mongo()
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    filename = f"gdpr_{uuid.uuid4().hex}.zip"
+    temp_path = EXPORT_DIR / f"{filename}.part"
+    size = 0
+    async with aiofiles.open(temp_path, "wb") as archive:
+        async for chunk in GDPRService.stream_export_zip(user_id):
+            await archive.write(chunk)
+            size += len(chunk)
+    await aiofiles.os.replace(temp_path, EXPORT_DIR / filename)
+    return {"status": "completed", "user_id": user_id, "filename": filename, "size": size}
+
+
+@celery_app.task(name="export_user_data_async", bind=True, max_retries=3, default_retry_delay=30)
+def export_user_data_async(self, user_id: str):
+    """Génère l'archive d'export RGPD d'un utilisateur en arrière-plan"""
+    try:
+        import asyncio
+        loop = asyncio.get_event_loop()
+        if loop.is_closed():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        
+        result = loop.run_until_complete(_write_export(user_id))
+        logger.info(f"Export RGPD généré pour l'utilisateur {user_id} ({result['size']} octets)")
+        return result
+    except Exception as e:
+        logger.error(f"Erreur lors de l'export RGPD asynchrone: {e}", exc_info=True)
+        raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+
+
+@celery_app.task(name="purge_expired_exports")
+def purge_expired_exports_task():
+    """Supprime les archives d'export expirées (planifiée par Celery beat)"""
+    removed = purge_expired_exports()
+    logger.info(f"{removed} archive(s) d'export RGPD expirée(s) supprimée(s)")
+    return {"status": "completed", "removed": removed}
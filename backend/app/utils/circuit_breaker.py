@@ -1,131 +1,280 @@
 """
 Circuit Breaker Pattern pour protéger contre les pannes en cascade
 Protège les appels aux services externes (OpenAI, MongoDB, etc.)
+
+Les vérifications et transitions d'état sont synchrones (aucun await) :
+elles sont atomiques dans la boucle asyncio, sans verrou, et l'appel
+protégé s'exécute en parallèle des autres. L'ouverture d'un circuit
+peut être partagée entre workers via Redis (shared=True).
 """
 import asyncio
 import logging
+import time
 from enum import Enum
-from typing import Callable, TypeVar, Optional
-from datetime import datetime, timedelta
+from typing import Callable, Dict, TypeVar, Optional
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# Préfixe des clés Redis des circuits ouverts partagés
+REDIS_KEY_PREFIX = "circuit_breaker:"
+# Intervalle minimal entre deux lectures de l'état partagé (secondes)
+REMOTE_SYNC_INTERVAL = 1.0
+
 
 class CircuitState(Enum):
     """États du circuit breaker"""
     CLOSED = "closed"  # Normal, les requêtes passent
     OPEN = "open"  # Panne détectée, toutes les requêtes sont bloquées
-    HALF_OPEN = "half_open"  # Test de récupération, une seule requête est autorisée
+    HALF_OPEN = "half_open"  # Test de récupération, quelques requêtes sont autorisées
+
+
+# Valeurs exportées dans la gauge Prometheus 'circuit_breaker_state'
+_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
 
 
 class CircuitBreaker:
     """Circuit breaker pour protéger les appels aux services externes"""
-    
+
     def __init__(
         self,
         failure_threshold: int = 5,  # Nombre d'échecs avant ouverture
         success_threshold: int = 2,  # Nombre de succès pour fermer
         timeout: float = 60.0,  # Temps avant de passer en half-open (secondes)
-        expected_exception: tuple = (Exception,)
+        expected_exception: tuple = (Exception,),
+        name: str = "default",
+        half_open_max_calls: int = 1,  # Appels de test simultanés en half-open
+        shared: bool = False  # Partager l'ouverture du circuit via Redis
     ):
         self.failure_threshold = failure_threshold
         self.success_threshold = success_threshold
         self.timeout = timeout
         self.expected_exception = expected_exception
-        
+        self.name = name
+        self.half_open_max_calls = half_open_max_calls
+        self.shared = shared
+
         self.state = CircuitState.CLOSED
         self.failure_count = 0
         self.success_count = 0
-        self.last_failure_time: Optional[datetime] = None
-        self._lock = asyncio.Lock()
-    
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        # Incrémenté à chaque transition : une place de test n'est rendue que
+        # dans la fenêtre half-open qui l'a accordée
+        self._generation = 0
+        self._last_remote_sync = 0.0
+        self._publish_metrics()
+
     async def call(self, func: Callable, *args, **kwargs) -> T:
         """Exécute une fonction avec protection circuit breaker"""
-        async with self._lock:
-            # Vérifier l'état du circuit
-            if self.state == CircuitState.OPEN:
-                # Vérifier si on peut passer en half-open
-                if self.last_failure_time and \
-                   (datetime.now() - self.last_failure_time).total_seconds() >= self.timeout:
-                    self.state = CircuitState.HALF_OPEN
-                    self.success_count = 0
-                    logger.info(f"Circuit breaker: Passage en HALF_OPEN pour {func.__name__}")
-                else:
-                    raise CircuitBreakerOpenError(
-                        f"Circuit breaker is OPEN. Service unavailable. "
-                        f"Retry after {self.timeout} seconds."
-                    )
-            
-            # Exécuter la fonction
-            try:
-                result = await func(*args, **kwargs) if asyncio.iscoroutinefunction(func) else func(*args, **kwargs)
-                
-                # Succès
-                await self._on_success()
-                return result
-                
-            except self.expected_exception as e:
-                # Échec
-                await self._on_failure()
-                raise e
-    
-    async def _on_success(self):
-        """Gère un succès"""
+        if self.shared:
+            await self._sync_remote_state()
+
+        probe = self._acquire()
+        try:
+            result = await func(*args, **kwargs) if asyncio.iscoroutinefunction(func) else func(*args, **kwargs)
+        except self.expected_exception:
+            opened = self._on_failure(probe)
+            if opened and self.shared:
+                await self._publish_remote_open()
+            raise
+        except BaseException:
+            # Erreur non comptabilisée : libérer la place de test éventuelle
+            self._release_probe(probe)
+            raise
+
+        closed = self._on_success(probe)
+        if closed and self.shared:
+            await self._publish_remote_closed()
+        return result
+
+    def _acquire(self) -> Optional[int]:
+        """
+        Admet ou rejette un appel (section critique synchrone)
+
+        Returns:
+            La génération de la fenêtre half-open si l'appel est un appel de test, sinon None
+        """
+        if self.state == CircuitState.OPEN:
+            if self._opened_at is not None and time.monotonic() - self._opened_at >= self.timeout:
+                self._transition(CircuitState.HALF_OPEN)
+            else:
+                self._reject()
+
         if self.state == CircuitState.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self._reject()
+            self._half_open_calls += 1
+            return self._generation
+        return None
+
+    def _release_probe(self, probe: Optional[int]):
+        """Rend la place de test, si elle appartient à la fenêtre half-open courante"""
+        if probe is not None and probe == self._generation and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _reject(self):
+        from app.utils.prometheus_metrics import MetricsCollector
+        MetricsCollector.record_circuit_breaker_rejection(self.name)
+        remaining = self.retry_after()
+        raise CircuitBreakerOpenError(
+            f"Circuit breaker '{self.name}' is {self.state.value.upper()}. Service unavailable. "
+            f"Retry after {remaining:.0f} seconds.",
+            retry_after=remaining
+        )
+
+    def _on_success(self, probe: Optional[int]) -> bool:
+        """Gère un succès ; retourne True si le circuit vient de se fermer"""
+        # Seuls les appels de test de la fenêtre half-open courante prouvent le rétablissement
+        # (pas un appel admis avant l'ouverture et terminé depuis)
+        is_probe = probe is not None and probe == self._generation
+        self._release_probe(probe)
+        if self.state == CircuitState.HALF_OPEN:
+            if not is_probe:
+                return False
             self.success_count += 1
             if self.success_count >= self.success_threshold:
-                self.state = CircuitState.CLOSED
-                self.failure_count = 0
-                self.success_count = 0
-                logger.info("Circuit breaker: Circuit CLOSED (service recovered)")
+                self._transition(CircuitState.CLOSED)
+                logger.info(f"Circuit breaker '{self.name}': Circuit CLOSED (service recovered)")
+                return True
         elif self.state == CircuitState.CLOSED:
             # Réinitialiser le compteur d'échecs en cas de succès
             self.failure_count = 0
-    
-    async def _on_failure(self):
-        """Gère un échec"""
+        return False
+
+    def _on_failure(self, probe: Optional[int]) -> bool:
+        """Gère un échec ; retourne True si le circuit vient de s'ouvrir"""
+        self._release_probe(probe)
         self.failure_count += 1
-        self.last_failure_time = datetime.now()
-        
+
         if self.state == CircuitState.HALF_OPEN:
             # Retour en OPEN si échec en half-open
-            self.state = CircuitState.OPEN
-            self.success_count = 0
-            logger.warning("Circuit breaker: Retour en OPEN (service still failing)")
-        elif self.state == CircuitState.CLOSED and self.failure_count >= self.failure_threshold:
+            self._transition(CircuitState.OPEN)
+            logger.warning(f"Circuit breaker '{self.name}': Retour en OPEN (service still failing)")
+            return True
+        if self.state == CircuitState.CLOSED and self.failure_count >= self.failure_threshold:
             # Passer en OPEN si seuil d'échecs atteint
-            self.state = CircuitState.OPEN
+            self._transition(CircuitState.OPEN)
             logger.error(
-                f"Circuit breaker: Circuit OPENED after {self.failure_count} failures. "
+                f"Circuit breaker '{self.name}': Circuit OPENED after {self.failure_count} failures. "
                 f"Service unavailable for {self.timeout} seconds."
             )
-    
+            return True
+        return False
+
+    def _transition(self, state: CircuitState, opened_at: Optional[float] = None):
+        self.state = state
+        self.success_count = 0
+        self._generation += 1
+        if state == CircuitState.OPEN:
+            self._opened_at = opened_at if opened_at is not None else time.monotonic()
+        elif state == CircuitState.CLOSED:
+            self.failure_count = 0
+            self._opened_at = None
+        self._half_open_calls = 0
+        self._publish_metrics()
+
+    def _publish_metrics(self):
+        try:
+            from app.utils.prometheus_metrics import MetricsCollector
+            MetricsCollector.set_circuit_breaker_state(self.name, _STATE_VALUES[self.state])
+        except Exception as e:
+            logger.debug(f"Erreur métriques circuit breaker: {e}")
+
+    def retry_after(self) -> float:
+        """Secondes restantes avant le prochain essai (0 si le circuit n'est pas ouvert)"""
+        if self.state != CircuitState.OPEN or self._opened_at is None:
+            return 0.0
+        return max(self.timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    @property
+    def _redis_key(self) -> str:
+        return f"{REDIS_KEY_PREFIX}{self.name}"
+
+    async def _sync_remote_state(self):
+        """Ouvre le circuit localement si un autre worker l'a ouvert (au plus une lecture par seconde)"""
+        now = time.monotonic()
+        if self.state != CircuitState.CLOSED or now - self._last_remote_sync < REMOTE_SYNC_INTERVAL:
+            return
+        self._last_remote_sync = now
+        from app.utils.cache import get_redis
+        redis = get_redis()
+        if not redis:
+            return
+        try:
+            ttl_ms = await redis.pttl(self._redis_key)
+        except Exception as e:
+            logger.debug(f"Lecture état circuit breaker '{self.name}' impossible: {e}")
+            return
+        if ttl_ms and ttl_ms > 0 and self.state == CircuitState.CLOSED:
+            self._transition(CircuitState.OPEN, opened_at=time.monotonic() - (self.timeout - ttl_ms / 1000))
+            logger.warning(f"Circuit breaker '{self.name}': OPEN (ouvert par un autre worker)")
+
+    async def _publish_remote_open(self):
+        from app.utils.cache import get_redis
+        redis = get_redis()
+        if not redis:
+            return
+        try:
+            await redis.set(self._redis_key, "open", px=max(int(self.timeout * 1000), 1))
+        except Exception as e:
+            logger.debug(f"Publication état circuit breaker '{self.name}' impossible: {e}")
+
+    async def _publish_remote_closed(self):
+        from app.utils.cache import get_redis
+        redis = get_redis()
+        if not redis:
+            return
+        try:
+            await redis.delete(self._redis_key)
+        except Exception as e:
+            logger.debug(f"Publication état circuit breaker '{self.name}' impossible: {e}")
+
     def reset(self):
         """Réinitialise le circuit breaker"""
-        self.state = CircuitState.CLOSED
-        self.failure_count = 0
-        self.success_count = 0
-        self.last_failure_time = None
-        logger.info("Circuit breaker: Reset to CLOSED")
+        self._transition(CircuitState.CLOSED)
+        logger.info(f"Circuit breaker '{self.name}': Reset to CLOSED")
 
 
 class CircuitBreakerOpenError(Exception):
     """Exception levée quand le circuit breaker est ouvert"""
-    pass
+
+    def __init__(self, message: str = "", retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Registre des circuit breakers nommés (un par service / modèle / endpoint)
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """
+    Retourne le circuit breaker nommé, créé au premier appel
+
+    Les paramètres (failure_threshold, timeout, shared, ...) ne sont
+    utilisés qu'à la création.
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name=name, **kwargs)
+        _breakers[name] = breaker
+    return breaker
 
 
 # Circuit breakers globaux pour les services externes
-openai_circuit_breaker = CircuitBreaker(
+openai_circuit_breaker = get_circuit_breaker(
+    "openai",
     failure_threshold=5,
     success_threshold=2,
     timeout=60.0,
     expected_exception=(Exception,)
 )
 
-mongodb_circuit_breaker = CircuitBreaker(
+mongodb_circuit_breaker = get_circuit_breaker(
+    "mongodb",
     failure_threshold=3,
     success_threshold=1,
     timeout=30.0,
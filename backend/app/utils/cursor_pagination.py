@@ -1,183 +1,272 @@
 """
-Pagination basée sur les cursors pour meilleures performances
-Remplace skip/limit pour éviter les problèmes de performance avec de grandes collections
+Pagination par clé (keyset) avec cursors signés
+Remplace skip/limit : chaque page part de la dernière clé (sort_field, _id)
+vue, quel que soit son rang, au lieu de parcourir et jeter 'offset' documents.
+
+- tri sur (sort_field, _id) : l'_id départage les valeurs égales, l'ordre est total
+- cursor = clé du dernier document renvoyé, encodée puis signée (HMAC-SHA256)
+  avec la SECRET_KEY : un cursor modifié, ou émis pour une autre liste
+  (scope) ou un autre tri, est refusé
+- chaque liste doit être servie par un index (champs d'égalité, sort_field, _id)
+  dans app/database/indexes.py ; voir supporting_index et plan_is_index_backed
 """
-from typing import Optional, Dict, Any, List
-from bson import ObjectId
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+from bson import json_util
+from datetime import timezone
 import base64
-import json
-from datetime import datetime
+import hashlib
+import hmac
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+# Longueur de la signature (octets) ajoutée au cursor
+SIGNATURE_BYTES = 16
+# En-tête HTTP portant le cursor de la page suivante (le corps reste une liste)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Dates relues en UTC (aware), comme stockées par l'application
+_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True, tzinfo=timezone.utc)
+
+_fallback_secret: Optional[bytes] = None
+
+
+class InvalidCursorError(ValueError):
+    """Cursor illisible, falsifié ou émis pour une autre liste"""
+    pass
+
+
+def _secret() -> bytes:
+    global _fallback_secret
+    from app.config import settings
+    if settings.secret_key:
+        return settings.secret_key.encode("utf-8")
+    if _fallback_secret is None:
+        # Développement sans SECRET_KEY : cursors valables pour ce processus uniquement
+        logger.warning("SECRET_KEY absente - cursors de pagination signés avec une clé temporaire")
+        _fallback_secret = secrets.token_bytes(32)
+    return _fallback_secret
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(body: str) -> str:
+    digest = hmac.new(_secret(), body.encode("ascii"), hashlib.sha256).digest()
+    return _b64encode(digest[:SIGNATURE_BYTES])
 
 
-def encode_cursor(cursor_data: Dict[str, Any]) -> str:
+def encode_cursor(cursor_data: Dict[str, Any], scope: str = "") -> str:
     """
-    Encode un cursor pour la pagination
-    
+    Encode et signe un cursor
+
     Args:
-        cursor_data: Données du cursor (ex: {"_id": ObjectId(...), "created_at": datetime})
-    
+        cursor_data: Données du cursor (ObjectId et datetime conservés)
+        scope: Liste à laquelle le cursor est lié
+
     Returns:
-        String encodée en base64
+        '<données base64>.<signature base64>'
     """
-    # Convertir ObjectId et datetime en strings pour sérialisation
-    serializable = {}
-    for key, value in cursor_data.items():
-        if isinstance(value, ObjectId):
-            serializable[key] = str(value)
-        elif isinstance(value, datetime):
-            serializable[key] = value.isoformat()
-        else:
-            serializable[key] = value
-    
-    json_str = json.dumps(serializable, default=str)
-    return base64.urlsafe_b64encode(json_str.encode()).decode()
-
-
-def decode_cursor(cursor_str: str) -> Dict[str, Any]:
+    payload = json_util.dumps({"scope": scope, **cursor_data}, separators=(",", ":"), sort_keys=True)
+    body = _b64encode(payload.encode("utf-8"))
+    return f"{body}.{_sign(body)}"
+
+
+def decode_cursor(cursor_str: str, scope: str = "") -> Dict[str, Any]:
     """
-    Décode un cursor pour la pagination
-    
-    Args:
-        cursor_str: String encodée en base64
-    
-    Returns:
-        Dictionnaire avec les données du cursor
+    Vérifie et décode un cursor
+
+    Raises:
+        InvalidCursorError: signature invalide, format illisible ou autre liste
     """
     try:
-        json_str = base64.urlsafe_b64decode(cursor_str.encode()).decode()
-        data = json.loads(json_str)
-        
-        # Reconvertir les strings en ObjectId et datetime si nécessaire
-        if "_id" in data:
-            try:
-                data["_id"] = ObjectId(data["_id"])
-            except Exception:
-                pass
-        
-        if "created_at" in data:
-            try:
-                data["created_at"] = datetime.fromisoformat(data["created_at"])
-            except Exception:
-                pass
-        
-        return data
+        body, signature = cursor_str.split(".", 1)
+    except (AttributeError, ValueError):
+        raise InvalidCursorError("Cursor de pagination invalide")
+    if not hmac.compare_digest(signature, _sign(body)):
+        raise InvalidCursorError("Cursor de pagination invalide")
+    try:
+        data = json_util.loads(_b64decode(body).decode("utf-8"), json_options=_JSON_OPTIONS)
     except Exception:
-        return {}
+        raise InvalidCursorError("Cursor de pagination invalide")
+    if not isinstance(data, dict) or data.pop("scope", None) != scope:
+        raise InvalidCursorError("Cursor émis pour une autre liste")
+    return data
 
 
 def build_cursor_query(
-    cursor: Optional[str] = None,
+    cursor_data: Dict[str, Any],
     sort_field: str = "created_at",
     sort_direction: int = -1
 ) -> Dict[str, Any]:
     """
-    Construit une requête MongoDB basée sur un cursor
-    
+    Filtre MongoDB des documents situés après la clé du cursor
+
     Args:
-        cursor: Cursor encodé (optionnel)
+        cursor_data: Cursor décodé ({"value": ..., "_id": ...})
         sort_field: Champ de tri (par défaut: created_at)
         sort_direction: Direction du tri (-1 pour décroissant, 1 pour croissant)
-    
+
     Returns:
         Dictionnaire de requête MongoDB
     """
-    if not cursor:
-        return {}
-    
-    cursor_data = decode_cursor(cursor)
-    if not cursor_data:
-        return {}
-    
-    # Construire la requête pour récupérer les documents après le cursor
-    if sort_direction == -1:  # Décroissant
-        query = {
-            "$or": [
-                {sort_field: {"$lt": cursor_data.get(sort_field)}},
-                {
-                    "$and": [
-                        {sort_field: cursor_data.get(sort_field)},
-                        {"_id": {"$lt": cursor_data.get("_id")}}
-                    ]
-                }
-            ]
-        }
-    else:  # Croissant
-        query = {
-            "$or": [
-                {sort_field: {"$gt": cursor_data.get(sort_field)}},
-                {
-                    "$and": [
-                        {sort_field: cursor_data.get(sort_field)},
-                        {"_id": {"$gt": cursor_data.get("_id")}}
-                    ]
-                }
-            ]
-        }
-    
-    return query
-
-
-def create_cursor_from_doc(doc: Dict[str, Any], sort_field: str = "created_at") -> str:
+    op = "$lt" if sort_direction == -1 else "$gt"
+    last_id = cursor_data["_id"]
+    if sort_field == "_id":
+        return {"_id": {op: last_id}}
+
+    value = cursor_data.get("value")
+    if value is None:
+        # Valeur absente : en tête du tri croissant, en fin du tri décroissant
+        if sort_direction == -1:
+            return {sort_field: None, "_id": {op: last_id}}
+        return {"$or": [
+            {sort_field: {"$ne": None}},
+            {sort_field: None, "_id": {op: last_id}}
+        ]}
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]}
+
+
+def create_cursor_from_doc(
+    doc: Dict[str, Any],
+    sort_field: str = "created_at",
+    sort_direction: int = -1,
+    scope: str = ""
+) -> str:
     """
-    Crée un cursor à partir d'un document
-    
+    Crée le cursor de la page suivante à partir du dernier document renvoyé
+
     Args:
-        doc: Document MongoDB
+        doc: Document MongoDB (avec '_id' et le champ de tri)
         sort_field: Champ de tri utilisé
-    
+        sort_direction: Direction du tri
+        scope: Liste à laquelle le cursor est lié
+
     Returns:
-        Cursor encodé
+        Cursor signé
     """
-    cursor_data = {
-        "_id": doc.get("_id"),
-        sort_field: doc.get(sort_field)
-    }
-    return encode_cursor(cursor_data)
+    return encode_cursor(
+        {"_id": doc["_id"], "value": doc.get(sort_field), "sort": [sort_field, sort_direction]},
+        scope
+    )
 
 
-def paginate_with_cursor(
-    cursor_obj,
+async def paginate_with_cursor(
+    collection,
+    query: Dict[str, Any],
     limit: int,
     sort_field: str = "created_at",
     sort_direction: int = -1,
-    cursor: Optional[str] = None
-) -> tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    scope: str = ""
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
     """
-    Pagine des résultats avec un cursor
-    
+    Pagine une collection par clé (sort_field, _id)
+
     Args:
-        cursor_obj: Cursor MongoDB
+        collection: Collection Motor
+        query: Filtre de la liste
         limit: Nombre de résultats à retourner
         sort_field: Champ de tri
         sort_direction: Direction du tri
-        cursor: Cursor de départ (optionnel)
-    
+        cursor: Cursor renvoyé par la page précédente (optionnel)
+        projection: Projection MongoDB (doit conserver sort_field)
+        scope: Identifiant de la liste, lié à la signature des cursors
+
     Returns:
-        Tuple (results, next_cursor, prev_cursor)
+        Tuple (documents, cursor de la page suivante ou None)
+
+    Raises:
+        InvalidCursorError: cursor falsifié ou émis pour une autre liste
     """
-    # Construire la requête avec le cursor
-    query = build_cursor_query(cursor, sort_field, sort_direction)
-    
-    # Appliquer la requête si elle existe
-    if query:
-        cursor_obj = cursor_obj.find(query)
-    
-    # Trier et limiter
-    cursor_obj = cursor_obj.sort(sort_field, sort_direction).limit(limit + 1)  # +1 pour détecter s'il y a plus
-    
-    # Récupérer les résultats
-    results = []
-    async def fetch_results():
-        count = 0
-        async for doc in cursor_obj:
-            if count < limit:
-                results.append(doc)
-                count += 1
-            else:
-                # Il y a plus de résultats, créer le next_cursor
-                return create_cursor_from_doc(doc, sort_field)
-        return None
-    
-    # Note: Cette fonction doit être appelée avec await dans un contexte async
-    # Pour l'instant, on retourne une fonction async
-    return results, None, None
+    filter_query = query
+    if cursor:
+        cursor_data = decode_cursor(cursor, scope)
+        if cursor_data.get("sort") != [sort_field, sort_direction] or "_id" not in cursor_data:
+            raise InvalidCursorError("Cursor émis pour un autre tri")
+        keyset = build_cursor_query(cursor_data, sort_field, sort_direction)
+        filter_query = {"$and": [query, keyset]} if query else keyset
+
+    sort = [(sort_field, sort_direction)]
+    if sort_field != "_id":
+        sort.append(("_id", sort_direction))
+
+    # +1 pour savoir s'il existe une page suivante
+    mongo_cursor = collection.find(filter_query, projection).sort(sort).limit(limit + 1)
+    docs = await mongo_cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = create_cursor_from_doc(docs[-1], sort_field, sort_direction, scope)
+    return docs, next_cursor
+
+
+def _index_keys(index: Any) -> List[Tuple[str, Any]]:
+    """Clés d'un IndexModel (ou d'une liste de paires)"""
+    if hasattr(index, "document"):
+        return list(index.document["key"].items())
+    return list(index)
+
+
+def supporting_index(
+    indexes: Sequence[Any],
+    equality_fields: Sequence[str],
+    sort_field: str,
+    sort_direction: int = -1
+) -> Optional[List[Tuple[str, Any]]]:
+    """
+    Index capable de servir une liste paginée sans tri en mémoire
+
+    Il faut : les champs d'égalité en préfixe (dans n'importe quel ordre),
+    puis sort_field et _id, tous deux dans le sens du tri ou tous deux inversés
+    (parcours de l'index à rebours).
+
+    Returns:
+        Les clés de l'index trouvé, ou None
+    """
+    equality = set(equality_fields)
+    wanted = [(sort_field, sort_direction)]
+    if sort_field != "_id":
+        wanted.append(("_id", sort_direction))
+    reversed_wanted = [(field, -direction) for field, direction in wanted]
+
+    for index in indexes:
+        keys = _index_keys(index)
+        prefix, rest = keys[:len(equality)], keys[len(equality):]
+        if {field for field, _ in prefix} != equality:
+            continue
+        if rest[:len(wanted)] in (wanted, reversed_wanted):
+            return keys
+    return None
+
+
+def plan_is_index_backed(explain: Dict[str, Any]) -> bool:
+    """
+    Vérifie un plan 'explain' : parcours d'index (IXSCAN) sans étape SORT ni COLLSCAN
+    """
+    stages = []
+
+    def walk(stage: Dict[str, Any]) -> None:
+        if not isinstance(stage, dict):
+            return
+        if "stage" in stage:
+            stages.append(stage["stage"])
+        for key in ("inputStage", "queryPlan"):
+            if key in stage:
+                walk(stage[key])
+        for child in stage.get("inputStages", []):
+            walk(child)
+
+    walk(explain.get("queryPlanner", {}).get("winningPlan", {}))
+    return "IXSCAN" in stages and "SORT" not in stages and "COLLSCAN" not in stages
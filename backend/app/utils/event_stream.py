@@ -0,0 +1,48 @@
+"""
+Réponses en flux d'événements JSON : SSE (text/event-stream) ou NDJSON
+
+Chaque événement est un dict sérialisé sur une ligne ; en SSE le flux se
+termine par 'data: [DONE]' comme pour le chat en streaming.
+"""
+from typing import Any, AsyncIterator, Dict
+import json
+import logging
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = ("sse", "ndjson")
+MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"  # Désactiver le buffering nginx
+}
+
+
+def format_event(event: Dict[str, Any], stream_format: str = "sse") -> str:
+    line = json.dumps(event, ensure_ascii=False, default=str)
+    if stream_format == "ndjson":
+        return line + "\n"
+    return f"data: {line}\n\n"
+
+
+async def _encode(events: AsyncIterator[Dict[str, Any]], stream_format: str) -> AsyncIterator[str]:
+    try:
+        async for event in events:
+            yield format_event(event, stream_format)
+    except Exception as e:
+        # Le statut HTTP est déjà parti : l'erreur est signalée dans le flux
+        logger.error(f"Erreur pendant le flux d'événements: {e}", exc_info=True)
+        yield format_event({"type": "error", "detail": "Erreur lors de la génération"}, stream_format)
+    if stream_format == "sse":
+        yield "data: [DONE]\n\n"
+
+
+def event_stream_response(events: AsyncIterator[Dict[str, Any]], stream_format: str = "sse") -> StreamingResponse:
+    return StreamingResponse(
+        _encode(events, stream_format),
+        media_type=MEDIA_TYPES[stream_format],
+        headers=STREAM_HEADERS
+    )
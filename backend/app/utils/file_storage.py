@@ -0,0 +1,262 @@
+"""
+Stockage des fichiers uploadés - écriture en streaming et adressage par contenu
+
+Le fichier est copié par blocs dans un fichier temporaire (I/O asynchrones),
+la taille maximale est vérifiée pendant la copie et un SHA-256 est calculé au
+fil de l'eau. Le fichier final est nommé d'après son empreinte : deux uploads
+identiques ne sont stockés qu'une seule fois.
+
+Un fichier partagé n'est jamais supprimé en même temps que la ressource : les
+fichiers qui ne sont plus référencés sont retirés par sweep_orphans(), après
+un délai de grâce qui couvre les uploads en cours.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+from urllib.parse import quote
+import hashlib
+import os
+import time
+import uuid
+import logging
+
+import aiofiles
+import aiofiles.os
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus/écrits (1 MB)
+CHUNK_SIZE = 1024 * 1024
+
+# Préfixe des fichiers temporaires (ignorés au téléchargement)
+TEMP_PREFIX = ".upload-"
+
+# Préfixe des fichiers mis de côté par sweep_orphans() avant suppression
+SWEEP_PREFIX = ".sweep-"
+
+_utime = aiofiles.os.wrap(os.utime)
+
+
+class FileTooLargeError(ValueError):
+    """Le fichier dépasse la taille maximale autorisée"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Fichier trop volumineux (max {max_size} octets)")
+
+
+class RangeNotSatisfiableError(ValueError):
+    """L'en-tête Range ne correspond à aucune portion du fichier"""
+
+
+@dataclass
+class StoredFile:
+    """Résultat d'un stockage de fichier"""
+    filename: str
+    path: Path
+    size: int
+    sha256: str
+    deduplicated: bool
+
+
+async def store_upload(upload, upload_dir: Path, extension: str, max_size: int,
+                       chunk_size: int = CHUNK_SIZE) -> StoredFile:
+    """
+    Copie un UploadFile en streaming vers un stockage adressé par contenu.
+
+    Le fichier temporaire est créé dans upload_dir pour que le renommage final
+    (os.replace) reste atomique sur le même système de fichiers.
+
+    Raises:
+        FileTooLargeError: si le fichier dépasse max_size
+    """
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    temp_path = upload_dir / f"{TEMP_PREFIX}{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(max_size)
+                digest.update(chunk)
+                await buffer.write(chunk)
+
+        sha256 = digest.hexdigest()
+        filename = f"{sha256}{extension}"
+        final_path = upload_dir / filename
+
+        if await aiofiles.os.path.exists(final_path):
+            try:
+                # Contenu déjà stocké : on garde l'exemplaire existant, rajeuni pour
+                # que sweep_orphans() ne le retire pas avant l'enregistrement de la ressource
+                await _utime(final_path)
+            except FileNotFoundError:
+                # Retiré entre-temps par sweep_orphans() : on stocke notre copie
+                pass
+            else:
+                await aiofiles.os.remove(temp_path)
+                logger.info(f"Fichier dédupliqué: {filename} ({size} octets)")
+                return StoredFile(filename, final_path, size, sha256, True)
+
+        await aiofiles.os.replace(temp_path, final_path)
+        logger.info(f"Fichier stocké: {final_path.absolute()} ({size} octets)")
+        return StoredFile(filename, final_path, size, sha256, False)
+    except BaseException:
+        try:
+            if temp_path.exists():
+                temp_path.unlink()
+        except OSError as cleanup_error:
+            logger.warning(f"Impossible de supprimer le fichier temporaire {temp_path}: {cleanup_error}")
+        raise
+
+
+def compute_etag(path: Path) -> str:
+    """
+    Calcule l'ETag d'un fichier stocké.
+
+    Pour les fichiers adressés par contenu, l'empreinte SHA-256 du nom est
+    réutilisée (ETag fort). Pour les anciens fichiers (noms UUID), on se
+    rabat sur la taille et la date de modification.
+    """
+    stem = path.stem
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return f'"{stem}"'
+    stat = path.stat()
+    return f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Vérifie si l'en-tête If-None-Match correspond à l'ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak_etag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == weak_etag:
+            return True
+    return False
+
+
+async def sweep_orphans(upload_dir: Path, is_referenced: Callable[[str], Awaitable[bool]],
+                        grace_seconds: float) -> int:
+    """
+    Supprime les fichiers stockés qui ne sont plus référencés.
+
+    Seuls les fichiers inchangés depuis grace_seconds sont examinés (store_upload
+    rajeunit un fichier réutilisé avant que la ressource ne soit enregistrée).
+    Le fichier est renommé avant d'être supprimé : s'il a été rajeuni entre la
+    vérification et le renommage, il est remis en place.
+
+    Returns:
+        nombre de fichiers supprimés
+    """
+    if not upload_dir.exists():
+        return 0
+    with await aiofiles.os.scandir(upload_dir) as iterator:
+        entries = list(iterator)
+    removed = 0
+    for entry in entries:
+        name = entry.name
+        if name.startswith((TEMP_PREFIX, SWEEP_PREFIX)) or not entry.is_file():
+            continue
+        try:
+            if time.time() - entry.stat().st_mtime < grace_seconds or await is_referenced(name):
+                continue
+            path = upload_dir / name
+            aside = upload_dir / f"{SWEEP_PREFIX}{uuid.uuid4().hex}-{name}"
+            await aiofiles.os.rename(path, aside)
+            if time.time() - (await aiofiles.os.stat(aside)).st_mtime < grace_seconds:
+                # Réutilisé par un upload concurrent : contenu identique, remis en place
+                await aiofiles.os.replace(aside, path)
+                continue
+            await aiofiles.os.remove(aside)
+            removed += 1
+            logger.info(f"Fichier orphelin supprimé: {name}")
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Impossible de supprimer le fichier orphelin {name}: {e}")
+    return removed
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Analyse un en-tête Range à une seule plage ("bytes=start-end").
+
+    Returns:
+        (start, end) inclusifs, ou None si l'en-tête est absent ou non géré
+        (plages multiples, unité inconnue) : le fichier complet est alors servi.
+
+    Raises:
+        RangeNotSatisfiableError: si la plage est hors du fichier
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        first = int(start_str) if start_str else None
+        last = int(end_str) if end_str else None
+    except ValueError:
+        return None
+
+    if first is None:
+        # Suffixe : les N derniers octets
+        if not last or last <= 0:
+            raise RangeNotSatisfiableError(range_header)
+        start = max(file_size - last, 0)
+        end = file_size - 1
+    else:
+        start = first
+        end = last if last is not None else file_size - 1
+
+    if start >= file_size or start > end or start < 0:
+        raise RangeNotSatisfiableError(range_header)
+    return start, min(end, file_size - 1)
+
+
+async def iter_file_range(path: Path, start: int, end: int,
+                          chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Lit une portion [start, end] d'un fichier par blocs (I/O asynchrones)"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def is_safe_filename(filename: str) -> bool:
+    """Refuse les noms de fichiers pouvant sortir du dossier d'upload"""
+    return (
+        bool(filename)
+        and filename == os.path.basename(filename)
+        and filename not in (".", "..")
+        and not filename.startswith((TEMP_PREFIX, SWEEP_PREFIX))
+    )
+
+
+def content_disposition(filename: str) -> str:
+    """En-tête Content-Disposition (même encodage que FileResponse)"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
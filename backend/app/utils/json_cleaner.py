@@ -1,7 +1,20 @@
 """
 Utilitaire pour nettoyer et parser le JSON généré par OpenAI
 Gère les caractères de contrôle invalides et autres problèmes de formatage
+
+TolerantJSONParser extrait et répare en une seule passe (linéaire) :
+- texte avant l'objet (« Voici le quiz : ```json ») et après sa fermeture
+- caractères de contrôle, retours à la ligne bruts dans les chaînes
+- échappements invalides (\\alpha -> \\\\alpha), guillemets non échappés dans les chaînes
+- virgules finales, virgules manquantes entre éléments
+- réponse tronquée : chaîne, clé ou littéral incomplet, accolades non fermées
+
+Il accepte le texte par morceaux (streaming) et renvoie les éléments déjà
+complets (ex. chaque question d'un quiz) sans attendre la fin de la réponse.
+clean_json_string et fix_unterminated_strings sont conservés pour les appelants
+historiques et la comparaison de performances (benchmarks.micro).
 """
+from typing import Any, List, Optional, Tuple
 import json
 import re
 import logging
@@ -109,58 +122,274 @@ def fix_unterminated_strings(json_str: str) -> str:
     return ''.join(result)
 
 
+# Arrêts du balayage : caractères structurels hors chaîne, guillemets/échappements/contrôles dans une chaîne
+_OUTSIDE_STOP = re.compile(r'["{}\[\],:\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+_INSIDE_STOP = re.compile(r'["\\\x00-\x1f\x7f]')
+_WHITESPACE = re.compile(r'\s*')
+_LITERAL_TOKEN = re.compile(r'\S+')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_VALID_ESCAPES = frozenset('"\\/bfnrt')
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_CLOSERS = {'{': '}', '[': ']'}
+# Littéral en fin de texte tronqué (après ':', ',' ou '[')
+_TRAILING_LITERAL = re.compile(r'[:,\[]\s*([^\s\[\]{},:"]+)$')
+_COMPLETE_LITERAL = re.compile(r'true|false|null|-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+
+
+class TolerantJSONParser:
+    """
+    Extraction et réparation du JSON d'une réponse LLM, en une passe
+
+    Usage ponctuel : repair_json(texte). En streaming :
+        parser = TolerantJSONParser(item_depth=3)
+        for chunk in stream:
+            for key, item in parser.feed(chunk):
+                ...  # item complet, enfant d'un tableau de clé 'key'
+        data = json.loads(parser.finish())
+
+    item_depth : profondeur des éléments renvoyés par feed() (objet racine = 1) ;
+    3 correspond aux objets de {"questions": [{...}, {...}]}.
+    """
+
+    def __init__(self, item_depth: int = 3):
+        self.item_depth = item_depth
+        self._pending = ""          # fin du texte reçu, pas encore décidable
+        self._out: List[str] = []   # JSON réparé, par morceaux
+        # Conteneurs ouverts : [caractère ouvrant, clé du conteneur, index de début dans _out]
+        self._stack: List[list] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._string_is_key = False
+        self._string_start = 0
+        self._expect_key = False
+        self._after_value = False
+        self._literal_open = False  # littéral pouvant se poursuivre dans le morceau suivant
+        self._comma: Optional[int] = None
+        self._last_key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._items: List[Tuple[Optional[str], Any]] = []
+
+    @property
+    def done(self) -> bool:
+        """True une fois l'objet racine fermé (la suite du texte est ignorée)"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[str], Any]]:
+        """Ajoute du texte ; retourne les éléments (clé du tableau parent, valeur) complétés"""
+        self._scan(self._pending + chunk, final=False)
+        items, self._items = self._items, []
+        return items
+
+    def finish(self) -> str:
+        """Termine le texte (réparation de la troncature) et retourne le JSON réparé ('' sans objet)"""
+        self._scan(self._pending, final=True)
+        if not self._started:
+            return ""
+        if self._done:
+            return "".join(self._out)
+
+        if self._in_string:
+            self._in_string = False
+            if self._string_is_key:
+                del self._out[self._string_start:]
+            else:
+                self._out.append('"')
+        text = "".join(self._out).rstrip()
+        tail_start = max(0, len(text) - 64)
+        match = _TRAILING_LITERAL.search(text, tail_start)
+        if match and not _COMPLETE_LITERAL.fullmatch(match.group(1)):
+            text = text[:match.start(1)].rstrip()
+        if text.endswith(":") and self._key_start is not None:
+            # Clé sans valeur : on la retire
+            text = "".join(self._out[:self._key_start]).rstrip()
+        text = text.rstrip(",").rstrip()
+        return text + "".join(_CLOSERS[frame[0]] for frame in reversed(self._stack))
+
+    def _value_start(self) -> None:
+        # Deux valeurs consécutives sans virgule : on l'ajoute (dans un objet, la suite est une clé)
+        if self._after_value and self._stack:
+            self._out.append(",")
+            self._expect_key = self._stack[-1][0] == "{"
+        self._comma = None
+        self._after_value = False
+
+    def _scan(self, buf: str, final: bool) -> None:
+        out = self._out
+        i, n = 0, len(buf)
+        while i < n and not self._done:
+            if not self._started:
+                j = buf.find("{", i)
+                if j < 0:
+                    i = n
+                    break
+                self._started = True
+                self._stack.append(["{", None, len(out)])
+                out.append("{")
+                self._expect_key = True
+                i = j + 1
+                continue
+
+            if self._in_string:
+                match = _INSIDE_STOP.search(buf, i)
+                if match is None:
+                    out.append(buf[i:])
+                    i = n
+                    break
+                j = match.start()
+                if j > i:
+                    out.append(buf[i:j])
+                char = buf[j]
+                if char == "\\":
+                    if j + 1 >= n:
+                        i = n if final else j
+                        break
+                    escaped = buf[j + 1]
+                    if escaped == "u":
+                        if j + 6 > n and not final:
+                            i = j
+                            break
+                        if _HEX4.fullmatch(buf, j + 2, j + 6):
+                            out.append(buf[j:j + 6])
+                            i = j + 6
+                        else:
+                            out.append("\\\\")
+                            i = j + 1
+                    elif escaped in _VALID_ESCAPES:
+                        out.append(buf[j:j + 2])
+                        i = j + 2
+                    else:
+                        out.append("\\\\")
+                        i = j + 1
+                elif char == '"':
+                    # Fin de chaîne seulement si suivie d'un séparateur, ou de blancs puis d'une
+                    # autre chaîne (virgule manquante : "x" "y") ; sinon guillemet interne
+                    k = _WHITESPACE.match(buf, j + 1).end()
+                    if k >= n and not final:
+                        i = j
+                        break
+                    if k >= n or buf[k] in ',:}]' or (
+                        buf[k] == '"' and k > j + 1 and not self._string_is_key
+                    ):
+                        out.append('"')
+                        self._in_string = False
+                        if self._string_is_key:
+                            try:
+                                self._last_key = json.loads("".join(out[self._string_start:]))
+                            except ValueError:
+                                self._last_key = None
+                        else:
+                            self._after_value = True
+                    else:
+                        out.append('\\"')
+                    i = j + 1
+                else:
+                    out.append(_CONTROL_ESCAPES.get(char, " "))
+                    i = j + 1
+                continue
+
+            match = _OUTSIDE_STOP.search(buf, i)
+            if match is None:
+                self._literal(buf[i:])
+                i = n
+                break
+            j = match.start()
+            if j > i:
+                self._literal(buf[i:j])
+            char = buf[j]
+            i = j + 1
+            self._literal_open = False
+            top = self._stack[-1][0] if self._stack else None
+
+            if char == '"':
+                self._value_start()
+                self._in_string = True
+                self._string_is_key = top == "{" and self._expect_key
+                self._string_start = len(out)
+                if self._string_is_key:
+                    self._key_start = len(out)
+                out.append('"')
+            elif char in "{[":
+                self._value_start()
+                key = self._last_key if top == "{" else None
+                self._stack.append([char, key, len(out)])
+                out.append(char)
+                self._expect_key = char == "{"
+            elif char in "}]":
+                if self._comma is not None:
+                    out[self._comma] = ""
+                    self._comma = None
+                frame = self._stack.pop()
+                out.append(_CLOSERS[frame[0]])
+                self._after_value = True
+                self._expect_key = False
+                if not self._stack:
+                    self._done = True
+                elif len(self._stack) + 1 == self.item_depth and self._stack[-1][0] == "[":
+                    self._emit(self._stack[-1][1], frame[2])
+            elif char == ",":
+                out.append(",")
+                self._comma = len(out) - 1
+                self._after_value = False
+                self._expect_key = top == "{"
+            elif char == ":":
+                out.append(":")
+                self._after_value = False
+                self._expect_key = False
+            else:
+                out.append(" ")
+
+        self._pending = "" if self._done else buf[i:]
+
+    def _literal(self, text: str) -> None:
+        # Littéraux séparés par des blancs ("[1, 2 3]") : virgule manquante ajoutée
+        pos = 0
+        for match in _LITERAL_TOKEN.finditer(text):
+            if match.start() > 0 or not self._literal_open:
+                self._value_start()
+            self._out.append(text[pos:match.end()])
+            pos = match.end()
+            self._after_value = True
+        self._out.append(text[pos:])
+        if text:
+            self._literal_open = not text[-1].isspace()
+
+    def _emit(self, key: Optional[str], start: int) -> None:
+        try:
+            self._items.append((key, json.loads("".join(self._out[start:]))))
+        except ValueError as e:
+            logger.debug(f"Élément JSON incomplet ignoré: {e}")
+
+
+def repair_json(text: str) -> str:
+    """JSON réparé du premier objet de 'text' ('' si aucun objet)"""
+    parser = TolerantJSONParser()
+    parser.feed(text)
+    return parser.finish()
+
+
 def safe_json_loads(json_str: str, fallback=None):
     """
     Parse un JSON de manière sécurisée avec nettoyage automatique
+
+    Le texte peut contenir autre chose que l'objet (markdown, explications) :
+    le premier objet est extrait et réparé par TolerantJSONParser.
     """
     if not json_str:
         return fallback
-    
+
     # Essayer de parser directement
     try:
         return json.loads(json_str)
     except json.JSONDecodeError:
         pass
-    
-    # Extraire le JSON si la chaîne contient du texte avant/après
-    json_start = json_str.find('{')
-    json_end = json_str.rfind('}') + 1
-    
-    if json_start >= 0 and json_end > json_start:
-        json_content = json_str[json_start:json_end]
-        
-        # Essayer de parser
-        try:
-            return json.loads(json_content)
-        except json.JSONDecodeError as e:
-            # Si c'est une erreur de chaîne non terminée, essayer de la corriger
-            if "Unterminated string" in str(e) or "Expecting property name" in str(e):
-                try:
-                    fixed = fix_unterminated_strings(json_content)
-                    return json.loads(fixed)
-                except json.JSONDecodeError:
-                    pass
-        
-        # Nettoyer et réessayer
-        try:
-            cleaned = clean_json_string(json_content)
-            # Essayer de corriger les chaînes non terminées
-            fixed = fix_unterminated_strings(cleaned)
-            return json.loads(fixed)
-        except json.JSONDecodeError as e:
-            logger.error(f"Erreur de parsing JSON même après nettoyage: {e}")
-            logger.error(f"Contenu problématique (premiers 1000 caractères): {json_content[:1000]}")
-            # Dernière tentative : tronquer à la dernière accolade fermante valide
-            try:
-                # Trouver la dernière accolade fermante complète
-                last_brace = json_content.rfind('}')
-                if last_brace > 0:
-                    truncated = json_content[:last_brace + 1]
-                    # Fermer toutes les chaînes ouvertes
-                    fixed = fix_unterminated_strings(truncated)
-                    return json.loads(fixed)
-            except:
-                pass
-            return fallback
-    
-    return fallback
+
+    repaired = repair_json(json_str)
+    if not repaired:
+        return fallback
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        logger.error(f"Erreur de parsing JSON même après réparation: {e}")
+        logger.error(f"Contenu problématique (premiers 1000 caractères): {json_str[:1000]}")
+        return fallback
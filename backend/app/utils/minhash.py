@@ -0,0 +1,116 @@
+"""
+Signatures MinHash et bandes LSH pour la détection de réponses similaires
+
+- les réponses sont normalisées puis découpées en shingles (k mots consécutifs,
+  ou k-grammes de caractères pour les réponses très courtes)
+- la signature MinHash (NUM_PERM entiers) estime la similarité de Jaccard
+  entre deux réponses sans les comparer directement
+- la signature est découpée en LSH_BANDS bandes de LSH_ROWS lignes : deux
+  réponses partageant au moins une bande sont candidates. Seuil approximatif
+  (1 / LSH_BANDS) ** (1 / LSH_ROWS) ≈ 0.42 avec les valeurs par défaut.
+"""
+from typing import Dict, Iterable, List, Set, Tuple
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_WORDS = 3
+SHINGLE_CHARS = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Permutations fixes : les signatures stockées restent comparables entre processus
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, int(_MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, int(_MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> List[str]:
+    """Mots en minuscules, sans accents ni ponctuation"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _WORD_RE.findall(text.lower())
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> Set[str]:
+    """Shingles de k mots (k-grammes de caractères si la réponse a moins de k mots)"""
+    words = normalize(text)
+    if len(words) >= k:
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    joined = " ".join(words)
+    if len(joined) <= SHINGLE_CHARS:
+        return {joined} if joined else set()
+    return {joined[i:i + SHINGLE_CHARS] for i in range(len(joined) - SHINGLE_CHARS + 1)}
+
+
+def _hash_shingle(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def signature_from_shingles(items: Iterable[str]) -> List[int]:
+    """Signature MinHash d'un ensemble de shingles (vide -> signature maximale)"""
+    hashes = np.fromiter((_hash_shingle(s) for s in items), dtype=np.uint64)
+    if hashes.size == 0:
+        return [int(_MAX_HASH)] * NUM_PERM
+    # (a * h + b) mod p, pour chaque permutation (lignes) et chaque shingle (colonnes)
+    permuted = (np.outer(_PERM_A, hashes % _MERSENNE_PRIME) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).tolist()
+
+
+def minhash_signature(text: str) -> List[int]:
+    """Signature MinHash d'une réponse"""
+    return signature_from_shingles(shingles(text))
+
+
+def lsh_bands(signature: List[int]) -> List[str]:
+    """Clés des bandes LSH ('indice:empreinte'), indexables dans MongoDB"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(
+            b"".join(int(value).to_bytes(4, "little") for value in rows), digest_size=8
+        ).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+def estimate_similarity(signature1: List[int], signature2: List[int]) -> float:
+    """Similarité de Jaccard estimée (part des positions identiques)"""
+    if not signature1 or len(signature1) != len(signature2):
+        return 0.0
+    if signature1[0] == int(_MAX_HASH) or signature2[0] == int(_MAX_HASH):
+        # Réponse vide
+        return 0.0
+    return float(np.mean(np.asarray(signature1) == np.asarray(signature2)))
+
+
+def candidate_pairs(bands_by_key: Dict[str, List[str]]) -> Set[Tuple[str, str]]:
+    """
+    Paires candidates à partir des bandes de chaque élément
+
+    Args:
+        bands_by_key: identifiant -> clés de bandes LSH
+
+    Returns:
+        Paires (a, b) avec a < b partageant au moins une bande
+    """
+    buckets: Dict[str, List[str]] = {}
+    for key, bands in bands_by_key.items():
+        for band in bands:
+            buckets.setdefault(band, []).append(key)
+
+    pairs: Set[Tuple[str, str]] = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        members = sorted(set(members))
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                pairs.add((first, second))
+    return pairs
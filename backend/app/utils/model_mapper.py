@@ -24,6 +24,16 @@ REAL_MODEL_COSTS: Dict[str, float] = {
     "gpt-5-nano": 0.50,
 }
 
+# Fenêtre de contexte (tokens, entrée + sortie) des vrais modèles OpenAI
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o-mini": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "gpt-3.5-turbo-16k": 16_385,
+}
+
 
 def map_to_real_model(model: str) -> str:
     """
@@ -68,6 +78,20 @@ def get_model_cost(model: str) -> float:
     return REAL_MODEL_COSTS.get(real_model, 2.50)  # Fallback: $2.50/M tokens (GPT-4o)
 
 
+def get_context_window(model: str) -> int:
+    """
+    Retourne la fenêtre de contexte (en tokens) d'un modèle.
+    
+    Args:
+        model: Nom du modèle (peut être fictif ou réel)
+        
+    Returns:
+        Taille de la fenêtre de contexte
+    """
+    real_model = model if model in MODEL_CONTEXT_WINDOWS else map_to_real_model(model)
+    return MODEL_CONTEXT_WINDOWS.get(real_model, 16_385)  # Fallback prudent
+
+
 def is_real_model(model: str) -> bool:
     """
     Vérifie si un modèle est un vrai modèle OpenAI (non fictif).
@@ -55,7 +55,7 @@ ai_request_duration = Histogram(
 ai_tokens_used = Counter(
     'ai_tokens_used_total',
     'Nombre total de tokens utilisés',
-    ['model', 'type']  # type: prompt, completion
+    ['model', 'type']  # type: prompt, completion, cached (prompt servi depuis le cache OpenAI)
 )
 
 ai_cost_eur = Counter(
@@ -70,6 +70,32 @@ ai_errors_total = Counter(
     ['model', 'error_type']
 )
 
+# Métriques circuit breakers
+circuit_breaker_state = Gauge(
+    'circuit_breaker_state',
+    'État du circuit breaker (0 = closed, 1 = half_open, 2 = open)',
+    ['breaker']
+)
+
+circuit_breaker_rejections = Counter(
+    'circuit_breaker_rejections_total',
+    'Nombre d\'appels rejetés par le circuit breaker',
+    ['breaker']
+)
+
+# Métriques retries
+retry_attempts = Counter(
+    'retry_attempts_total',
+    'Nombre de nouvelles tentatives après un échec temporaire',
+    ['operation']
+)
+
+retry_abandoned = Counter(
+    'retry_abandoned_total',
+    'Nombre de retries abandonnés',
+    ['operation', 'reason']  # reason: budget_exhausted, deadline
+)
+
 # Métriques cache
 cache_hits = Counter(
     'cache_hits_total',
@@ -161,7 +187,8 @@ class MetricsCollector:
         tokens_prompt: int = 0,
         tokens_completion: int = 0,
         cost_eur: float = 0.0,
-        status: str = 'success'
+        status: str = 'success',
+        tokens_cached: int = 0
     ):
         """Enregistre une requête IA"""
         ai_requests_total.labels(
@@ -178,12 +205,35 @@ class MetricsCollector:
         if tokens_completion > 0:
             ai_tokens_used.labels(model=model, type='completion').inc(tokens_completion)
         
+        if tokens_cached > 0:
+            ai_tokens_used.labels(model=model, type='cached').inc(tokens_cached)
+        
         if cost_eur > 0:
             ai_cost_eur.labels(model=model).inc(cost_eur)
         
         if status != 'success':
             ai_errors_total.labels(model=model, error_type=status).inc()
     
+    @staticmethod
+    def set_circuit_breaker_state(breaker: str, state_value: int):
+        """Définit l'état d'un circuit breaker"""
+        circuit_breaker_state.labels(breaker=breaker).set(state_value)
+    
+    @staticmethod
+    def record_circuit_breaker_rejection(breaker: str):
+        """Enregistre un appel rejeté par un circuit breaker"""
+        circuit_breaker_rejections.labels(breaker=breaker).inc()
+    
+    @staticmethod
+    def record_retry(operation: str):
+        """Enregistre une nouvelle tentative"""
+        retry_attempts.labels(operation=operation).inc()
+    
+    @staticmethod
+    def record_retry_abandoned(operation: str, reason: str):
+        """Enregistre un retry abandonné (budget épuisé ou deadline)"""
+        retry_abandoned.labels(operation=operation, reason=reason).inc()
+    
     @staticmethod
     def record_cache_hit(cache_type: str):
         """Enregistre un hit de cache"""
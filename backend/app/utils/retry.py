@@ -1,15 +1,134 @@
 """
 Utilitaires pour retry avec backoff exponentiel
+
+- full jitter : délai aléatoire dans [0, min(max_delay, initial_delay * base^n)]
+  pour éviter que tous les workers réessaient au même instant
+- respect de l'en-tête Retry-After (RateLimitError OpenAI)
+- deadline par requête (request_deadline) propagée via contextvars
+- budget de retries par processus (token bucket) : les retries ne
+  dépassent jamais une fraction du trafic de base
 """
 import asyncio
+import contextvars
 import logging
-from typing import Callable, TypeVar, Optional
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator, TypeVar, Optional
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# Instant (time.monotonic) au-delà duquel la requête en cours ne doit plus rien tenter
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceededError(TimeoutError):
+    """La deadline de la requête est dépassée"""
+    pass
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """
+    Fixe une deadline pour tous les appels effectués dans le bloc
+
+    Une deadline déjà définie plus courte est conservée.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining_time() -> Optional[float]:
+    """Secondes restantes avant la deadline de la requête (None si aucune deadline)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class RetryBudget:
+    """
+    Budget de retries (token bucket)
+
+    Chaque appel initial crédite `ratio` jeton, chaque retry en consomme un.
+    Un débit minimal (min_retries_per_second) permet de réessayer même à
+    faible trafic.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries_per_second: float = 1.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last_refill = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.min_retries_per_second)
+        self._last_refill = now
+
+    def record_request(self):
+        """Crédite le budget pour un appel initial"""
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        """Consomme un jeton pour un retry ; False si le budget est épuisé"""
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+# Budget partagé par tous les appels du processus
+retry_budget = RetryBudget()
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """Délai demandé par le serveur (Retry-After / retry-after-ms), en secondes"""
+    retry_after = getattr(exc, "retry_after", None)
+    if isinstance(retry_after, (int, float)) and retry_after > 0:
+        return float(retry_after)
+
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = parsedate_to_datetime(value)
+            return max(retry_at.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _record_metric(method: str, *args):
+    try:
+        from app.utils.prometheus_metrics import MetricsCollector
+        getattr(MetricsCollector, method)(*args)
+    except Exception as e:
+        logger.debug(f"Erreur métriques retry: {e}")
+
 
 async def retry_with_backoff(
     func: Callable,
@@ -17,11 +136,13 @@ async def retry_with_backoff(
     initial_delay: float = 1.0,
     max_delay: float = 60.0,
     exponential_base: float = 2.0,
-    exceptions: tuple = (Exception,)
+    exceptions: tuple = (Exception,),
+    operation: str = "default",
+    budget: Optional[RetryBudget] = None
 ) -> T:
     """
-    Exécute une fonction avec retry et backoff exponentiel
-    
+    Exécute une fonction avec retry et backoff exponentiel (full jitter)
+
     Args:
         func: Fonction à exécuter (doit être awaitable)
         max_retries: Nombre maximum de tentatives
@@ -29,16 +150,23 @@ async def retry_with_backoff(
         max_delay: Délai maximum en secondes
         exponential_base: Base pour le calcul exponentiel
         exceptions: Tuple d'exceptions à capturer
-    
+        operation: Nom de l'opération (métriques)
+        budget: Budget de retries (par défaut celui du processus)
+
     Returns:
         Résultat de la fonction
-    
+
     Raises:
-        La dernière exception si toutes les tentatives échouent
+        La dernière exception si toutes les tentatives échouent, si le budget
+        de retries est épuisé ou si la deadline de la requête serait dépassée
     """
-    delay = initial_delay
-    
+    budget = budget or retry_budget
+    budget.record_request()
+
     for attempt in range(max_retries):
+        remaining = get_remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f"Deadline dépassée avant la tentative {attempt + 1}")
         try:
             return await func()
         except exceptions as e:
@@ -46,15 +174,31 @@ async def retry_with_backoff(
                 # Dernière tentative échouée, lever l'exception
                 logger.error(f"Toutes les tentatives ont échoué après {max_retries} essais: {e}")
                 raise
-            
+
+            delay = random.uniform(0, min(max_delay, initial_delay * exponential_base ** attempt))
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+            remaining = get_remaining_time()
+            if remaining is not None and delay >= remaining:
+                logger.warning(f"Tentative {attempt + 1}/{max_retries} échouée: {e}. Deadline trop proche, abandon")
+                _record_metric("record_retry_abandoned", operation, "deadline")
+                raise
+
+            if not budget.try_acquire():
+                logger.warning(f"Tentative {attempt + 1}/{max_retries} échouée: {e}. Budget de retries épuisé")
+                _record_metric("record_retry_abandoned", operation, "budget_exhausted")
+                raise
+
             logger.warning(
                 f"Tentative {attempt + 1}/{max_retries} échouée: {e}. "
                 f"Réessai dans {delay:.2f} secondes..."
             )
-            
+            _record_metric("record_retry", operation)
+
             await asyncio.sleep(delay)
-            delay = min(delay * exponential_base, max_delay)
-    
+
     # Ne devrait jamais arriver ici, mais au cas où
     raise Exception("Erreur inattendue dans retry_with_backoff")
 
@@ -67,20 +211,16 @@ def retry_sync(
 ) -> T:
     """
     Version synchrone de retry_with_backoff
-    
+
     Args:
         func: Fonction à exécuter
         max_retries: Nombre maximum de tentatives
         initial_delay: Délai initial en secondes
         exceptions: Tuple d'exceptions à capturer
-    
+
     Returns:
         Résultat de la fonction
     """
-    import time
-    
-    delay = initial_delay
-    
     for attempt in range(max_retries):
         try:
             return func()
@@ -88,14 +228,17 @@ def retry_sync(
             if attempt == max_retries - 1:
                 logger.error(f"Toutes les tentatives ont échoué après {max_retries} essais: {e}")
                 raise
-            
+
+            delay = random.uniform(0, min(60.0, initial_delay * 2 ** attempt))
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
             logger.warning(
                 f"Tentative {attempt + 1}/{max_retries} échouée: {e}. "
                 f"Réessai dans {delay:.2f} secondes..."
             )
-            
+
             time.sleep(delay)
-            delay = min(delay * 2, 60.0)
-    
-    raise Exception("Erreur inattendue dans retry_sync")
 
+    raise Exception("Erreur inattendue dans retry_sync")
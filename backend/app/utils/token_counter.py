@@ -0,0 +1,212 @@
+"""
+Comptage des tokens et budget de contexte pour l'historique de conversation
+
+- tokenizer BPE local (tiktoken) si installé, sinon approximation ~4 caractères/token
+- longueurs encodées mises en cache par contenu (un même message d'historique
+  n'est encodé qu'une fois, même s'il est renvoyé à chaque tour)
+- historique tronqué au budget du modèle : les messages les plus récents sont
+  gardés, les plus anciens sont remplacés par un court résumé extractif
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import logging
+
+from app.config import settings
+from app.utils.model_mapper import get_context_window, map_to_real_model
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+    logger.warning("tiktoken non installé - estimation des tokens approximative (pip install tiktoken)")
+
+# Tokens de formatage ajoutés par l'API pour chaque message et pour l'amorce de réponse
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+# Coût forfaitaire d'une image (détail élevé, 512x512)
+IMAGE_PART_TOKENS = 765
+# Marge de sécurité sous la fenêtre de contexte
+CONTEXT_SAFETY_MARGIN = 256
+# Taille maximale du résumé des messages retirés de l'historique
+SUMMARY_TOKEN_BUDGET = 200
+SUMMARY_SNIPPET_CHARS = 120
+TRUNCATION_MARKER = " […]"
+
+# Cache LRU : (encodage, hash, longueur) -> nombre de tokens
+TOKEN_CACHE_SIZE = 10_000
+_token_cache: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+
+
+@lru_cache(maxsize=32)
+def _get_encoding(model: str):
+    if tiktoken is None:
+        return None
+    real_model = map_to_real_model(model)
+    try:
+        return tiktoken.encoding_for_model(real_model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Fichiers BPE indisponibles (pas de réseau au premier chargement...)
+        logger.warning(f"Encodage tiktoken indisponible pour {real_model}: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Nombre de tokens d'un texte (mis en cache par contenu)"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+
+    key = (encoding.name, hash(text), len(text))
+    cached = _token_cache.get(key)
+    if cached is not None:
+        _token_cache.move_to_end(key)
+        return cached
+
+    count = len(encoding.encode(text, disallowed_special=()))
+    _token_cache[key] = count
+    if len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+    return count
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Tronque un texte à max_tokens (début conservé)"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4] + TRUNCATION_MARKER
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARKER
+
+
+def _content_tokens(content: Any, model: str) -> int:
+    if content is None:
+        return 0
+    if isinstance(content, str):
+        return count_tokens(content, model)
+    if isinstance(content, list):
+        # Contenu multimodal : parties texte et images
+        total = 0
+        for part in content:
+            if not isinstance(part, dict):
+                total += count_tokens(str(part), model)
+            elif part.get("type") == "text":
+                total += count_tokens(part.get("text") or "", model)
+            elif part.get("type") == "image_url":
+                total += IMAGE_PART_TOKENS
+        return total
+    return count_tokens(str(content), model)
+
+
+def message_tokens(message: Dict[str, Any], model: str = "gpt-4o-mini") -> int:
+    """Tokens d'un message de chat, formatage compris"""
+    total = MESSAGE_OVERHEAD_TOKENS + _content_tokens(message.get("content"), model)
+    if message.get("name"):
+        total += 1
+    return total
+
+
+def count_messages_tokens(messages: List[Dict[str, Any]], model: str = "gpt-4o-mini") -> int:
+    """Tokens d'une liste de messages, telle qu'envoyée à l'API"""
+    if not messages:
+        return 0
+    return sum(message_tokens(message, model) for message in messages) + REPLY_PRIMING_TOKENS
+
+
+def history_budget(model: str, fixed_tokens: int, max_completion_tokens: int = 0) -> int:
+    """
+    Budget de tokens disponible pour l'historique
+
+    Borné par settings.ai_history_token_budget et par la fenêtre de contexte
+    du modèle, une fois le prompt fixe et la réponse attendue réservés.
+    """
+    available = get_context_window(model) - fixed_tokens - max_completion_tokens - CONTEXT_SAFETY_MARGIN
+    return max(0, min(settings.ai_history_token_budget, available))
+
+
+def _summarize(dropped: List[Dict[str, Any]], budget: int, model: str) -> Optional[Dict[str, Any]]:
+    """Résumé extractif (sans appel au modèle) des questions retirées de l'historique"""
+    budget = min(budget, SUMMARY_TOKEN_BUDGET) - MESSAGE_OVERHEAD_TOKENS
+    header = "Résumé des échanges précédents (questions de l'apprenant) :"
+    lines = []
+    used = count_tokens(header, model)
+    # Les plus récentes d'abord : ce sont les plus utiles si le budget est court
+    for message in reversed(dropped):
+        if message.get("role") != "user" or not isinstance(message.get("content"), str):
+            continue
+        snippet = " ".join(message["content"].split())[:SUMMARY_SNIPPET_CHARS]
+        if not snippet:
+            continue
+        line = f"- {snippet}"
+        cost = count_tokens(line, model) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return None
+    return {"role": "system", "content": "\n".join([header] + lines[::-1])}
+
+
+def fit_history(
+    history: Optional[List[Dict[str, Any]]],
+    model: str,
+    budget: int,
+    max_messages: Optional[int] = None,
+    summarize: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Garde les messages les plus récents qui tiennent dans `budget` tokens
+
+    - un dernier message trop long à lui seul (document collé) est tronqué
+      plutôt que de vider tout l'historique ;
+    - les messages retirés sont remplacés par un résumé extractif s'il reste
+      de la place.
+    """
+    if not history or budget <= 0:
+        return []
+
+    kept: List[Dict[str, Any]] = []
+    used = 0
+    first_kept = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        if max_messages is not None and len(kept) >= max_messages:
+            break
+        message = history[index]
+        cost = message_tokens(message, model)
+        if used + cost > budget:
+            if not kept and isinstance(message.get("content"), str):
+                content = truncate_to_tokens(
+                    message["content"],
+                    budget - MESSAGE_OVERHEAD_TOKENS - count_tokens(TRUNCATION_MARKER, model),
+                    model
+                )
+                if content:
+                    kept.append({**message, "content": content})
+                    used += message_tokens(kept[-1], model)
+                    first_kept = index
+            break
+        kept.append(message)
+        used += cost
+        first_kept = index
+    kept.reverse()
+
+    dropped = history[:first_kept]
+    if dropped:
+        logger.debug(f"Historique tronqué: {len(dropped)} messages retirés ({used}/{budget} tokens gardés)")
+        if summarize and budget - used > MESSAGE_OVERHEAD_TOKENS:
+            summary = _summarize(dropped, budget - used, model)
+            if summary:
+                kept.insert(0, summary)
+    return kept
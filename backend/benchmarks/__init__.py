@@ -0,0 +1,11 @@
+"""
+Benchmarks de performance du backend
+
+- fake_openai : serveur local compatible OpenAI (latence et débit configurables)
+- seed        : jeu de données MongoDB (utilisateurs, modules, progression, tentatives)
+- load        : générateur de charge asynchrone sur les parcours principaux
+- micro       : microbenchmarks des fonctions Python pures (débit, allocations, profil)
+- report      : percentiles, résultats JSON et comparaison à une référence
+
+Voir benchmarks/README.md.
+"""
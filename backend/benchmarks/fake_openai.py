@@ -0,0 +1,206 @@
+"""
+Serveur local compatible OpenAI (chat completions) pour les benchmarks
+
+Remplace l'API OpenAI pendant les mesures de charge : latences et débits
+reproductibles, aucun coût. Le backend y est branché avec
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-bench
+
+Comportement configurable :
+- latence avant le premier token (--latency-ms, --jitter-ms)
+- débit de génération (--tokens-per-second) et longueur des réponses (--completion-tokens)
+- streaming SSE (stream=True), avec le chunk d'usage final si stream_options.include_usage
+- réponses JSON (response_format json_object/json_schema) : quiz / examen factices
+- taux d'erreurs injectées (--error-rate : 429 et 500 à parts égales)
+
+Usage (depuis backend/):
+    python -m benchmarks.fake_openai --port 8100 --latency-ms 400 --tokens-per-second 60
+"""
+from typing import Any, AsyncIterator, Dict, List
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "la dérivée d'une fonction mesure sa variation instantanée ; pour une fonction polynomiale "
+    "on dérive chaque terme séparément puis on additionne les résultats . un algorithme de tri "
+    "compare les éléments deux à deux et sa complexité dépend du nombre de comparaisons . "
+    "exemple : si f ( x ) = x² alors f' ( x ) = 2x , ce qui donne la pente de la tangente"
+).split()
+
+
+class FakeOpenAIConfig:
+    """Paramètres du serveur (modifiables à chaud par les tests)"""
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 50.0,
+        tokens_per_second: float = 80.0,
+        completion_tokens: int = 200,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def first_token_delay(self) -> float:
+        jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Approximation 4 caractères = 1 token (pas de tokenizer côté serveur factice)"""
+    chars = sum(len(m.get("content") or "") if isinstance(m.get("content"), str) else 200 for m in messages)
+    return max(1, chars // 4)
+
+
+def _text_tokens(count: int, rng: random.Random) -> List[str]:
+    start = rng.randrange(len(WORDS))
+    return [WORDS[(start + i) % len(WORDS)] + " " for i in range(count)]
+
+
+def _json_content(count: int, rng: random.Random) -> str:
+    """Contenu JSON factice au format des quiz et examens générés"""
+    questions = max(1, count // 40)
+    return json.dumps({
+        "questions": [
+            {
+                "question": f"Question {i + 1} : " + "".join(_text_tokens(12, rng)).strip(),
+                "options": [f"Réponse {c}" for c in "ABCD"],
+                "correct_answer": rng.randrange(4),
+                "explanation": "".join(_text_tokens(15, rng)).strip(),
+                "points": 1.0,
+            }
+            for i in range(questions)
+        ]
+    }, ensure_ascii=False)
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, Any]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+def create_app(config: FakeOpenAIConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI (benchmarks)")
+    app.state.config = config
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "gpt-5-mini", "object": "model", "owned_by": "bench"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.requests += 1
+        if config.error_rate and config.rng.random() < config.error_rate:
+            status = config.rng.choice((429, 500))
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": "Erreur injectée", "type": "bench_error", "code": status}}
+            )
+
+        model = body.get("model", "gpt-5-mini")
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or config.completion_tokens
+        completion_tokens = max(1, min(config.completion_tokens, int(max_tokens)))
+        prompt_tokens = _prompt_tokens(body.get("messages", []))
+        wants_json = (body.get("response_format") or {}).get("type") in ("json_object", "json_schema")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if wants_json:
+            content = _json_content(completion_tokens, config.rng)
+            # Le JSON est découpé en morceaux d'environ 4 caractères (un « token »)
+            pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        else:
+            pieces = _text_tokens(completion_tokens, config.rng)
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_delay() + len(pieces) * config.token_delay())
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(pieces)},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(prompt_tokens, len(pieces)),
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: Dict[str, Any], finish_reason=None, usage=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            await asyncio.sleep(config.first_token_delay())
+            yield chunk({"role": "assistant", "content": ""})
+            delay = config.token_delay()
+            for piece in pieces:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield chunk({"content": piece})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk({}, usage=_usage(prompt_tokens, len(pieces)))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Délai avant le premier token")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="0 = réponse instantanée")
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = FakeOpenAIConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Générateur de charge asynchrone sur les parcours principaux de l'API
+
+Chaque utilisateur virtuel se connecte puis enchaîne des scénarios tirés
+au sort (pondérés) jusqu'à la fin de la mesure :
+- login           POST /api/auth/login
+- module_list     GET  /api/modules/ (et la page suivante via X-Next-Cursor)
+- tutor_chat      POST /api/ai/chat
+- tutor_stream    POST /api/ai/chat/stream (temps jusqu'au premier octet et total)
+- quiz            GET  /api/quiz/module/{id} puis POST /api/quiz/attempt
+- exam_submit     POST /api/exams/start puis POST /api/exams/submit
+- progress_stats  GET  /api/progress/stats
+
+Rapport : p50/p95/p99, débit et taux d'erreur par requête, écrit en JSON
+(benchmarks/results/) et comparé à une référence avec --baseline.
+
+Prérequis : backend lancé sur la base de benchmark (benchmarks.seed) avec
+OPENAI_BASE_URL pointant sur benchmarks.fake_openai.
+
+Usage (depuis backend/):
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --concurrency 50 --duration 60
+    python -m benchmarks.load --baseline benchmarks/results/baseline.json --output benchmarks/results/current.json
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+
+from benchmarks.report import (
+    DEFAULT_TOLERANCE, build_report, compare, load_report, print_regressions, print_table,
+    save_report, summarize_latencies
+)
+from benchmarks.seed import DEFAULT_MANIFEST
+
+DEFAULT_WEIGHTS = {
+    "login": 5,
+    "module_list": 30,
+    "tutor_chat": 10,
+    "tutor_stream": 10,
+    "quiz": 15,
+    "exam_submit": 10,
+    "progress_stats": 20,
+}
+TUTOR_MESSAGES = [
+    "Explique-moi la dérivée d'un produit de fonctions",
+    "Comment fonctionne le tri fusion ?",
+    "Quelle est la différence entre une suite arithmétique et géométrique ?",
+    "Donne-moi un exercice corrigé sur les probabilités conditionnelles",
+]
+
+
+class Recorder:
+    """Latences (ms) et erreurs par requête, hors période de chauffe"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    def record(self, name: str, elapsed_ms: float, ok: bool, status: int = 0) -> None:
+        if not self.recording:
+            return
+        self.statuses[name][status] += 1
+        if ok:
+            self.latencies[name].append(elapsed_ms)
+        else:
+            self.errors[name] += 1
+
+
+class VirtualUser:
+    """Un étudiant : session HTTP, jeton et identifiants tirés du jeu de données"""
+
+    def __init__(self, client: httpx.AsyncClient, dataset: Dict[str, Any], recorder: Recorder, rng: random.Random):
+        self.client = client
+        self.dataset = dataset
+        self.recorder = recorder
+        self.rng = rng
+        self.email = rng.choice(dataset["users"]) if dataset["users"] else None
+        self.token: Optional[str] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(name, (time.perf_counter() - start) * 1000, ok=False)
+            return None
+        self.recorder.record(name, (time.perf_counter() - start) * 1000, response.status_code < 400, response.status_code)
+        return response
+
+    async def login(self) -> None:
+        if not self.email:
+            return
+        response = await self.request(
+            "login", "POST", "/api/auth/login",
+            data={"username": self.email, "password": self.dataset["password"]}
+        )
+        if response is not None and response.status_code == 200:
+            self.token = response.json().get("access_token")
+
+    async def module_list(self) -> None:
+        response = await self.request("module_list", "GET", "/api/modules/", params={"limit": 20})
+        cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+        if cursor and self.rng.random() < 0.3:
+            await self.request("module_list", "GET", "/api/modules/", params={"limit": 20, "cursor": cursor})
+
+    async def tutor_chat(self) -> None:
+        await self.request("tutor_chat", "POST", "/api/ai/chat", json={
+            "message": self.rng.choice(TUTOR_MESSAGES),
+            "module_id": self.rng.choice(self.dataset["modules"]),
+        })
+
+    async def tutor_stream(self) -> None:
+        payload = {"message": self.rng.choice(TUTOR_MESSAGES), "module_id": self.rng.choice(self.dataset["modules"])}
+        start = time.perf_counter()
+        first_byte_ms = None
+        try:
+            async with self.client.stream("POST", "/api/ai/chat/stream", json=payload) as response:
+                async for chunk in response.aiter_bytes():
+                    if chunk and first_byte_ms is None:
+                        first_byte_ms = (time.perf_counter() - start) * 1000
+                ok, status = response.status_code < 400, response.status_code
+        except httpx.HTTPError:
+            ok, status = False, 0
+        total_ms = (time.perf_counter() - start) * 1000
+        self.recorder.record("tutor_stream", total_ms, ok, status)
+        if first_byte_ms is not None:
+            self.recorder.record("tutor_stream.ttfb", first_byte_ms, ok, status)
+
+    async def quiz(self) -> None:
+        quiz = self.rng.choice(self.dataset["quizzes"])
+        response = await self.request("quiz_get", "GET", f"/api/quiz/module/{quiz['module_id']}")
+        if response is None or response.status_code != 200:
+            return
+        questions = response.json().get("questions", [])
+        answers = {i: self.rng.randrange(max(1, len(q.get("options", [])))) for i, q in enumerate(questions)}
+        num_correct = sum(1 for i, q in enumerate(questions) if answers[i] == q.get("correct_answer"))
+        await self.request("quiz_attempt", "POST", "/api/quiz/attempt", json={
+            "module_id": quiz["module_id"], "quiz_id": response.json().get("id", quiz["id"]),
+            "answers": answers, "score": num_correct * 100 / max(1, len(questions)),
+            "time_spent": self.rng.randint(60, 600), "num_questions": len(questions), "num_correct": num_correct,
+        })
+
+    async def exam_submit(self) -> None:
+        if not self.token:
+            await self.login()
+        exam = self.rng.choice(self.dataset["exams"])
+        response = await self.request(
+            "exam_start", "POST", "/api/exams/start", json={"exam_id": exam["id"]}, headers=self.headers
+        )
+        if response is None or response.status_code >= 400:
+            return
+        await self.request("exam_submit", "POST", "/api/exams/submit", headers=self.headers, json={
+            "exam_id": exam["id"],
+            "answers": [{"question_index": i, "answer": self.rng.randrange(4)} for i in range(exam["num_questions"])],
+            "time_spent": self.rng.randint(300, 1800),
+        })
+
+    async def progress_stats(self) -> None:
+        await self.request("progress_stats", "GET", "/api/progress/stats")
+
+
+async def run_load(
+    base_url: str,
+    dataset: Dict[str, Any],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    weights: Dict[str, float],
+    seed: int = 0,
+    transport: Optional[httpx.AsyncBaseTransport] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Lance la charge et retourne le résumé par requête (plus '_total')"""
+    recorder = Recorder()
+    recorder.recording = warmup <= 0
+    names = [name for name, weight in weights.items() if weight > 0]
+    cumulative = [weights[name] for name in names]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits, transport=transport) as client:
+        users = [VirtualUser(client, dataset, recorder, random.Random(seed + i)) for i in range(concurrency)]
+        await asyncio.gather(*(user.login() for user in users))
+
+        loop = asyncio.get_running_loop()
+        measure_start = loop.time() + warmup
+        deadline = measure_start + duration
+
+        async def start_recording() -> None:
+            await asyncio.sleep(warmup)
+            recorder.recording = True
+
+        async def run_user(user: VirtualUser) -> None:
+            while loop.time() < deadline:
+                scenario: Callable[[], Awaitable[None]] = getattr(user, user.rng.choices(names, cumulative)[0])
+                await scenario()
+                # Laisse tourner les autres tâches même si la réponse était déjà prête
+                await asyncio.sleep(0)
+
+        await asyncio.gather(start_recording(), *(run_user(user) for user in users))
+        elapsed = loop.time() - measure_start
+
+    results = {
+        name: summarize_latencies(recorder.latencies[name], recorder.errors[name], elapsed)
+        for name in sorted(set(recorder.latencies) | set(recorder.errors))
+    }
+    all_latencies = [ms for name, values in recorder.latencies.items() if not name.endswith(".ttfb") for ms in values]
+    all_errors = sum(count for name, count in recorder.errors.items() if not name.endswith(".ttfb"))
+    results["_total"] = summarize_latencies(all_latencies, all_errors, elapsed)
+    return results
+
+
+def _parse_weights(values: List[str]) -> Dict[str, float]:
+    weights = dict(DEFAULT_WEIGHTS)
+    for value in values:
+        name, _, weight = value.partition("=")
+        if name not in DEFAULT_WEIGHTS:
+            raise SystemExit(f"Scénario inconnu: {name} (disponibles: {', '.join(DEFAULT_WEIGHTS)})")
+        weights[name] = float(weight)
+    return weights
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_MANIFEST, help="Manifeste écrit par benchmarks.seed")
+    parser.add_argument("--concurrency", type=int, default=50, help="Utilisateurs virtuels simultanés")
+    parser.add_argument("--duration", type=float, default=60.0, help="Durée de mesure (s)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Chauffe non mesurée (s)")
+    parser.add_argument("--weight", action="append", default=[], metavar="SCENARIO=POIDS",
+                        help="Pondération d'un scénario (0 pour le désactiver)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Fichier de résultats (défaut: results/load-<date>.json)")
+    parser.add_argument("--baseline", type=Path, help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    dataset = json.loads(args.dataset.read_text(encoding="utf-8"))
+    weights = _parse_weights(args.weight)
+    results = asyncio.run(run_load(
+        args.base_url, dataset, args.concurrency, args.duration, args.warmup, weights, args.seed
+    ))
+
+    report = build_report(
+        "load", results,
+        base_url=args.base_url, concurrency=args.concurrency, duration_s=args.duration,
+        weights=weights, dataset_counts=dataset.get("counts")
+    )
+    path = save_report(report, args.output)
+    print_table(results, ("count", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps"))
+    print(f"Résultats écrits dans {path}")
+
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), args.tolerance)
+        print_regressions(regressions)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
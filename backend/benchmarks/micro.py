@@ -0,0 +1,383 @@
+"""
+Microbenchmarks des fonctions Python pures du chemin de requête
+
+Chaque cas appelle une fonction CPU (nettoyage JSON, normalisation, détection
+d'abus, clés de cache, routage, assainissement) sur des entrées réalistes et
+volumineuses (sorties GPT de quiz, messages longs, requêtes imbriquées).
+
+Mesures par cas :
+- us_per_op / ops_per_sec : meilleure de --repeat séries, chaque série étant
+  calibrée pour durer au moins --min-time secondes
+- alloc_kb_per_op : pic de mémoire allouée pendant un appel (tracemalloc,
+  mesuré à part pour ne pas fausser le chronométrage)
+
+--profile écrit en plus, par cas, des piles échantillonnées au format
+« collapsed » (une ligne 'f1;f2;f3 N' par pile) lisible par flamegraph.pl,
+speedscope ou inferno.
+
+Usage (depuis backend/):
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter json --repeat 7
+    python -m benchmarks.micro --baseline benchmarks/results/baseline-micro.json
+    python -m benchmarks.micro --profile --filter clean_json
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+from benchmarks.report import (
+    DEFAULT_TOLERANCE, RESULTS_DIR, build_report, compare, load_report, print_regressions, print_table,
+    save_report
+)
+
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_REPEAT = 5
+ALLOC_SAMPLES = 3
+PROFILE_INTERVAL = 0.001
+PROFILE_DURATION = 2.0
+
+WORDS = (
+    "la dérivée d'une fonction mesure sa variation instantanée ; pour une fonction polynomiale, "
+    "on dérive chaque terme séparément puis on additionne les résultats. Un algorithme de tri "
+    "compare les éléments deux à deux : sa complexité dépend du nombre de comparaisons ! "
+    "Exemple : si f(x) = x² alors f'(x) = 2x, ce qui donne la pente de la tangente..."
+).split()
+
+
+class MicroCase:
+    """Un cas de benchmark : fonction sans argument préparée par setup()"""
+
+    def __init__(self, name: str, setup: Callable[[], Callable[[], Any]], description: str = ""):
+        self.name = name
+        self.setup = setup
+        self.description = description
+
+
+def _text(rng: random.Random, words: int) -> str:
+    start = rng.randrange(len(WORDS))
+    return " ".join(WORDS[(start + i) % len(WORDS)] for i in range(words))
+
+
+def gpt_quiz_output(rng: random.Random, questions: int = 150) -> str:
+    """
+    Sortie GPT typique d'une génération de quiz : texte autour du JSON,
+    retours à la ligne bruts et tabulations dans les chaînes, caractères de contrôle
+    """
+    items = []
+    for i in range(questions):
+        explanation = _text(rng, 40).replace(" ; ", " ;\n").replace(". ", ".\n\t")
+        items.append(
+            '    {\n'
+            f'      "question": "Question {i + 1} : {_text(rng, 15)} ?",\n'
+            f'      "options": ["Réponse A", "Réponse B", "Réponse \\"C\\"", "Réponse D"],\n'
+            f'      "correct_answer": {rng.randrange(4)},\n'
+            f'      "explanation": "{explanation}\x0b",\n'
+            '      "points": 1.0\n'
+            '    }'
+        )
+    return 'Voici le quiz demandé :\n```json\n{\n  "questions": [\n' + ",\n".join(items) + "\n  ]\n}\n```"
+
+
+def truncated_output(rng: random.Random) -> str:
+    """Réponse coupée au milieu d'une chaîne (max_tokens atteint)"""
+    text = gpt_quiz_output(rng)
+    return text[:int(len(text) * 0.8)].rsplit('"', 1)[0] + '"' + _text(rng, 10)
+
+
+def _run_sync(coroutine) -> Any:
+    """Exécute une coroutine qui ne suspend jamais, sans boucle d'événements"""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("La coroutine s'est suspendue : cas non mesurable en microbenchmark")
+
+
+def _clean_json():
+    from app.utils.json_cleaner import clean_json_string
+    text = gpt_quiz_output(random.Random(1))
+    return lambda: clean_json_string(text)
+
+
+def _fix_unterminated():
+    from app.utils.json_cleaner import fix_unterminated_strings
+    text = truncated_output(random.Random(2))
+    return lambda: fix_unterminated_strings(text)
+
+
+def _safe_json_loads():
+    from app.utils.json_cleaner import safe_json_loads
+    text = gpt_quiz_output(random.Random(3))
+    return lambda: safe_json_loads(text)
+
+
+def _legacy_chain():
+    """Ancienne chaîne de safe_json_loads : extraction find/rfind, nettoyage puis fermeture des chaînes"""
+    from app.utils.json_cleaner import clean_json_string, fix_unterminated_strings
+    text = gpt_quiz_output(random.Random(3))
+
+    def run():
+        content = text[text.find("{"):text.rfind("}") + 1]
+        return json.loads(fix_unterminated_strings(clean_json_string(content)))
+    return run
+
+
+def _repair_json():
+    from app.utils.json_cleaner import repair_json
+    text = gpt_quiz_output(random.Random(3))
+    return lambda: repair_json(text)
+
+
+def _streaming_parser():
+    from app.utils.json_cleaner import TolerantJSONParser
+    text = gpt_quiz_output(random.Random(3))
+    # Morceaux de la taille d'un token (~4 caractères) comme en streaming
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def run():
+        parser = TolerantJSONParser()
+        items = [item for chunk in chunks for item in parser.feed(chunk)]
+        parser.finish()
+        return items
+    return run
+
+
+def _normalize_message():
+    from app.services.semantic_cache import SemanticCache
+    message = _text(random.Random(4), 600)
+    return lambda: SemanticCache._normalize_message(message)
+
+
+def _prompt_hacking():
+    from app.services.abuse_detection_service import AbuseDetectionService
+    # Message légitime : tous les motifs sont parcourus (pire cas)
+    message = _text(random.Random(5), 800)
+    return lambda: _run_sync(AbuseDetectionService.detect_prompt_hacking(message))
+
+
+def _cache_key():
+    from app.utils.fast_cache import _generate_cache_key
+    rng = random.Random(6)
+    filters = {"subject": "mathematics", "difficulty": "advanced", "tags": [_text(rng, 3) for _ in range(20)]}
+    module_ids = [f"{rng.getrandbits(96):024x}" for _ in range(50)]
+    return lambda: _generate_cache_key("list_modules", "user-42", module_ids, filters=filters, limit=50, skip=0)
+
+
+def _estimate_complexity():
+    from app.services.ai_routing_service import AIRoutingService
+    rng = random.Random(7)
+    message = _text(rng, 300)
+    context = _text(rng, 1500)
+    return lambda: AIRoutingService._estimate_complexity(message, context)
+
+
+def _sanitize_string():
+    from app.utils.security import InputSanitizer
+    value = _text(random.Random(8), 1500).replace(" ; ", "\x00 \t\n ")
+    return lambda: InputSanitizer.sanitize_string(value, max_length=10000)
+
+
+def _sanitize_email():
+    from app.utils.security import InputSanitizer
+    return lambda: InputSanitizer.sanitize_email("  Jean.Dupont+kairos@Universite-Exemple.fr ")
+
+
+def _sanitize_object_id():
+    from app.utils.security import InputSanitizer
+    return lambda: InputSanitizer.sanitize_object_id("65f1c2a9e4b0d3a1f2c3d4e5")
+
+
+def _prevent_nosql_injection():
+    from app.utils.security import InputSanitizer
+    rng = random.Random(9)
+
+    def nested(depth: int) -> Dict[str, Any]:
+        node: Dict[str, Any] = {f"field_{i}": _text(rng, 20) for i in range(10)}
+        node["$where"] = "sleep(1000)"
+        node["count"] = rng.randrange(100)
+        if depth:
+            node["child"] = nested(depth - 1)
+        return node
+
+    query = nested(4)
+    return lambda: InputSanitizer.prevent_nosql_injection(query)
+
+
+CASES: List[MicroCase] = [
+    MicroCase("json_cleaner.clean_json_string", _clean_json, "quiz GPT de 150 questions"),
+    MicroCase("json_cleaner.fix_unterminated_strings", _fix_unterminated, "quiz tronqué dans une chaîne"),
+    MicroCase("json_cleaner.safe_json_loads", _safe_json_loads, "extraction + réparation + json.loads"),
+    MicroCase("json_cleaner.legacy_chain", _legacy_chain, "ancienne chaîne (référence de comparaison)"),
+    MicroCase("json_cleaner.repair_json", _repair_json, "réparation seule, une passe"),
+    MicroCase("json_cleaner.streaming_parser", _streaming_parser, "quiz reçu par morceaux de 4 caractères"),
+    MicroCase("semantic_cache.normalize_message", _normalize_message, "message de 600 mots"),
+    MicroCase("abuse_detection.detect_prompt_hacking", _prompt_hacking, "message légitime de 800 mots"),
+    MicroCase("fast_cache.generate_cache_key", _cache_key, "json.dumps + md5 sur arguments imbriqués"),
+    MicroCase("ai_routing.estimate_complexity", _estimate_complexity, "message + contexte longs"),
+    MicroCase("input_sanitizer.sanitize_string", _sanitize_string, "1500 mots avec contrôles"),
+    MicroCase("input_sanitizer.sanitize_email", _sanitize_email, ""),
+    MicroCase("input_sanitizer.sanitize_object_id", _sanitize_object_id, ""),
+    MicroCase("input_sanitizer.prevent_nosql_injection", _prevent_nosql_injection, "requête imbriquée (5 niveaux)"),
+]
+
+
+def _time_loop(func: Callable[[], Any], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - start
+
+
+def measure(func: Callable[[], Any], min_time: float = DEFAULT_MIN_TIME, repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """Débit (meilleure série) et pic d'allocation par appel"""
+    func()  # chauffe (imports paresseux, caches de regex)
+
+    # Calibrage : augmenter le nombre d'appels (x2 à x10) jusqu'à atteindre min_time
+    number = 1
+    elapsed = _time_loop(func, number)
+    while elapsed < min_time:
+        estimate = int(number * min_time / max(elapsed, 1e-9)) + 1
+        number = min(number * 10, max(number * 2, estimate))
+        elapsed = _time_loop(func, number)
+
+    best = min([elapsed] + [_time_loop(func, number) for _ in range(repeat - 1)]) / number
+
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(ALLOC_SAMPLES):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "count": number * repeat,
+        "us_per_op": round(best * 1e6, 3),
+        "ops_per_sec": round(1 / best, 1) if best > 0 else 0.0,
+        "alloc_kb_per_op": round(min(peaks) / 1024, 2),
+    }
+
+
+class StackSampler:
+    """
+    Échantillonneur de piles du thread appelant (profil type flamegraph)
+
+    Un thread relève la pile toutes les 'interval' secondes ; les piles sont
+    agrégées au format collapsed ('racine;...;feuille N').
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._switch_interval = sys.getswitchinterval()
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{Path(code.co_filename).stem}.{code.co_name}:{code.co_firstlineno}"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self) -> "StackSampler":
+        # Rendre la main plus souvent au thread d'échantillonnage
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 2))
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+def profile(func: Callable[[], Any], duration: float = PROFILE_DURATION, interval: float = PROFILE_INTERVAL) -> str:
+    """Piles collapsed de 'func' appelée en boucle pendant 'duration' secondes"""
+    func()
+    with StackSampler(interval) as sampler:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            func()
+    return sampler.collapsed()
+
+
+def select_cases(patterns: List[str]) -> List[MicroCase]:
+    if not patterns:
+        return list(CASES)
+    return [case for case in CASES if any(pattern in case.name for pattern in patterns)]
+
+
+def run_micro(
+    cases: List[MicroCase],
+    min_time: float = DEFAULT_MIN_TIME,
+    repeat: int = DEFAULT_REPEAT
+) -> Dict[str, Dict[str, Any]]:
+    return {case.name: measure(case.setup(), min_time, repeat) for case in cases}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", action="append", default=[], help="Sous-chaîne du nom des cas à lancer")
+    parser.add_argument("--list", action="store_true", help="Liste les cas disponibles")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="Durée minimale d'une série (s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Nombre de séries (la meilleure est gardée)")
+    parser.add_argument("--output", type=Path, help="Fichier de résultats (défaut: results/micro-<date>.json)")
+    parser.add_argument("--baseline", type=Path, help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--profile", action="store_true", help="Écrit les piles collapsed de chaque cas")
+    parser.add_argument("--profile-duration", type=float, default=PROFILE_DURATION)
+    parser.add_argument("--profile-dir", type=Path, default=RESULTS_DIR / "profiles")
+    args = parser.parse_args()
+
+    cases = select_cases(args.filter)
+    if args.list or not cases:
+        for case in CASES:
+            print(f"{case.name:45} {case.description}")
+        return
+
+    results = run_micro(cases, args.min_time, args.repeat)
+    report = build_report("micro", results, min_time=args.min_time, repeat=args.repeat)
+    path = save_report(report, args.output)
+    print_table(results, ("us_per_op", "ops_per_sec", "alloc_kb_per_op"))
+    print(f"Résultats écrits dans {path}")
+
+    if args.profile:
+        args.profile_dir.mkdir(parents=True, exist_ok=True)
+        for case in cases:
+            stacks_path = args.profile_dir / f"{case.name}.folded"
+            stacks_path.write_text(profile(case.setup(), args.profile_duration), encoding="utf-8")
+            print(f"Piles écrites dans {stacks_path} (flamegraph.pl {stacks_path.name} > {case.name}.svg)")
+
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), args.tolerance)
+        print_regressions(regressions)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Statistiques, résultats JSON et comparaison à une référence (baseline)
+
+Format d'un fichier de résultats :
+    {
+        "meta": {"suite": ..., "git_commit": ..., "created_at": ..., ...},
+        "results": {
+            "<nom>": {"count": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ..., "throughput_rps": ..., ...}
+        }
+    }
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import platform
+import statistics
+import subprocess
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_TOLERANCE = 0.10
+
+# Métriques comparées : plus haut = pire (latences, allocations) ou plus bas = pire (débit)
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms", "error_rate", "alloc_kb_per_op", "us_per_op")
+LOWER_IS_WORSE = ("throughput_rps", "ops_per_sec")
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Percentile par rang le plus proche (0 si aucune valeur)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize_latencies(latencies_ms: Sequence[float], errors: int, elapsed_s: float) -> Dict[str, Any]:
+    """Résumé d'une série de latences : percentiles, moyenne, débit, taux d'erreur"""
+    count = len(latencies_ms)
+    total = count + errors
+    return {
+        "count": count,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies_ms), 2) if latencies_ms else 0.0,
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else 0.0,
+        "throughput_rps": round(count / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_report(suite: str, results: Dict[str, Dict[str, Any]], **meta: Any) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "suite": suite,
+            "git_commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            **meta,
+        },
+        "results": results,
+    }
+
+
+def save_report(report: Dict[str, Any], path: Optional[Path] = None) -> Path:
+    """Écrit le rapport (par défaut results/<suite>-<date>.json)"""
+    if path is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = RESULTS_DIR / f"{report['meta']['suite']}-{stamp}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def load_report(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE
+) -> List[Dict[str, Any]]:
+    """
+    Régressions de 'current' par rapport à 'baseline'
+
+    Une métrique régresse quand elle se dégrade de plus de 'tolerance'
+    (10 % par défaut) : latence ou allocations plus hautes, débit plus bas.
+    """
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        result = current.get("results", {}).get(name)
+        if result is None:
+            continue
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            before, after = base.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change > tolerance if metric in HIGHER_IS_WORSE else change < -tolerance
+            if worse:
+                regressions.append({
+                    "name": name, "metric": metric, "baseline": before, "current": after,
+                    "change_pct": round(change * 100, 1)
+                })
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]], columns: Sequence[str]) -> None:
+    width = max([len(name) for name in results] + [10])
+    print(f"{'':{width}}  " + "  ".join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:{width}}  " + "  ".join(f"{result.get(column, ''):>14}" for column in columns))
+
+
+def print_regressions(regressions: List[Dict[str, Any]]) -> None:
+    if not regressions:
+        print("Aucune régression par rapport à la référence")
+        return
+    print(f"{len(regressions)} régression(s) :")
+    for r in regressions:
+        print(f"  {r['name']}.{r['metric']}: {r['baseline']} -> {r['current']} ({r['change_pct']:+.1f}%)")
@@ -0,0 +1,273 @@
+"""
+Jeu de données de benchmark dans MongoDB
+
+Crée N utilisateurs (même mot de passe), des modules avec leçons, un quiz et
+un examen par module, puis pour chaque utilisateur de la progression, de
+l'historique du tuteur et des tentatives de quiz et d'examen. L'utilisateur
+"anonymous" (routes publiques) reçoit le même volume que les autres.
+
+Écrit le manifeste du jeu (identifiants, ids des modules et examens) lu par
+le générateur de charge (benchmarks/load.py).
+
+La base visée est celle de MONGODB_URL / MONGODB_DB_NAME ; par sécurité son
+nom doit contenir "bench" (sinon --force).
+
+Usage (depuis backend/):
+    MONGODB_DB_NAME=kairos_bench python -m benchmarks.seed --users 200 --modules 100 --reset
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+from benchmarks.report import RESULTS_DIR
+
+DEFAULT_MANIFEST = RESULTS_DIR / "dataset.json"
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 1000
+SEEDED_COLLECTIONS = (
+    "users", "modules", "quizzes", "exams", "progress",
+    "user_history", "quiz_attempts", "exam_attempts"
+)
+
+SUBJECTS = ("mathematics", "computer_science")
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+TOPICS = {
+    "mathematics": ["Dérivées", "Intégrales", "Probabilités", "Suites numériques", "Matrices", "Équations différentielles"],
+    "computer_science": ["Algorithmes de tri", "Graphes", "Récursivité", "Bases de données", "Réseaux", "Complexité"],
+}
+QUESTIONS = [
+    "Comment calculer la dérivée de {topic} ?",
+    "Peux-tu m'expliquer {topic} avec un exemple ?",
+    "Quelle est la différence entre {topic} et le chapitre précédent ?",
+    "Je ne comprends pas l'exercice 3 sur {topic}",
+    "Donne-moi un résumé de {topic} pour réviser l'examen",
+]
+
+
+def _questions(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "question": f"Question {i + 1}",
+            "options": [f"Réponse {c}" for c in "ABCD"],
+            "correct_answer": rng.randrange(4),
+            "explanation": "Explication de la réponse attendue.",
+            "points": 1.0,
+        }
+        for i in range(count)
+    ]
+
+
+def build_modules(rng: random.Random, count: int, now: datetime) -> List[Dict[str, Any]]:
+    modules = []
+    for i in range(count):
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        topic = rng.choice(TOPICS[subject])
+        created = now - timedelta(days=count - i)
+        modules.append({
+            "title": f"{topic} - niveau {i + 1}",
+            "description": f"Module d'entraînement sur {topic.lower()} : cours, exemples et exercices.",
+            "subject": subject,
+            "difficulty": rng.choice(DIFFICULTIES),
+            "estimated_time": rng.choice((30, 45, 60, 90)),
+            "learning_objectives": [f"Maîtriser {topic.lower()}", "Résoudre des exercices types"],
+            "content": {
+                "lessons": [
+                    {"title": f"Leçon {n + 1} : {topic}", "content": "Texte de la leçon. " * 40}
+                    for n in range(rng.randint(3, 8))
+                ]
+            },
+            "created_at": created,
+            "updated_at": created,
+        })
+    return modules
+
+
+def build_user_documents(
+    rng: random.Random,
+    user_id: str,
+    modules: List[Dict[str, Any]],
+    exams: Dict[str, Dict[str, Any]],
+    history_per_user: int,
+    attempts_per_user: int,
+    now: datetime
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Progression, historique et tentatives d'un utilisateur"""
+    docs: Dict[str, List[Dict[str, Any]]] = {"progress": [], "user_history": [], "quiz_attempts": [], "exam_attempts": []}
+    followed = rng.sample(modules, k=min(len(modules), max(1, attempts_per_user)))
+
+    for module in followed:
+        module_id = str(module["_id"])
+        started = now - timedelta(days=rng.randint(1, 60))
+        completed = rng.random() < 0.5
+        docs["progress"].append({
+            "user_id": user_id, "module_id": module_id, "completed": completed,
+            "score": round(rng.uniform(40, 100), 1) if completed else None,
+            "time_spent": rng.randint(60, 5400), "attempts": rng.randint(1, 3),
+            "started_at": started, "completed_at": started + timedelta(hours=2) if completed else None,
+        })
+
+        num_questions = 10
+        num_correct = rng.randint(0, num_questions)
+        when = started + timedelta(minutes=rng.randint(5, 600))
+        docs["quiz_attempts"].append({
+            "user_id": user_id, "module_id": module_id, "quiz_id": str(module["quiz_id"]),
+            "answers": {str(q): rng.randrange(4) for q in range(num_questions)},
+            "score": num_correct * 100 / num_questions, "time_spent": rng.randint(60, 900),
+            "num_questions": num_questions, "num_correct": num_correct,
+            "started_at": when, "completed_at": when,
+        })
+
+        exam = exams[module_id]
+        max_score = float(len(exam["questions"]))
+        score = float(rng.randint(0, int(max_score)))
+        docs["exam_attempts"].append({
+            "user_id": user_id, "exam_id": str(exam["_id"]), "module_id": module_id,
+            "score": score, "max_score": max_score, "percentage": score * 100 / max_score,
+            "passed": score * 100 / max_score >= exam["passing_score"],
+            "answers": [], "time_spent": rng.randint(300, 1800),
+            "started_at": when, "completed_at": when + timedelta(minutes=20),
+        })
+
+    for _ in range(history_per_user):
+        module = rng.choice(modules)
+        topic = module["title"].split(" - ")[0]
+        question = rng.choice(QUESTIONS).format(topic=topic.lower())
+        docs["user_history"].append({
+            "user_id": user_id, "question": question, "answer": "Réponse du tuteur. " * 30,
+            "subject": module["subject"], "module_id": str(module["_id"]),
+            "model_used": "gpt-5-mini", "tokens_used": rng.randint(200, 2000), "cost_eur": 0.0004,
+            "language": "fr", "metadata": None,
+            "keywords": [w for w in question.lower().split() if len(w) >= 4][:10],
+            "created_at": now - timedelta(minutes=rng.randint(1, 60 * 24 * 90)),
+        })
+    return docs
+
+
+def _batches(documents: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
+    for start in range(0, len(documents), BATCH_SIZE):
+        yield documents[start:start + BATCH_SIZE]
+
+
+async def seed(
+    users: int,
+    modules_count: int,
+    history_per_user: int,
+    attempts_per_user: int,
+    reset: bool,
+    seed_value: int = 0
+) -> Dict[str, Any]:
+    from app.database.indexes import apply_index_manifest
+    from app.database.mongo import get_database
+    from app.utils.security import PasswordHasher
+
+    db = get_database()
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+
+    if reset:
+        for collection in SEEDED_COLLECTIONS:
+            await db[collection].delete_many({})
+    await apply_index_manifest(db)
+
+    modules = build_modules(rng, modules_count, now)
+    result = await db.modules.insert_many(modules)
+    for module, module_id in zip(modules, result.inserted_ids):
+        module["_id"] = module_id
+
+    quizzes = [
+        {"module_id": str(m["_id"]), "questions": _questions(rng, 10), "num_questions": 10, "created_at": now}
+        for m in modules
+    ]
+    result = await db.quizzes.insert_many(quizzes)
+    for module, quiz_id in zip(modules, result.inserted_ids):
+        module["quiz_id"] = quiz_id
+
+    exams = [
+        {
+            "module_id": str(m["_id"]), "questions": _questions(rng, 20), "num_questions": 20,
+            "passing_score": 70.0, "time_limit": 30, "exam_type": "standard",
+            "qcm_weight": 1.0, "practical_weight": 0.0, "created_at": now,
+        }
+        for m in modules
+    ]
+    result = await db.exams.insert_many(exams)
+    for exam, exam_id in zip(exams, result.inserted_ids):
+        exam["_id"] = exam_id
+    exams_by_module = {exam["module_id"]: exam for exam in exams}
+
+    # Un seul hachage bcrypt pour tous les comptes de benchmark
+    hashed_password = PasswordHasher.hash_password(BENCH_PASSWORD)
+    user_docs = [
+        {
+            "email": f"bench{i}@kairos.test", "username": f"bench{i}", "hashed_password": hashed_password,
+            "first_name": "Bench", "last_name": str(i), "is_active": True, "is_admin": False,
+            "created_at": now, "updated_at": now,
+        }
+        for i in range(users)
+    ]
+    result = await db.users.insert_many(user_docs)
+    user_ids = [str(user_id) for user_id in result.inserted_ids] + ["anonymous"]
+
+    counts = {"users": users, "modules": modules_count, "quizzes": modules_count, "exams": modules_count}
+    for user_id in user_ids:
+        documents = build_user_documents(
+            rng, user_id, modules, exams_by_module, history_per_user, attempts_per_user, now
+        )
+        for collection, docs in documents.items():
+            for batch in _batches(docs):
+                await db[collection].insert_many(batch, ordered=False)
+            counts[collection] = counts.get(collection, 0) + len(docs)
+
+    return {
+        "created_at": now.isoformat(),
+        "password": BENCH_PASSWORD,
+        "users": [user["email"] for user in user_docs],
+        "modules": [str(m["_id"]) for m in modules],
+        "exams": [
+            {"id": str(exam["_id"]), "module_id": exam["module_id"], "num_questions": len(exam["questions"])}
+            for exam in exams
+        ],
+        "quizzes": [{"id": str(m["quiz_id"]), "module_id": str(m["_id"])} for m in modules],
+        "counts": counts,
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.database.mongo import connect_to_mongo, close_mongo_connection
+    await connect_to_mongo()
+    try:
+        return await seed(args.users, args.modules, args.history, args.attempts, args.reset, args.seed)
+    finally:
+        await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--modules", type=int, default=100)
+    parser.add_argument("--history", type=int, default=50, help="Entrées d'historique par utilisateur")
+    parser.add_argument("--attempts", type=int, default=10, help="Modules suivis (progression, tentatives) par utilisateur")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="Vide les collections concernées avant d'insérer")
+    parser.add_argument("--force", action="store_true", help="Autorise une base dont le nom ne contient pas 'bench'")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    from app.config import settings
+    if "bench" not in settings.mongodb_db_name and not args.force:
+        sys.exit(f"Base '{settings.mongodb_db_name}' refusée : utilisez MONGODB_DB_NAME=kairos_bench ou --force")
+
+    manifest = asyncio.run(_run(args))
+    args.manifest.parent.mkdir(parents=True, exist_ok=True)
+    args.manifest.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Jeu de données créé dans '{settings.mongodb_db_name}': {manifest['counts']}")
+    print(f"Manifeste écrit dans {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Configuration Gunicorn (workers Uvicorn)
+
+Mode preload (PRELOAD_APP=true, défaut) : l'application est importée une
+seule fois dans le processus maître puis les workers sont forkés. Les modules
+importés (FastAPI, openai, pydantic, prompts...) sont partagés en
+copy-on-write au lieu d'être réimportés par chaque worker.
+
+Les connexions (MongoDB, Redis, client OpenAI) sont ouvertes dans le
+lifespan, donc après le fork, dans chaque worker.
+
+Usage : gunicorn -c gunicorn.conf.py main:app
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 4))))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+
+def when_ready(server):
+    if preload_app:
+        # Sortir les objets importés du suivi du GC : sans cela, chaque
+        # collecte dans un worker réécrit leurs en-têtes et duplique les pages
+        # mémoire partagées avec le maître.
+        gc.freeze()
+        server.log.info(f"Application préchargée, {gc.get_freeze_count()} objets partagés entre les workers")
@@ -29,12 +29,15 @@ except ImportError:
     # Redis est optionnel
     init_redis = None
     close_redis = None
-from app.routers import auth, modules, ai_tutor, progress, badges, favorites, recommendations, support, quiz, exam, validation, td, tp, adaptive_learning, pathways, exercise_generator, error_learning, analytics, anti_cheat, virtual_labs, avatar, gamification, collaboration, gdpr, subscriptions, prompt_router, user_history, resources, openai_content, feedback, pedagogical_memory, kairos_prompts
+# Les routeurs sont importés à la demande selon ENABLED_FEATURES (voir app/routers/registry.py)
+from app.routers.registry import include_routers, parse_features
 from app.middleware.error_handler import (
     validation_exception_handler,
     http_exception_handler,
+    ai_quota_exception_handler,
     general_exception_handler
 )
+from app.services.ai_gateway import AIQuotaExceededError
 from app.middleware.security import (
     SecurityHeadersMiddleware,
     RateLimitMiddleware,
@@ -140,8 +143,30 @@ async def lifespan(app: FastAPI):
         logger.info("   Pour activer Redis, installez: pip install redis[hiredis]")
         logger.info("   Et configurez REDIS_URL dans .env")
     
+    # Reprendre les webhooks Stripe reçus mais non appliqués avant l'arrêt précédent
+    if mongo_connected:
+        try:
+            from app.services.stripe_webhook_queue import StripeWebhookQueue
+            await StripeWebhookQueue.resume_pending()
+        except Exception as e:
+            logger.warning(f"Reprise des webhooks Stripe impossible: {e}")
+    
     yield
     
+    # Terminer les webhooks Stripe en cours (avant MongoDB)
+    try:
+        from app.services.stripe_webhook_queue import StripeWebhookQueue
+        await StripeWebhookQueue.close()
+    except Exception as e:
+        logger.warning(f"Erreur arrêt de la file des webhooks Stripe: {e}")
+    
+    # Écrire l'usage IA en attente et fermer le client OpenAI (avant MongoDB)
+    try:
+        from app.services.ai_gateway import AIGateway
+        await AIGateway.close()
+    except Exception as e:
+        logger.warning(f"Erreur fermeture passerelle IA: {e}")
+    
     if mongo_connected:
         await close_mongo_connection()
     
@@ -436,41 +461,12 @@ app.add_middleware(ErrorHandlerMiddleware)
 # Gestionnaires d'erreurs centralisés
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
+app.add_exception_handler(AIQuotaExceededError, ai_quota_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 
-# Inclusion des routeurs
-app.include_router(auth.router, prefix="/api/auth", tags=["Authentification"])
-app.include_router(modules.router, prefix="/api/modules", tags=["Modules"])
-app.include_router(ai_tutor.router, prefix="/api/ai", tags=["Kaïrox"])
-app.include_router(prompt_router.router, prefix="/api/prompt-router", tags=["Prompt Router"])
-app.include_router(kairos_prompts.router, prefix="/api/kairos", tags=["Kaïrox Prompts"])
-app.include_router(user_history.router, prefix="/api/user-history", tags=["Historique Utilisateur"])
-app.include_router(progress.router, prefix="/api/progress", tags=["Progression"])
-app.include_router(badges.router, prefix="/api/badges", tags=["Badges"])
-app.include_router(favorites.router, prefix="/api/favorites", tags=["Favoris"])
-app.include_router(recommendations.router, prefix="/api/recommendations", tags=["Recommandations"])
-app.include_router(support.router, prefix="/api/support", tags=["Support"])
-app.include_router(quiz.router, prefix="/api/quiz", tags=["Quiz"])
-app.include_router(exam.router, prefix="/api/exams", tags=["Examens"])
-app.include_router(validation.router, prefix="/api/validations", tags=["Validations"])
-app.include_router(td.router, prefix="/api/tds", tags=["Travaux Dirigés"])
-app.include_router(tp.router, prefix="/api/tps", tags=["Travaux Pratiques"])
-app.include_router(resources.router, prefix="/api/resources", tags=["Ressources"])
-app.include_router(adaptive_learning.router, prefix="/api/adaptive-learning", tags=["Apprentissage Adaptatif"])
-app.include_router(pathways.router, prefix="/api/pathways", tags=["Parcours Intelligents"])
-app.include_router(exercise_generator.router, prefix="/api/exercise-generator", tags=["Génération Exercices"])
-app.include_router(error_learning.router, prefix="/api/error-learning", tags=["Apprendre par l'Erreur"])
-app.include_router(analytics.router, prefix="/api/analytics", tags=["Learning Analytics"])
-app.include_router(anti_cheat.router, prefix="/api/anti-cheat", tags=["Anti-Triche"])
-app.include_router(virtual_labs.router, prefix="/api/virtual-labs", tags=["Laboratoires Virtuels"])
-app.include_router(avatar.router, prefix="/api/avatar", tags=["Avatar IA"])
-app.include_router(gamification.router, prefix="/api/gamification", tags=["Gamification"])
-app.include_router(collaboration.router, prefix="/api/collaboration", tags=["Collaboration"])
-app.include_router(gdpr.router, prefix="/api/gdpr", tags=["RGPD"])
-app.include_router(subscriptions.router, prefix="/api/subscriptions", tags=["Abonnements"])
-app.include_router(openai_content.router, prefix="/api", tags=["OpenAI Content Generation"])
-app.include_router(feedback.router, prefix="/api/feedback", tags=["Feedback Utilisateur"])
-app.include_router(pedagogical_memory.router, prefix="/api/pedagogical-memory", tags=["Mémoire Pédagogique"])
+# Inclusion des routeurs (uniquement les groupes de fonctionnalités activés)
+enabled_features = parse_features(settings.enabled_features)
+include_routers(app, enabled_features)
 
 @app.get("/")
 @app.head("/")  # Support HEAD pour les health checks Render
@@ -557,8 +553,8 @@ async def health_check():
     
     # Vérifier OpenAI (optionnel)
     try:
-        from app.services.ai_service import client
-        if client:
+        from app.services.ai_gateway import AIGateway
+        if AIGateway.is_available():
             health_status["openai"] = "configured"
         else:
             health_status["openai"] = "not_configured"
@@ -0,0 +1,195 @@
+"""
+Benchmark de fin d'examen : toute une promotion soumet dans la même minute
+
+Deux modes :
+- par défaut, contre une vraie base MongoDB (MONGODB_URL / MONGODB_DB_NAME) :
+  crée un examen temporaire, démarre une tentative par étudiant puis lance
+  toutes les soumissions en rafale (ExamService.submit_exam) et mesure les
+  latences p50/p95/p99 et le débit. Les données créées sont supprimées.
+- --grading-only : uniquement le coût CPU de la correction, boucle Python
+  historique comparée à la clé de réponses compilée (le gain de la clé est
+  surtout côté base : examen lu sans ses questions, tentative clôturée en
+  une requête ; côté CPU elle doit rester au niveau de la boucle).
+
+Usage (depuis backend/):
+    python scripts/bench_exam_submit.py --students 300 --questions 40
+    python scripts/bench_exam_submit.py --grading-only --students 5000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.models import ExamAnswer, ExamSubmission  # noqa: E402
+from app.services.exam_grading import ExamGrader  # noqa: E402
+
+
+def build_questions(count: int, choices: int = 4) -> List[Dict[str, Any]]:
+    rng = random.Random(42)
+    return [
+        {
+            "question": f"Question {i}",
+            "options": [f"Option {c}" for c in range(choices)],
+            "correct_answer": rng.randrange(choices),
+            "points": 1.0
+        }
+        for i in range(count)
+    ]
+
+
+def build_answers(questions: List[Dict[str, Any]], rng: random.Random) -> List[ExamAnswer]:
+    return [
+        ExamAnswer(question_index=i, answer=rng.randrange(len(q["options"])))
+        for i, q in enumerate(questions)
+    ]
+
+
+def legacy_grade(questions: List[Dict[str, Any]], answers: List[ExamAnswer]) -> float:
+    """Boucle de correction historique, détail des réponses compris (référence)"""
+    score = 0.0
+    details = []
+    for answer in answers:
+        if answer.question_index < len(questions):
+            question = questions[answer.question_index]
+            points = question.get("points", 1.0)
+            if answer.answer == question.get("correct_answer", -1):
+                score += points
+                details.append({"question_index": answer.question_index, "answer": answer.answer,
+                                "correct": True, "points": points})
+            else:
+                details.append({"question_index": answer.question_index, "answer": answer.answer,
+                                "correct": False, "points": 0.0,
+                                "correct_answer": question.get("correct_answer")})
+    return score
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(label: str, latencies: List[float], elapsed: float) -> None:
+    ms = [v * 1000 for v in latencies]
+    print(f"{label}")
+    print(f"  soumissions : {len(ms)} en {elapsed:.2f}s ({len(ms) / elapsed:.0f}/s)")
+    print(
+        f"  latence ms  : p50={percentile(ms, 50):.2f} p95={percentile(ms, 95):.2f} "
+        f"p99={percentile(ms, 99):.2f} max={max(ms):.2f} moyenne={statistics.mean(ms):.2f}"
+    )
+
+
+def bench_grading(students: int, question_count: int) -> None:
+    questions = build_questions(question_count)
+    rng = random.Random(7)
+    submissions = [build_answers(questions, rng) for _ in range(students)]
+    exam = {"id": "bench", "updated_at": "v1", "questions": questions}
+
+    start = time.perf_counter()
+    legacy = [legacy_grade(questions, answers) for answers in submissions]
+    legacy_elapsed = time.perf_counter() - start
+
+    ExamGrader.invalidate("bench")
+    start = time.perf_counter()
+    answer_key = ExamGrader.compile(exam)
+    compiled = [answer_key.grade(answers)["score"] for answers in submissions]
+    compiled_elapsed = time.perf_counter() - start
+
+    assert legacy == compiled, "Les deux corrections divergent"
+    print(f"Correction de {students} copies de {question_count} questions")
+    print(f"  boucle Python : {legacy_elapsed * 1000:.1f} ms ({legacy_elapsed / students * 1e6:.1f} µs/copie)")
+    print(
+        f"  clé compilée  : {compiled_elapsed * 1000:.1f} ms ({compiled_elapsed / students * 1e6:.1f} µs/copie, "
+        f"compilation incluse)"
+    )
+
+
+async def bench_burst(students: int, question_count: int, concurrency: int) -> None:
+    from bson import ObjectId
+    from app.database import get_database
+    from app.database.mongo import connect_to_mongo, close_mongo_connection
+    from app.repositories.exam_repository import ExamRepository, ExamAttemptRepository
+    from app.services.exam_service import ExamService
+
+    await connect_to_mongo()
+    db = get_database()
+    questions = build_questions(question_count)
+    exam = await ExamRepository.create({
+        "module_id": None,
+        "title": "Benchmark fin d'examen",
+        "questions": questions,
+        "passing_score": 101.0,  # Aucune validation de module
+        "time_limit": 60
+    })
+    exam_id = exam["id"]
+    user_ids = [f"bench-student-{i}" for i in range(students)]
+
+    try:
+        for user_id in user_ids:
+            await ExamAttemptRepository.create({
+                "user_id": user_id,
+                "exam_id": exam_id,
+                "module_id": None,
+                "score": 0.0,
+                "max_score": float(question_count),
+                "percentage": 0.0,
+                "passed": False,
+                "answers": [],
+                "time_spent": 0,
+                "started_at": datetime.now(timezone.utc)
+            })
+
+        rng = random.Random(7)
+        submissions = [
+            ExamSubmission(exam_id=exam_id, answers=build_answers(questions, rng), time_spent=3600)
+            for _ in user_ids
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+
+        async def submit(user_id: str, submission: ExamSubmission) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                await ExamService.submit_exam(user_id, submission)
+                latencies.append(time.perf_counter() - start)
+
+        ExamGrader.invalidate(exam_id)
+        start = time.perf_counter()
+        await asyncio.gather(*(submit(u, s) for u, s in zip(user_ids, submissions)))
+        report(
+            f"Rafale de {students} soumissions ({question_count} questions, concurrence {concurrency})",
+            latencies,
+            time.perf_counter() - start
+        )
+    finally:
+        await db.exam_attempts.delete_many({"exam_id": exam_id})
+        await db.exams.delete_one({"_id": ObjectId(exam_id)})
+        await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=300, help="Taille de la promotion")
+    parser.add_argument("--questions", type=int, default=40, help="Questions par examen")
+    parser.add_argument("--concurrency", type=int, default=100, help="Soumissions simultanées")
+    parser.add_argument("--grading-only", action="store_true", help="Mesurer uniquement la correction (sans MongoDB)")
+    args = parser.parse_args()
+
+    if args.grading_only:
+        bench_grading(args.students, args.questions)
+    else:
+        asyncio.run(bench_burst(args.students, args.questions, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -69,11 +69,10 @@ def check_openai_config():
     
     # Vérifier l'initialisation du client
     try:
-        from app.services.ai_service import client
+        from app.services.ai_gateway import AIGateway
         print("3. Client OpenAI:")
-        if client:
-            print(f"   [OK] Client OpenAI initialise avec succes")
-            print(f"   Type: {type(client)}")
+        if AIGateway.is_available():
+            print(f"   [OK] Passerelle IA configuree (client AsyncOpenAI partage)")
         else:
             print(f"   [ERREUR] Client OpenAI non initialise")
             print(f"   [ATTENTION] Verifiez que OPENAI_API_KEY est correctement configuree dans .env")
@@ -96,8 +95,8 @@ def check_openai_config():
         settings_ok = False
     
     try:
-        from app.services.ai_service import client
-        client_ok = client is not None
+        from app.services.ai_gateway import AIGateway
+        client_ok = AIGateway.is_available()
     except:
         client_ok = False
     
@@ -0,0 +1,113 @@
+"""
+Profil du coût d'import de l'application (démarrage à froid d'un worker)
+
+Lance `python -X importtime -c "import main"` dans un sous-processus et
+résume le résultat : temps total, modules les plus coûteux (cumulé et propre)
+et coût de chaque routeur.
+
+Usage (depuis backend/):
+    python scripts/profile_imports.py
+    python scripts/profile_imports.py --features core,tutor --top 30
+    python scripts/profile_imports.py --module app.services.payment_service
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+class ImportCost(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportCost]:
+    """Parse la sortie de -X importtime ('import time: self | cumulative | module')"""
+    costs = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # Ligne d'en-tête
+            continue
+        name = parts[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module)) // 2
+        costs.append(ImportCost(module, self_us, cumulative_us, depth))
+    return costs
+
+
+def profile(module: str, features: str = None) -> List[ImportCost]:
+    env = dict(os.environ)
+    if features:
+        env["ENABLED_FEATURES"] = features
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        raise SystemExit(f"❌ Import de '{module}' échoué")
+    return parse_importtime(result.stderr)
+
+
+def by_package(costs: List[ImportCost]) -> Dict[str, int]:
+    """Temps propre cumulé par package de premier niveau (app.* détaillé au 2e niveau)"""
+    totals: Dict[str, int] = {}
+    for cost in costs:
+        parts = cost.module.split(".")
+        key = ".".join(parts[:2]) if parts[0] == "app" else parts[0]
+        totals[key] = totals.get(key, 0) + cost.self_us
+    return totals
+
+
+def _ms(us: int) -> str:
+    return f"{us / 1000:9.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil du coût d'import")
+    parser.add_argument("--module", default="main", help="Module à importer (défaut: main)")
+    parser.add_argument("--features", default=None, help="Valeur de ENABLED_FEATURES")
+    parser.add_argument("--top", type=int, default=20, help="Nombre de lignes par tableau")
+    args = parser.parse_args()
+
+    costs = profile(args.module, args.features)
+    root = next((c for c in costs if c.module == args.module and c.depth == 0), None)
+    total = root.cumulative_us if root else sum(c.self_us for c in costs)
+
+    print(f"📦 import {args.module} (ENABLED_FEATURES={args.features or os.getenv('ENABLED_FEATURES', 'all')})")
+    print(f"   {len(costs)} modules, total {_ms(total).strip()}\n")
+
+    print("Packages les plus coûteux (temps propre) :")
+    for package, self_us in sorted(by_package(costs).items(), key=lambda x: -x[1])[:args.top]:
+        print(f"  {_ms(self_us)}  {package}")
+
+    print("\nModules les plus coûteux (cumulé) :")
+    for cost in sorted(costs, key=lambda c: -c.cumulative_us)[:args.top]:
+        if cost.module != args.module:
+            print(f"  {_ms(cost.cumulative_us)}  {cost.module}")
+
+    routers = [c for c in costs if c.module.startswith("app.routers.") and c.module != "app.routers.registry"]
+    if routers:
+        print("\nRouteurs (cumulé, dépendances déjà importées non comptées) :")
+        for cost in sorted(routers, key=lambda c: -c.cumulative_us):
+            print(f"  {_ms(cost.cumulative_us)}  {cost.module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Entraînement hors ligne du classifieur local du Prompt Router
+
+Lit les classifications GPT journalisées dans 'request_classifications'
+(ou un fichier JSONL {"message", "context", "category"}), entraîne la
+régression logistique sur features hachées, affiche la précision sur un jeu
+de validation (globale et au-dessus du seuil de confiance, avec la part des
+requêtes qui n'auraient plus besoin de GPT) et écrit le fichier de poids.
+
+Usage (depuis backend/):
+    python scripts/train_request_classifier.py
+    python scripts/train_request_classifier.py --input classifications.jsonl --output app/data/request_classifier.npz
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.request_classifier import DEFAULT_MODEL_PATH, RequestClassifier, train  # noqa: E402
+
+
+def load_jsonl(path: Path) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def load_from_mongo(limit: int) -> List[Dict[str, Any]]:
+    from app.database.mongo import connect_to_mongo, close_mongo_connection
+    from app.repositories.request_classification_repository import RequestClassificationRepository
+
+    await connect_to_mongo()
+    try:
+        return await RequestClassificationRepository.find_all(limit=limit)
+    finally:
+        await close_mongo_connection()
+
+
+def evaluate(classifier: RequestClassifier, samples: List[Dict[str, Any]], min_confidence: float) -> None:
+    correct = confident = confident_correct = 0
+    start = time.perf_counter()
+    for sample in samples:
+        category, confidence = classifier.predict(sample["message"], sample.get("context"))
+        hit = category == int(sample["category"])
+        correct += hit
+        if confidence >= min_confidence:
+            confident += 1
+            confident_correct += hit
+    elapsed = time.perf_counter() - start
+
+    total = len(samples)
+    print(f"Validation ({total} exemples)")
+    print(f"  précision globale         : {correct / total:.3f}")
+    if confident:
+        print(f"  précision confiance >= {min_confidence:.2f} : {confident_correct / confident:.3f}")
+    print(f"  requêtes sans appel GPT   : {confident / total:.1%}")
+    print(f"  latence de prédiction     : {elapsed / total * 1e6:.1f} µs")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, help="Fichier JSONL (sinon la collection MongoDB)")
+    parser.add_argument("--output", type=Path, default=DEFAULT_MODEL_PATH, help="Fichier de poids (.npz)")
+    parser.add_argument("--limit", type=int, default=100000, help="Nombre maximal d'exemples lus en base")
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--validation", type=float, default=0.2, help="Part des exemples réservés à la validation")
+    parser.add_argument("--min-confidence", type=float, default=0.7, help="Seuil évalué (REQUEST_CLASSIFIER_MIN_CONFIDENCE)")
+    args = parser.parse_args()
+
+    samples = load_jsonl(args.input) if args.input else asyncio.run(load_from_mongo(args.limit))
+    samples = [s for s in samples if s.get("message") and int(s.get("category", 0)) in (1, 2, 3, 4)]
+    if len(samples) < 10:
+        sys.exit(f"Pas assez d'exemples pour entraîner le classifieur ({len(samples)})")
+
+    random.Random(0).shuffle(samples)
+    split = max(1, int(len(samples) * args.validation))
+    validation, training = samples[:split], samples[split:]
+
+    start = time.perf_counter()
+    classifier = train(training, epochs=args.epochs)
+    print(f"Entraînement sur {len(training)} exemples en {time.perf_counter() - start:.1f}s")
+    evaluate(classifier, validation, args.min_confidence)
+
+    # Modèle final sur l'ensemble des exemples
+    classifier = train(samples, epochs=args.epochs)
+    classifier.save(args.output)
+    print(f"Poids écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Tests pour la passerelle IA (comptage des tokens et écriture par lots de 'ai_usage')
+"""
+import asyncio
+import gc
+import weakref
+from types import SimpleNamespace
+import pytest
+from app.services import ai_gateway
+from app.services.ai_gateway import AIGateway
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **params):
+        self.calls.append(params)
+        if params.get("stream"):
+            return self._stream()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=SimpleNamespace(prompt_tokens=12, completion_tokens=30)
+        )
+
+    async def _stream(self):
+        for text in ("Bon", "jour"):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=5, completion_tokens=2))
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Client OpenAI factice et capture des lignes 'ai_usage' insérées"""
+    completions = FakeCompletions()
+    inserted = []
+
+    async def record_usage_batch(rows):
+        inserted.extend(rows)
+
+    monkeypatch.setattr(ai_gateway.settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(AIGateway, "_create_client", staticmethod(
+        lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    ))
+    monkeypatch.setattr(AIGateway, "_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(AIGateway, "_semaphores", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(ai_gateway, "usage_recorder", ai_gateway._UsageRecorder())
+    monkeypatch.setattr("app.services.ai_cost_guard.AICostGuard.record_usage_batch", record_usage_batch)
+    return completions, inserted
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_records_real_usage(fake_openai):
+    completions, inserted = fake_openai
+    response = await AIGateway.chat_completion(
+        feature="chat", model="gpt-4o-mini", messages=[{"role": "user", "content": "Bonjour"}]
+    )
+    assert response.choices[0].message.content == "ok"
+    assert inserted == []  # Écriture différée
+
+    await AIGateway.flush_usage()
+    assert len(inserted) == 1
+    row = inserted[0]
+    assert row["feature"] == "chat"
+    assert row["user_id"] == "system"
+    assert (row["prompt_tokens"], row["completion_tokens"], row["tokens_used"]) == (12, 30, 42)
+
+
+@pytest.mark.asyncio
+async def test_usage_written_in_batches(fake_openai, monkeypatch):
+    completions, inserted = fake_openai
+    monkeypatch.setattr(ai_gateway, "USAGE_BATCH_SIZE", 3)
+    await asyncio.gather(*[
+        AIGateway.chat_completion(feature="quiz_generation", model="gpt-4o-mini", messages=[])
+        for _ in range(3)
+    ])
+    await asyncio.sleep(0)
+    assert len(inserted) == 3
+
+
+@pytest.mark.asyncio
+async def test_flush_never_interrupts_a_write_in_progress(fake_openai, monkeypatch):
+    """Un lot plein pendant une écriture ne fait pas perdre les lignes déjà retirées du tampon"""
+    completions, inserted = fake_openai
+    monkeypatch.setattr(ai_gateway, "USAGE_BATCH_SIZE", 2)
+    release = asyncio.Event()
+
+    async def slow_record_usage_batch(rows):
+        await release.wait()
+        inserted.extend(rows)
+
+    monkeypatch.setattr("app.services.ai_cost_guard.AICostGuard.record_usage_batch", slow_record_usage_batch)
+    for _ in range(2):
+        await AIGateway.chat_completion(feature="chat", model="gpt-4o-mini", messages=[])
+    await asyncio.sleep(0)  # premier lot en cours d'écriture
+    for _ in range(3):
+        await AIGateway.chat_completion(feature="chat", model="gpt-4o-mini", messages=[])
+
+    release.set()
+    await AIGateway.flush_usage()
+    assert len(inserted) == 5
+
+
+@pytest.mark.asyncio
+async def test_stream_requests_usage_chunk(fake_openai):
+    completions, inserted = fake_openai
+    chunks = [
+        chunk async for chunk in AIGateway.stream_chat_completion(
+            feature="chat_stream", model="gpt-4o-mini", messages=[]
+        )
+    ]
+    assert len(chunks) == 3
+    assert completions.calls[0]["stream_options"] == {"include_usage": True}
+
+    await AIGateway.flush_usage()
+    assert inserted[0]["tokens_used"] == 7
+
+
+@pytest.mark.asyncio
+async def test_exhausted_quota_is_answered_with_429(fake_openai, monkeypatch):
+    from app.middleware.error_handler import ai_quota_exception_handler
+    from app.services.ai_routing_service import AIRoutingService
+    completions, inserted = fake_openai
+    checked = []
+
+    async def check_user_limit(user_id, estimated_tokens):
+        checked.append(user_id)
+        return {"allowed": False, "reason": "Limite quotidienne atteinte", "fallback_model": None}
+
+    monkeypatch.setattr("app.services.ai_cost_guard.AICostGuard.check_user_limit", check_user_limit)
+
+    with pytest.raises(ai_gateway.AIQuotaExceededError) as exc:
+        await AIRoutingService.chat("Bonjour", force_model="gpt-5-mini", user_id="u1")
+    assert checked == ["u1"] and completions.calls == []
+
+    request = SimpleNamespace(method="POST", url=SimpleNamespace(path="/api/ai/chat"))
+    response = await ai_quota_exception_handler(request, exc.value)
+    assert response.status_code == 429
+
+
+def test_client_is_dropped_with_its_event_loop(fake_openai):
+    """Une boucle fermée (tâche Celery) ne laisse ni client ni sémaphore derrière elle"""
+    async def call():
+        await AIGateway.chat_completion(feature="chat", model="gpt-4o-mini", messages=[])
+        return AIGateway.get_client()
+
+    first = asyncio.run(call())
+    # La ligne d'usage en attente s'écrit au flush suivant et ne retient plus la boucle fermée
+    asyncio.run(AIGateway.flush_usage())
+    gc.collect()
+    assert len(AIGateway._clients) == 0 and len(AIGateway._semaphores) == 0
+    # Nouvelle boucle (même id possible) : nouveau client
+    assert asyncio.run(call()) is not first
@@ -0,0 +1,117 @@
+"""
+Tests pour l'outillage de benchmarks (faux OpenAI, générateur de charge, microbenchmarks, comparaison)
+"""
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+from openai import AsyncOpenAI
+from benchmarks.fake_openai import FakeOpenAIConfig, create_app
+from benchmarks.load import run_load
+from benchmarks.micro import CASES, gpt_quiz_output, measure, profile, select_cases
+from benchmarks.report import compare, percentile, summarize_latencies
+
+
+def _client(app):
+    return AsyncOpenAI(
+        api_key="sk-bench",
+        base_url="http://fake/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+        max_retries=0
+    )
+
+
+@pytest.mark.asyncio
+async def test_fake_openai_streams_with_usage():
+    config = FakeOpenAIConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, completion_tokens=12)
+    client = _client(create_app(config))
+
+    stream = await client.chat.completions.create(
+        model="gpt-5-mini", messages=[{"role": "user", "content": "Bonjour " * 20}],
+        stream=True, stream_options={"include_usage": True}
+    )
+    text, usage = "", None
+    async for chunk in stream:
+        if chunk.choices:
+            text += chunk.choices[0].delta.content or ""
+        if chunk.usage:
+            usage = chunk.usage
+    assert len(text.split()) == 12
+    assert usage.completion_tokens == 12 and usage.prompt_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_fake_openai_json_mode_and_errors():
+    config = FakeOpenAIConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, completion_tokens=200)
+    client = _client(create_app(config))
+    response = await client.chat.completions.create(
+        model="gpt-5-mini", messages=[{"role": "user", "content": "quiz"}],
+        response_format={"type": "json_object"}
+    )
+    import json
+    assert json.loads(response.choices[0].message.content)["questions"]
+
+    config.error_rate = 1.0
+    with pytest.raises(Exception):
+        await client.chat.completions.create(model="gpt-5-mini", messages=[{"role": "user", "content": "x"}])
+
+
+@pytest.mark.asyncio
+async def test_load_generator_reports_percentiles():
+    app = FastAPI()
+
+    @app.get("/api/modules/")
+    async def modules(response: Response):
+        return []
+
+    @app.get("/api/progress/stats")
+    async def stats():
+        return {}
+
+    dataset = {"users": [], "password": "", "modules": [], "quizzes": [], "exams": []}
+    weights = {"module_list": 1, "progress_stats": 1}
+    results = await run_load(
+        "http://bench", dataset, concurrency=4, duration=0.2, warmup=0.0, weights=weights,
+        transport=httpx.ASGITransport(app=app)
+    )
+    assert results["module_list"]["count"] > 0 and results["progress_stats"]["count"] > 0
+    assert results["_total"]["errors"] == 0
+    assert results["_total"]["throughput_rps"] > 0
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"results": {"module_list": {"p95_ms": 100.0, "throughput_rps": 500.0}}}
+    similar = {"results": {"module_list": {"p95_ms": 105.0, "throughput_rps": 480.0}}}
+    slower = {"results": {"module_list": {"p95_ms": 150.0, "throughput_rps": 300.0}}}
+
+    assert compare(similar, baseline) == []
+    assert {r["metric"] for r in compare(slower, baseline)} == {"p95_ms", "throughput_rps"}
+
+
+def test_percentiles():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    summary = summarize_latencies([10.0, 20.0], errors=2, elapsed_s=1.0)
+    assert summary["error_rate"] == 0.5 and summary["throughput_rps"] == 2.0
+
+
+def test_micro_cases_run_on_realistic_inputs():
+    import random
+    from app.utils.json_cleaner import safe_json_loads
+    assert len(safe_json_loads(gpt_quiz_output(random.Random(0), questions=5))["questions"]) == 5
+
+    for case in CASES:
+        case.setup()()
+    result = measure(select_cases(["sanitize_object_id"])[0].setup(), min_time=0.01, repeat=2)
+    assert result["ops_per_sec"] > 0 and result["us_per_op"] > 0
+    assert result["alloc_kb_per_op"] >= 0
+
+
+def test_micro_profile_emits_collapsed_stacks():
+    def busy():
+        return sum(i * i for i in range(2000))
+
+    stacks = profile(busy, duration=0.2)
+    lines = [line for line in stacks.splitlines() if line]
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and "busy" in stack and ";" in stack
@@ -0,0 +1,73 @@
+"""
+Tests pour la détection de plagiat locale (MinHash/LSH) et le recours limité à GPT
+"""
+import pytest
+from app.services import cheating_detector
+from app.services.cheating_detector import CheatingDetector
+from app.utils.minhash import candidate_pairs, estimate_similarity, lsh_bands, minhash_signature
+
+ORIGINAL = "La dérivée de x au carré vaut deux x car on applique la règle de dérivation des puissances"
+COPY = "La dérivée de x au carré vaut deux x, car on applique la règle de dérivation des puissances !"
+OTHER = "Le théorème de Pythagore relie les longueurs des côtés d'un triangle rectangle entre elles"
+
+
+def test_minhash_estimates_similarity():
+    original, copy, other = map(minhash_signature, (ORIGINAL, COPY, OTHER))
+    assert estimate_similarity(original, copy) == 1.0  # Ponctuation ignorée
+    assert estimate_similarity(original, other) < 0.2
+
+
+def test_lsh_pairs_only_similar_answers():
+    pairs = candidate_pairs({
+        "a": lsh_bands(minhash_signature(ORIGINAL)),
+        "b": lsh_bands(minhash_signature(COPY)),
+        "c": lsh_bands(minhash_signature(OTHER)),
+    })
+    assert pairs == {("a", "b")}
+
+
+@pytest.mark.asyncio
+async def test_gpt_only_reviews_high_score_candidates(monkeypatch):
+    reviewed = []
+
+    async def fake_similarity(answer1, answer2, question):
+        reviewed.append(answer2)
+        return 0.95
+
+    monkeypatch.setattr(cheating_detector.AIGateway, "is_available", staticmethod(lambda: True))
+    monkeypatch.setattr(CheatingDetector, "_calculate_similarity", staticmethod(fake_similarity))
+
+    others = [OTHER] * 20 + [COPY]
+    result = await CheatingDetector.detect_plagiarism(ORIGINAL, others, "Dérivée de x²")
+
+    assert reviewed == [COPY]
+    assert result["is_plagiarized"] is True
+    assert result["compared_answers"] == 21
+
+
+@pytest.mark.asyncio
+async def test_exam_cohort_flags_copied_answers(monkeypatch):
+    stored = {}
+
+    async def replace_for_attempt(attempt_id, signatures):
+        for i, signature in enumerate(signatures):
+            stored[f"{attempt_id}-{i}"] = {"_id": f"{attempt_id}-{i}", "attempt_id": attempt_id, **signature}
+        return len(signatures)
+
+    async def find_by_exam(exam_id):
+        return [s for s in stored.values() if s["exam_id"] == exam_id]
+
+    repository = cheating_detector.AnswerSignatureRepository
+    monkeypatch.setattr(repository, "replace_for_attempt", staticmethod(replace_for_attempt))
+    monkeypatch.setattr(repository, "find_by_exam", staticmethod(find_by_exam))
+
+    await CheatingDetector.index_attempt_answers("exam1", "att1", "alice", [{"exercise_index": 0, "answer": ORIGINAL}])
+    await CheatingDetector.index_attempt_answers("exam1", "att2", "bob", [{"exercise_index": 0, "answer": COPY}, "42"])
+    await CheatingDetector.index_attempt_answers("exam1", "att3", "carol", [{"exercise_index": 0, "answer": OTHER}])
+
+    result = await CheatingDetector.detect_exam_plagiarism("exam1", use_ai=False)
+
+    assert result["answers_indexed"] == 3  # "42" est trop court pour être comparé
+    assert len(result["flagged"]) == 1
+    assert sorted(result["flagged"][0]["user_ids"]) == ["alice", "bob"]
+    assert result["ai_reviews"] == 0
@@ -0,0 +1,156 @@
+"""
+Tests pour le circuit breaker (appels concurrents, half-open limité)
+"""
+import asyncio
+import pytest
+from app.utils.circuit_breaker import CircuitBreaker, CircuitBreakerOpenError, CircuitState
+
+
+@pytest.mark.asyncio
+async def test_calls_run_concurrently():
+    """Le breaker ne sérialise pas les appels protégés"""
+    breaker = CircuitBreaker(name="test-concurrency")
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_call():
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "ok"
+
+    results = await asyncio.gather(*[breaker.call(slow_call) for _ in range(10)])
+    assert results == ["ok"] * 10
+    assert max_in_flight == 10
+
+
+@pytest.mark.asyncio
+async def test_opens_then_limits_half_open_probes():
+    breaker = CircuitBreaker(
+        name="test-half-open", failure_threshold=2, success_threshold=1,
+        timeout=0.01, half_open_max_calls=1
+    )
+
+    async def failing():
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call(failing)
+    assert breaker.state == CircuitState.OPEN
+
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(failing)
+
+    await asyncio.sleep(0.02)
+    probe_started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def probe():
+        probe_started.set()
+        await release.wait()
+        return "recovered"
+
+    probe_task = asyncio.create_task(breaker.call(probe))
+    await probe_started.wait()
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    # Une seule sonde à la fois en half-open
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(probe)
+
+    release.set()
+    assert await probe_task == "recovered"
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_stale_probe_does_not_free_a_slot_in_a_later_window():
+    breaker = CircuitBreaker(
+        name="test-half-open-generation", failure_threshold=1, success_threshold=5,
+        timeout=0.01, half_open_max_calls=2
+    )
+
+    async def failing():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        await breaker.call(failing)
+    await asyncio.sleep(0.02)
+
+    # Fenêtre half-open n°1 : une sonde lente, une sonde qui échoue et rouvre le circuit
+    release = asyncio.Event()
+
+    async def slow_failure():
+        await release.wait()
+        raise ConnectionError("still down")
+
+    slow = asyncio.create_task(breaker.call(slow_failure))
+    await asyncio.sleep(0)
+    with pytest.raises(ConnectionError):
+        await breaker.call(failing)
+    assert breaker.state == CircuitState.OPEN
+
+    # La sonde de la fenêtre précédente se termine après la réouverture
+    release.set()
+    with pytest.raises(ConnectionError):
+        await slow
+    assert breaker._half_open_calls == 0
+
+    # Fenêtre half-open n°2 : toujours au plus half_open_max_calls sondes
+    await asyncio.sleep(0.02)
+    hold = asyncio.Event()
+
+    async def waiting_probe():
+        await hold.wait()
+        return "ok"
+
+    probes = [asyncio.create_task(breaker.call(waiting_probe)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitBreakerOpenError):
+        await breaker.call(waiting_probe)
+    hold.set()
+    assert await asyncio.gather(*probes) == ["ok", "ok"]
+
+
+@pytest.mark.asyncio
+async def test_only_probe_successes_close_the_circuit():
+    """Un appel admis avant l'ouverture et réussi en half-open ne ferme pas le circuit"""
+    breaker = CircuitBreaker(
+        name="test-half-open-successes", failure_threshold=1, success_threshold=1,
+        timeout=0.01, half_open_max_calls=1
+    )
+    release = asyncio.Event()
+
+    async def slow_success():
+        await release.wait()
+        return "ok"
+
+    async def failing():
+        raise ConnectionError("down")
+
+    slow = asyncio.create_task(breaker.call(slow_success))
+    await asyncio.sleep(0)
+    with pytest.raises(ConnectionError):
+        await breaker.call(failing)
+    await asyncio.sleep(0.02)
+
+    # Sonde de la fenêtre half-open en cours ; l'ancien appel se termine avec succès
+    hold = asyncio.Event()
+
+    async def waiting_probe():
+        await hold.wait()
+        return "ok"
+
+    probe = asyncio.create_task(breaker.call(waiting_probe))
+    await asyncio.sleep(0)
+    assert breaker.state == CircuitState.HALF_OPEN
+    release.set()
+    assert await slow == "ok"
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    hold.set()
+    assert await probe == "ok"
+    assert breaker.state == CircuitState.CLOSED
@@ -0,0 +1,131 @@
+"""
+Tests pour la pagination par clé (cursors signés) et les index qui la servent
+"""
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+import pytest
+from app.database.indexes import INDEX_MANIFEST
+from app.utils.cursor_pagination import (
+    InvalidCursorError, paginate_with_cursor, plan_is_index_backed, supporting_index
+)
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for op, operand in condition.items():
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Collection en mémoire : find / sort / limit / to_list"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        self._result = [d for d in self.docs if _matches(d, query)]
+        return self
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self._result.sort(key=lambda d: d[field], reverse=direction == -1)
+        return self
+
+    def limit(self, n):
+        self._result = self._result[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self._result[:length]
+
+
+@pytest.fixture
+def messages():
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Plusieurs documents par date : l'_id départage les ex aequo
+    return [
+        {"_id": ObjectId(), "created_at": start + timedelta(minutes=i // 3), "read": i % 2 == 0}
+        for i in range(25)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pages_cover_every_document_once_in_order(messages):
+    collection = FakeCollection(messages)
+    seen, cursor = [], None
+    while True:
+        page, cursor = await paginate_with_cursor(collection, {}, 7, cursor=cursor, scope="support")
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    expected = sorted(messages, key=lambda d: (d["created_at"], d["_id"]), reverse=True)
+    assert [d["_id"] for d in seen] == [d["_id"] for d in expected]
+
+
+@pytest.mark.asyncio
+async def test_filtered_pages_keep_the_filter(messages):
+    collection = FakeCollection(messages)
+    first, cursor = await paginate_with_cursor(collection, {"read": False}, 5, cursor=None, scope="unread")
+    second, _ = await paginate_with_cursor(collection, {"read": False}, 5, cursor=cursor, scope="unread")
+    assert all(not d["read"] for d in first + second)
+    assert len({d["_id"] for d in first + second}) == 10
+
+
+@pytest.mark.asyncio
+async def test_tampered_or_foreign_cursor_is_rejected(messages):
+    collection = FakeCollection(messages)
+    _, cursor = await paginate_with_cursor(collection, {}, 5, scope="user_history:alice")
+
+    body, signature = cursor.split(".")
+    with pytest.raises(InvalidCursorError):
+        await paginate_with_cursor(collection, {}, 5, cursor=body[:-2] + "AA." + signature, scope="user_history:alice")
+    with pytest.raises(InvalidCursorError):
+        await paginate_with_cursor(collection, {}, 5, cursor=cursor, scope="user_history:bob")
+    with pytest.raises(InvalidCursorError):
+        await paginate_with_cursor(collection, {}, 5, sort_field="_id", cursor=cursor, scope="user_history:alice")
+
+
+@pytest.mark.parametrize("collection, equality_fields, sort_field", [
+    ("modules", [], "created_at"),
+    ("modules", ["subject"], "created_at"),
+    ("modules", ["difficulty"], "created_at"),
+    ("modules", ["subject", "difficulty"], "created_at"),
+    ("user_history", ["user_id"], "created_at"),
+    ("user_history", ["user_id", "subject"], "created_at"),
+    ("user_history", ["user_id", "module_id"], "created_at"),
+    ("support_messages", [], "created_at"),
+    ("support_messages", ["read"], "created_at"),
+    ("exam_attempts", ["user_id"], "started_at"),
+    ("exam_attempts", ["user_id", "module_id"], "started_at"),
+    ("quiz_attempts", ["user_id", "module_id"], "completed_at"),
+])
+def test_every_keyset_listing_is_index_backed(collection, equality_fields, sort_field):
+    assert supporting_index(INDEX_MANIFEST[collection], equality_fields, sort_field, -1) is not None
+
+
+def test_explain_plan_check():
+    index_scan = {"queryPlanner": {"winningPlan": {
+        "stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+    }}}
+    in_memory_sort = {"queryPlanner": {"winningPlan": {
+        "stage": "SORT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+    }}}
+    assert plan_is_index_backed(index_scan)
+    assert not plan_is_index_backed(in_memory_sort)
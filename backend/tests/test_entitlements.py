@@ -0,0 +1,121 @@
+"""
+Tests pour le cache des droits (plan, fonctionnalités, quotas)
+"""
+import pytest
+from app.models.subscription import SubscriptionPlan
+from app.services import entitlements_service
+from app.services.ai_cost_guard import AICostGuard
+from app.services.entitlements_service import Entitlements, EntitlementsService, REDIS_PREFIX
+from app.services.payment_service import PaymentService
+from app.services.subscription_service import SubscriptionService
+from app.repositories.subscription_repository import SubscriptionRepository
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def expire(self, key, ttl):
+        pass
+
+    async def exists(self, key):
+        return int(key in self.hashes)
+
+    async def hincrby(self, key, field, amount):
+        value = int(self.hashes[key].get(field, 0)) + amount
+        self.hashes[key][field] = str(value)
+        return value
+
+    async def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Redis en mémoire et plans 'en base' ; compte les lectures MongoDB"""
+    redis = FakeRedis()
+    plans = {"u1": SubscriptionPlan.PREMIUM, "u2": SubscriptionPlan.ENTERPRISE}
+    builds = []
+
+    async def build(user_id, month, day):
+        builds.append(user_id)
+        return Entitlements(user_id, plans.get(user_id, SubscriptionPlan.FREE), month, day,
+                            ai_requests_used=10, tokens_used_today=1000)
+
+    monkeypatch.setattr("app.utils.cache.get_redis", lambda: redis)
+    monkeypatch.setattr(EntitlementsService, "_build", build)
+    EntitlementsService._local.clear()
+    yield redis, plans, builds
+    EntitlementsService._local.clear()
+
+
+@pytest.mark.asyncio
+async def test_all_gates_answered_from_one_lookup(backend):
+    _, _, builds = backend
+    assert await SubscriptionService.get_user_plan("u1") == SubscriptionPlan.PREMIUM
+    assert await SubscriptionService.can_access_feature("u1", "ai_tutor")
+    assert not await SubscriptionService.can_access_feature("u1", "api_access")
+    limit = await SubscriptionService.check_ai_limit("u1")
+    assert (limit["allowed"], limit["remaining"], limit["used"]) == (True, 490, 10)
+    check = await AICostGuard.check_user_limit("u1", 500)
+    assert check["allowed"] and check["remaining_tokens"] == 200000 - 1000 - 500
+    assert builds == ["u1"]
+
+
+@pytest.mark.asyncio
+async def test_counters_are_shared_through_redis(backend):
+    redis, _, builds = backend
+    await EntitlementsService.get("u1")
+    await EntitlementsService.record_ai_request("u1")
+    assert (await EntitlementsService.get("u1")).ai_requests_used == 11
+
+    # Autre worker : pas de copie locale, droits relus dans Redis sans MongoDB
+    EntitlementsService._local.clear()
+    assert (await EntitlementsService.get("u1")).ai_requests_used == 11
+    assert redis.hashes[REDIS_PREFIX + "u1"]["plan"] == "premium"
+    assert builds == ["u1"]
+
+
+@pytest.mark.asyncio
+async def test_counters_reset_on_new_period(backend):
+    entitlements = await EntitlementsService.get("u1")
+    entitlements.month, entitlements.day = "2000-01", "2000-01-31"
+    refreshed = await EntitlementsService.get("u1")
+    assert (refreshed.ai_requests_used, refreshed.tokens_used_today) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_enterprise_tokens_are_unlimited(backend):
+    check = await AICostGuard.check_user_limit("u2", 10_000_000)
+    assert check["allowed"]
+    assert (await SubscriptionService.check_ai_limit("u2"))["remaining"] == -1
+
+
+@pytest.mark.asyncio
+async def test_stripe_webhook_invalidates_entitlements(backend, monkeypatch):
+    redis, plans, builds = backend
+    assert await SubscriptionService.get_user_plan("u1") == SubscriptionPlan.PREMIUM
+
+    async def apply_stripe_update(*args, **kwargs):
+        plans["u1"] = SubscriptionPlan.FREE
+        return True
+
+    async def find_user_id_by_stripe_id(stripe_id):
+        return "u1" if stripe_id == "sub_1" else None
+
+    monkeypatch.setattr(SubscriptionRepository, "apply_stripe_update", apply_stripe_update)
+    monkeypatch.setattr(SubscriptionRepository, "find_user_id_by_stripe_id", find_user_id_by_stripe_id)
+    await PaymentService.apply_event({
+        "id": "evt_1", "type": "customer.subscription.deleted", "created": 1,
+        "data": {"object": {"id": "sub_1"}}
+    })
+
+    assert REDIS_PREFIX + "u1" not in redis.hashes
+    assert await SubscriptionService.get_user_plan("u1") == SubscriptionPlan.FREE
+    assert builds == ["u1", "u1"]
@@ -0,0 +1,90 @@
+"""
+Tests pour la correction par clé de réponses compilée et la clôture atomique des tentatives
+"""
+import pytest
+from app.models import ExamAnswer, ExamSubmission
+from app.services import exam_service
+from app.services.exam_grading import ExamGrader
+from app.services.exam_service import ExamService
+
+QUESTIONS = [
+    {"question": "Q0", "correct_answer": 1, "points": 1.0},
+    {"question": "Q1", "correct_answer": 0, "points": 2.0, "weight": 1.5},
+    {"question": "Q2", "parts": [{"correct_answer": 2, "points": 0.5}, {"correct_answer": 3, "points": 0.5}]},
+]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    ExamGrader.invalidate()
+    yield
+    ExamGrader.invalidate()
+
+
+def test_weighted_and_multi_part_questions():
+    key = ExamGrader.compile({"id": "exam1", "updated_at": "v1", "questions": QUESTIONS})
+    result = key.grade([
+        ExamAnswer(question_index=0, answer=1),
+        ExamAnswer(question_index=1, answer=0),
+        ExamAnswer(question_index=2, part_index=0, answer=2),
+        ExamAnswer(question_index=2, part_index=1, answer=0),
+        ExamAnswer(question_index=9, answer=0),  # Hors examen
+    ])
+
+    assert result["score"] == 1.0 + 3.0 + 0.5
+    assert result["max_score"] == 1.0 + 3.0 + 0.5 + 0.5
+    assert [d["correct"] for d in result["answers"]] == [True, True, True, False]
+    assert result["answers"][3] == {
+        "question_index": 2, "answer": 0, "correct": False, "points": 0.0, "correct_answer": 3, "part_index": 1
+    }
+
+
+def test_answer_key_is_cached_per_version():
+    exam = {"id": "exam1", "updated_at": "v1", "questions": QUESTIONS}
+    key = ExamGrader.compile(exam)
+    assert ExamGrader.get_cached("exam1", "v1") is key
+
+    updated = {**exam, "updated_at": "v2", "questions": [{"correct_answer": 3}]}
+    assert ExamGrader.get_cached("exam1", "v2") is None
+    assert ExamGrader.compile(updated).grade([{"question_index": 0, "answer": 3}])["score"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_submit_closes_open_attempt_in_one_update(monkeypatch):
+    calls = {"full_exam": 0, "completed": []}
+
+    async def find_header_by_id(exam_id):
+        return {"id": exam_id, "updated_at": "v1", "passing_score": 50.0, "module_id": "mod1"}
+
+    async def find_by_id(exam_id):
+        calls["full_exam"] += 1
+        return {"id": exam_id, "updated_at": "v1", "questions": QUESTIONS}
+
+    async def complete_open_attempt(user_id, exam_id, update_data):
+        calls["completed"].append(update_data)
+        return {"id": f"attempt-{len(calls['completed'])}", "user_id": user_id, **update_data}
+
+    async def validate_module(user_id, module_id, exam_attempt_id, score, attempt=None):
+        assert attempt["id"] == exam_attempt_id
+        return True
+
+    repository = exam_service.ExamRepository
+    monkeypatch.setattr(repository, "find_header_by_id", staticmethod(find_header_by_id))
+    monkeypatch.setattr(repository, "find_by_id", staticmethod(find_by_id))
+    monkeypatch.setattr(exam_service.ExamAttemptRepository, "complete_open_attempt", staticmethod(complete_open_attempt))
+    from app.services.validation_service import ValidationService
+    monkeypatch.setattr(ValidationService, "validate_module", staticmethod(validate_module))
+
+    submission = ExamSubmission(
+        exam_id="exam1",
+        answers=[ExamAnswer(question_index=0, answer=1), ExamAnswer(question_index=1, answer=0)],
+        time_spent=600
+    )
+    first = await ExamService.submit_exam("alice", submission)
+    await ExamService.submit_exam("bob", submission)
+
+    assert first["passed"] is True
+    assert first["module_validated"] is True
+    assert first["percentage"] == 100.0
+    assert calls["full_exam"] == 1  # Questions relues une seule fois pour toute la cohorte
+    assert calls["completed"][0]["completed_at"] is not None
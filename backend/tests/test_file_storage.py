@@ -0,0 +1,99 @@
+"""
+Tests pour le stockage des fichiers uploadés (streaming, dédup, Range)
+"""
+import hashlib
+import io
+import os
+import pytest
+from app.utils.file_storage import (
+    store_upload,
+    sweep_orphans,
+    parse_range_header,
+    iter_file_range,
+    compute_etag,
+    etag_matches,
+    is_safe_filename,
+    FileTooLargeError,
+    RangeNotSatisfiableError,
+)
+
+
+class FakeUpload:
+    """Imite UploadFile.read(size)"""
+
+    def __init__(self, content: bytes):
+        self._buffer = io.BytesIO(content)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+@pytest.mark.asyncio
+async def test_store_upload_content_addressed_and_deduplicated(tmp_path):
+    """Deux uploads identiques partagent le même fichier"""
+    content = b"kairos" * 10000
+    first = await store_upload(FakeUpload(content), tmp_path, ".pdf", 10**6, chunk_size=4096)
+    second = await store_upload(FakeUpload(content), tmp_path, ".pdf", 10**6, chunk_size=4096)
+
+    assert first.sha256 == hashlib.sha256(content).hexdigest()
+    assert first.filename == f"{first.sha256}.pdf"
+    assert first.size == len(content)
+    assert not first.deduplicated
+    assert second.deduplicated
+    assert sorted(p.name for p in tmp_path.iterdir()) == [first.filename]
+
+
+@pytest.mark.asyncio
+async def test_store_upload_too_large_leaves_no_file(tmp_path):
+    """La taille est vérifiée pendant la copie et le fichier temporaire est supprimé"""
+    with pytest.raises(FileTooLargeError):
+        await store_upload(FakeUpload(b"x" * 5000), tmp_path, ".pdf", 4096, chunk_size=1024)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_range_and_etag(tmp_path):
+    """Plages d'octets et ETag"""
+    stored = await store_upload(FakeUpload(b"0123456789"), tmp_path, ".mp4", 100)
+
+    assert parse_range_header(None, 10) is None
+    assert parse_range_header("bytes=2-5", 10) == (2, 5)
+    assert parse_range_header("bytes=7-", 10) == (7, 9)
+    assert parse_range_header("bytes=-3", 10) == (7, 9)
+    assert parse_range_header("bytes=0-3,5-6", 10) is None
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_range_header("bytes=20-30", 10)
+
+    chunks = [c async for c in iter_file_range(stored.path, 2, 5, chunk_size=2)]
+    assert b"".join(chunks) == b"2345"
+
+    etag = compute_etag(stored.path)
+    assert etag == f'"{stored.sha256}"'
+    assert etag_matches(etag, etag)
+    assert not etag_matches('"other"', etag)
+
+    assert not is_safe_filename("..")
+    assert not is_safe_filename("../secret.pdf")
+    assert is_safe_filename(stored.filename)
+
+
+@pytest.mark.asyncio
+async def test_sweep_keeps_files_reused_by_a_concurrent_upload(tmp_path):
+    """Un fichier orphelin est supprimé, sauf s'il vient d'être réutilisé par un upload"""
+    orphan = await store_upload(FakeUpload(b"orphelin"), tmp_path, ".pdf", 100)
+    referenced = await store_upload(FakeUpload(b"reference"), tmp_path, ".pdf", 100)
+    reused = await store_upload(FakeUpload(b"reutilise"), tmp_path, ".pdf", 100)
+    recent = await store_upload(FakeUpload(b"recent"), tmp_path, ".pdf", 100)
+    for stored in (orphan, referenced, reused):
+        os.utime(stored.path, (0, 0))
+
+    async def is_referenced(filename):
+        if filename == reused.filename:
+            # Upload identique pendant le balayage, ressource pas encore enregistrée
+            assert (await store_upload(FakeUpload(b"reutilise"), tmp_path, ".pdf", 100)).deduplicated
+        return filename == referenced.filename
+
+    assert await sweep_orphans(tmp_path, is_referenced, grace_seconds=3600) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [referenced.filename, reused.filename, recent.filename]
+    )
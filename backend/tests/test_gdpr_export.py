@@ -0,0 +1,163 @@
+"""
+Tests pour l'export RGPD en streaming (ZIP de fichiers NDJSON)
+"""
+import io
+import json
+import zipfile
+import pytest
+from app.services.gdpr_service import GDPRService, USER_DATA_COLLECTIONS
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        self._iterator = iter(self._documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection=None):
+        field, value = next(iter(query.items()))
+        return FakeCursor([d for d in self.documents if d.get(field) == value])
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        return FakeCollection([])
+
+
+@pytest.mark.asyncio
+async def test_stream_export_zip_covers_all_collections(monkeypatch):
+    """Chaque collection devient un fichier NDJSON de l'archive"""
+    history = [{"_id": i, "user_id": "u1", "question": f"q{i}"} for i in range(1200)]
+    history.append({"_id": "other", "user_id": "u2", "question": "not mine"})
+    fake_db = FakeDatabase(user_history=FakeCollection(history))
+    monkeypatch.setattr("app.database.get_database", lambda: fake_db)
+
+    chunks = [chunk async for chunk in GDPRService.stream_export_zip("u1")]
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+    names = set(archive.namelist())
+    assert {f"{collection}.ndjson" for collection, _ in USER_DATA_COLLECTIONS} <= names
+    lines = archive.read("user_history.ndjson").decode().splitlines()
+    assert len(lines) == 1200
+    assert json.loads(lines[0])["question"] == "q0"
+
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["collections"]["user_history"] == 1200
+
+
+class FakeDeletionCollection:
+    """Documents d'une collection, avec find().limit() et delete_many sur _id"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection=None):
+        field, value = next(iter(query.items()))
+        matches = [d for d in self.documents if d.get(field) == value]
+
+        class Cursor(FakeCursor):
+            def limit(self, size):
+                return FakeCursor(matches[:size])
+
+        return Cursor(matches)
+
+    async def delete_many(self, query):
+        ids = set(query["_id"]["$in"])
+        before = len(self.documents)
+        self.documents[:] = [d for d in self.documents if d["_id"] not in ids]
+        return type("Result", (), {"deleted_count": before - len(self.documents)})()
+
+
+class FakeDeletionState:
+    """gdpr_deletions : un document par utilisateur"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def _apply(self, document, update):
+        for key, value in update.get("$set", {}).items():
+            if "." in key:
+                parent, child = key.split(".", 1)
+                document.setdefault(parent, {})[child] = value
+            else:
+                document[key] = value
+        for key in update.get("$unset", {}):
+            document.pop(key, None)
+        for key, value in update.get("$addToSet", {}).items():
+            if value not in document.setdefault(key, []):
+                document[key].append(value)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        document = self.documents.get(query["_id"])
+        if document is None:
+            document = self.documents[query["_id"]] = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+        self._apply(document, update)
+        return dict(document)
+
+    async def update_one(self, query, update):
+        document = self.documents.get(query["_id"])
+        if document and all(document.get(k) == v for k, v in query.items()):
+            self._apply(document, update)
+
+    async def insert_one(self, document):
+        pass
+
+
+class FakeDeletionDatabase(dict):
+    def __missing__(self, name):
+        return FakeDeletionCollection([])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.mark.asyncio
+async def test_deletion_runs_again_after_a_completed_one(monkeypatch):
+    """Une suppression terminée ne bloque pas les suivantes"""
+    history = FakeDeletionCollection([{"_id": 1, "user_id": "anonymous"}])
+    state = FakeDeletionState()
+    fake_db = FakeDeletionDatabase(user_history=history, gdpr_deletions=state, gdpr_logs=state)
+    monkeypatch.setattr("app.database.get_database", lambda: fake_db)
+
+    assert await GDPRService.delete_user_data("anonymous")
+    assert history.documents == []
+    assert state.documents["anonymous"]["status"] == "completed"
+
+    # Nouvelles données puis nouvelle demande : elles sont supprimées aussi
+    history.documents.append({"_id": 2, "user_id": "anonymous"})
+    assert await GDPRService.delete_user_data("anonymous")
+    assert history.documents == []
+    assert state.documents["anonymous"]["deleted_counts"]["user_history"] == 1
+
+
+def test_expired_export_archives_are_purged(tmp_path, monkeypatch):
+    """Les archives (données personnelles) ne restent pas indéfiniment sur disque"""
+    import os
+    from app.tasks import gdpr_export
+    monkeypatch.setattr(gdpr_export, "EXPORT_DIR", tmp_path)
+    old = tmp_path / "gdpr_old.zip"
+    abandoned = tmp_path / "gdpr_abandoned.zip.part"
+    recent = tmp_path / "gdpr_recent.zip"
+    for path in (old, abandoned, recent):
+        path.write_bytes(b"PK")
+    for path in (old, abandoned):
+        os.utime(path, (0, 0))
+
+    assert gdpr_export.purge_expired_exports() == 2
+    assert [path.name for path in tmp_path.iterdir()] == [recent.name]
@@ -0,0 +1,144 @@
+"""
+Tests pour le manifeste d'index MongoDB (diff et verrou de déploiement)
+"""
+import pytest
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+from app.database import indexes
+from app.database.indexes import apply_index_manifest, ensure_indexes_once
+
+
+class FakeCollection:
+    def __init__(self, existing=None):
+        self.existing = {"_id_": {"key": [("_id", 1)]}, **(existing or {})}
+        self.create_calls = []
+        self.documents = {}
+        self.failing = set()
+
+    async def index_information(self):
+        return dict(self.existing)
+
+    async def create_indexes(self, models):
+        names = [model.document["name"] for model in models]
+        self.create_calls.append(names)
+        if self.failing & set(names):
+            raise Exception("E11000 duplicate key")
+        for name in names:
+            self.existing[name] = {}
+        return names
+
+    async def find_one(self, query):
+        return self.documents.get(query["_id"])
+
+    async def insert_one(self, document):
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate")
+        self.documents[document["_id"]] = document
+
+    async def find_one_and_update(self, query, update):
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+    async def delete_one(self, query):
+        if all(self.documents.get(query["_id"], {}).get(k) == v for k, v in query.items()):
+            self.documents.pop(query["_id"], None)
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    async def list_collection_names(self):
+        return [name for name in self if name != indexes.LOCK_COLLECTION]
+
+    async def create_collection(self, name):
+        self[name]
+
+    async def command(self, name, collection, index):
+        assert name == "collMod"
+        self[collection].existing[index["name"]]["expireAfterSeconds"] = index["expireAfterSeconds"]
+
+
+MANIFEST = {
+    "users": [IndexModel("email", unique=True), IndexModel("username", unique=True)],
+    "tds": [IndexModel("module_id")],
+}
+
+
+@pytest.mark.asyncio
+async def test_only_missing_indexes_are_created():
+    database = FakeDatabase(users=FakeCollection({"email_1": {"unique": True}}))
+    created = await apply_index_manifest(database, MANIFEST)
+    assert created == {"users": ["username_1"], "tds": ["module_id_1"]}
+    assert database["users"].create_calls == [["username_1"]]
+
+    # Deuxième passage : plus rien à créer
+    assert await apply_index_manifest(database, MANIFEST) == {}
+
+
+@pytest.mark.asyncio
+async def test_manifest_applied_once_per_version():
+    database = FakeDatabase()
+
+    first = await ensure_indexes_once(database, manifest=MANIFEST)
+    assert first == {"users": ["email_1", "username_1"], "tds": ["module_id_1"]}
+
+    # Autre worker / redémarrage : le verrou indique que c'est déjà fait
+    assert await ensure_indexes_once(database, manifest=MANIFEST) is None
+    assert database["users"].create_calls == [["email_1", "username_1"]]
+
+
+@pytest.mark.asyncio
+async def test_ttl_added_to_existing_index():
+    database = FakeDatabase(logs=FakeCollection({"created_at_1": {"key": [("created_at", 1)]}}))
+    manifest = {"logs": [IndexModel("created_at", expireAfterSeconds=60)]}
+
+    assert await apply_index_manifest(database, manifest) == {}
+    assert database["logs"].existing["created_at_1"]["expireAfterSeconds"] == 60
+    assert database["logs"].create_calls == []
+
+
+@pytest.mark.asyncio
+async def test_failed_index_is_retried_on_next_start():
+    database = FakeDatabase()
+    database["users"].failing = {"email_1"}
+
+    created = await ensure_indexes_once(database, manifest=MANIFEST)
+    assert created == {"users": ["username_1"], "tds": ["module_id_1"]}
+    # Verrou libéré, pas marqué "done"
+    assert database[indexes.LOCK_COLLECTION].documents == {}
+
+    database["users"].failing = set()
+    assert await ensure_indexes_once(database, manifest=MANIFEST) == {"users": ["email_1"]}
+    assert await ensure_indexes_once(database, manifest=MANIFEST) is None
+
+
+def _hinted_queries():
+    """(fichier, collection, clé) de chaque hint= littéral appelé sur db.<collection>.<méthode>"""
+    import ast
+    from pathlib import Path
+
+    app_dir = Path(indexes.__file__).resolve().parents[1]
+    for path in sorted(app_dir.rglob("*.py")):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+                continue
+            for keyword in node.keywords:
+                if keyword.arg != "hint":
+                    continue
+                target = node.func.value
+                collection = target.attr if isinstance(target, ast.Attribute) else None
+                yield path.name, collection, [tuple(pair) for pair in ast.literal_eval(keyword.value)]
+
+
+def test_every_hint_matches_a_manifest_index():
+    hints = list(_hinted_queries())
+    assert hints
+    for filename, collection, key in hints:
+        assert collection in indexes.INDEX_MANIFEST, f"{filename}: collection inconnue {collection}"
+        keys = [list(model.document["key"].items()) for model in indexes.INDEX_MANIFEST[collection]]
+        assert key in keys, f"{filename}: aucun index {key} sur {collection}"
@@ -0,0 +1,64 @@
+"""
+Tests pour l'extraction et la réparation du JSON des réponses LLM
+"""
+import json
+import random
+from app.utils.json_cleaner import TolerantJSONParser, repair_json, safe_json_loads
+
+
+def test_extracts_object_from_markdown_and_repairs_strings():
+    text = (
+        'Voici le quiz :\n```json\n{"question": "Ligne 1\nLigne 2\tfin", '
+        '"options": ["A", "Réponse "B"", "C", ], "formule": "\\alpha + \\u00e9"}\n``` '
+        'Bonne révision {fin}'
+    )
+    assert safe_json_loads(text) == {
+        "question": "Ligne 1\nLigne 2\tfin",
+        "options": ["A", 'Réponse "B"', "C"],
+        "formule": "\\alpha + é",
+    }
+
+
+def test_repairs_truncated_output():
+    assert json.loads(repair_json('{"questions": [{"q": "a"}, {"q": "b", "options": ["x", "y'))["questions"][1] == {
+        "q": "b", "options": ["x", "y"]
+    }
+    assert json.loads(repair_json('{"a": 1, "b": {"c": ')) == {"a": 1, "b": {}}
+    assert json.loads(repair_json('{"a": 1, "b": tr')) == {"a": 1}
+    assert json.loads(repair_json('{"a": 1, "partial_ke')) == {"a": 1}
+    assert json.loads(repair_json('{"items": [{"a": 1} {"a": 2}]}')) == {"items": [{"a": 1}, {"a": 2}]}
+    assert safe_json_loads('{"a": [1, 2 3], "b": [true null]}') == {"a": [1, 2, 3], "b": [True, None]}
+    # Virgule manquante après une chaîne : la suivante est une nouvelle clé (ou un nouvel élément)
+    assert safe_json_loads('{"a": "x" "b": "y"}') == {"a": "x", "b": "y"}
+    assert safe_json_loads('{"options": ["x"\n  "y"], "n": 1}') == {"options": ["x", "y"], "n": 1}
+    assert repair_json("pas de JSON ici") == ""
+    assert safe_json_loads("pas de JSON ici", fallback={}) == {}
+
+
+def test_streaming_parser_yields_items_as_they_complete():
+    questions = [{"question": f"Q{i}", "options": ["a", "b"], "correct_answer": i % 2} for i in range(20)]
+    text = "```json\n" + json.dumps({"title": "Quiz", "questions": questions}, ensure_ascii=False) + "\n```"
+
+    parser = TolerantJSONParser(item_depth=3)
+    rng = random.Random(0)
+    received, position, first_item_at = [], 0, None
+    while position < len(text):
+        size = rng.randint(1, 7)
+        items = parser.feed(text[position:position + size])
+        position += size
+        if items and first_item_at is None:
+            first_item_at = position
+        received.extend(items)
+
+    assert [item for _, item in received] == questions
+    assert {key for key, _ in received} == {"questions"}
+    # Le premier élément arrive bien avant la fin du texte
+    assert first_item_at < len(text) // 10
+    assert json.loads(parser.finish()) == {"title": "Quiz", "questions": questions}
+
+
+def test_streaming_literal_split_across_chunks():
+    parser = TolerantJSONParser()
+    for chunk in ['{"a": [12', '34 5', '6, tr', 'ue]}']:
+        parser.feed(chunk)
+    assert json.loads(parser.finish()) == {"a": [1234, 56, True]}
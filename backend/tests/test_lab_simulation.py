@@ -0,0 +1,124 @@
+"""
+Tests pour les simulations vectorisées des laboratoires virtuels
+"""
+import base64
+import json
+import numpy as np
+import pytest
+from app.services.lab_simulation_service import LabSimulationService
+
+
+@pytest.fixture
+def gravity_module(monkeypatch):
+    """Module de gravitation (sans MongoDB), compte les lectures"""
+    calls = []
+
+    async def find_by_id(module_id):
+        calls.append(module_id)
+        return {"id": module_id, "title": "La gravitation universelle"}
+
+    monkeypatch.setattr("app.services.lab_simulation_service.ModuleRepository.find_by_id", find_by_id)
+    LabSimulationService.invalidate_config_cache()
+    yield calls
+    LabSimulationService.invalidate_config_cache()
+
+
+@pytest.mark.asyncio
+async def test_sweep_matches_scalar_calculation(gravity_module):
+    """Chaque point de la grille vaut le calcul scalaire correspondant"""
+    result = await LabSimulationService.calculate_sweep(
+        "m1",
+        sweep={"mass1": {"values": [1, 10]}, "distance": {"start": 1, "stop": 100, "num": 5}},
+        parameters={"mass2": 20}
+    )
+    assert result["shape"] == [2, 5]
+    forces = np.array(result["results"]["force"]).reshape(result["shape"])
+    for i, m1 in enumerate(result["axes"]["mass1"]):
+        for j, r in enumerate(result["axes"]["distance"]):
+            expected = LabSimulationService._calculate_gravity({"mass1": m1, "mass2": 20, "distance": r})
+            assert forces[i, j] == pytest.approx(expected["force"])
+
+    # Configuration du module mise en cache
+    await LabSimulationService.calculate_simulation("m1", {"mass1": 1})
+    assert gravity_module == ["m1"]
+
+
+@pytest.mark.asyncio
+async def test_time_series_float32_encoding(gravity_module):
+    """Trajectoire encodée en float32 base64"""
+    result = await LabSimulationService.simulate_time_series(
+        "m1", parameters={"initial_velocity": 10, "angle": 90}, duration=1.0, steps=11, encoding="float32"
+    )
+    y = np.frombuffer(base64.b64decode(result["series"]["y"]), dtype="<f4")
+    assert y.shape == (11,)
+    assert y[0] == pytest.approx(0.0)
+    assert y[5] == pytest.approx(10 * 0.5 - 0.5 * 9.81 * 0.25, rel=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_sweep_rejects_unknown_parameter(gravity_module):
+    with pytest.raises(ValueError):
+        await LabSimulationService.calculate_sweep("m1", sweep={"voltage": [1, 2]})
+
+
+@pytest.mark.asyncio
+async def test_sweep_size_checked_before_allocation(gravity_module, monkeypatch):
+    allocations = []
+    monkeypatch.setattr(np, "linspace", lambda *args, **kwargs: allocations.append(args) or None)
+    with pytest.raises(ValueError):
+        await LabSimulationService.calculate_sweep("m1", sweep={"distance": {"start": 1, "stop": 2, "num": 10 ** 9}})
+    with pytest.raises(ValueError):
+        await LabSimulationService.calculate_sweep("m1", sweep={
+            "distance": {"start": 1, "stop": 2, "num": 1000}, "mass1": {"start": 1, "stop": 2, "num": 1000}
+        })
+    assert allocations == []
+
+
+@pytest.mark.asyncio
+async def test_non_finite_results_are_json_null(gravity_module):
+    result = await LabSimulationService.calculate_sweep("m1", sweep={"distance": [0, 10]})
+    assert result["results"]["force"][0] is None
+    assert result["results"]["force"][1] == pytest.approx(6.67430e-11 * 100 / 100)
+    json.dumps(result, allow_nan=False)
+
+
+@pytest.mark.asyncio
+async def test_projectile_stops_at_impact(gravity_module):
+    result = await LabSimulationService.simulate_time_series(
+        "m1", parameters={"initial_velocity": 10, "angle": 45}, duration=4.0, steps=41
+    )
+    series = {name: np.array(values) for name, values in result["series"].items()}
+    landed = series["y"][1:] == 0
+    assert landed.any()
+    # Après l'impact : position figée, vitesse nulle
+    first = int(np.argmax(landed)) + 1
+    assert np.all(series["x"][first:] == series["x"][first])
+    assert np.all(series["vx"][first:] == 0) and np.all(series["vy"][first:] == 0)
+    assert series["x"][first] == pytest.approx(10 ** 2 / 9.81, rel=1e-6)
+
+
+@pytest.mark.asyncio
+async def test_module_update_invalidates_cached_config(gravity_module, monkeypatch):
+    """La configuration suit le module modifié sans attendre l'expiration du cache"""
+    from types import SimpleNamespace
+    from app.repositories.module_repository import ModuleRepository
+    from app.services.module_search_service import ModuleSearchService
+    module_id = "64b7f0c2a1b2c3d4e5f60718"
+
+    async def update_one(query, update):
+        return None
+
+    monkeypatch.setattr(
+        "app.repositories.module_repository.get_database",
+        lambda: SimpleNamespace(modules=SimpleNamespace(update_one=update_one))
+    )
+    monkeypatch.setattr(ModuleSearchService, "on_module_saved", staticmethod(lambda module: None))
+
+    await LabSimulationService.calculate_simulation(module_id, {"mass1": 1})
+    await LabSimulationService.calculate_simulation(module_id, {"mass1": 2})
+    assert gravity_module == [module_id]
+
+    await ModuleRepository.update(module_id, {"title": "Gravitation et orbites"})
+    await LabSimulationService.calculate_simulation(module_id, {"mass1": 1})
+    # Une lecture pour update(), puis une pour la configuration recalculée
+    assert gravity_module == [module_id] * 3
@@ -0,0 +1,79 @@
+"""
+Tests pour le moteur de recherche des modules (index inversé BM25 en mémoire)
+"""
+import time
+import pytest
+from app.services.module_search_service import ModuleSearchIndex, ModuleSearchService
+
+
+def _module(module_id, title, description="", lessons=(), subject="mathematics", difficulty="beginner"):
+    return {
+        "id": module_id,
+        "title": title,
+        "description": description,
+        "subject": subject,
+        "difficulty": difficulty,
+        "learning_objectives": [],
+        "content": {"lessons": [{"title": lesson} for lesson in lessons]},
+    }
+
+
+@pytest.fixture
+def index():
+    index = ModuleSearchIndex()
+    index.upsert(_module("m1", "Équations du second degré", "Résoudre des équations", ["Le discriminant"]))
+    index.upsert(_module("m2", "Fonctions et dérivées", "Étude de fonctions", ["Dérivée d'un produit"]))
+    index.upsert(_module("m3", "Algorithmes de tri", "Tri rapide et tri fusion",
+                         ["Complexité"], subject="computer_science", difficulty="intermediate"))
+    index.upsert(_module("m4", "Probabilités", "Variables aléatoires et équations de récurrence"))
+    return index
+
+
+def test_accents_case_and_plurals_are_ignored(index):
+    assert [m for m, _ in index.search("EQUATION", prefix=False)][0] == "m1"
+    assert [m for m, _ in index.search("dérivée", prefix=False)] == ["m2"]
+
+
+def test_title_match_ranks_above_description_match(index):
+    ranked = [m for m, _ in index.search("équations", prefix=False)]
+    assert ranked == ["m1", "m4"]
+
+
+def test_prefix_completes_last_word_and_filters(index):
+    assert [m for m, _ in index.search("algo")] == ["m3"]
+    assert [m for m, _ in index.search("tri fus")] == ["m3"]
+    assert index.search("algo", prefix=False) == []
+    assert index.search("tri", subject="mathematics") == []
+
+
+def test_lesson_titles_are_indexed(index):
+    assert [m for m, _ in index.search("discriminant")] == ["m1"]
+
+
+def test_incremental_update_and_removal(index):
+    index.upsert(_module("m2", "Intégrales", "Primitives"))
+    assert index.search("dérivée", prefix=False) == []
+    assert [m for m, _ in index.search("primitive")] == ["m2"]
+
+    assert index.remove("m2")
+    assert index.search("primitive") == []
+    assert "primitive" not in index.postings
+
+
+@pytest.mark.asyncio
+async def test_service_cache_is_invalidated_on_write(index, monkeypatch):
+    monkeypatch.setattr(ModuleSearchService, "_index", index)
+    monkeypatch.setattr(ModuleSearchService, "_built", True)
+    monkeypatch.setattr(ModuleSearchService, "_checked_at", time.monotonic())
+    ModuleSearchService._cache.clear()
+
+    first = await ModuleSearchService.search("probab")
+    assert [r["id"] for r in first] == ["m4"]
+
+    ModuleSearchService.on_module_saved(_module("m5", "Probabilités conditionnelles"))
+    second = await ModuleSearchService.search("probab")
+    assert {r["id"] for r in second} == {"m4", "m5"}
+
+    ModuleSearchService.on_module_deleted("m4")
+    assert [r["id"] for r in await ModuleSearchService.search("probab")] == ["m5"]
+    ModuleSearchService._cache.clear()
@@ -39,3 +39,71 @@ async def test_update_level():
     
     level = await PedagogicalMemoryService.get_subject_level(user_id, "mathematics")
     assert level == "intermediate"
+
+
+@pytest.mark.asyncio
+async def test_adapt_explanation_reads_memory_once(monkeypatch):
+    """Une seule lecture MongoDB par requête tuteur (instantané mis en cache)"""
+    reads = []
+
+    async def find_by_user(user_id):
+        reads.append(user_id)
+        return {
+            "user_id": user_id,
+            "subject_levels": {"mathematics": {"level": "advanced"}},
+            "error_history": [{"concept": "limites", "error_count": 2}, {"concept": "dérivées", "error_count": 5}],
+            "learning_style": {"preferred_format": "visual"}
+        }
+
+    monkeypatch.setattr(PedagogicalMemoryRepository, "find_by_user", find_by_user)
+    PedagogicalMemoryService.invalidate_snapshot()
+
+    adaptation = await PedagogicalMemoryService.adapt_explanation("snapshot_user", "mathematics")
+    await PedagogicalMemoryService.get_frequent_errors("snapshot_user")
+    assert reads == ["snapshot_user"]
+    assert adaptation["level"] == "advanced"
+    assert adaptation["detail_level"] == "low"
+    assert adaptation["frequent_errors"] == ["dérivées", "limites"]
+    PedagogicalMemoryService.invalidate_snapshot()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_cache_is_bounded(monkeypatch):
+    """Le cache garde les instantanés les plus récemment lus, dans la limite fixée"""
+    from app.services import pedagogical_memory_service
+    reads = []
+
+    async def find_by_user(user_id):
+        reads.append(user_id)
+        return {"user_id": user_id}
+
+    monkeypatch.setattr(PedagogicalMemoryRepository, "find_by_user", find_by_user)
+    monkeypatch.setattr(pedagogical_memory_service, "SNAPSHOT_CACHE_SIZE", 2)
+    PedagogicalMemoryService.invalidate_snapshot()
+
+    for user_id in ("u1", "u2", "u1", "u3", "u1", "u2"):
+        await PedagogicalMemoryService.get_snapshot(user_id)
+    # u2, le moins récemment lu, a été évincé par u3
+    assert reads == ["u1", "u2", "u3", "u2"]
+    assert list(PedagogicalMemoryService._snapshot_cache) == ["u1", "u2"]
+    PedagogicalMemoryService.invalidate_snapshot()
+
+
+@pytest.mark.asyncio
+async def test_add_error_known_concept_single_update(monkeypatch):
+    """Concept déjà présent : un seul update_one atomique"""
+    calls = []
+
+    class FakeCollection:
+        async def update_one(self, query, update, upsert=False):
+            calls.append((query, update, upsert))
+            return type("Result", (), {"matched_count": 1})()
+
+    fake_db = type("FakeDB", (), {"pedagogical_memory": FakeCollection()})()
+    monkeypatch.setattr("app.repositories.pedagogical_memory_repository.get_database", lambda: fake_db)
+
+    await PedagogicalMemoryRepository.add_error("u1", "dérivées", "calcul")
+    assert len(calls) == 1
+    query, update, upsert = calls[0]
+    assert query["error_history.concept"] == "dérivées"
+    assert update["$inc"] == {"error_history.$.error_count": 1}
@@ -0,0 +1,51 @@
+"""
+Tests pour l'assemblage des messages à préfixe stable (cache de prompt OpenAI)
+"""
+from types import SimpleNamespace
+from app.prompts.assembly import build_messages, cached_tokens, system_prompt
+from app.services.ai_gateway import AIGateway
+
+
+def test_static_prefix_is_identical_across_requests():
+    first = build_messages("Qu'est-ce qu'une dérivée ?", mode="tutor", context="Contexte du module: Analyse - Dérivées")
+    second = build_messages("Bonjour", mode="tutor", context="Contexte du module: Chimie - Moles", language="fr")
+    # Même objet interné, aucune partie variable dans le préfixe
+    assert first[0]["content"] is second[0]["content"]
+    assert "Contexte" not in first[0]["content"]
+    assert first[1]["content"] == "Contexte du module: Analyse - Dérivées"
+
+
+def test_language_and_context_go_after_prefix():
+    messages = build_messages(
+        "Hello",
+        mode="expert",
+        language="en",
+        context="Contexte: mécanique",
+        prompt_language="fr",
+        force_language=True
+    )
+    assert messages[0]["content"] == system_prompt("expert", "fr")
+    assert messages[1]["content"] == "Contexte: mécanique\n\nLANGUE : Réponds TOUJOURS en en"
+    assert messages[-1] == {"role": "user", "content": "Hello"}
+
+
+def test_history_is_truncated_and_placed_before_user_message():
+    history = [{"role": "user", "content": str(i)} for i in range(15)]
+    messages = build_messages("fin", history=history)
+    assert [m["content"] for m in messages[1:-1]] == [str(i) for i in range(5, 15)]
+
+
+def test_cached_tokens_and_gateway_stats(monkeypatch):
+    monkeypatch.setattr(AIGateway, "_prompt_cache_totals", {})
+    usage = SimpleNamespace(
+        prompt_tokens=2000,
+        completion_tokens=100,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1536)
+    )
+    assert cached_tokens(usage) == 1536
+    assert cached_tokens(SimpleNamespace(prompt_tokens=10, prompt_tokens_details=None)) == 0
+    assert cached_tokens(SimpleNamespace(prompt_tokens_details={"cached_tokens": 64})) == 64
+
+    AIGateway._record("gpt-4o-mini", "chat", 0.0, usage, user_id=None, status="error")
+    stats = AIGateway.prompt_cache_stats()
+    assert stats["features"]["chat"] == {"prompt_tokens": 2000, "cached_tokens": 1536, "cached_ratio": 0.768}
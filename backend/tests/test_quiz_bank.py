@@ -0,0 +1,89 @@
+"""
+Tests pour le tirage des questions et la correction côté serveur
+"""
+import pytest
+from fastapi import HTTPException
+from app.repositories.quiz_repository import ANSWER_KEY_FIELDS, QuizRepository
+from app.services import quiz_service
+from app.services.quiz_service import QuizService
+
+MODULE_ID = "64b7f0c2a1b2c3d4e5f60718"
+BANK = [
+    {"question": f"Q{i}", "options": ["a", "b", "c", "d"], "correct_answer": i % 4, "explanation": f"E{i}"}
+    for i in range(50)
+]
+
+
+def test_sample_indexes_are_distinct_and_reproducible():
+    indexes = quiz_service._sample_indexes(50, 20, seed=7)
+    assert len(set(indexes)) == 20 and all(0 <= i < 50 for i in indexes)
+    assert indexes == quiz_service._sample_indexes(50, 20, seed=7)
+    assert indexes != quiz_service._sample_indexes(50, 20, seed=8)
+    assert sorted(quiz_service._sample_indexes(3, 10, seed=0)) == [0, 1, 2]
+
+
+@pytest.fixture
+def fake_bank(monkeypatch):
+    saved = {}
+
+    async def find_module(module_id):
+        return {"_id": module_id, "subject": "computer_science"}
+
+    async def find_summary(module_id):
+        return {"id": "quiz-1", "module_id": module_id, "num_questions": len(BANK), "version": 2}
+
+    async def find_questions_at(module_id, indexes, fields=("question", "options")):
+        # Même résultat que la projection $arrayElemAt / $let de MongoDB
+        questions = [{"index": i, **{f: BANK[i][f] for f in fields}} for i in indexes if 0 <= i < len(BANK)]
+        return {"id": "quiz-1", "version": 2, "questions": questions}
+
+    async def create_attempt(attempt_data):
+        saved.update(attempt_data)
+        return {"id": "attempt-1", **attempt_data}
+
+    monkeypatch.setattr(quiz_service.ModuleRepository, "find_by_id", staticmethod(find_module))
+    monkeypatch.setattr(QuizRepository, "find_summary", staticmethod(find_summary))
+    monkeypatch.setattr(QuizRepository, "find_questions_at", staticmethod(find_questions_at))
+    monkeypatch.setattr(QuizRepository, "create_attempt", staticmethod(create_attempt))
+    return saved
+
+
+async def test_sample_hides_answer_keys_and_grading_uses_them(fake_bank):
+    sample = await QuizService.sample_quiz(MODULE_ID, num_questions=10, seed=3)
+    assert (sample["quiz_id"], sample["quiz_version"], sample["seed"], sample["num_questions"]) == ("quiz-1", 2, 3, 10)
+    assert len(sample["questions"]) == 10
+    assert all(set(q) == {"index", "question", "options"} for q in sample["questions"])
+
+    first, second = sample["questions"][:2]
+    answers = {first["index"]: BANK[first["index"]]["correct_answer"], second["index"]: 9}
+    result = await QuizService.grade_attempt(
+        "anonymous", MODULE_ID, "quiz-1", 2, seed=3, num_questions=10, answers=answers, time_spent=120
+    )
+
+    # Les 8 questions du tirage sans réponse comptent comme fausses
+    assert result["attempt"]["num_questions"] == 10
+    assert result["attempt"]["num_correct"] == 1 and result["attempt"]["score"] == 10.0
+    assert [c["index"] for c in result["corrections"]] == [q["index"] for q in sample["questions"]]
+    assert [c["is_correct"] for c in result["corrections"][:3]] == [True, False, False]
+    assert result["corrections"][2]["answer"] is None
+    assert result["corrections"][0]["explanation"] == BANK[first["index"]]["explanation"]
+    assert set(fake_bank["answers"]) == {str(first["index"]), str(second["index"])}
+    assert set(ANSWER_KEY_FIELDS) <= set(result["corrections"][1])
+
+
+async def test_answers_outside_the_sample_are_ignored(fake_bank):
+    sampled = set(quiz_service._sample_indexes(len(BANK), 5, seed=11))
+    outside = next(i for i in range(len(BANK)) if i not in sampled)
+    result = await QuizService.grade_attempt(
+        "anonymous", MODULE_ID, "quiz-1", 2, seed=11, num_questions=5,
+        answers={outside: BANK[outside]["correct_answer"]}, time_spent=10
+    )
+    assert result["attempt"]["score"] == 0 and result["attempt"]["num_questions"] == 5
+
+
+async def test_grading_rejects_regenerated_quiz(fake_bank):
+    with pytest.raises(HTTPException) as exc:
+        await QuizService.grade_attempt(
+            "anonymous", MODULE_ID, "quiz-1", 1, seed=0, num_questions=5, answers={0: 0}, time_spent=10
+        )
+    assert exc.value.status_code == 409
@@ -0,0 +1,156 @@
+"""
+Tests pour la génération de quiz en streaming (questions envoyées au fil de l'eau)
+"""
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from app.services.ai_service import AIService
+from app.services.ai_gateway import AIGateway
+from app.services import quiz_service
+from app.services.quiz_service import QuizService
+from app.repositories.quiz_repository import QuizRepository
+from app.repositories.module_repository import ModuleRepository
+from app.utils.event_stream import format_event
+
+MODULE_ID = "64b7f0c2a1b2c3d4e5f60718"
+QUESTIONS = [
+    {"question": f"Q{i}", "options": ["a", "b", "c", "d"], "correct_answer": i % 4, "explanation": "ok"}
+    for i in range(7)
+]
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+@pytest.fixture
+def fake_generation(monkeypatch):
+    state = {"stored": [], "statuses": [], "chunks_sent": 0, "chunks_total": 0}
+    text = json.dumps({"questions": QUESTIONS})
+    chunks = [text[i:i + 10] for i in range(0, len(text), 10)]
+    state["chunks_total"] = len(chunks)
+
+    async def stream_chat_completion(feature, user_id=None, max_retries=3, **params):
+        for chunk in chunks:
+            state["chunks_sent"] += 1
+            yield _chunk(chunk)
+
+    async def build_params(*args, **kwargs):
+        return {"model": "gpt-4o-mini", "messages": []}
+
+    async def find_module(module_id):
+        return {"_id": module_id, "title": "Algorithmique", "subject": "computer_science"}
+
+    async def find_quiz(module_id, question_limit=None):
+        return None
+
+    async def start_generation(module_id, stale_before):
+        if state.get("generating_since") and state["generating_since"] >= stale_before:
+            return None
+        state["version"] = state.get("version", 0) + 1
+        state["generating_since"] = datetime.now(timezone.utc)
+        state["stored"] = []
+        return {"id": "quiz-1", "version": state["version"]}
+
+    async def append_questions(module_id, version, questions):
+        if version != state["version"]:
+            return False
+        state["stored"].extend(questions)
+        return True
+
+    async def set_generation_status(module_id, version, status):
+        if version != state["version"]:
+            return False
+        state["statuses"].append(status)
+        state["generating_since"] = None
+        return True
+
+    monkeypatch.setattr(AIGateway, "is_available", staticmethod(lambda: True))
+    monkeypatch.setattr(AIGateway, "stream_chat_completion", staticmethod(stream_chat_completion))
+    monkeypatch.setattr(AIService, "_build_quiz_generation_params", staticmethod(build_params))
+    monkeypatch.setattr(ModuleRepository, "find_by_id", staticmethod(find_module))
+    monkeypatch.setattr(QuizRepository, "find_by_module_id", staticmethod(find_quiz))
+    monkeypatch.setattr(QuizRepository, "start_generation", staticmethod(start_generation))
+    monkeypatch.setattr(QuizRepository, "append_questions", staticmethod(append_questions))
+    monkeypatch.setattr(QuizRepository, "set_generation_status", staticmethod(set_generation_status))
+    monkeypatch.setattr(quiz_service, "PERSIST_BATCH", 3)
+    return state
+
+
+async def test_questions_streamed_before_generation_ends(fake_generation):
+    events = await QuizService.stream_quiz(MODULE_ID, num_questions=10)
+    received = []
+    async for event in events:
+        if event["type"] == "question" and not received:
+            # La première question part bien avant la fin de la réponse du modèle
+            assert fake_generation["chunks_sent"] < fake_generation["chunks_total"] // 3
+        received.append(event)
+
+    assert received[0]["type"] == "start"
+    assert [e["question"]["question"] for e in received if e["type"] == "question"] == [q["question"] for q in QUESTIONS]
+    assert received[-1] == {"type": "done", "quiz_id": "quiz-1", "num_questions": 7, "status": "complete"}
+    assert fake_generation["stored"] == QUESTIONS
+    assert fake_generation["statuses"] == ["complete"]
+
+
+async def test_interrupted_stream_keeps_questions_and_marks_incomplete(fake_generation):
+    events = await QuizService.stream_quiz(MODULE_ID, num_questions=10)
+    async for event in events:
+        if event["type"] == "question" and event["index"] == 3:
+            break
+    await events.aclose()
+
+    assert fake_generation["stored"] == QUESTIONS[:4]
+    assert fake_generation["statuses"] == ["incomplete"]
+
+
+def test_format_event():
+    event = {"type": "question", "index": 0, "question": {"question": "Qu'est-ce qu'une pile ?"}}
+    assert format_event(event, "sse") == f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    assert format_event(event, "ndjson") == json.dumps(event, ensure_ascii=False) + "\n"
+
+
+async def test_only_complete_quizzes_are_served(fake_generation, monkeypatch):
+    from datetime import timedelta
+    from fastapi import HTTPException
+    stored = {}
+
+    async def find_quiz(module_id, question_limit=None):
+        return dict(stored, questions=QUESTIONS[:question_limit])
+
+    monkeypatch.setattr(QuizRepository, "find_by_module_id", staticmethod(find_quiz))
+
+    # Génération en cours : le quiz partiel n'est pas servi
+    stored.update(id="quiz-1", generation_status="generating", updated_at=datetime.now(timezone.utc).isoformat())
+    with pytest.raises(HTTPException) as exc:
+        await QuizService.stream_quiz(MODULE_ID, num_questions=10)
+    assert exc.value.status_code == 409
+
+    # Génération abandonnée (worker arrêté) : regénérée
+    stale = datetime.now(timezone.utc) - quiz_service.GENERATION_STALE_AFTER - timedelta(seconds=1)
+    stored["updated_at"] = stale.replace(tzinfo=None).isoformat()
+    events = [event async for event in await QuizService.stream_quiz(MODULE_ID, num_questions=10)]
+    assert events[0]["cached"] is False and fake_generation["statuses"] == ["complete"]
+
+    # Quiz antérieur au streaming (sans statut) : servi tel quel
+    stored.clear()
+    stored["id"] = "quiz-0"
+    events = [event async for event in await QuizService.stream_quiz(MODULE_ID, num_questions=3)]
+    assert events[0]["cached"] is True and events[-1]["num_questions"] == 3
+
+
+async def test_overlapping_generation_is_rejected(fake_generation):
+    """Une seconde génération (double clic, force_regenerate) ne mélange pas ses questions à la première"""
+    from fastapi import HTTPException
+    first = await QuizService.stream_quiz(MODULE_ID, num_questions=10)
+    received = [await first.__anext__()]
+
+    with pytest.raises(HTTPException) as exc:
+        await QuizService.stream_quiz(MODULE_ID, num_questions=10, force_regenerate=True)
+    assert exc.value.status_code == 409
+
+    received += [event async for event in first]
+    assert received[-1]["num_questions"] == 7
+    assert fake_generation["stored"] == QUESTIONS
+    assert fake_generation["statuses"] == ["complete"]
@@ -0,0 +1,73 @@
+"""
+Tests pour le classifieur local du Prompt Router et l'évaluation fantôme
+"""
+import pytest
+from app.services import prompt_router_service, request_classifier
+from app.services.prompt_router_service import PromptRouterService
+from app.services.request_classifier import RequestClassifier, train
+
+SAMPLES = [
+    {"message": "c'est quoi une fraction", "category": 1},
+    {"message": "what is a fraction", "category": 1},
+    {"message": "définition rapide de la vitesse", "category": 1},
+    {"message": "donne moi un quiz sur les fractions", "category": 2},
+    {"message": "give me a quiz on fractions", "category": 2},
+    {"message": "exercice standard sur les équations", "category": 2},
+    {"message": "démontre le théorème de Pythagore étape par étape", "category": 3},
+    {"message": "prove the theorem step by step", "category": 3},
+    {"message": "corrige mon TP de simulation numérique", "category": 3},
+    {"message": "analyse mes erreurs et fais un diagnostic pédagogique complet", "category": 4},
+    {"message": "analyse my mistakes and give a full learning diagnosis", "category": 4},
+    {"message": "diagnostic de mes lacunes en algèbre", "category": 4},
+]
+
+
+@pytest.fixture
+def classifier():
+    model = train(SAMPLES, epochs=300)
+    request_classifier.set_classifier(model)
+    yield model
+    request_classifier.set_classifier(None)
+
+
+def test_training_fits_bilingual_samples(classifier, tmp_path):
+    assert all(classifier.predict(s["message"])[0] == s["category"] for s in SAMPLES)
+
+    path = tmp_path / "classifier.npz"
+    classifier.save(path)
+    loaded = RequestClassifier.load(path)
+    assert loaded.predict("quiz sur les fractions") == classifier.predict("quiz sur les fractions")
+
+
+@pytest.mark.asyncio
+async def test_confident_local_prediction_skips_gpt(classifier, monkeypatch):
+    async def gpt(message, context=None):
+        raise AssertionError("GPT ne doit pas être appelé")
+
+    monkeypatch.setattr(prompt_router_service.settings, "request_classifier_mode", "local")
+    monkeypatch.setattr(prompt_router_service.settings, "request_classifier_min_confidence", 0.0)
+    monkeypatch.setattr(PromptRouterService, "_classify_with_gpt", staticmethod(gpt))
+
+    assert await PromptRouterService.classify_request("give me a quiz on fractions") == 2
+
+
+@pytest.mark.asyncio
+async def test_shadow_mode_reports_agreement(classifier, monkeypatch):
+    async def gpt(message, context=None):
+        return 3
+
+    monkeypatch.setattr(prompt_router_service.settings, "request_classifier_mode", "shadow")
+    monkeypatch.setattr(PromptRouterService, "_classify_with_gpt", staticmethod(gpt))
+    monkeypatch.setattr(PromptRouterService, "_log_for_training", staticmethod(lambda *args: None))
+    monkeypatch.setattr(PromptRouterService, "_local_stats", {
+        "local_decisions": 0, "gpt_decisions": 0, "compared": 0, "agreed": 0,
+        "confident_compared": 0, "confident_agreed": 0, "confusion": {}
+    })
+
+    assert await PromptRouterService.classify_request("prove the theorem step by step") == 3
+    assert await PromptRouterService.classify_request("what is a fraction") == 3
+
+    stats = PromptRouterService.get_local_classifier_stats()
+    assert stats["gpt_decisions"] == 2
+    assert stats["agreement_rate"] == 0.5
+    assert stats["confusion"] == {"3->3": 1, "3->1": 1}
@@ -0,0 +1,75 @@
+"""
+Tests pour retry_with_backoff (Retry-After, deadline, budget de retries)
+"""
+from types import SimpleNamespace
+import pytest
+from app.utils import retry
+from app.utils.retry import RetryBudget, request_deadline, retry_with_backoff
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: str):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": retry_after})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Remplace asyncio.sleep et enregistre les délais demandés"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def flaky(failures: int, error: Exception):
+    calls = []
+
+    async def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return func, calls
+
+
+@pytest.mark.asyncio
+async def test_honours_retry_after(sleeps):
+    func, calls = flaky(1, RateLimited("7"))
+    result = await retry_with_backoff(func, initial_delay=0.1, max_delay=1.0, budget=RetryBudget())
+    assert result == "ok"
+    assert sleeps == [7.0]
+
+
+@pytest.mark.asyncio
+async def test_jittered_delay_stays_under_cap(sleeps):
+    func, calls = flaky(3, ConnectionError("down"))
+    await retry_with_backoff(func, max_retries=4, initial_delay=1.0, max_delay=2.0, budget=RetryBudget())
+    assert len(sleeps) == 3
+    assert all(0 <= delay <= 2.0 for delay in sleeps)
+
+
+@pytest.mark.asyncio
+async def test_gives_up_when_deadline_too_close(sleeps):
+    func, calls = flaky(1, RateLimited("30"))
+    with request_deadline(5.0):
+        with pytest.raises(RateLimited):
+            await retry_with_backoff(func, budget=RetryBudget())
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+@pytest.mark.asyncio
+async def test_gives_up_when_budget_exhausted(sleeps):
+    budget = RetryBudget(ratio=0.0, min_retries_per_second=0.0, max_tokens=1.0)
+    first, _ = flaky(1, ConnectionError("down"))
+    assert await retry_with_backoff(first, initial_delay=0.01, budget=budget) == "ok"
+
+    second, calls = flaky(1, ConnectionError("down"))
+    with pytest.raises(ConnectionError):
+        await retry_with_backoff(second, initial_delay=0.01, budget=budget)
+    assert len(calls) == 1
@@ -0,0 +1,29 @@
+"""
+Tests pour la table des routeurs et les groupes de fonctionnalités
+"""
+from app.routers.registry import FEATURE_GROUPS, ROUTERS, parse_features, routers_for
+
+
+def test_all_enables_every_group():
+    assert parse_features("all") == FEATURE_GROUPS
+    assert parse_features(None) == FEATURE_GROUPS
+
+
+def test_core_is_always_enabled():
+    assert parse_features("tutor") == {"core", "tutor"}
+    assert parse_features("all,-core") == FEATURE_GROUPS
+
+
+def test_exclusion_and_unknown_groups():
+    features = parse_features("all, -payments, -documents, unknown")
+    assert "payments" not in features
+    assert "documents" not in features
+    assert "tutor" in features
+
+
+def test_tutor_deployment_skips_pdf_and_payment_routers():
+    modules = [spec.module for spec in routers_for(parse_features("core,tutor"))]
+    assert "ai_tutor" in modules
+    assert not {"subscriptions", "td", "tp", "openai_content"} & set(modules)
+    # L'ordre d'inclusion de la table est conservé
+    assert modules == [spec.module for spec in ROUTERS if spec.module in modules]
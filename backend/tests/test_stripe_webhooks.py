@@ -0,0 +1,253 @@
+"""
+Tests pour l'intégration Stripe : appels hors boucle et file des webhooks
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from app.config import settings
+from app.repositories import stripe_event_repository
+from app.repositories.stripe_event_repository import StripeEventRepository, MAX_ATTEMPTS
+from app.repositories.subscription_repository import SubscriptionRepository
+from app.services import payment_service, stripe_webhook_queue
+from app.services.payment_service import PaymentService
+from app.services.stripe_webhook_queue import StripeWebhookQueue
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """Serveur Stripe local : répond lentement à la création de session"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(0.3)
+        body = json.dumps({
+            "id": "cs_test_1", "object": "checkout.session", "url": "https://checkout.test/cs_test_1"
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), FakeStripeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    import stripe
+    monkeypatch.setattr(stripe, "api_base", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(settings, "stripe_secret_key", "sk_test_fake")
+    monkeypatch.setattr(settings, "stripe_webhook_secret", WEBHOOK_SECRET)
+    monkeypatch.setattr(payment_service, "_stripe", None)
+    yield stripe
+    server.shutdown()
+    monkeypatch.setattr(payment_service, "_stripe", None)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Événements et abonnements en mémoire à la place de MongoDB"""
+    events, subscriptions = {}, {}
+
+    async def insert_if_new(record):
+        if record["_id"] in events:
+            return False
+        events[record["_id"]] = {**record, "status": "pending", "attempts": 0}
+        return True
+
+    async def claim(event_id):
+        record = events.get(event_id)
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=stripe_event_repository.STALE_PROCESSING_SECONDS)
+        claimable = record and record["attempts"] < MAX_ATTEMPTS and (
+            record["status"] in ("pending", "failed")
+            or (record["status"] == "processing" and record["claimed_at"] < stale_before)
+        )
+        if not claimable:
+            return None
+        record.update(status="processing", attempts=record["attempts"] + 1, claimed_at=datetime.now(timezone.utc))
+        return dict(record)
+
+    async def find_unprocessed():
+        return [dict(record) for record in events.values() if record["status"] != "processed"]
+
+    async def mark_processed(event_id):
+        events[event_id]["status"] = "processed"
+
+    async def mark_failed(event_id, error):
+        events[event_id]["status"] = "failed"
+
+    async def apply_stripe_update(stripe_id, update_data, event_created, watermark="status_event_at", set_on_insert=None):
+        current = subscriptions.get(stripe_id)
+        if current is None:
+            current = subscriptions[stripe_id] = dict(set_on_insert or {})
+        elif event_created is not None and current.get(watermark, 0) > event_created:
+            return False
+        current.update(update_data)
+        if event_created is not None:
+            current[watermark] = event_created
+        return True
+
+    async def activate_unless_status_event(stripe_id, event_created):
+        current = subscriptions.get(stripe_id)
+        if current is None or "status_event_at" in current:
+            return False
+        current.update(status="active", status_event_at=event_created)
+        return True
+
+    monkeypatch.setattr(StripeEventRepository, "insert_if_new", insert_if_new)
+    monkeypatch.setattr(StripeEventRepository, "claim", claim)
+    monkeypatch.setattr(StripeEventRepository, "mark_processed", mark_processed)
+    monkeypatch.setattr(StripeEventRepository, "mark_failed", mark_failed)
+    monkeypatch.setattr(StripeEventRepository, "find_unprocessed", find_unprocessed)
+    async def find_user_id_by_stripe_id(stripe_id):
+        return subscriptions.get(stripe_id, {}).get("user_id")
+
+    monkeypatch.setattr(SubscriptionRepository, "apply_stripe_update", apply_stripe_update)
+    monkeypatch.setattr(SubscriptionRepository, "find_user_id_by_stripe_id", find_user_id_by_stripe_id)
+    monkeypatch.setattr(SubscriptionRepository, "activate_unless_status_event", activate_unless_status_event)
+    yield events, subscriptions
+
+
+def _signed(event):
+    payload = json.dumps(event).encode()
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return payload, f"t={timestamp},v1={signature}"
+
+
+def _event(event_id, event_type, obj, created):
+    return {"id": event_id, "type": event_type, "created": created, "data": {"object": obj}}
+
+
+@pytest.mark.asyncio
+async def test_checkout_session_does_not_block_the_event_loop(fake_stripe):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    session = await PaymentService.create_checkout_session("u1", "premium", "https://ok", "https://ko")
+    task.cancel()
+
+    assert session["session_id"] == "cs_test_1"
+    assert session["url"] == "https://checkout.test/cs_test_1"
+    # La réponse du faux Stripe prend 300 ms : la boucle a continué de tourner
+    assert ticks >= 10
+
+
+@pytest.mark.asyncio
+async def test_webhooks_are_deduplicated_and_applied_in_order(fake_stripe, store):
+    events, subscriptions = store
+    checkout = _event("evt_1", "checkout.session.completed", {
+        "subscription": "sub_1", "customer": "cus_1", "metadata": {"user_id": "u1", "plan": "premium"}
+    }, created=100)
+    past_due = _event("evt_2", "customer.subscription.updated", {"id": "sub_1", "status": "past_due"}, created=120)
+    stale = _event("evt_3", "customer.subscription.updated", {"id": "sub_1", "status": "active"}, created=110)
+    # Facture payée reçue avant le checkout d'un autre abonnement
+    invoice = _event("evt_4", "invoice.payment_succeeded", {"subscription": "sub_2"}, created=200)
+    checkout_2 = _event("evt_5", "checkout.session.completed", {
+        "subscription": "sub_2", "customer": "cus_2", "metadata": {"user_id": "u2", "plan": "premium"}
+    }, created=199)
+
+    results = []
+    for event in (past_due, checkout, past_due, stale, invoice, checkout_2):
+        results.append(await PaymentService.handle_webhook(*_signed(event)))
+    await StripeWebhookQueue.drain()
+    await StripeWebhookQueue.close()
+
+    assert [r["status"] for r in results] == ["queued", "queued", "duplicate", "queued", "queued", "queued"]
+    assert all(record["status"] == "processed" for record in events.values())
+    # Le checkout arrivé après la mise à jour renseigne l'utilisateur sans écraser le statut,
+    # l'événement plus ancien arrivé en dernier est ignoré
+    assert subscriptions["sub_1"]["user_id"] == "u1"
+    assert subscriptions["sub_1"]["status"] == "past_due"
+    # Le document créé par la facture reçoit le statut actif au checkout
+    assert subscriptions["sub_2"]["user_id"] == "u2"
+    assert subscriptions["sub_2"]["status"] == "active"
+
+
+@pytest.mark.asyncio
+async def test_recent_invoice_does_not_hide_older_status_change(fake_stripe, store):
+    events, subscriptions = store
+    invoice = _event("evt_1", "invoice.payment_succeeded", {"subscription": "sub_1"}, created=101)
+    updated = _event("evt_2", "customer.subscription.updated", {"id": "sub_1", "status": "past_due"}, created=100)
+
+    for event in (invoice, updated):
+        await PaymentService.handle_webhook(*_signed(event))
+    await StripeWebhookQueue.drain()
+    await StripeWebhookQueue.close()
+
+    assert subscriptions["sub_1"]["status"] == "past_due"
+    assert subscriptions["sub_1"]["payment_event_at"] == 101
+
+
+@pytest.mark.asyncio
+async def test_invalid_signature_is_rejected(fake_stripe, store):
+    payload, _ = _signed(_event("evt_x", "invoice.payment_failed", {"subscription": "sub_1"}, 1))
+    with pytest.raises(ValueError):
+        await PaymentService.handle_webhook(payload, "t=1,v1=deadbeef")
+    assert store[0] == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_event_is_retried(fake_stripe, store, monkeypatch):
+    events, subscriptions = store
+    monkeypatch.setattr(stripe_webhook_queue, "RETRY_BASE_DELAY", 0.01)
+    original = PaymentService.apply_event
+    calls = []
+
+    async def flaky(event):
+        calls.append(event["id"])
+        if len(calls) == 1:
+            raise RuntimeError("base indisponible")
+        await original(event)
+
+    monkeypatch.setattr(PaymentService, "apply_event", flaky)
+    await PaymentService.handle_webhook(*_signed(
+        _event("evt_9", "invoice.payment_failed", {"subscription": "sub_9"}, created=5)
+    ))
+    await StripeWebhookQueue.drain()
+    await asyncio.sleep(0.05)
+    await StripeWebhookQueue.drain()
+    await StripeWebhookQueue.close()
+
+    assert calls == ["evt_9", "evt_9"]
+    assert events["evt_9"]["status"] == "processed"
+    assert subscriptions["sub_9"]["status"] == "payment_failed"
+
+
+@pytest.mark.asyncio
+async def test_event_left_processing_is_resumed_once_its_claim_expires(fake_stripe, store, monkeypatch):
+    """Redémarrage juste après un arrêt brutal : l'événement réservé n'est pas perdu"""
+    events, subscriptions = store
+    monkeypatch.setattr(stripe_event_repository, "STALE_PROCESSING_SECONDS", 0.2)
+    events["evt_7"] = {
+        "_id": "evt_7", "subscription_key": "sub_7", "status": "processing", "attempts": 1,
+        "claimed_at": datetime.now(timezone.utc),
+        "event": _event("evt_7", "invoice.payment_failed", {"subscription": "sub_7"}, created=5),
+    }
+
+    assert await StripeWebhookQueue.resume_pending() == 1
+    await StripeWebhookQueue.drain()
+    assert events["evt_7"]["status"] == "processing"  # réservation pas encore expirée
+
+    await asyncio.sleep(1.5)
+    await StripeWebhookQueue.drain()
+    await StripeWebhookQueue.close()
+    assert events["evt_7"]["status"] == "processed"
+    assert subscriptions["sub_7"]["status"] == "payment_failed"
@@ -0,0 +1,56 @@
+"""
+Tests pour le comptage des tokens et le budget de l'historique de conversation
+"""
+from app.prompts.assembly import build_messages
+from app.utils import token_counter
+from app.utils.token_counter import count_messages_tokens, count_tokens, fit_history, history_budget, message_tokens
+
+
+def test_message_tokens_include_overhead_and_images():
+    text = {"role": "user", "content": "Bonjour"}
+    assert message_tokens(text) == count_tokens("Bonjour") + token_counter.MESSAGE_OVERHEAD_TOKENS
+
+    image = {"role": "user", "content": [
+        {"type": "text", "text": "Bonjour"},
+        {"type": "image_url", "image_url": {"url": "data:..."}}
+    ]}
+    assert message_tokens(image) == message_tokens(text) + token_counter.IMAGE_PART_TOKENS
+
+
+def test_history_budget_respects_setting_and_context_window(monkeypatch):
+    monkeypatch.setattr(token_counter.settings, "ai_history_token_budget", 6000)
+    assert history_budget("gpt-5-mini", fixed_tokens=500, max_completion_tokens=2000) == 6000
+    # gpt-4 : fenêtre de 8192 tokens
+    assert history_budget("gpt-4", fixed_tokens=3000, max_completion_tokens=4000) == 8192 - 7000 - 256
+    assert history_budget("gpt-4", fixed_tokens=8000, max_completion_tokens=4000) == 0
+
+
+def test_fit_history_keeps_recent_messages_and_summarizes_the_rest():
+    history = []
+    for i in range(6):
+        history.append({"role": "user", "content": f"Question {i} " + "mot " * 40})
+        history.append({"role": "assistant", "content": "réponse " * 40})
+    budget = sum(message_tokens(m) for m in history[-2:]) + 60
+
+    fitted = fit_history(history, "gpt-4o-mini", budget)
+
+    assert fitted[-2:] == history[-2:]
+    assert fitted[0]["role"] == "system"
+    assert "Question 4" in fitted[0]["content"]
+    assert count_messages_tokens(fitted) <= budget + token_counter.REPLY_PRIMING_TOKENS
+
+
+def test_oversized_last_message_is_truncated_not_dropped():
+    document = "paragraphe " * 5000
+    fitted = fit_history([{"role": "user", "content": document}], "gpt-4o-mini", budget=300)
+    assert len(fitted) == 1
+    assert fitted[0]["content"].endswith(token_counter.TRUNCATION_MARKER)
+    assert message_tokens(fitted[0]) <= 300
+
+
+def test_build_messages_bounds_history_by_tokens(monkeypatch):
+    monkeypatch.setattr(token_counter.settings, "ai_history_token_budget", 500)
+    history = [{"role": "user", "content": "document " * 3000}, {"role": "assistant", "content": "ok"}]
+    messages = build_messages("suite ?", history=history, model="gpt-5-mini", max_completion_tokens=500)
+    assert count_messages_tokens(messages[1:-1]) <= 500 + token_counter.REPLY_PRIMING_TOKENS
+    assert messages[-2] == {"role": "assistant", "content": "ok"}
@@ -0,0 +1,222 @@
+"""
+Tests pour l'historique utilisateur (empreintes, mots-clés et statistiques matérialisées)
+"""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from app.repositories.user_history_repository import UserHistoryRepository, _stats_key, _unstats_key
+
+
+def test_hash_question_ignores_case_and_spacing():
+    """Deux formulations ne différant que par la casse/les espaces ont la même empreinte"""
+    first = UserHistoryRepository.hash_question("Qu'est-ce qu'une  Dérivée ?")
+    second = UserHistoryRepository.hash_question("  qu'est-ce qu'une dérivée ?")
+    assert first == second
+    assert first != UserHistoryRepository.hash_question("Qu'est-ce qu'une intégrale ?")
+
+
+def test_extract_keywords():
+    """Mots de 4+ caractères, en minuscules et sans doublons"""
+    keywords = UserHistoryRepository.extract_keywords("Comment calculer la dérivée, puis la DÉRIVÉE seconde ?")
+    assert keywords == ["comment", "calculer", "dérivée", "puis", "seconde"]
+
+
+def test_stats_key_roundtrip():
+    """Les noms de modèles contenant des points restent utilisables comme clés"""
+    key = _stats_key("gpt-5.2")
+    assert "." not in key
+    assert _unstats_key(key) == "gpt-5.2"
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    def sort(self, field, direction):
+        self._documents = sorted(self._documents, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, size):
+        self._documents = self._documents[:size]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._documents)
+
+
+class FakeResult:
+    def __init__(self, matched_count):
+        self.matched_count = matched_count
+
+
+class FakeStatsCollection:
+    """user_history_stats / user_question_counts : un document par filtre"""
+
+    def __init__(self):
+        self.documents = {}
+
+    @staticmethod
+    def _key(query):
+        return query.get("_id") or (query["user_id"], query["question_hash"])
+
+    def _apply(self, document, update):
+        for key, value in update.get("$inc", {}).items():
+            target = document
+            *parents, leaf = key.split(".")
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = target.get(leaf, 0) + value
+        document.update(update.get("$set", {}))
+
+    async def find_one(self, query):
+        return self.documents.get(self._key(query))
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        document = self.documents.get(self._key(query))
+        if document is None:
+            document = self.documents[self._key(query)] = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+        self._apply(document, update)
+        return dict(document)
+
+    async def replace_one(self, query, replacement):
+        document = self.documents.get(self._key(query))
+        if document is None or document.get("version") != query["version"]:
+            return FakeResult(0)
+        self.documents[self._key(query)] = {"_id": query["_id"], **replacement}
+        return FakeResult(1)
+
+    async def update_one(self, query, update, upsert=False):
+        document = self.documents.get(self._key(query))
+        if document is not None and "rebuilt_through" in query:
+            # {"$not": {"$gt": created_at}} : entrée postérieure au dernier recalcul
+            rebuilt_through = document.get("rebuilt_through")
+            if rebuilt_through is not None and rebuilt_through > query["rebuilt_through"]["$not"]["$gt"]:
+                return FakeResult(0)
+        if document is None:
+            if not upsert:
+                return FakeResult(0)
+            document = self.documents[self._key(query)] = {**query, **update.get("$setOnInsert", {})}
+        self._apply(document, update)
+        return FakeResult(1)
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.documents.values() if d.get("user_id") == query["user_id"]])
+
+
+@pytest.fixture
+def stats_db(monkeypatch):
+    """Historique en mémoire ; l'agrégation $facet est calculée en Python"""
+    database = {"user_history_stats": FakeStatsCollection(), "user_question_counts": FakeStatsCollection()}
+    database["entries"] = []
+
+    async def aggregate_stats(user_id, before):
+        entries = [e for e in database["entries"] if e["user_id"] == user_id and e["created_at"] < before]
+        return {
+            "total_questions": len(entries),
+            "total_tokens": sum(e["tokens_used"] for e in entries),
+            "total_cost": 0.0,
+            "by_subject": {},
+            "by_model": {"gpt-5.2": len(entries)} if entries else {},
+        }
+
+    async def rebuild_question_counts(user_id, before):
+        pass
+
+    monkeypatch.setattr(
+        "app.repositories.user_history_repository.get_database", lambda: SimpleNamespace(**database)
+    )
+    monkeypatch.setattr(UserHistoryRepository, "_aggregate_stats", staticmethod(aggregate_stats))
+    monkeypatch.setattr(UserHistoryRepository, "_rebuild_question_counts", staticmethod(rebuild_question_counts))
+    return database
+
+
+def _insert_entry(database, user_id, tokens):
+    entry = {"user_id": user_id, "tokens_used": tokens, "created_at": datetime.now(timezone.utc)}
+    database["entries"].append(entry)
+    return entry
+
+
+async def _increment(entry):
+    return await UserHistoryRepository.increment_stats(
+        entry["user_id"], "question", model_used="gpt-5.2", tokens_used=entry["tokens_used"],
+        created_at=entry["created_at"]
+    )
+
+
+async def _add_entry(database, user_id, tokens):
+    return await _increment(_insert_entry(database, user_id, tokens))
+
+
+@pytest.mark.asyncio
+async def test_stats_materialized_then_incremented(stats_db):
+    # Pas de document : rien n'est écrit, get_stats recalcule
+    assert not await _add_entry(stats_db, "u1", 10)
+    stats = await UserHistoryRepository.get_stats("u1")
+    assert stats["total_questions"] == 1
+
+    assert await _add_entry(stats_db, "u1", 5)
+    stats = await UserHistoryRepository.get_stats("u1")
+    assert stats["total_questions"] == 2
+    assert stats["total_tokens"] == 15
+    assert stats["by_model"] == {"gpt-5.2": 2}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_concurrent_increment(stats_db, monkeypatch):
+    """Une entrée ajoutée pendant le recalcul n'est pas écrasée par celui-ci"""
+    _insert_entry(stats_db, "u1", 10)
+    aggregate = UserHistoryRepository._aggregate_stats
+    calls = []
+
+    async def aggregate_then_concurrent_entry(user_id, before):
+        totals = await aggregate(user_id, before)
+        if not calls:
+            await _add_entry(stats_db, user_id, 5)
+        calls.append(user_id)
+        return totals
+
+    monkeypatch.setattr(UserHistoryRepository, "_aggregate_stats", staticmethod(aggregate_then_concurrent_entry))
+    await UserHistoryRepository.rebuild_stats("u1")
+
+    assert len(calls) == 2
+    document = stats_db["user_history_stats"].documents["u1"]
+    assert document["total_questions"] == 2
+    assert document["total_tokens"] == 15
+    assert "rebuilding" not in document
+
+
+@pytest.mark.asyncio
+async def test_entry_counted_by_rebuild_is_not_incremented_again(stats_db):
+    """Entrée insérée avant le recalcul mais dont increment_stats s'exécute après"""
+    late_entry = _insert_entry(stats_db, "u1", 10)
+    await UserHistoryRepository.rebuild_stats("u1")
+    assert not await _increment(late_entry)
+
+    assert await _add_entry(stats_db, "u1", 5)
+    document = stats_db["user_history_stats"].documents["u1"]
+    assert (document["total_questions"], document["total_tokens"]) == (2, 15)
+
+
+@pytest.mark.asyncio
+async def test_aggregate_stats_single_facet_pass(monkeypatch):
+    pipelines = []
+
+    class History:
+        def aggregate(self, pipeline, hint=None):
+            pipelines.append(pipeline)
+            return FakeCursor([{
+                "totals": [{"_id": None, "total_questions": 3, "total_tokens": 30, "total_cost": 0.5}],
+                "by_subject": [{"_id": "mathematiques", "count": 2}],
+                "by_model": [{"_id": "gpt-5.2", "count": 2}, {"_id": None, "count": 1}],
+            }])
+
+    monkeypatch.setattr(
+        "app.repositories.user_history_repository.get_database", lambda: SimpleNamespace(user_history=History())
+    )
+    totals = await UserHistoryRepository._aggregate_stats("u1", datetime.now(timezone.utc))
+
+    assert [list(stage) for stage in pipelines[0]] == [["$match"], ["$facet"]]
+    assert totals == {
+        "total_questions": 3, "total_tokens": 30, "total_cost": 0.5,
+        "by_subject": {"mathematiques": 2}, "by_model": {"gpt-5.2": 2},
+    }